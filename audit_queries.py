@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Query plan audit
+Explains the application's queries on a database (best a copy of a busy
+store's thangamayil.db) and reports scans and temporary B-trees with index
+suggestions. Save the report per release and diff the files.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.database.connection import db
+from thangamayil.diagnostics.queryplan import QueryPlanAuditor, format_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit query plans and suggest indexes")
+    parser.add_argument('--database', default=db.db_path, help="database file to audit")
+    parser.add_argument('--output', help="write the report to this file instead of the screen")
+    parser.add_argument('--json', action='store_true', help="write the report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        print(f"✗ Database not found: {args.database}")
+        return 1
+
+    db.db_path = args.database
+    db.connect()
+    try:
+        report = QueryPlanAuditor(db).audit()
+    except Exception as e:
+        print(f"✗ {e}")
+        return 1
+    finally:
+        db.disconnect()
+
+    text = json.dumps(report, indent=2) + "\n" if args.json else format_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"✓ {len(report['queries'])} statements audited, {report['scans']} scans, "
+              f"{len(report['suggestions'])} suggested indexes: {args.output}")
+    else:
+        print(text, end="")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
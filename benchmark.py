@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmarks
+  python benchmark.py run [--scale medium | --database store.db] [--baseline old.json]
+  python benchmark.py compare baseline.json current.json
+Runs are saved under benchmarks/ as JSON. Without --database a synthetic
+store of the chosen scale is generated once into benchmarks/data/.
+Exits with 1 when a case regressed against the baseline.
+"""
+
+import argparse
+import os
+import sys
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.diagnostics.benchmark import (
+    BenchmarkSuite, BENCHMARK_DIR, DATASET_DIR, CASE_SECONDS, DEFAULT_THRESHOLD,
+    save_results, load_results, compare_results, format_results, format_comparison
+)
+from thangamayil.diagnostics.datagen import StoreDataGenerator, SCALES
+
+
+def dataset_path(scale: str, seed: int) -> str:
+    """Generated store database for a scale, created on first use"""
+    path = os.path.join(DATASET_DIR, f"{scale}-seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {scale} store database (once): {path}")
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        StoreDataGenerator.from_scale(path, scale, seed=seed,
+                                      progress_callback=lambda message: print(f"  {message}")).generate()
+    return path
+
+
+def compare(baseline_path: str, results, threshold: float) -> int:
+    rows = compare_results(load_results(baseline_path), results, threshold)
+    print(format_comparison(rows), end="")
+    regressions = [row['name'] for row in rows if row['status'] == 'REGRESSION']
+    if regressions:
+        print(f"✗ {len(regressions)} regressions against {baseline_path}")
+        return 1
+    print(f"✓ No regressions against {baseline_path}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the billing application")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmarks and save the results")
+    run_parser.add_argument('--database', help="store database to benchmark (a copy is used)")
+    run_parser.add_argument('--scale', choices=sorted(SCALES), default='medium',
+                            help="size of the generated store when no --database is given")
+    run_parser.add_argument('--seed', type=int, default=1, help="seed for the generated store and samples")
+    run_parser.add_argument('--seconds', type=float, default=CASE_SECONDS, help="time budget per case")
+    run_parser.add_argument('--only', nargs='*', help="run only cases whose name contains one of these")
+    run_parser.add_argument('--label', default="", help="added to the results file name")
+    run_parser.add_argument('--output-dir', default=BENCHMARK_DIR, help="folder for results files")
+    run_parser.add_argument('--baseline', help="results file to compare the run with")
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help="slowdown counted as a regression (0.2 = 20%%)")
+
+    compare_parser = commands.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="slowdown counted as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'compare':
+            return compare(args.baseline, load_results(args.current), args.threshold)
+
+        database = args.database or dataset_path(args.scale, args.seed)
+        suite = BenchmarkSuite(database, seconds=args.seconds, only=args.only, seed=args.seed,
+                               label=args.label or (args.scale if not args.database else ""),
+                               progress_callback=print)
+        results = suite.run()
+        path = save_results(results, args.output_dir)
+        print(format_results(results), end="")
+        print(f"✓ {len(results['results'])} cases saved to {path}")
+        return compare(args.baseline, results, args.threshold) if args.baseline else 0
+    except Exception as e:
+        print(f"✗ {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,8 @@ from thangamayil.database.connection import db
 from thangamayil.models.auth import auth, StaffManager
 from thangamayil.models.items import ItemsManager
 from thangamayil.models.billing import BillingManager, GSTCalculator
+from thangamayil.service.client import service_url_from_args, connect_to_service
+from thangamayil.diagnostics.profiler import profiler, profile_mode_from_args
 from thangamayil import APP_NAME, APP_VERSION
 
 
@@ -117,33 +119,32 @@ class ConsoleApp:
             staff_name = auth.get_current_staff_name()
             print(f"Logged in as: {staff_name}")
             
-            options = [
-                "🛒 New Bill / POS",
-                "📦 Items Management",
-                "👥 Staff Management", 
-                "📊 Reports",
-                "💾 Database Backup",
-                "🚪 Logout"
+            entries = [
+                ("🛒 New Bill / POS", self.pos_billing),
+                ("📦 Items Management", self.items_management),
+                ("👥 Staff Management", self.staff_management),
+                ("📊 Reports", self.reports)
             ]
+            # These work on the database file, so only where it is opened directly;
+            # on a service terminal they run on the service computer
+            if not db.remote:
+                entries += [
+                    ("💾 Database Backup", self.database_backup),
+                    ("♻️ Restore Database", self.database_restore),
+                    ("🗄️ Archive Old Years", self.archive_old_years),
+                    ("🧹 Database Maintenance", self.database_maintenance),
+                    ("📤 Head Office Sync", self.head_office_sync)
+                ]
+            entries.append(("🚪 Logout", self.logout))
             
-            self.print_menu("Select Operation:", options)
+            self.print_menu("Select Operation:", [label for label, action in entries])
             
             choice = self.get_input("Enter choice", int, required=False)
             
-            if choice == 1:
-                self.pos_billing()
-            elif choice == 2:
-                self.items_management()
-            elif choice == 3:
-                self.staff_management()
-            elif choice == 4:
-                self.reports()
-            elif choice == 5:
-                self.database_backup()
-            elif choice == 6:
-                self.logout()
-            elif choice == 0:
+            if choice == 0:
                 self.running = False
+            elif choice and 1 <= choice <= len(entries):
+                entries[choice - 1][1]()
             else:
                 print("Invalid choice. Please try again.")
                 self.wait_for_enter()
@@ -698,7 +699,8 @@ class ConsoleApp:
             options = [
                 "📈 Daily Sales Report",
                 "📊 Staff Performance Report",
-                "🏪 All Bills Today"
+                "🏪 All Bills Today",
+                "📄 Export Invoices to PDF"
             ]
             
             self.print_menu("Reports:", options)
@@ -711,6 +713,8 @@ class ConsoleApp:
                 self.staff_performance_report()
             elif choice == 3:
                 self.bills_today()
+            elif choice == 4:
+                self.export_invoices_pdf()
             elif choice == 0:
                 break
             else:
@@ -748,6 +752,41 @@ class ConsoleApp:
         
         self.wait_for_enter()
     
+    def export_invoices_pdf(self):
+        """Export invoices for a date range as PDFs"""
+        from thangamayil.printing.invoice_export import InvoiceExporter
+        
+        self.clear_screen()
+        self.print_header("Export Invoices to PDF")
+        
+        today = datetime.now()
+        date_from = self.get_input(f"From date (YYYY-MM-DD) [{today.strftime('%Y-%m-01')}]", required=False)
+        date_from = date_from or today.strftime('%Y-%m-01')
+        date_to = self.get_input(f"To date (YYYY-MM-DD) [{today.strftime('%Y-%m-%d')}]", required=False)
+        date_to = date_to or today.strftime('%Y-%m-%d')
+        
+        layout = (self.get_input("Format - a4 or thermal [a4]", required=False) or 'a4').lower()
+        default_output = f"invoices_{date_from}_to_{date_to}.zip"
+        output_path = self.get_input(f"Output .zip file or folder [{default_output}]", required=False)
+        output_path = output_path or default_output
+        
+        def show_progress(done, total):
+            print(f"\r  Exported {done}/{total} invoices", end="", flush=True)
+        
+        try:
+            exporter = InvoiceExporter(output_path, layout=layout, progress_callback=show_progress)
+            result = exporter.export(date_from, date_to)
+            print()
+            print(f"✓ Exported: {result['exported']}, skipped (already present): {result['skipped']}, "
+                  f"failed: {result['failed']}")
+            for error in result['errors'][:5]:
+                print(f"  ✗ {error}")
+            print(f"Output: {output_path}")
+        except Exception as e:
+            print(f"\n✗ Export error: {e}")
+        
+        self.wait_for_enter()
+    
     def staff_performance_report(self):
         """Show staff performance report"""
         today = datetime.now().strftime("%Y-%m-%d")
@@ -826,12 +865,17 @@ class ConsoleApp:
         
         if confirm in ('', 'y', 'yes'):
             try:
-                success = db.backup_database(backup_filename)
-                if success:
-                    print(f"✓ Database backup created successfully!")
-                    print(f"File: {backup_filename}")
-                else:
-                    print("✗ Backup failed")
+                from thangamayil.database.backup import BackupEngine
+                
+                def on_progress(done, total):
+                    print(f"\rCopying pages: {done}/{total}", end="", flush=True)
+                
+                result = BackupEngine(progress_callback=on_progress).backup(backup_filename)
+                print()
+                print(f"✓ Database backup created successfully!")
+                print(f"File: {backup_filename}")
+                print(f"Size: {result['file_size'] / 1024:.0f} KB | Time: {result['duration_ms'] / 1000:.1f} s")
+                print(f"Integrity check: {result['integrity']} | SHA-256: {result['checksum'][:16]}...")
             except Exception as e:
                 print(f"✗ Backup error: {e}")
         else:
@@ -839,6 +883,187 @@ class ConsoleApp:
         
         self.wait_for_enter()
     
+    def database_restore(self):
+        """Restore database to a point in time from scheduled backups"""
+        from thangamayil.database.restore import RestoreEngine
+        
+        self.clear_screen()
+        self.print_header("Restore Database")
+        
+        engine = RestoreEngine(progress_callback=lambda message: print(f"  {message}"))
+        points = engine.restore_points()
+        if not points:
+            print(f"No scheduled backups found in {engine.backup_dir}")
+            self.wait_for_enter()
+            return
+        
+        print(f"Backup folder: {engine.backup_dir}")
+        print(f"Restore points: {points[0]['time']:%d-%m-%Y %H:%M} to {points[-1]['time']:%d-%m-%Y %H:%M}")
+        print("\nLatest backups:")
+        for point in points[-10:]:
+            print(f"  {point['time']:%d-%m-%Y %H:%M:%S}  {point['type']}")
+        
+        target = self.get_input("\nRestore up to (YYYY-MM-DD HH:MM, blank for latest)", str, required=False)
+        try:
+            target_time = datetime.strptime(target, '%Y-%m-%d %H:%M').replace(second=59, microsecond=999999) if target else None
+        except ValueError:
+            print("Invalid date/time format")
+            self.wait_for_enter()
+            return
+        
+        try:
+            print()
+            result = engine.build(target_time)
+            verification = result['verification']
+            print(f"\n✓ Restored copy built in {result['duration_ms'] / 1000:.1f} s")
+            print(f"Restored to: {result['restored_to']:%d-%m-%Y %H:%M:%S}")
+            print(f"Changesets applied: {result['incrementals']} ({result['records']} rows)")
+            print(f"Integrity check: {verification['integrity']}")
+            print(f"Active bills: {verification['bill_count']} (₹{verification['sales_total']:,.2f})")
+            
+            mismatched = verification['mismatched_bills']
+            if mismatched:
+                print(f"⚠️ {len(mismatched)} bills have totals that differ from their lines: "
+                      f"{', '.join(mismatched[:10])}{' ...' if len(mismatched) > 10 else ''}")
+                if input("Restore with these bills as they are? (y/N): ").lower() != 'y':
+                    print(f"Restore not applied. Restored copy left at: {result['output_path']}")
+                    self.wait_for_enter()
+                    return
+            
+            print("\nClose billing on all other terminals before replacing the database.")
+            confirm = input("Replace the live database with this copy? (y/N): ").lower()
+            if confirm == 'y':
+                previous_path = engine.swap_in(result['output_path'], accept_mismatches=True)
+                print("✓ Database restored successfully!")
+                print(f"Previous database saved as: {previous_path}")
+            else:
+                print(f"Restore not applied. Restored copy left at: {result['output_path']}")
+        except Exception as e:
+            print(f"✗ Restore failed: {e}")
+        
+        self.wait_for_enter()
+    
+    def archive_old_years(self):
+        """Move closed financial years to archive files"""
+        from thangamayil.database.archive import ArchiveManager, get_archives, financial_year_label
+        
+        self.clear_screen()
+        self.print_header("Archive Old Years")
+        
+        manager = ArchiveManager()
+        archives = get_archives()
+        if archives:
+            print("Archived years:")
+            for archive in archives:
+                print(f"  {financial_year_label(archive['fy_start'])}: {archive['bill_count']} bills "
+                      f"(₹{archive['sales_total']:,.2f})")
+            print()
+        
+        years = manager.archivable_years()
+        if not years:
+            print("No closed financial years left to archive.")
+            self.wait_for_enter()
+            return
+        
+        print(f"Closed years in the live database: {', '.join(financial_year_label(fy) for fy in years)}")
+        print(f"Archive folder: {manager.archive_dir}")
+        confirm = input("Archive these years now? (y/N): ").lower()
+        if confirm == 'y':
+            for fy_start in years:
+                try:
+                    result = manager.archive_year(fy_start)
+                    print(f"✓ {result['label']}: {result['bills']} bills, {result['bill_items']} bill items, "
+                          f"{result['stock_movements']} stock movements archived")
+                except Exception as e:
+                    print(f"✗ {financial_year_label(fy_start)} archive failed: {e}")
+                    break
+        else:
+            print("Archive cancelled.")
+        
+        self.wait_for_enter()
+    
+    def database_maintenance(self):
+        """Run ANALYZE, optimize, checkpoint and VACUUM"""
+        from thangamayil.database.maintenance import MaintenanceEngine, measure, format_run
+        
+        self.clear_screen()
+        self.print_header("Database Maintenance")
+        
+        engine = MaintenanceEngine()
+        stats = measure()
+        print(f"Database size: {stats['file_bytes'] / 1024:,.0f} KB ({stats['page_count']} pages)")
+        print(f"Free pages: {stats['freelist_count']} ({stats['free_percent']}%)")
+        if stats['fragmentation_percent'] is not None:
+            print(f"Fragmentation: {stats['fragmentation_percent']}%")
+        print(f"Journal mode: {stats['journal_mode']} | WAL size: {stats['wal_bytes'] / 1024:,.0f} KB")
+        print(f"VACUUM needed: {'Yes' if engine.vacuum_needed(stats) else 'No'}")
+        
+        history = engine.get_history(5)
+        if history:
+            print("\nRecent runs:")
+            for run in history:
+                print(f"  {run['run_time']}  {run['run_type']:<9} {run['duration_ms']:>6} ms  {run['tasks']}")
+        
+        confirm = input("\nRun maintenance now? (y/N/force vacuum = f): ").lower()
+        if confirm in ('y', 'f'):
+            try:
+                print()
+                print(format_run(engine.run('MANUAL', force_vacuum=confirm == 'f')))
+            except Exception as e:
+                print(f"✗ Maintenance failed: {e}")
+        else:
+            print("Maintenance cancelled.")
+        
+        self.wait_for_enter()
+    
+    def head_office_sync(self):
+        """Export changes since the last sync for head office"""
+        from thangamayil.database.sync import ChangesetExporter, get_sync_cursor
+        
+        self.clear_screen()
+        self.print_header("Head Office Sync")
+        
+        exporter = ChangesetExporter()
+        if not exporter.store_code:
+            print("No store code is set. Head office keeps each store's bills under its code,")
+            print("so every store needs its own.")
+            store_code = self.get_input("Store code for this store (blank to cancel)", str, required=False)
+            if not store_code:
+                self.wait_for_enter()
+                return
+            db.update_setting('store_code', store_code.upper())
+            exporter = ChangesetExporter()
+        
+        cursor = get_sync_cursor()
+        print(f"Store code: {exporter.store_code}")
+        print(f"Confirmed by head office up to change: {cursor if cursor is not None else 'never synced'}")
+        
+        exports = exporter.get_exports(5)
+        if exports:
+            print("\nRecent exports:")
+            for export in exports:
+                print(f"  {export['exported_at']}  changes {export['from_seq']}-{export['to_seq']}  "
+                      f"{export['records']} rows  {(export['file_size'] or 0) / 1024:,.1f} KB")
+        
+        confirm = input("\nExport changes now? (y/N): ").lower()
+        if confirm == 'y':
+            try:
+                result = exporter.export_since()
+                if result is None:
+                    print("No changes since the last sync.")
+                else:
+                    print(f"✓ {result['records']} rows written to {result['file_path']} "
+                          f"({result['file_size'] / 1024:,.1f} KB)")
+                    sent = input("Mark as received by head office? (y/N): ").lower()
+                    if sent == 'y' and exporter.acknowledge(result['to_seq']):
+                        print(f"✓ Sync cursor moved to {result['to_seq']}")
+            except Exception as e:
+                print(f"✗ Export failed: {e}")
+        else:
+            print("Export cancelled.")
+        
+        self.wait_for_enter()
+    
     def logout(self):
         """Logout current user"""
         confirm = input("Are you sure you want to logout? (y/N): ").lower()
@@ -849,8 +1074,17 @@ class ConsoleApp:
     def run(self):
         """Run the console application"""
         try:
-            # Initialize database
-            db.connect()
+            # Initialize database (or connect to the billing service)
+            service_url = service_url_from_args(sys.argv[1:])
+            if service_url:
+                connect_to_service(service_url)
+            else:
+                db.connect()
+            
+            # Whole session profiled with --profile [sampling|cprofile]
+            profile_mode = profile_mode_from_args(sys.argv[1:])
+            if profile_mode:
+                profiler.start(profile_mode)
             
             # Show welcome message
             self.clear_screen()
@@ -872,6 +1106,9 @@ class ConsoleApp:
         except Exception as e:
             print(f"Application error: {e}")
         finally:
+            if profiler.running:
+                result = profiler.stop()
+                print(f"\nProfile saved to {result['file']} (summary: {result['summary']})")
             db.disconnect()
             print("\nThank you for using தங்கமயில் சில்க்ஸ் Billing Software!")
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Head office consolidation
+Merges store database files and sync changesets into one reporting
+database and shows the same reports as the store Reports window
+"""
+
+import argparse
+import glob
+import os
+import sys
+from datetime import date
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.database.consolidation import ConsolidationEngine, DEFAULT_CONSOLIDATED_PATH
+
+
+def expand_inputs(patterns):
+    """Files named on the command line, with folders and wildcards expanded"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*.jsonl.gz")) +
+                                glob.glob(os.path.join(pattern, "*.db"))))
+        else:
+            paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return paths
+
+
+def merge(engine: ConsolidationEngine, inputs):
+    paths = expand_inputs(inputs)
+    if not paths:
+        print("No store files to merge")
+        return 1
+
+    summary = engine.merge(paths)
+    for source in summary['sources']:
+        print(f"  {source['store'] or '-':<10} {source['kind']:<9} {source['rows']:>7} rows  "
+              f"{source['status']}  ({os.path.basename(source['path'])})")
+    print(f"Merged {summary['merged']} of {len(paths)} files, {summary['rows']} rows "
+          f"in {summary['duration_ms'] / 1000:.2f} s (reading {summary['load_ms'] / 1000:.2f} s)")
+    return 0
+
+
+def report(engine: ConsolidationEngine, date_from: str, date_to: str):
+    """Sales per store, payment mode and GST for a date range"""
+    bills = engine.get_bills_by_date(date_from, date_to)
+    print(f"Consolidated sales {date_from} to {date_to}: {len(bills)} bills")
+
+    stores = {}
+    for bill in bills:
+        totals = stores.setdefault(bill['store_code'], {'bills': 0, 'amount': 0, 'gst': 0})
+        totals['bills'] += 1
+        totals['amount'] += bill['grand_total']
+        totals['gst'] += bill['cgst_amount'] + bill['sgst_amount'] + bill['igst_amount']
+    for store, totals in sorted(stores.items()):
+        print(f"  {store:<10} {totals['bills']:>6} bills  ₹{totals['amount']:>14,.2f}  GST ₹{totals['gst']:>12,.2f}")
+
+    payment_modes = {}
+    for bill in bills:
+        payment_modes[bill['payment_mode']] = payment_modes.get(bill['payment_mode'], 0) + bill['grand_total']
+    if payment_modes:
+        print("Payment modes: " + ", ".join(f"{mode} ₹{amount:,.2f}" for mode, amount in sorted(payment_modes.items())))
+    print(f"Total: ₹{sum(bill['grand_total'] for bill in bills):,.2f}")
+    return 0
+
+
+def show_reports_window(engine: ConsolidationEngine):
+    import tkinter as tk
+    from thangamayil.ui.reports import ReportsWindow
+
+    root = tk.Tk()
+    root.withdraw()
+    window = ReportsWindow(engine.get_bills_by_date, title="Head Office Reports - All Stores")
+    window.show(root)
+    window.window.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge store data into the head office database")
+    parser.add_argument('--output', default=DEFAULT_CONSOLIDATED_PATH, help="consolidated database file")
+    parser.add_argument('--workers', type=int, help="processes reading store files (default: CPU count, max 8)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = commands.add_parser('merge', help="merge store .db files and changesets")
+    merge_parser.add_argument('inputs', nargs='+', help="files, folders or wildcards")
+
+    today = date.today().isoformat()
+    report_parser = commands.add_parser('report', help="print consolidated sales")
+    report_parser.add_argument('--from', dest='date_from', default=today)
+    report_parser.add_argument('--to', dest='date_to', default=today)
+
+    commands.add_parser('gui', help="open the Reports window on the consolidated data")
+    args = parser.parse_args()
+
+    engine = ConsolidationEngine(args.output, args.workers)
+    try:
+        if args.command == 'merge':
+            return merge(engine, args.inputs)
+        if args.command == 'report':
+            return report(engine, args.date_from, args.date_to)
+        return show_reports_window(engine)
+    finally:
+        engine.disconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
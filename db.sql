@@ -110,7 +110,98 @@ CREATE TABLE settings (
 CREATE TABLE backup_log (
     backup_id INTEGER PRIMARY KEY AUTOINCREMENT,
     file_path TEXT NOT NULL,
-    backup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    backup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    file_size INTEGER,              -- bytes
+    duration_ms INTEGER,
+    checksum TEXT,                  -- SHA-256 of the backup file
+    backup_type TEXT DEFAULT 'MANUAL', -- 'MANUAL', 'FULL', 'INCREMENTAL'
+    change_seq INTEGER              -- last change_log entry included
+);
+
+-- Row changes for incremental backups (triggers are created by migrations)
+CREATE TABLE change_log (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    operation TEXT NOT NULL,        -- 'I', 'U', 'D', 'A' (moved to an archive)
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Closed financial years moved to per-year archive files
+CREATE TABLE archives (
+    fy_start INTEGER PRIMARY KEY,   -- financial year starting April of this year
+    file_path TEXT NOT NULL,
+    min_bill_id INTEGER,
+    max_bill_id INTEGER,
+    bill_count INTEGER DEFAULT 0,
+    sales_total DECIMAL(12,2) DEFAULT 0,
+    movement_count INTEGER DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Last invoice number issued per prefix (updated under the write lock)
+CREATE TABLE invoice_sequences (
+    prefix TEXT PRIMARY KEY,
+    last_number INTEGER NOT NULL
+);
+
+-- Stock added and removed per item by each terminal's database copy;
+-- items.stock_quantity is their sum (maintained by triggers from migrations)
+CREATE TABLE stock_counters (
+    item_id INTEGER NOT NULL,
+    terminal_id TEXT NOT NULL,
+    added INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_id, terminal_id)
+);
+
+-- Changeset files exported for head office sync
+CREATE TABLE sync_exports (
+    export_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    from_seq INTEGER NOT NULL,      -- change_log cursor the export starts after
+    to_seq INTEGER NOT NULL,        -- last change_log entry included
+    records INTEGER DEFAULT 0,
+    file_size INTEGER,
+    checksum TEXT,
+    exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ranges of invoice numbers leased to terminals; a terminal issues its
+-- block's numbers without touching invoice_sequences
+CREATE TABLE invoice_blocks (
+    block_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prefix TEXT NOT NULL,
+    terminal TEXT NOT NULL,
+    start_number INTEGER NOT NULL,
+    end_number INTEGER NOT NULL,
+    next_number INTEGER NOT NULL,   -- next number to issue (end_number + 1 when used up)
+    leased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    released_at TIMESTAMP           -- set when the terminal gave up the rest
+);
+
+-- Highest invoice number archived per prefix, so numbers are never reused
+CREATE TABLE archived_invoice_sequences (
+    prefix TEXT PRIMARY KEY,
+    max_number INTEGER NOT NULL
+);
+
+-- Database maintenance runs (ANALYZE, optimize, checkpoint, VACUUM)
+CREATE TABLE maintenance_log (
+    maintenance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_time TIMESTAMP,             -- local time
+    run_type TEXT NOT NULL,         -- 'IDLE', 'DAY_CLOSE', 'MANUAL'
+    tasks TEXT,                     -- tasks that ran, e.g. 'ANALYZE, OPTIMIZE'
+    duration_ms INTEGER,
+    page_count_before INTEGER,
+    page_count_after INTEGER,
+    freelist_before INTEGER,
+    freelist_after INTEGER,
+    wal_bytes_before INTEGER,
+    wal_bytes_after INTEGER,
+    fragmentation_before REAL,      -- percent of out-of-order pages
+    fragmentation_after REAL,
+    details TEXT                    -- JSON per-task durations
 );
 
 -- Schema migrations tracking
@@ -123,6 +214,7 @@ CREATE TABLE schema_migrations (
 CREATE INDEX IF NOT EXISTS idx_items_barcode ON items(barcode);
 CREATE INDEX IF NOT EXISTS idx_items_name ON items(item_name);
 CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(bill_date);
+CREATE INDEX IF NOT EXISTS idx_invoice_blocks_terminal ON invoice_blocks(prefix, terminal);
 CREATE INDEX IF NOT EXISTS idx_bills_invoice ON bills(invoice_number);
 CREATE INDEX IF NOT EXISTS idx_bills_staff ON bills(staff_id);
 CREATE INDEX IF NOT EXISTS idx_bill_items_bill ON bill_items(bill_id);
@@ -144,7 +236,20 @@ INSERT OR IGNORE INTO settings (setting_key, setting_value, description) VALUES
 ('gstin', '33AAACT9454F1ZB', 'GST Identification Number'),
 ('state_code', '33', 'State Code for GST'),
 ('invoice_prefix', 'TSK', 'Invoice Number Prefix'),
-('low_stock_threshold', '10', 'Low Stock Alert Threshold');
+('low_stock_threshold', '10', 'Low Stock Alert Threshold'),
+('receipt_paper_width', '4in', 'Receipt Paper Width (58mm / 80mm / 4in)'),
+('backup_interval_minutes', '15', 'Scheduled Backup Interval (minutes, 0 = off)'),
+('backup_full_interval_hours', '24', 'Hours Between Full Backups'),
+('backup_retention_count', '7', 'Full Backups Kept (with their incrementals)'),
+('maintenance_idle_minutes', '10', 'Idle Minutes Before Maintenance (0 = off)'),
+('maintenance_day_close_time', '21:00', 'Day Close Time for Full Maintenance (HH:MM)'),
+('vacuum_free_percent', '10', 'Free or Fragmented Page Percent That Triggers VACUUM'),
+('store_code', '', 'Store Code Used in Head Office Sync (required before syncing; unique per store)'),
+('terminal_id', 'MAIN', 'Terminal Id of This Database Copy (offline tills use their own)'),
+('scheduled_jobs_terminal', '', 'Terminal That Runs Scheduled Backups and Maintenance (empty = one terminal at a time)'),
+('invoice_block_size', '0', 'Invoice Numbers Leased to a Terminal at a Time (0 = no blocks, one shared sequence)'),
+('slow_query_ms', '100', 'Statements Slower Than This Are Logged While SQL Tracing Is On (ms)'),
+('ui_freeze_ms', '500', 'Screen Stalls Longer Than This Are Logged With the Blocking Code (ms)');
 
 -- Insert Default Admin Staff (password: admin123)
 INSERT OR IGNORE INTO staff (staff_name, password_hash, is_active) VALUES 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Synthetic store database
+Writes a new database with years of realistic billing history (festival
+peaks, GST slabs, repeat customers) for benchmarks and query plan audits.
+The large scale matches a big store: 100k items, 2M bills, ~10M bill lines.
+"""
+
+import argparse
+import os
+import sys
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.diagnostics.datagen import StoreDataGenerator, SCALES, STAFF_PASSWORD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic store database")
+    parser.add_argument('--output', default="store_synthetic.db", help="database file to create")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help="preset size")
+    parser.add_argument('--items', type=int, help="number of items (overrides the scale)")
+    parser.add_argument('--bills', type=int, help="number of bills (overrides the scale)")
+    parser.add_argument('--customers', type=int, help="number of registered customers (overrides the scale)")
+    parser.add_argument('--years', type=float, help="years of history (overrides the scale)")
+    parser.add_argument('--lines-per-bill', type=float, help="average lines per bill (default 5)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed; the same seed gives the same data")
+    parser.add_argument('--force', action='store_true', help="replace the output file if it exists")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"✗ {args.output} exists (use --force to replace it)")
+            return 1
+        os.remove(args.output)
+
+    generator = StoreDataGenerator.from_scale(
+        args.output, args.scale, items=args.items, bills=args.bills, customers=args.customers,
+        years=args.years, lines_per_bill=args.lines_per_bill, seed=args.seed,
+        progress_callback=lambda message: print(f"  {message}")
+    )
+    try:
+        result = generator.generate()
+    except Exception as e:
+        print(f"✗ {e}")
+        return 1
+
+    print(f"✓ {args.output}: {result['items']:,} items, {result['customers']:,} customers, "
+          f"{result['bills']:,} bills ({result['cancelled']:,} cancelled), {result['bill_items']:,} bill lines, "
+          f"{result['stock_movements']:,} stock movements")
+    print(f"  {result['file_size'] / 1024 / 1024:.0f} MB in {result['duration']:.0f}s; "
+          f"staff01..staff{result['staff']:02d} use password '{STAFF_PASSWORD}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
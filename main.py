@@ -4,6 +4,9 @@ Main entry point for தங்கமயில் சில்க்ஸ் Billin
 Handles application startup, login, and main window initialization
 """
 
+import time
+STARTED = time.perf_counter()
+
 import sys
 import os
 import tkinter as tk
@@ -12,10 +15,12 @@ from tkinter import messagebox
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# Only what the login screen needs is imported up front; the main window,
+# printing and export modules load after login or on first use
 try:
-    from thangamayil.ui.login import show_login
-    from thangamayil.ui.main_window import MainWindow
+    from thangamayil.ui.login import LoginWindow
     from thangamayil.database.connection import db
+    from thangamayil.startup import StartupTimer, StartupTasks, warm_up
     from thangamayil import APP_NAME, APP_VERSION
 except ImportError as e:
     print(f"Import error: {e}")
@@ -29,79 +34,51 @@ class BillingApplication:
     
     def __init__(self):
         self.main_window = None
+        self.timer = StartupTimer(STARTED)
+        self.timer.record('imports', time.perf_counter() - STARTED)
+        self.startup = StartupTasks(self.timer)
     
     def initialize_database(self):
-        """Initialize database connection and schema"""
-        try:
-            # Test database connection
-            db.connect()
-            print("Database connected successfully")
-            return True
-        except Exception as e:
-            messagebox.showerror(
-                "Database Error",
-                f"Failed to initialize database:\n{str(e)}\n\nPlease check database configuration."
-            )
-            return False
-    
-    def show_splash_screen(self):
-        """Show application splash screen"""
-        splash = tk.Tk()
-        splash.title(APP_NAME)
-        splash.geometry("500x300")
-        splash.resizable(False, False)
-        
-        # Center splash screen (same as login window)
-        splash.update_idletasks()
-        width = splash.winfo_width()
-        height = splash.winfo_height()
-        x = (splash.winfo_screenwidth() // 2) - (width // 2)
-        y = (splash.winfo_screenheight() // 2) - (height // 2)
-        splash.geometry(f"{width}x{height}+{x}+{y}")
-        
-        # Splash content
-        tk.Label(splash, text=APP_NAME, font=("Arial", 16, "bold")).pack(pady=20)
-        tk.Label(splash, text=f"Version {APP_VERSION}", font=("Arial", 10)).pack()
-        tk.Label(splash, text="Loading...", font=("Arial", 10)).pack(pady=20)
-        
-        # Progress bar
-        progress_frame = tk.Frame(splash)
-        progress_frame.pack(pady=10)
-        
-        progress_bar = tk.Canvas(progress_frame, width=200, height=10, bg="white", highlightthickness=1)
-        progress_bar.pack()
-        
-        # Animate progress
-        for i in range(0, 201, 10):
-            progress_bar.delete("all")
-            progress_bar.create_rectangle(0, 0, i, 10, fill="blue", outline="")
-            splash.update()
-            splash.after(50)  # Small delay for animation
+        """Initialize database connection and schema (runs on the startup thread)"""
+        # Terminals can use a billing service instead of the database file
+        from thangamayil.service.client import service_url_from_args, connect_to_service
+        service_url = service_url_from_args(sys.argv[1:])
+        if service_url:
+            connect_to_service(service_url)
+            print(f"Connected to billing service at {service_url}")
+            return
         
-        splash.destroy()
+        db.connect()
+        print("Database connected successfully")
     
     def run(self):
         """Main application entry point"""
         print(f"Starting {APP_NAME} v{APP_VERSION}")
         
-        # Show splash screen
-        self.show_splash_screen()
-        
-        # Initialize database
-        if not self.initialize_database():
-            return
+        # Open the database while the login window is drawn and the cashier types,
+        # then get the catalog, settings and receipt template ready for the first bill
+        self.startup.add('database', self.initialize_database)
+        self.startup.add('warm_up', warm_up)
+        self.startup.start()
         
         # Show login window
         print("Showing login window...")
-        if not show_login():
-            print("Login cancelled or failed")
-            return
-        
-        print("Login successful, starting main application...")
-        
-        # Create and run main window
         try:
-            self.main_window = MainWindow()
+            with self.timer.phase('login_window'):
+                login_window = LoginWindow(self.startup)
+            self.timer.mark('login_ready')
+            if not login_window.run():
+                print("Login cancelled or failed")
+                return
+            
+            print("Login successful, starting main application...")
+            
+            # Create and run main window
+            with self.timer.phase('main_window'):
+                from thangamayil.ui.main_window import MainWindow
+                self.main_window = MainWindow()
+            print(self.timer.summary())
+            self.timer.save(os.path.join(os.path.dirname(os.path.abspath(db.db_path)), "logs"))
             self.main_window.run()
         except Exception as e:
             try:
@@ -110,7 +87,8 @@ class BillingApplication:
                 pass  # GUI might be destroyed
             print(f"Application error: {e}")
         finally:
-            # Cleanup
+            # Cleanup (after the startup thread, which may still be opening the database)
+            self.startup.join(10)
             try:
                 db.disconnect()
             except:
@@ -139,4 +117,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Needed for process pools (invoice export) in the frozen executable
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Offline till copies
+Prepares a copy of thangamayil.db for a till to bill on while the main
+database is unreachable, and merges its stock back when it reconnects
+"""
+
+import argparse
+import os
+import sys
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.database.connection import db
+from thangamayil.database.offline import prepare_offline_copy, merge_offline_copy, stock_discrepancies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare and merge offline till databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    prepare_parser = commands.add_parser('prepare', help="copy the main database for a till")
+    prepare_parser.add_argument('--terminal', required=True, help="terminal id for the till, e.g. TILL2")
+    prepare_parser.add_argument('--output', required=True, help="database file for the till")
+
+    merge_parser = commands.add_parser('merge', help="merge a till's stock with the main database")
+    merge_parser.add_argument('copy', help="the till's database file")
+    args = parser.parse_args()
+
+    db.connect()
+    try:
+        if args.command == 'prepare':
+            result = prepare_offline_copy(args.output, args.terminal)
+            print(f"✓ Till {result['terminal_id']} database written to {result['file_path']} "
+                  f"({result['file_size'] / 1024:,.0f} KB)")
+            print(f"Run the till from {os.path.dirname(os.path.abspath(args.output))} "
+                  f"with the file named thangamayil.db")
+            return 0
+
+        result = merge_offline_copy(args.copy)
+        print(f"✓ Merged till {result['terminal_id']}: {result['main_items_updated']} items updated here, "
+              f"{result['till_items_updated']} on the till")
+        if result['unknown_items']:
+            print(f"Items created on the till were not merged: {result['unknown_items']}")
+        if stock_discrepancies():
+            print("✗ Stock does not match the stock counters")
+            return 1
+        return 0
+    except Exception as e:
+        print(f"✗ {e}")
+        return 1
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
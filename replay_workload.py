@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Workload replay
+Record a real trading day by starting each till with
+THANGAMAYIL_RECORD_WORKLOAD=1 (recordings are written to workloads/), then
+replay the tills together against a copy of the store database:
+  python replay_workload.py --database thangamayil.db --speed 10 workloads/*.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.diagnostics.workload import WorkloadReplayer, format_replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded till workloads against a copy of a database")
+    parser.add_argument('recordings', nargs='+', help="recording files, one per till")
+    parser.add_argument('--database', default="thangamayil.db", help="database to copy for the replay")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 = as recorded, 10 = ten times faster, 0 = as fast as possible")
+    parser.add_argument('--output', help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    try:
+        summary = WorkloadReplayer(args.database, args.recordings, args.speed, progress_callback=print).run()
+    except Exception as e:
+        print(f"✗ {e}")
+        return 1
+
+    print(format_replay(summary), end="")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"✓ Summary saved to {args.output}")
+    return 0 if not summary['errors'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run the local billing service
+The service owns thangamayil.db; terminals connect with --service URL or
+the THANGAMAYIL_SERVICE_URL environment variable
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from thangamayil.database.connection import db
+from thangamayil.database.backup import BackupScheduler
+from thangamayil.database.maintenance import MaintenanceScheduler
+from thangamayil.diagnostics.metrics import metrics
+from thangamayil.service.server import BillingService, DEFAULT_HOST, DEFAULT_PORT
+from thangamayil.service.client import SERVICE_TOKEN_ENV
+from thangamayil import APP_NAME, APP_VERSION
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the billing service that owns the store database")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help="address to listen on (use 0.0.0.0 for terminals on the LAN)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument('--token', default=os.environ.get(SERVICE_TOKEN_ENV),
+                        help="shared secret terminals must send (required unless listening on 127.0.0.1)")
+    args = parser.parse_args()
+
+    print(f"{APP_NAME} v{APP_VERSION} - Billing Service")
+    db.connect()
+    service = BillingService(host=args.host, port=args.port, token=args.token)
+    try:
+        url = service.start()
+    except Exception as e:
+        print(f"✗ Could not start the billing service: {e}")
+        db.disconnect()
+        return 1
+    print(f"Listening on {url}")
+    print(f"Start terminals with: --service {url}")
+
+    # Backups and maintenance run here, next to the database file
+    backup_scheduler = BackupScheduler()
+    backup_scheduler.start()
+    maintenance_scheduler = MaintenanceScheduler(service.idle_seconds)
+    maintenance_scheduler.start()
+
+    # Server-side timings of the calls terminals make
+    metrics.start()
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping billing service...")
+    finally:
+        metrics.stop()
+        maintenance_scheduler.stop()
+        backup_scheduler.stop()
+        service.stop()
+        db.disconnect()
+        print(f"Handled {service.stats['calls']} calls in {service.stats['commits']} commits")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
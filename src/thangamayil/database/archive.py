@@ -0,0 +1,271 @@
+"""
+Year-wise archival
+Moves closed financial years of bills, bill lines and stock movements into
+per-year SQLite files that are read back through ATTACH when needed
+"""
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+from .connection import db, DatabaseConnection
+
+
+ARCHIVED_TABLES = ('bills', 'bill_items', 'stock_movements')
+
+# SQLite allows 10 attached databases by default; keep room for other uses
+MAX_ATTACHED_ARCHIVES = 8
+
+INVOICE_NUMBER_PATTERN = re.compile(r'^(.*?)(\d+)$')
+
+
+def financial_year_start(value) -> int:
+    """Financial year (April to March) a date falls in, as its starting year"""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d')
+    return value.year if value.month >= 4 else value.year - 1
+
+
+def financial_year_label(fy_start: int) -> str:
+    """Display label such as FY2023-24"""
+    return f"FY{fy_start}-{(fy_start + 1) % 100:02d}"
+
+
+def financial_year_range(fy_start: int) -> Tuple[str, str]:
+    """First day of the year and first day of the next year"""
+    return f"{fy_start}-04-01", f"{fy_start + 1}-04-01"
+
+
+def archive_schema(fy_start: int) -> str:
+    """Schema name an archive is attached under"""
+    return f"archive_{fy_start}"
+
+
+def get_archives(database: Optional[DatabaseConnection] = None) -> List[Dict[str, Any]]:
+    """Archived financial years, oldest first"""
+    database = database or db
+    return [dict(row) for row in database.execute_query("SELECT * FROM archives ORDER BY fy_start")]
+
+
+def attach_archive(archive: Dict[str, Any], database: Optional[DatabaseConnection] = None) -> str:
+    """Attach an archive file to the connection if needed and return its schema name"""
+    database = database or db
+    schema = archive_schema(archive['fy_start'])
+    attached = {row['name']: row['file'] for row in database.execute_query("PRAGMA database_list")}
+    if schema in attached:
+        if os.path.realpath(attached[schema]) == os.path.realpath(archive['file_path']):
+            return schema
+        # Attached from another file (e.g. before the registry changed)
+        database.connection.execute(f"DETACH DATABASE {schema}")
+        del attached[schema]
+
+    # Make room by detaching the oldest attached archives
+    attached_archives = [name for name in attached if name.startswith("archive_")]
+    for name in attached_archives[:max(0, len(attached_archives) - MAX_ATTACHED_ARCHIVES + 1)]:
+        database.connection.execute(f"DETACH DATABASE {name}")
+
+    database.connection.execute("ATTACH DATABASE ? AS " + schema, (archive['file_path'],))
+    return schema
+
+
+def archive_sources(date_from: str, date_to: str,
+                    database: Optional[DatabaseConnection] = None) -> Iterator[str]:
+    """
+    Schemas holding bills for a date range: 'main' plus any archives
+    covering part of the range. Each archive is attached as it is reached,
+    so read one schema's rows before moving on to the next.
+    """
+    database = database or db
+    first_year = financial_year_start(date_from)
+    last_year = financial_year_start(date_to)
+    archives = [archive for archive in get_archives(database)
+                if first_year <= archive['fy_start'] <= last_year]
+    yield 'main'
+    for archive in archives:
+        yield attach_archive(archive, database)
+
+
+def find_archived_bill(bill_id: int, database: Optional[DatabaseConnection] = None) -> Optional[str]:
+    """Schema of the archive holding a bill, if any"""
+    database = database or db
+    # Back-dated bills make the years' id ranges overlap, so check each candidate file
+    for archive in database.execute_query(
+        "SELECT * FROM archives WHERE ? BETWEEN min_bill_id AND max_bill_id ORDER BY fy_start",
+        (bill_id,)
+    ):
+        schema = attach_archive(dict(archive), database)
+        if database.get_single_result(f"SELECT 1 FROM {schema}.bills WHERE bill_id = ?", (bill_id,)):
+            return schema
+    return None
+
+
+class ArchiveManager:
+    """Moves closed financial years out of the live database"""
+
+    def __init__(self, database: Optional[DatabaseConnection] = None, archive_dir: Optional[str] = None):
+        self.database = database or db
+        self.archive_dir = archive_dir or os.path.join(
+            os.path.dirname(os.path.abspath(self.database.db_path)), "archive"
+        )
+
+    def archive_path(self, fy_start: int) -> str:
+        """Archive file for a financial year; a year archived before keeps its file"""
+        registered = self.database.get_single_result(
+            "SELECT file_path FROM archives WHERE fy_start = ?", (fy_start,)
+        )
+        if registered:
+            return registered['file_path']
+        return os.path.join(self.archive_dir, f"thangamayil_{financial_year_label(fy_start)}.db")
+
+    def archivable_years(self, today: Optional[date] = None) -> List[int]:
+        """Closed financial years that still have bills in the live database"""
+        current_start, _ = financial_year_range(financial_year_start(today or date.today()))
+        result = self.database.get_single_result(
+            "SELECT MIN(bill_date) AS first_date FROM bills WHERE bill_date < ?",
+            (current_start,)
+        )
+        if not result or not result['first_date']:
+            return []
+
+        years = []
+        for fy_start in range(financial_year_start(result['first_date']),
+                              financial_year_start(today or date.today())):
+            start, end = financial_year_range(fy_start)
+            if self.database.get_single_result(
+                "SELECT 1 FROM bills WHERE bill_date >= ? AND bill_date < ? LIMIT 1", (start, end)
+            ):
+                years.append(fy_start)
+        return years
+
+    def _create_archive_file(self, path: str):
+        """Create the archive file with the live table and index definitions"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        placeholders = ", ".join("?" for _ in ARCHIVED_TABLES)
+        definitions = self.database.execute_query(
+            f"""
+            SELECT type, sql FROM sqlite_master
+            WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index') AND sql IS NOT NULL
+            ORDER BY type DESC
+            """,
+            ARCHIVED_TABLES
+        )
+        connection = sqlite3.connect(path)
+        try:
+            existing = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+            for row in definitions:
+                statement = row['sql']
+                name = re.match(r'CREATE\s+(?:TABLE|INDEX)\s+(?:IF NOT EXISTS\s+)?(\w+)', statement, re.I)
+                if name and name.group(1) in existing:
+                    continue
+                connection.execute(statement)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def archive_year(self, fy_start: int) -> Dict[str, Any]:
+        """
+        Move one closed financial year into its archive file
+
+        Rows are copied and deleted in a single transaction spanning both
+        files, after checking that the copied counts and totals match.
+        Running it again for the same year adds any late rows to the archive.
+        """
+        if fy_start >= financial_year_start(date.today()):
+            raise ValueError(f"{financial_year_label(fy_start)} is not closed yet")
+
+        start, end = financial_year_range(fy_start)
+        path = self.archive_path(fy_start)
+        self._create_archive_file(path)
+
+        schema = archive_schema(fy_start)
+        attach_archive({'fy_start': fy_start, 'file_path': path}, self.database)
+        bill_filter = "bill_date >= ? AND bill_date < ?"
+        movement_filter = "movement_date >= ? AND movement_date < ?"
+
+        # One write transaction spans both files
+        with self.database.transaction() as cursor:
+            source = cursor.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(grand_total), 0) FROM main.bills WHERE {bill_filter}",
+                (start, end)
+            ).fetchone()
+
+            cursor.execute(
+                f"INSERT INTO {schema}.bills SELECT * FROM main.bills WHERE {bill_filter}", (start, end)
+            )
+            lines = cursor.execute(
+                f"""
+                INSERT INTO {schema}.bill_items
+                SELECT * FROM main.bill_items
+                WHERE bill_id IN (SELECT bill_id FROM main.bills WHERE {bill_filter})
+                """,
+                (start, end)
+            ).rowcount
+            movements = cursor.execute(
+                f"INSERT INTO {schema}.stock_movements SELECT * FROM main.stock_movements WHERE {movement_filter}",
+                (start, end)
+            ).rowcount
+
+            copied = cursor.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(grand_total), 0) FROM {schema}.bills WHERE {bill_filter}",
+                (start, end)
+            ).fetchone()
+            if copied[0] < source[0] or copied[1] + 0.005 < source[1]:
+                raise Exception("Archived rows do not match the live database")
+
+            # Remember the invoice sequence so numbers are never reused
+            for (invoice_number,) in cursor.execute(
+                f"SELECT invoice_number FROM main.bills WHERE {bill_filter}", (start, end)
+            ).fetchall():
+                match = INVOICE_NUMBER_PATTERN.match(invoice_number or '')
+                if match:
+                    cursor.execute(
+                        """
+                        INSERT INTO archived_invoice_sequences (prefix, max_number) VALUES (?, ?)
+                        ON CONFLICT(prefix) DO UPDATE SET max_number = MAX(max_number, excluded.max_number)
+                        """,
+                        (match.group(1), int(match.group(2)))
+                    )
+
+            last_change = cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log").fetchone()[0]
+            cursor.execute(
+                f"""
+                DELETE FROM main.bill_items
+                WHERE bill_id IN (SELECT bill_id FROM main.bills WHERE {bill_filter})
+                """,
+                (start, end)
+            )
+            cursor.execute(f"DELETE FROM main.bills WHERE {bill_filter}", (start, end))
+            cursor.execute(f"DELETE FROM main.stock_movements WHERE {movement_filter}", (start, end))
+            # Archived rows still exist; head office sync must not delete them
+            cursor.execute(
+                "UPDATE change_log SET operation = 'A' WHERE change_id > ? AND operation = 'D'",
+                (last_change,)
+            )
+
+            # Archive totals cover every row in the file, including earlier runs
+            totals = cursor.execute(
+                f"""
+                SELECT MIN(bill_id), MAX(bill_id), COUNT(*), COALESCE(SUM(grand_total), 0),
+                (SELECT COUNT(*) FROM {schema}.stock_movements)
+                FROM {schema}.bills
+                """
+            ).fetchone()
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO archives
+                (fy_start, file_path, min_bill_id, max_bill_id, bill_count, sales_total, movement_count, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (fy_start, path, *totals)
+            )
+
+        return {
+            'fy_start': fy_start,
+            'label': financial_year_label(fy_start),
+            'file_path': path,
+            'bills': source[0],
+            'bill_items': lines,
+            'stock_movements': movements,
+            'sales_total': round(source[1], 2)
+        }
@@ -0,0 +1,432 @@
+"""
+Online database backup
+Copies the live database with the SQLite backup API while billing continues
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable
+from .connection import db, DatabaseConnection, CHANGE_TRACKED_TABLES
+from ..diagnostics.metrics import terminal_name
+
+
+# Pages copied per backup step (4 KB pages, so 512 KB per step)
+PAGES_PER_STEP = 128
+
+# Pause between steps so other work on the shared connection can run
+STEP_PAUSE = 0.005
+
+# Scheduled backup defaults, overridden by settings
+DEFAULT_INTERVAL_MINUTES = 15
+DEFAULT_FULL_INTERVAL_HOURS = 24
+DEFAULT_RETENTION_COUNT = 7
+
+# Scheduled backups and maintenance run on one terminal at a time: the
+# scheduled_jobs_terminal setting, else whichever terminal holds the lease.
+# A lease not renewed for this long is taken over by another terminal
+SCHEDULED_JOBS_LEASE_MINUTES = 30
+
+# Version of the incremental changeset file format
+SNAPSHOT_FORMAT = 1
+
+# Rows fetched per query when writing an incremental snapshot
+SNAPSHOT_FETCH_SIZE = 500
+
+
+def file_checksum(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def quick_check(path: str) -> str:
+    """Run PRAGMA quick_check on a database file and return the result"""
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute("PRAGMA quick_check").fetchall()
+        return "; ".join(str(row[0]) for row in rows)
+    finally:
+        connection.close()
+
+
+class BackupEngine:
+    """Hot backup of the live database in page batches"""
+
+    def __init__(self, database: Optional[DatabaseConnection] = None,
+                 pages_per_step: int = PAGES_PER_STEP, step_pause: float = STEP_PAUSE,
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        self.database = database or db
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.progress_callback = progress_callback
+
+    def _on_step(self, status, remaining, total):
+        """Called by sqlite3 after each step"""
+        if self.progress_callback:
+            self.progress_callback(total - remaining, total)
+        # Give the billing screen a turn on the connection between steps
+        if self.step_pause:
+            time.sleep(self.step_pause)
+
+    def copy(self, target_path: str) -> Dict[str, Any]:
+        """
+        Copy the database to target_path without logging it
+
+        The copy is made from the application's own connection, so bills saved
+        while the backup runs are carried into the copy instead of restarting it.
+        The copy is written next to the target, checked with PRAGMA quick_check
+        and only then moved into place.
+        Returns the copy details; raises on failure
+        """
+        started = time.perf_counter()
+        temp_path = target_path + ".part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        source = self.database.connection or self.database.connect()
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=self.pages_per_step, progress=self._on_step)
+        except Exception:
+            target.close()
+            os.remove(temp_path)
+            raise
+        target.close()
+
+        integrity = quick_check(temp_path)
+        if integrity != "ok":
+            os.remove(temp_path)
+            raise Exception(f"Backup verification failed: {integrity}")
+
+        checksum = file_checksum(temp_path)
+        os.replace(temp_path, target_path)
+
+        return {
+            'file_path': target_path,
+            'file_size': os.path.getsize(target_path),
+            'duration_ms': int((time.perf_counter() - started) * 1000),
+            'checksum': checksum,
+            'integrity': integrity
+        }
+
+    def backup(self, backup_path: str) -> Dict[str, Any]:
+        """Back up the database to backup_path and log it; raises on failure"""
+        result = self.copy(backup_path)
+        result['backup_id'] = log_backup(self.database, result, 'MANUAL')
+        return result
+
+
+def log_backup(database: DatabaseConnection, result: Dict[str, Any], backup_type: str,
+               change_seq: Optional[int] = None) -> int:
+    """Record a backup in backup_log"""
+    return database.execute_insert(
+        """
+        INSERT INTO backup_log (file_path, file_size, duration_ms, checksum, backup_type, change_seq)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (result['file_path'], result['file_size'], result['duration_ms'], result['checksum'],
+         backup_type, change_seq)
+    )
+
+
+def get_backup_history(limit: int = 20) -> List[Dict[str, Any]]:
+    """Get recent backups, newest first"""
+    return [dict(row) for row in db.execute_query(
+        "SELECT * FROM backup_log ORDER BY backup_id DESC LIMIT ?",
+        (limit,)
+    )]
+
+
+def current_change_seq(database: DatabaseConnection) -> int:
+    """Latest change_log entry, including ones rotation has since pruned"""
+    result = database.get_single_result("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    return result['seq'] if result else 0
+
+
+def compress_file(source_path: str, target_path: str):
+    """Gzip a file in chunks"""
+    with open(source_path, 'rb') as source, gzip.open(target_path, 'wb', compresslevel=6) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def _int_setting(database: DatabaseConnection, key: str, default: int) -> int:
+    """Read an integer setting with a fallback"""
+    try:
+        return int(database.get_setting(key) or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def claim_scheduled_jobs(database: Optional[DatabaseConnection] = None) -> bool:
+    """
+    True when this terminal should run the scheduled jobs now; takes or
+    renews the lease kept in the scheduled_jobs_lease setting
+    """
+    database = database or db
+    terminal = terminal_name()
+    designated = database.get_setting('scheduled_jobs_terminal')
+    if designated:
+        return designated == terminal
+
+    now = time.time()
+    with database.transaction():
+        holder, _, renewed = (database.get_setting('scheduled_jobs_lease') or '').partition('|')
+        try:
+            renewed_at = float(renewed)
+        except ValueError:
+            renewed_at = 0.0
+        if holder and holder != terminal and now - renewed_at < SCHEDULED_JOBS_LEASE_MINUTES * 60:
+            return False
+        database.update_setting('scheduled_jobs_lease', f"{terminal}|{now:.0f}")
+    return True
+
+
+def release_scheduled_jobs(database: Optional[DatabaseConnection] = None):
+    """Give up the scheduled jobs lease when this terminal closes"""
+    database = database or db
+    try:
+        with database.transaction():
+            holder = (database.get_setting('scheduled_jobs_lease') or '').partition('|')[0]
+            if holder == terminal_name():
+                database.update_setting('scheduled_jobs_lease', '')
+    except Exception as e:
+        print(f"Scheduled jobs lease not released: {e}")
+
+
+class SnapshotManager:
+    """
+    Scheduled snapshots: compressed full copies plus incremental changesets
+
+    Incrementals hold the current state of every row in CHANGE_TRACKED_TABLES
+    touched since the previous snapshot (found through change_log), so each
+    one is small and replaying them over a full copy is idempotent.
+    Other tables (staff, settings, categories) are captured by full copies.
+    """
+
+    def __init__(self, database: Optional[DatabaseConnection] = None,
+                 backup_dir: Optional[str] = None,
+                 full_interval_hours: Optional[int] = None,
+                 retention_count: Optional[int] = None):
+        self.database = database or db
+        self.backup_dir = backup_dir or os.path.join(
+            os.path.dirname(os.path.abspath(self.database.db_path)), "backups"
+        )
+        self.full_interval_hours = full_interval_hours or _int_setting(
+            self.database, 'backup_full_interval_hours', DEFAULT_FULL_INTERVAL_HOURS)
+        self.retention_count = retention_count or _int_setting(
+            self.database, 'backup_retention_count', DEFAULT_RETENTION_COUNT)
+
+    def get_snapshots(self, backup_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Scheduled snapshots, newest first"""
+        if backup_type:
+            rows = self.database.execute_query(
+                "SELECT * FROM backup_log WHERE backup_type = ? ORDER BY backup_id DESC",
+                (backup_type,)
+            )
+        else:
+            rows = self.database.execute_query(
+                "SELECT * FROM backup_log WHERE backup_type IN ('FULL', 'INCREMENTAL') "
+                "ORDER BY backup_id DESC"
+            )
+        return [dict(row) for row in rows]
+
+    def is_full_due(self) -> bool:
+        """A full snapshot is due when none exists or the last one is too old"""
+        result = self.database.get_single_result(
+            """
+            SELECT (julianday('now') - julianday(MAX(backup_time))) * 24 AS age_hours
+            FROM backup_log WHERE backup_type = 'FULL'
+            """
+        )
+        return result['age_hours'] is None or result['age_hours'] >= self.full_interval_hours
+
+    def _snapshot_path(self, prefix: str, extension: str) -> str:
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return os.path.join(self.backup_dir, f"{prefix}_{stamp}{extension}")
+
+    def take_full(self) -> Dict[str, Any]:
+        """Take a compressed full snapshot"""
+        started = time.perf_counter()
+        # Changes after this point are replayed by the next incremental
+        change_seq = current_change_seq(self.database)
+
+        db_path = self._snapshot_path("full", ".db")
+        result = BackupEngine(self.database).copy(db_path)
+        gz_path = db_path + ".gz"
+        try:
+            compress_file(db_path, gz_path)
+        finally:
+            os.remove(db_path)
+
+        result.update({
+            'file_path': gz_path,
+            'file_size': os.path.getsize(gz_path),
+            'checksum': file_checksum(gz_path),
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        })
+        result['backup_id'] = log_backup(self.database, result, 'FULL', change_seq)
+        return result
+
+    def take_incremental(self) -> Optional[Dict[str, Any]]:
+        """
+        Write rows changed since the last snapshot as a compressed changeset
+        Returns None when nothing changed
+        """
+        snapshots = self.get_snapshots()
+        if not snapshots:
+            return self.take_full()
+
+        started = time.perf_counter()
+        from_seq = snapshots[0]['change_seq'] or 0
+        to_seq = current_change_seq(self.database)
+        if to_seq <= from_seq:
+            return None
+
+        changed = {}
+        for row in self.database.execute_query(
+            """
+            SELECT table_name, row_id FROM change_log
+            WHERE change_id > ? AND change_id <= ?
+            GROUP BY table_name, row_id
+            """,
+            (from_seq, to_seq)
+        ):
+            changed.setdefault(row['table_name'], []).append(row['row_id'])
+
+        path = self._snapshot_path("incr", ".jsonl.gz")
+        temp_path = path + ".part"
+        records = 0
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(json.dumps({
+                'format': SNAPSHOT_FORMAT, 'from_seq': from_seq, 'to_seq': to_seq,
+                'created_at': datetime.now().isoformat(timespec='seconds')
+            }) + "\n")
+
+            for table, row_ids in changed.items():
+                key = CHANGE_TRACKED_TABLES.get(table)
+                if not key:
+                    continue
+                for start in range(0, len(row_ids), SNAPSHOT_FETCH_SIZE):
+                    batch = row_ids[start:start + SNAPSHOT_FETCH_SIZE]
+                    placeholders = ", ".join("?" for _ in batch)
+                    found = set()
+                    for row in self.database.execute_query(
+                        f"SELECT * FROM {table} WHERE {key} IN ({placeholders})", tuple(batch)
+                    ):
+                        found.add(row[key])
+                        f.write(json.dumps({'table': table, 'op': 'upsert', 'row': dict(row)},
+                                           ensure_ascii=False) + "\n")
+                        records += 1
+                    # Rows that no longer exist were deleted
+                    for row_id in batch:
+                        if row_id not in found:
+                            f.write(json.dumps({'table': table, 'op': 'delete', 'id': row_id}) + "\n")
+                            records += 1
+        os.replace(temp_path, path)
+
+        result = {
+            'file_path': path,
+            'file_size': os.path.getsize(path),
+            'duration_ms': int((time.perf_counter() - started) * 1000),
+            'checksum': file_checksum(path),
+            'records': records
+        }
+        result['backup_id'] = log_backup(self.database, result, 'INCREMENTAL', to_seq)
+        return result
+
+    def rotate(self) -> int:
+        """
+        Keep the newest retention_count full snapshots and the incrementals
+        taken after the oldest of them; returns the number of files removed
+        """
+        fulls = self.get_snapshots('FULL')
+        if len(fulls) <= self.retention_count:
+            return 0
+
+        oldest_kept = fulls[self.retention_count - 1]
+        expired = self.database.execute_query(
+            """
+            SELECT backup_id, file_path FROM backup_log
+            WHERE backup_type IN ('FULL', 'INCREMENTAL') AND backup_id < ?
+            """,
+            (oldest_kept['backup_id'],)
+        )
+        for row in expired:
+            if os.path.exists(row['file_path']):
+                os.remove(row['file_path'])
+            self.database.execute_update("DELETE FROM backup_log WHERE backup_id = ?", (row['backup_id'],))
+
+        # Changes older than every kept snapshot are no longer needed,
+        # unless head office sync has not picked them up yet
+        prune_seq = oldest_kept['change_seq'] or 0
+        sync_cursor = self.database.get_setting('sync_cursor')
+        if sync_cursor is not None:
+            prune_seq = min(prune_seq, int(sync_cursor))
+        self.database.execute_update("DELETE FROM change_log WHERE change_id <= ?", (prune_seq,))
+        return len(expired)
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Take whichever snapshot is due and apply the retention policy"""
+        result = self.take_full() if self.is_full_due() else self.take_incremental()
+        self.rotate()
+        return result
+
+
+class BackupScheduler:
+    """Background thread taking scheduled snapshots"""
+
+    def __init__(self, manager: Optional[SnapshotManager] = None,
+                 interval_minutes: Optional[int] = None, initial_delay: float = 60):
+        self.manager = manager
+        self.interval_minutes = interval_minutes
+        self.initial_delay = initial_delay
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Start the scheduler; False when scheduled backups are turned off"""
+        if self.interval_minutes is None:
+            self.interval_minutes = _int_setting(db, 'backup_interval_minutes', DEFAULT_INTERVAL_MINUTES)
+        if self.interval_minutes <= 0:
+            return False
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5):
+        """Stop the scheduler, waiting briefly for a running snapshot"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+            release_scheduled_jobs()
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            try:
+                # Another terminal sharing the database takes the snapshots
+                if claim_scheduled_jobs():
+                    if self.manager is None:
+                        self.manager = SnapshotManager()
+                    self.last_result = self.manager.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Scheduled backup failed: {e}")
+            delay = self.interval_minutes * 60
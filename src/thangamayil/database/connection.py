@@ -5,30 +5,109 @@ Handles SQLite database operations for Thangamayil Billing Software
 
 import sqlite3
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 from typing import Optional, Any, List, Dict
-import bcrypt
+from ..diagnostics.metrics import metrics
+
+
+# Tables whose row changes are recorded in change_log (table -> primary key)
+CHANGE_TRACKED_TABLES = {
+    'bills': 'bill_id',
+    'bill_items': 'bill_item_id',
+    'stock_movements': 'movement_id',
+    'items': 'item_id',
+    'customers': 'customer_id'
+}
+
+
+# Counter column of this database copy in stock_counters (terminal_id setting)
+DEFAULT_TERMINAL_ID = "MAIN"
+LOCAL_TERMINAL_SQL = (
+    "COALESCE((SELECT setting_value FROM settings WHERE setting_key = 'terminal_id'), "
+    f"'{DEFAULT_TERMINAL_ID}')"
+)
+
+
+# Several terminals may share one database file: wait this long for a lock,
+# then retry whole transactions with exponential backoff
+BUSY_TIMEOUT_MS = 5000
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05  # seconds, doubled on each retry
+
+
+# Metric timing how long write transactions wait for the lock
+LOCK_WAIT_METRIC = "db_lock_wait"
+
+
+# Set to trace SQL from startup (value: slow query threshold in ms, or 1)
+SQL_TRACE_ENV = "THANGAMAYIL_SQL_TRACE"
+
+# Used in place of a statement timer while SQL tracing is off
+_NOT_TRACED = nullcontext()
+
+
+def is_busy_error(error: Exception) -> bool:
+    """True when SQLite reported the database as busy or locked"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def busy_wait(attempt: int):
+    """Sleep before retrying a busy operation (exponential backoff with jitter)"""
+    time.sleep(BUSY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
 
 
 class DatabaseConnection:
     """Handles SQLite database connection and operations"""
     
-    def __init__(self, db_path: str = "thangamayil.db"):
+    def __init__(self, db_path: str = "thangamayil.db", create: bool = True):
         self.db_path = db_path
         self.connection: Optional[sqlite3.Connection] = None
-        self.ensure_database_exists()
+        self.migrations_checked = False
+        # Threads share the connection; writes and transactions take this lock
+        self.lock = threading.RLock()
+        self.transaction_depth = 0
+        # Set when a billing service owns the database (see service.client)
+        self.remote = None
+        # Set while SQL tracing is on (see enable_tracing)
+        self.tracer = None
+        # Without create the file is only opened (or created) by the first connect
+        if create:
+            self.ensure_database_exists()
     
     def ensure_database_exists(self):
         """Create database and tables if they don't exist"""
         if not os.path.exists(self.db_path):
             self.connect()
-            self.initialize_database()
     
     def connect(self) -> sqlite3.Connection:
-        """Establish database connection"""
+        """Establish database connection, creating the database if it doesn't exist"""
+        if self.remote:
+            return None
         try:
-            self.connection = sqlite3.connect(self.db_path)
+            existing = os.path.exists(self.db_path)
+            # Background jobs (exports, printing) share this connection; the
+            # sqlite3 module serializes access, so the same-thread check is off
+            self.connection = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                              check_same_thread=False)
             self.connection.row_factory = sqlite3.Row  # Enable column access by name
+            
+            # New databases are migrated by initialize_database, existing ones on first connect
+            if not existing:
+                self.initialize_database()
+            elif not self.migrations_checked:
+                self.run_migrations()
+            
+            if self.tracer:
+                self.tracer.attach(self.connection)
+            elif existing and os.environ.get(SQL_TRACE_ENV):
+                self.enable_tracing()
             return self.connection
         except sqlite3.Error as e:
             raise Exception(f"Database connection failed: {e}")
@@ -76,7 +155,8 @@ class DatabaseConnection:
             admin = cursor.fetchone()
             
             if admin and admin['password_hash'] == 'admin123':
-                # Hash the password
+                # Hash the password (bcrypt is only needed on the first start)
+                import bcrypt
                 hashed_password = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt())
                 cursor.execute(
                     "UPDATE staff SET password_hash = ? WHERE staff_name = 'admin'",
@@ -90,6 +170,7 @@ class DatabaseConnection:
     
     def run_migrations(self):
         """Run database migrations for schema updates"""
+        self.migrations_checked = True
         try:
             cursor = self.connection.cursor()
             
@@ -118,6 +199,153 @@ class DatabaseConnection:
                 cursor.execute("ALTER TABLE items ADD COLUMN hsn_code TEXT")
                 print("Migration: Added hsn_code column to items table")
             
+            # Migration 4: Record size, duration, checksum and type of backups
+            cursor.execute("PRAGMA table_info(backup_log)")
+            backup_columns = [row[1] for row in cursor.fetchall()]
+            
+            for column, column_type in (('file_size', 'INTEGER'), ('duration_ms', 'INTEGER'),
+                                        ('checksum', 'TEXT'), ('backup_type', "TEXT DEFAULT 'MANUAL'"),
+                                        ('change_seq', 'INTEGER')):
+                if column not in backup_columns:
+                    cursor.execute(f"ALTER TABLE backup_log ADD COLUMN {column} {column_type}")
+                    print(f"Migration: Added {column} column to backup_log table")
+            
+            # Migration 5: Change log feeding incremental backups
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    operation TEXT NOT NULL,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            for table, key in CHANGE_TRACKED_TABLES.items():
+                for event, operation, row in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'),
+                                              ('DELETE', 'D', 'OLD')):
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_log
+                        AFTER {event} ON {table}
+                        BEGIN
+                            INSERT INTO change_log (table_name, row_id, operation)
+                            VALUES ('{table}', {row}.{key}, '{operation}');
+                        END
+                    """)
+            
+            # Migration 6: Registry of year-wise archive files
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS archives (
+                    fy_start INTEGER PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    min_bill_id INTEGER,
+                    max_bill_id INTEGER,
+                    bill_count INTEGER DEFAULT 0,
+                    sales_total DECIMAL(12,2) DEFAULT 0,
+                    movement_count INTEGER DEFAULT 0,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS archived_invoice_sequences (
+                    prefix TEXT PRIMARY KEY,
+                    max_number INTEGER NOT NULL
+                )
+            """)
+            
+            # Migration 7: Log of database maintenance runs
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS maintenance_log (
+                    maintenance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_time TIMESTAMP,
+                    run_type TEXT NOT NULL,
+                    tasks TEXT,
+                    duration_ms INTEGER,
+                    page_count_before INTEGER,
+                    page_count_after INTEGER,
+                    freelist_before INTEGER,
+                    freelist_after INTEGER,
+                    wal_bytes_before INTEGER,
+                    wal_bytes_after INTEGER,
+                    fragmentation_before REAL,
+                    fragmentation_after REAL,
+                    details TEXT
+                )
+            """)
+            
+            # Migration 8: Invoice number counter shared by all terminals
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS invoice_sequences (
+                    prefix TEXT PRIMARY KEY,
+                    last_number INTEGER NOT NULL
+                )
+            """)
+            
+            # Migration 9: Changeset exports for head office sync
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_exports (
+                    export_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file_path TEXT NOT NULL,
+                    from_seq INTEGER NOT NULL,
+                    to_seq INTEGER NOT NULL,
+                    records INTEGER DEFAULT 0,
+                    file_size INTEGER,
+                    checksum TEXT,
+                    exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Migration 10: Per-terminal stock counters that merge between offline tills
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stock_counters (
+                    item_id INTEGER NOT NULL,
+                    terminal_id TEXT NOT NULL,
+                    added INTEGER NOT NULL DEFAULT 0,
+                    removed INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (item_id, terminal_id)
+                )
+            """)
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO stock_counters (item_id, terminal_id, added, removed)
+                SELECT item_id, {LOCAL_TERMINAL_SQL}, MAX(COALESCE(stock_quantity, 0), 0),
+                MAX(-COALESCE(stock_quantity, 0), 0)
+                FROM items WHERE item_id NOT IN (SELECT item_id FROM stock_counters)
+            """)
+            # Any change to stock_quantity is added to this terminal's counter,
+            # keeping stock_quantity equal to the sum of all terminals' counters
+            for event in ('INSERT', 'UPDATE OF stock_quantity'):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_items_{event.split()[0].lower()}_stock_counter
+                    AFTER {event} ON items
+                    BEGIN
+                        INSERT INTO stock_counters (item_id, terminal_id, added, removed)
+                        SELECT NEW.item_id, {LOCAL_TERMINAL_SQL}, MAX(delta, 0), MAX(-delta, 0)
+                        FROM (
+                            SELECT COALESCE(NEW.stock_quantity, 0) - COALESCE(SUM(added - removed), 0) AS delta
+                            FROM stock_counters WHERE item_id = NEW.item_id
+                        )
+                        WHERE delta != 0
+                        ON CONFLICT(item_id, terminal_id) DO UPDATE SET
+                        added = added + excluded.added, removed = removed + excluded.removed;
+                    END
+                """)
+            
+            # Migration 11: Invoice number blocks leased to terminals
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS invoice_blocks (
+                    block_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prefix TEXT NOT NULL,
+                    terminal TEXT NOT NULL,
+                    start_number INTEGER NOT NULL,
+                    end_number INTEGER NOT NULL,
+                    next_number INTEGER NOT NULL,
+                    leased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    released_at TIMESTAMP
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_invoice_blocks_terminal ON invoice_blocks(prefix, terminal)"
+            )
+            
             self.connection.commit()
             
         except Exception as e:
@@ -125,63 +353,171 @@ class DatabaseConnection:
     
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """Execute SELECT query and return results"""
+        if self.remote:
+            return self.remote.execute_query(query, params)
         try:
             if not self.connection:
                 self.connect()
             
             cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            with self.tracer.statement(query) if self.tracer else _NOT_TRACED:
+                cursor.execute(query, params)
+                return cursor.fetchall()
             
         except sqlite3.Error as e:
             raise Exception(f"Query execution failed: {e}")
     
-    def execute_update(self, query: str, params: tuple = ()) -> int:
-        """Execute INSERT/UPDATE/DELETE query and return affected rows"""
-        try:
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction started with BEGIN IMMEDIATE, so the write lock is
+        taken up front instead of failing halfway when another terminal is
+        writing. Nested use joins the outer transaction; execute_update and
+        execute_insert inside it do not commit on their own.
+        """
+        if self.remote:
+            with self.remote.transaction():
+                yield None
+            return
+        
+        waiting_since = time.perf_counter()
+        with self.lock:
             if not self.connection:
                 self.connect()
             
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            self.connection.commit()
-            return cursor.rowcount
+            if self.transaction_depth:
+                # Inner block gets a savepoint, so its failure only undoes its own work
+                self.transaction_depth += 1
+                savepoint = f"nested_{self.transaction_depth}"
+                self.connection.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    yield self.connection.cursor()
+                    self.connection.execute(f"RELEASE {savepoint}")
+                except BaseException:
+                    self.connection.execute(f"ROLLBACK TO {savepoint}")
+                    self.connection.execute(f"RELEASE {savepoint}")
+                    raise
+                finally:
+                    self.transaction_depth -= 1
+                return
+            
+            if self.connection.in_transaction:
+                self.connection.commit()
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    self.connection.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e) or attempt == BUSY_RETRIES:
+                        raise Exception(f"Could not start transaction: {e}")
+                    busy_wait(attempt)
+            # Other threads holding the connection and other terminals holding the file
+            metrics.record(LOCK_WAIT_METRIC, time.perf_counter() - waiting_since)
+            
+            self.transaction_depth = 1
+            try:
+                yield self.connection.cursor()
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+            finally:
+                self.transaction_depth = 0
+    
+    def _execute_write(self, query: str, params: tuple) -> sqlite3.Cursor:
+        """Run one write, committing it unless a transaction is open"""
+        with self.lock:
+            if not self.connection:
+                self.connect()
+            
+            if self.transaction_depth:
+                cursor = self.connection.cursor()
+                with self.tracer.statement(query) if self.tracer else _NOT_TRACED:
+                    cursor.execute(query, params)
+                return cursor
+            
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    cursor = self.connection.cursor()
+                    with self.tracer.statement(query) if self.tracer else _NOT_TRACED:
+                        cursor.execute(query, params)
+                        self.connection.commit()
+                    return cursor
+                except sqlite3.OperationalError as e:
+                    self.connection.rollback()
+                    if not is_busy_error(e) or attempt == BUSY_RETRIES:
+                        raise
+                    busy_wait(attempt)
+    
+    def execute_update(self, query: str, params: tuple = ()) -> int:
+        """Execute INSERT/UPDATE/DELETE query and return affected rows"""
+        if self.remote:
+            return self.remote.execute_update(query, params)
+        try:
+            return self._execute_write(query, params).rowcount
             
         except sqlite3.Error as e:
-            self.connection.rollback()
+            if not self.transaction_depth:
+                self.connection.rollback()
             raise Exception(f"Update execution failed: {e}")
     
     def execute_insert(self, query: str, params: tuple = ()) -> int:
         """Execute INSERT query and return the last inserted row ID"""
+        if self.remote:
+            return self.remote.execute_insert(query, params)
         try:
-            if not self.connection:
-                self.connect()
-            
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            self.connection.commit()
-            return cursor.lastrowid
+            return self._execute_write(query, params).lastrowid
             
         except sqlite3.Error as e:
-            self.connection.rollback()
+            if not self.transaction_depth:
+                self.connection.rollback()
             raise Exception(f"Insert execution failed: {e}")
     
+    def enable_tracing(self, slow_ms: Optional[float] = None):
+        """
+        Time every statement and write slow ones to logs/slow_queries.log
+        (threshold: slow_ms, else the THANGAMAYIL_SQL_TRACE value or the
+        slow_query_ms setting)
+        """
+        from ..diagnostics.sqltrace import SQLTracer, DEFAULT_SLOW_QUERY_MS
+        
+        if self.tracer:
+            return self.tracer
+        if slow_ms is None:
+            try:
+                slow_ms = float(os.environ.get(SQL_TRACE_ENV) or 0)
+                if slow_ms <= 1:
+                    slow_ms = float(self.get_setting('slow_query_ms') or DEFAULT_SLOW_QUERY_MS)
+            except (TypeError, ValueError):
+                slow_ms = DEFAULT_SLOW_QUERY_MS
+        
+        self.tracer = SQLTracer(
+            log_dir=os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "logs"),
+            slow_ms=slow_ms
+        )
+        if self.connection:
+            self.tracer.attach(self.connection)
+        return self.tracer
+    
+    def disable_tracing(self):
+        """Stop tracing; returns the tracer with the statistics gathered"""
+        tracer, self.tracer = self.tracer, None
+        if tracer:
+            if self.connection:
+                tracer.detach(self.connection)
+            tracer.close()
+        return tracer
+    
     def get_single_result(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
         """Execute query and return single result"""
         results = self.execute_query(query, params)
         return results[0] if results else None
     
-    def backup_database(self, backup_path: str) -> bool:
-        """Create database backup"""
+    def backup_database(self, backup_path: str, progress_callback=None) -> bool:
+        """Create database backup (online, verified copy)"""
         try:
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
-            
-            # Log the backup
-            self.execute_insert(
-                "INSERT INTO backup_log (file_path) VALUES (?)",
-                (backup_path,)
-            )
+            from .backup import BackupEngine
+            BackupEngine(self, progress_callback=progress_callback).backup(backup_path)
             return True
             
         except Exception as e:
@@ -219,5 +555,5 @@ class DatabaseConnection:
             return False
 
 
-# Global database instance
-db = DatabaseConnection()
\ No newline at end of file
+# Global database instance (opened on first use, so importing it touches no files)
+db = DatabaseConnection(create=False)
\ No newline at end of file
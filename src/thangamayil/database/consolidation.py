@@ -0,0 +1,351 @@
+"""
+Head office consolidation
+Merges store database files and sync changesets into one reporting database,
+reading the inputs in parallel worker processes
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable, Sequence
+from .connection import CHANGE_TRACKED_TABLES
+from .sync import SYNC_TABLES, STAFF_COLUMNS, read_changeset
+
+
+DEFAULT_CONSOLIDATED_PATH = "headoffice.db"
+
+# Primary key of each consolidated table within a store
+CONSOLIDATED_KEYS = dict(CHANGE_TRACKED_TABLES, staff='staff_id')
+
+# Every table carries the store it came from; bills are unique per
+# (store, invoice number), so the same bill arriving twice is merged
+CONSOLIDATED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stores (
+    store_code TEXT PRIMARY KEY,
+    last_seq INTEGER DEFAULT 0,     -- last store change_log entry merged
+    last_source TEXT,
+    last_import_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS staff (
+    store_code TEXT NOT NULL,
+    staff_id INTEGER NOT NULL,
+    staff_name TEXT,
+    PRIMARY KEY (store_code, staff_id)
+);
+
+CREATE TABLE IF NOT EXISTS customers (
+    store_code TEXT NOT NULL,
+    customer_id INTEGER NOT NULL,
+    customer_name TEXT,
+    phone_number TEXT,
+    address TEXT,
+    created_at TIMESTAMP,
+    modified_at TIMESTAMP,
+    PRIMARY KEY (store_code, customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS items (
+    store_code TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    barcode TEXT,
+    item_name TEXT,
+    hsn_code TEXT,
+    category_id INTEGER,
+    price REAL,
+    gst_percentage REAL,
+    stock_quantity INTEGER,
+    is_active INTEGER,
+    created_at TIMESTAMP,
+    modified_at TIMESTAMP,
+    PRIMARY KEY (store_code, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS bills (
+    store_code TEXT NOT NULL,
+    bill_id INTEGER NOT NULL,
+    invoice_number TEXT NOT NULL,
+    bill_date TIMESTAMP,
+    customer_id INTEGER,
+    staff_id INTEGER,
+    subtotal REAL DEFAULT 0.00,
+    discount_amount REAL DEFAULT 0.00,
+    discount_percentage REAL DEFAULT 0.00,
+    cgst_amount REAL DEFAULT 0.00,
+    sgst_amount REAL DEFAULT 0.00,
+    igst_amount REAL DEFAULT 0.00,
+    round_off REAL DEFAULT 0.00,
+    grand_total REAL,
+    payment_mode TEXT,
+    is_cancelled INTEGER DEFAULT 0,
+    created_at TIMESTAMP,
+    PRIMARY KEY (store_code, bill_id),
+    UNIQUE (store_code, invoice_number)
+);
+
+CREATE TABLE IF NOT EXISTS bill_items (
+    store_code TEXT NOT NULL,
+    bill_item_id INTEGER NOT NULL,
+    bill_id INTEGER NOT NULL,
+    item_id INTEGER,
+    item_name TEXT,
+    barcode TEXT,
+    quantity INTEGER,
+    unit_price REAL,
+    discount_percentage REAL DEFAULT 0.00,
+    discount_amount REAL DEFAULT 0.00,
+    gst_percentage REAL,
+    gst_amount REAL DEFAULT 0.00,
+    line_total REAL,
+    created_at TIMESTAMP,
+    PRIMARY KEY (store_code, bill_item_id)
+);
+
+CREATE TABLE IF NOT EXISTS stock_movements (
+    store_code TEXT NOT NULL,
+    movement_id INTEGER NOT NULL,
+    item_id INTEGER,
+    movement_type TEXT,
+    quantity INTEGER,
+    reference_type TEXT,
+    reference_id INTEGER,
+    notes TEXT,
+    staff_id INTEGER,
+    movement_date TIMESTAMP,
+    PRIMARY KEY (store_code, movement_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(bill_date);
+CREATE INDEX IF NOT EXISTS idx_bill_items_bill ON bill_items(store_code, bill_id);
+"""
+
+
+def load_store_file(path: str) -> Dict[str, Any]:
+    """
+    Read a store database file or changeset into plain rows (runs in a
+    worker process, so the result must pickle)
+    The store is the store_code the store set, for both kinds of input;
+    None when it has not set one
+    """
+    started = time.perf_counter()
+    source = {'path': path, 'tables': {}}
+
+    if path.endswith('.db'):
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            existing = {row['name'] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            store = None
+            if 'settings' in existing:
+                store = connection.execute(
+                    "SELECT setting_value FROM settings WHERE setting_key = 'store_code'"
+                ).fetchone()
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone() \
+                if 'sqlite_sequence' in existing else None
+
+            source.update({
+                'kind': 'database',
+                'store': (store[0] or '').strip() or None if store else None,
+                'from_seq': 0,
+                'to_seq': row[0] if row else 0
+            })
+            for table in SYNC_TABLES:
+                if table in existing:
+                    source['tables'][table] = {
+                        'upserts': [dict(row) for row in connection.execute(f"SELECT * FROM {table}")],
+                        'deletes': []
+                    }
+            source['tables']['staff'] = {
+                'upserts': [dict(row) for row in connection.execute(f"SELECT {', '.join(STAFF_COLUMNS)} FROM staff")],
+                'deletes': []
+            }
+        finally:
+            connection.close()
+    else:
+        header, records = read_changeset(path)
+        source.update({
+            'kind': 'changeset',
+            'store': (header.get('store') or '').strip() or None,
+            'from_seq': header['from_seq'],
+            'to_seq': header['to_seq']
+        })
+        for table, operation, data in records:
+            changes = source['tables'].setdefault(table, {'upserts': [], 'deletes': []})
+            changes['upserts' if operation == 'upsert' else 'deletes'].append(data)
+
+    source['load_ms'] = int((time.perf_counter() - started) * 1000)
+    return source
+
+
+class ConsolidationEngine:
+    """Head office reporting database built from every store's data"""
+
+    def __init__(self, db_path: str = DEFAULT_CONSOLIDATED_PATH, workers: Optional[int] = None):
+        self.db_path = db_path
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.connection: Optional[sqlite3.Connection] = None
+        self._columns: Dict[str, List[str]] = {}
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the consolidated database, creating its tables if needed"""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.db_path)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.executescript(CONSOLIDATED_SCHEMA)
+        return self.connection
+
+    def disconnect(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def columns(self, table: str) -> List[str]:
+        """Columns of a consolidated table (cached)"""
+        if table not in self._columns:
+            self._columns[table] = [row['name'] for row in self.connect().execute(f"PRAGMA table_info({table})")]
+        return self._columns[table]
+
+    def load(self, paths: Sequence[str]) -> List[Dict[str, Any]]:
+        """Read the input files, in parallel when there are several"""
+        if len(paths) < 2 or self.workers < 2:
+            return [load_store_file(path) for path in paths]
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(paths)), mp_context=context) as pool:
+            return list(pool.map(load_store_file, paths))
+
+    def merge(self, paths: Sequence[str],
+              progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Merge store files and changesets into the consolidated database
+        Full database files are applied first, then each store's changesets
+        in cursor order; changesets already merged are skipped and a gap in
+        a store's cursor stops its later changesets. Inputs from a store
+        without a store code are not merged, since their rows could not be
+        told apart from another store's.
+        """
+        started = time.perf_counter()
+        sources = self.load(list(paths))
+        load_ms = int((time.perf_counter() - started) * 1000)
+        sources.sort(key=lambda source: (source['kind'] != 'database', source['store'] or '', source['from_seq']))
+
+        connection = self.connect()
+        cursors = {row['store_code']: row['last_seq'] for row in connection.execute(
+            "SELECT store_code, last_seq FROM stores"
+        )}
+
+        results = []
+        with connection:
+            for index, source in enumerate(sources, 1):
+                store = source['store']
+                last_seq = cursors.get(store)
+                result = {'path': source['path'], 'store': store, 'kind': source['kind'], 'rows': 0}
+
+                if not store:
+                    result['status'] = "skipped: no store code set at the store"
+                    results.append(result)
+                    continue
+
+                if source['kind'] == 'changeset' and last_seq is not None:
+                    if source['to_seq'] <= last_seq:
+                        result['status'] = 'already merged'
+                        results.append(result)
+                        continue
+                    if source['from_seq'] > last_seq:
+                        result['status'] = f"gap: store is at {last_seq}, changeset starts after {source['from_seq']}"
+                        results.append(result)
+                        continue
+
+                result['rows'] = self._apply(store, source['tables'])
+                cursors[store] = max(last_seq or 0, source['to_seq'])
+                connection.execute(
+                    """
+                    INSERT INTO stores (store_code, last_seq, last_source, last_import_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(store_code) DO UPDATE SET last_seq = excluded.last_seq,
+                    last_source = excluded.last_source, last_import_at = excluded.last_import_at
+                    """,
+                    (store, cursors[store], os.path.basename(source['path']),
+                     datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                result['status'] = 'merged'
+                results.append(result)
+                if progress_callback:
+                    progress_callback(index, len(sources))
+
+        return {
+            'sources': results,
+            'merged': sum(1 for result in results if result['status'] == 'merged'),
+            'rows': sum(result['rows'] for result in results),
+            'load_ms': load_ms,
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        }
+
+    def _apply(self, store: str, tables: Dict[str, Dict[str, list]]) -> int:
+        connection = self.connection
+        applied = 0
+        for table in ('staff',) + SYNC_TABLES:
+            changes = tables.get(table)
+            if not changes:
+                continue
+            key = CONSOLIDATED_KEYS[table]
+            columns = self.columns(table)
+
+            if changes['upserts'] and table == 'bills':
+                # A bill replaced through its invoice number takes its old lines with it
+                connection.executemany(
+                    """
+                    DELETE FROM bill_items WHERE store_code = :store_code AND bill_id IN (
+                        SELECT bill_id FROM bills WHERE store_code = :store_code
+                        AND invoice_number = :invoice_number AND bill_id != :bill_id
+                    )
+                    """,
+                    ({'store_code': store, 'invoice_number': row['invoice_number'], 'bill_id': row['bill_id']}
+                     for row in changes['upserts'])
+                )
+            if changes['upserts']:
+                # Only columns the consolidated table knows; stores on older versions may lack some
+                present = [column for column in columns if column in changes['upserts'][0] or column == 'store_code']
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(present)}) "
+                    f"VALUES ({', '.join(':' + column for column in present)})",
+                    (dict(row, store_code=store) for row in changes['upserts'])
+                )
+            if changes['deletes']:
+                connection.executemany(
+                    f"DELETE FROM {table} WHERE store_code = ? AND {key} = ?",
+                    ((store, row_id) for row_id in changes['deletes'])
+                )
+            applied += len(changes['upserts']) + len(changes['deletes'])
+        return applied
+
+    def get_stores(self) -> List[Dict[str, Any]]:
+        """Stores merged so far with their sync cursors"""
+        return [dict(row) for row in self.connect().execute("SELECT * FROM stores ORDER BY store_code")]
+
+    def get_bills_by_date(self, date_from: str, date_to: str, staff_id: Optional[int] = None,
+                          store_code: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Bills of every store in the same shape as BillingManager.get_bills_by_date"""
+        query = """
+            SELECT b.*, s.staff_name, c.customer_name,
+            COUNT(bi.bill_item_id) as item_count
+            FROM bills b
+            LEFT JOIN staff s ON b.store_code = s.store_code AND b.staff_id = s.staff_id
+            LEFT JOIN customers c ON b.store_code = c.store_code AND b.customer_id = c.customer_id
+            LEFT JOIN bill_items bi ON b.store_code = bi.store_code AND b.bill_id = bi.bill_id
+            WHERE DATE(b.bill_date) BETWEEN ? AND ?
+            AND b.is_cancelled = 0
+        """
+        params = [date_from, date_to]
+
+        if staff_id:
+            query += " AND b.staff_id = ?"
+            params.append(staff_id)
+        if store_code:
+            query += " AND b.store_code = ?"
+            params.append(store_code)
+
+        query += " GROUP BY b.store_code, b.bill_id ORDER BY b.bill_date DESC"
+        return [dict(row) for row in self.connect().execute(query, params)]
@@ -0,0 +1,306 @@
+"""
+Database maintenance
+Refreshes planner statistics and reclaims space with ANALYZE, PRAGMA optimize,
+WAL checkpoints and VACUUM, run while the shop is idle or at day close
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, time as clock_time
+from typing import Optional, List, Dict, Any, Callable
+from .connection import db, DatabaseConnection
+from .backup import _int_setting, claim_scheduled_jobs, release_scheduled_jobs
+
+
+# Maintenance defaults, overridden by settings
+DEFAULT_IDLE_MINUTES = 10
+DEFAULT_DAY_CLOSE_TIME = "21:00"
+DEFAULT_VACUUM_FREE_PERCENT = 10
+
+# Hours between light (idle) maintenance runs
+IDLE_RUN_INTERVAL_HOURS = 6
+
+# Seconds between scheduler checks
+CHECK_INTERVAL = 60
+
+IDLE_TASKS = ('OPTIMIZE', 'CHECKPOINT')
+DAY_CLOSE_TASKS = ('ANALYZE', 'OPTIMIZE', 'CHECKPOINT', 'VACUUM')
+
+TASK_STATEMENTS = {
+    'ANALYZE': "ANALYZE",
+    'OPTIMIZE': "PRAGMA optimize",
+    'CHECKPOINT': "PRAGMA wal_checkpoint(TRUNCATE)",
+    'VACUUM': "VACUUM"
+}
+
+
+def fragmentation_percent(connection: sqlite3.Connection) -> Optional[float]:
+    """
+    Share of b-tree pages not stored directly after the previous page of the
+    same table or index, from the dbstat virtual table (None when unavailable)
+    """
+    try:
+        rows = connection.execute("SELECT name, pageno FROM dbstat ORDER BY name, path").fetchall()
+    except sqlite3.OperationalError:
+        return None
+
+    jumps = 0
+    previous_name, previous_page = None, None
+    for name, pageno in rows:
+        if name == previous_name and pageno != previous_page + 1:
+            jumps += 1
+        previous_name, previous_page = name, pageno
+    return round(100.0 * jumps / len(rows), 1) if rows else 0.0
+
+
+def measure(database: Optional[DatabaseConnection] = None, include_fragmentation: bool = True) -> Dict[str, Any]:
+    """Page counts, free pages, WAL size and fragmentation of the live database"""
+    database = database or db
+    if not database.connection:
+        database.connect()
+    connection = database.connection
+
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_path = database.db_path + "-wal"
+
+    return {
+        'journal_mode': connection.execute("PRAGMA journal_mode").fetchone()[0],
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'free_percent': round(100.0 * freelist_count / page_count, 1) if page_count else 0.0,
+        'file_bytes': page_size * page_count,
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'fragmentation_percent': fragmentation_percent(connection) if include_fragmentation else None
+    }
+
+
+def database_idle_seconds(database: Optional[DatabaseConnection] = None) -> float:
+    """Seconds since any terminal last changed a bill, item or stock row (infinite when unknown)"""
+    database = database or db
+    result = database.get_single_result(
+        """
+        SELECT (julianday('now') - julianday(changed_at)) * 86400 AS idle
+        FROM change_log ORDER BY change_id DESC LIMIT 1
+        """
+    )
+    return result['idle'] if result and result['idle'] is not None else float('inf')
+
+
+def parse_clock_time(value: Optional[str], default: str = DEFAULT_DAY_CLOSE_TIME) -> clock_time:
+    """Time of day from an 'H:MM' or 'HH:MM' setting, the default when unreadable"""
+    try:
+        return datetime.strptime((value or default).strip(), '%H:%M').time()
+    except ValueError:
+        print(f"Invalid time '{value}', using {default}")
+        return datetime.strptime(default, '%H:%M').time()
+
+
+class MaintenanceEngine:
+    """Runs maintenance tasks and records what each run did in maintenance_log"""
+
+    def __init__(self, database: Optional[DatabaseConnection] = None,
+                 vacuum_free_percent: Optional[int] = None):
+        self.database = database or db
+        self.vacuum_free_percent = vacuum_free_percent if vacuum_free_percent is not None else _int_setting(
+            self.database, 'vacuum_free_percent', DEFAULT_VACUUM_FREE_PERCENT
+        )
+
+    def vacuum_needed(self, stats: Dict[str, Any]) -> bool:
+        """VACUUM only pays off when enough of the file is free or scattered"""
+        fragmentation = stats.get('fragmentation_percent') or 0
+        return (stats['free_percent'] >= self.vacuum_free_percent or
+                fragmentation >= self.vacuum_free_percent)
+
+    def run(self, run_type: str = 'MANUAL', tasks: Optional[List[str]] = None,
+            force_vacuum: bool = False) -> Dict[str, Any]:
+        """
+        Run maintenance tasks in order, measuring before and after
+        VACUUM is skipped unless vacuum_needed() or force_vacuum. Idle runs
+        skip the dbstat fragmentation scan, which reads every page.
+        Returns the run summary that is also stored in maintenance_log
+        """
+        tasks = list(tasks or DAY_CLOSE_TASKS)
+        connection = self.database.connection or self.database.connect()
+        started = time.perf_counter()
+        scan_pages = run_type != 'IDLE'
+        before = measure(self.database, include_fragmentation=scan_pages)
+
+        results = []
+        for task in tasks:
+            if task == 'VACUUM' and not (force_vacuum or self.vacuum_needed(before)):
+                results.append({'task': task, 'skipped': True, 'duration_ms': 0})
+                continue
+
+            with self.database.lock:
+                if connection.in_transaction:
+                    connection.commit()
+                task_started = time.perf_counter()
+                rows = connection.execute(TASK_STATEMENTS[task]).fetchall()
+                connection.commit()
+            result = {'task': task, 'skipped': False,
+                      'duration_ms': int((time.perf_counter() - task_started) * 1000)}
+            if task == 'CHECKPOINT' and rows:
+                # busy flag, WAL frames, frames checkpointed (-1 outside WAL mode)
+                result['wal_frames'] = rows[0][1]
+            results.append(result)
+
+        after = measure(self.database, include_fragmentation=scan_pages)
+        summary = {
+            'run_type': run_type,
+            'tasks': results,
+            'before': before,
+            'after': after,
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        }
+        self.log_run(summary)
+        return summary
+
+    def run_idle(self) -> Dict[str, Any]:
+        """Light maintenance for idle periods"""
+        return self.run('IDLE', list(IDLE_TASKS))
+
+    def run_day_close(self, force_vacuum: bool = False) -> Dict[str, Any]:
+        """Full maintenance at the end of the day"""
+        return self.run('DAY_CLOSE', list(DAY_CLOSE_TASKS), force_vacuum)
+
+    def log_run(self, summary: Dict[str, Any]):
+        """Record a run in maintenance_log"""
+        before, after = summary['before'], summary['after']
+        self.database.execute_insert(
+            """
+            INSERT INTO maintenance_log
+            (run_time, run_type, tasks, duration_ms, page_count_before, page_count_after,
+             freelist_before, freelist_after, wal_bytes_before, wal_bytes_after,
+             fragmentation_before, fragmentation_after, details)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                summary['run_type'],
+                ", ".join(task['task'] for task in summary['tasks'] if not task['skipped']),
+                summary['duration_ms'],
+                before['page_count'], after['page_count'],
+                before['freelist_count'], after['freelist_count'],
+                before['wal_bytes'], after['wal_bytes'],
+                before['fragmentation_percent'], after['fragmentation_percent'],
+                json.dumps(summary['tasks'])
+            )
+        )
+
+    def get_history(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Recent maintenance runs, newest first"""
+        rows = self.database.execute_query(
+            "SELECT * FROM maintenance_log ORDER BY maintenance_id DESC LIMIT ?", (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def last_run_time(self, run_type: str) -> Optional[datetime]:
+        """Local time of the last run of a type"""
+        result = self.database.get_single_result(
+            "SELECT MAX(run_time) AS run_time FROM maintenance_log WHERE run_type = ?", (run_type,)
+        )
+        if not result or not result['run_time']:
+            return None
+        return datetime.strptime(result['run_time'], '%Y-%m-%d %H:%M:%S')
+
+
+def format_run(summary: Dict[str, Any]) -> str:
+    """Readable summary of a maintenance run"""
+    before, after = summary['before'], summary['after']
+    lines = [
+        f"{task['task']:<11}: {'skipped' if task['skipped'] else str(task['duration_ms']) + ' ms'}"
+        for task in summary['tasks']
+    ]
+    lines += [
+        f"Database size : {before['file_bytes'] / 1024:,.0f} KB -> {after['file_bytes'] / 1024:,.0f} KB",
+        f"Free pages    : {before['freelist_count']} ({before['free_percent']}%) -> "
+        f"{after['freelist_count']} ({after['free_percent']}%)",
+        f"WAL size      : {before['wal_bytes'] / 1024:,.0f} KB -> {after['wal_bytes'] / 1024:,.0f} KB"
+    ]
+    if before['fragmentation_percent'] is not None:
+        lines.append(f"Fragmentation : {before['fragmentation_percent']}% -> {after['fragmentation_percent']}%")
+    lines.append(f"Total time    : {summary['duration_ms'] / 1000:.1f} s")
+    return "\n".join(lines)
+
+
+class MaintenanceScheduler:
+    """
+    Background thread running maintenance while the shop is idle
+    idle_seconds reports how long since the last user activity here; other
+    terminals count as busy while they write to the database. Light
+    maintenance runs after the idle threshold; full maintenance runs once a
+    day when idle after the day close time. Only the terminal holding the
+    scheduled jobs lease runs either.
+    """
+
+    def __init__(self, idle_seconds: Callable[[], float], engine: Optional[MaintenanceEngine] = None,
+                 idle_minutes: Optional[int] = None, day_close_time: Optional[str] = None):
+        self.idle_seconds = idle_seconds
+        self.engine = engine
+        self.idle_minutes = idle_minutes
+        self.day_close_time = day_close_time
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Start the scheduler; False when idle maintenance is turned off"""
+        if self.idle_minutes is None:
+            self.idle_minutes = _int_setting(db, 'maintenance_idle_minutes', DEFAULT_IDLE_MINUTES)
+        if self.day_close_time is None:
+            self.day_close_time = db.get_setting('maintenance_day_close_time') or DEFAULT_DAY_CLOSE_TIME
+        if self.idle_minutes <= 0:
+            return False
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5):
+        """Stop the scheduler, waiting briefly for a running task"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+            release_scheduled_jobs()
+
+    def due(self, now: Optional[datetime] = None) -> Optional[str]:
+        """Run type due now, if any"""
+        now = now or datetime.now()
+        idle = min(self.idle_seconds(), database_idle_seconds(self.engine.database))
+        if idle < self.idle_minutes * 60:
+            return None
+
+        if now.time() >= parse_clock_time(self.day_close_time):
+            last = self.engine.last_run_time('DAY_CLOSE')
+            if last is None or last.date() < now.date():
+                return 'DAY_CLOSE'
+
+        last = self.engine.last_run_time('IDLE')
+        if last is None or (now - last).total_seconds() >= IDLE_RUN_INTERVAL_HOURS * 3600:
+            return 'IDLE'
+        return None
+
+    def _run(self):
+        while not self._stop_event.wait(CHECK_INTERVAL):
+            try:
+                if self.engine is None:
+                    self.engine = MaintenanceEngine()
+                # Another terminal sharing the database runs maintenance
+                run_type = self.due() if claim_scheduled_jobs(self.engine.database) else None
+                if run_type == 'DAY_CLOSE':
+                    self.last_result = self.engine.run_day_close()
+                elif run_type == 'IDLE':
+                    self.last_result = self.engine.run_idle()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Scheduled maintenance failed: {e}")
@@ -0,0 +1,140 @@
+"""
+Offline tills
+A till that loses the main database bills on its own copy. Stock is kept as
+per-terminal counters (stock_counters), so merging the copies when the till
+reconnects adds up every terminal's sales instead of overwriting stock
+"""
+
+import os
+import sqlite3
+from typing import Optional, List, Dict, Any, Tuple
+from .connection import db, DatabaseConnection, DEFAULT_TERMINAL_ID
+from .backup import BackupEngine
+
+
+CounterRow = Tuple[int, str, int, int]  # item_id, terminal_id, added, removed
+
+
+def get_terminal_id(database: Optional[DatabaseConnection] = None) -> str:
+    """Terminal whose counter this database copy increments"""
+    database = database or db
+    return database.get_setting('terminal_id') or DEFAULT_TERMINAL_ID
+
+
+def get_counters(database: Optional[DatabaseConnection] = None) -> List[CounterRow]:
+    """Every terminal's stock counters as known to this database copy"""
+    database = database or db
+    return [tuple(row) for row in database.execute_query(
+        "SELECT item_id, terminal_id, added, removed FROM stock_counters ORDER BY item_id, terminal_id"
+    )]
+
+
+def apply_counters(counters: List[CounterRow], database: Optional[DatabaseConnection] = None) -> Dict[str, Any]:
+    """
+    Merge counters from another copy: each (item, terminal) keeps the larger
+    added and removed totals, then stock_quantity is recomputed for the
+    items that changed. Applying the same counters again changes nothing,
+    and the order copies are merged in does not matter.
+    """
+    database = database or db
+    changed, unknown = set(), set()
+
+    with database.transaction():
+        items = {row['item_id'] for row in database.execute_query("SELECT item_id FROM items")}
+        current = {(row[0], row[1]): (row[2], row[3]) for row in get_counters(database)}
+
+        for item_id, terminal_id, added, removed in counters:
+            if item_id not in items:
+                # Items created on an offline till are not merged automatically
+                unknown.add(item_id)
+                continue
+            known_added, known_removed = current.get((item_id, terminal_id), (0, 0))
+            if added <= known_added and removed <= known_removed:
+                continue
+            database.execute_update(
+                """
+                INSERT INTO stock_counters (item_id, terminal_id, added, removed) VALUES (?, ?, ?, ?)
+                ON CONFLICT(item_id, terminal_id) DO UPDATE SET
+                added = MAX(added, excluded.added), removed = MAX(removed, excluded.removed)
+                """,
+                (item_id, terminal_id, added, removed)
+            )
+            changed.add(item_id)
+
+        for item_id in changed:
+            # Equals the counter total, so the stock trigger adds nothing
+            database.execute_update(
+                """
+                UPDATE items SET stock_quantity = (
+                    SELECT SUM(added - removed) FROM stock_counters WHERE item_id = items.item_id
+                ), modified_at = CURRENT_TIMESTAMP
+                WHERE item_id = ?
+                """,
+                (item_id,)
+            )
+
+    return {'items_updated': len(changed), 'unknown_items': sorted(unknown)}
+
+
+def stock_discrepancies(database: Optional[DatabaseConnection] = None) -> List[Dict[str, Any]]:
+    """Items whose stock_quantity differs from the sum of their counters (should be none)"""
+    database = database or db
+    return [dict(row) for row in database.execute_query(
+        """
+        SELECT i.item_id, i.stock_quantity, COALESCE(SUM(c.added - c.removed), 0) AS counted
+        FROM items i LEFT JOIN stock_counters c ON c.item_id = i.item_id
+        GROUP BY i.item_id
+        HAVING i.stock_quantity != counted
+        """
+    )]
+
+
+def prepare_offline_copy(target_path: str, terminal_id: str,
+                         database: Optional[DatabaseConnection] = None) -> Dict[str, Any]:
+    """Copy the main database for a till to bill on while disconnected"""
+    database = database or db
+    if terminal_id == get_terminal_id(database):
+        raise Exception(f"Terminal id {terminal_id} is already used by this database")
+
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    result = BackupEngine(database).copy(target_path)
+    connection = sqlite3.connect(target_path)
+    try:
+        connection.execute(
+            """
+            INSERT INTO settings (setting_key, setting_value, description) VALUES ('terminal_id', ?, ?)
+            ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value
+            """,
+            (terminal_id, "Terminal Id of This Database Copy (offline tills use their own)")
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    result['terminal_id'] = terminal_id
+    return result
+
+
+def merge_offline_copy(copy_path: str, database: Optional[DatabaseConnection] = None) -> Dict[str, Any]:
+    """
+    Exchange stock counters with a till's copy in both directions, after
+    which both show the same stock for every item they share
+    """
+    database = database or db
+    if not os.path.exists(copy_path):
+        raise Exception(f"Till database not found: {copy_path}")
+
+    till = DatabaseConnection(copy_path)
+    till.connect()
+    try:
+        terminal_id = get_terminal_id(till)
+        pulled = apply_counters(get_counters(till), database)
+        pushed = apply_counters(get_counters(database), till)
+    finally:
+        till.disconnect()
+
+    return {
+        'terminal_id': terminal_id,
+        'main_items_updated': pulled['items_updated'],
+        'till_items_updated': pushed['items_updated'],
+        'unknown_items': pulled['unknown_items']
+    }
@@ -0,0 +1,356 @@
+"""
+Point-in-time restore
+Rebuilds the database from a full snapshot plus incremental changesets
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable
+from .connection import db, DatabaseConnection, CHANGE_TRACKED_TABLES, LOCAL_TERMINAL_SQL
+from .backup import SNAPSHOT_FORMAT, SnapshotManager
+
+
+SNAPSHOT_PATTERN = re.compile(r'^(full|incr)_(\d{8}_\d{6}_\d{6})\.(db\.gz|jsonl\.gz)$')
+
+# Largest difference between stored and recalculated bill totals accepted
+TOTALS_TOLERANCE = 0.01
+
+
+def scan_snapshots(backup_dir: str) -> List[Dict[str, Any]]:
+    """
+    Snapshots found in a backup folder, oldest first
+    Works from the files alone, so a restore does not need the live database
+    """
+    snapshots = []
+    if not os.path.isdir(backup_dir):
+        return snapshots
+
+    for filename in os.listdir(backup_dir):
+        match = SNAPSHOT_PATTERN.match(filename)
+        if not match:
+            continue
+        snapshots.append({
+            'type': 'FULL' if match.group(1) == 'full' else 'INCREMENTAL',
+            'time': datetime.strptime(match.group(2), '%Y%m%d_%H%M%S_%f'),
+            'file_path': os.path.join(backup_dir, filename)
+        })
+
+    snapshots.sort(key=lambda snapshot: snapshot['time'])
+    return snapshots
+
+
+def read_changeset(path: str):
+    """Read an incremental changeset: returns (header, record iterator)"""
+    f = gzip.open(path, 'rt', encoding='utf-8')
+    header = json.loads(f.readline())
+    if header.get('format') != SNAPSHOT_FORMAT:
+        f.close()
+        raise Exception(f"Unsupported changeset format in {os.path.basename(path)}")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+
+def verify_database(path: str) -> Dict[str, Any]:
+    """
+    Check a database file: PRAGMA integrity_check, orphaned bill lines and
+    bill totals recalculated with GSTCalculator against the stored totals.
+    'ok' covers the file structure; bills with mismatched totals are listed
+    separately, since old bills may have been saved by earlier GST rules
+    """
+    from ..models.billing import GSTCalculator
+
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    try:
+        integrity = "; ".join(str(row[0]) for row in connection.execute("PRAGMA integrity_check"))
+
+        orphans = connection.execute(
+            """
+            SELECT COUNT(*) FROM bill_items bi
+            LEFT JOIN bills b ON bi.bill_id = b.bill_id
+            WHERE b.bill_id IS NULL
+            """
+        ).fetchone()[0]
+
+        summary = connection.execute(
+            """
+            SELECT COUNT(*) AS bill_count, COALESCE(SUM(grand_total), 0) AS sales_total
+            FROM bills WHERE is_cancelled = 0
+            """
+        ).fetchone()
+
+        # Recalculate every finalized bill from its lines in one ordered pass
+        mismatched = []
+        bills = {row['bill_id']: row for row in connection.execute(
+            "SELECT bill_id, invoice_number, discount_percentage, igst_amount, grand_total "
+            "FROM bills WHERE grand_total > 0"
+        )}
+        current_id, lines = None, []
+
+        def check(bill_id, bill_lines):
+            bill = bills.get(bill_id)
+            if not bill:
+                return
+            totals = GSTCalculator.calculate_bill_summary(
+                bill_lines, bill['discount_percentage'] or 0, (bill['igst_amount'] or 0) > 0
+            )
+            if abs(totals['grand_total'] - bill['grand_total']) > TOTALS_TOLERANCE:
+                mismatched.append(bill['invoice_number'])
+
+        for row in connection.execute("SELECT * FROM bill_items ORDER BY bill_id, bill_item_id"):
+            if row['bill_id'] != current_id:
+                if current_id is not None:
+                    check(current_id, lines)
+                current_id, lines = row['bill_id'], []
+            lines.append(dict(row))
+        if current_id is not None:
+            check(current_id, lines)
+
+        return {
+            'integrity': integrity,
+            'orphan_lines': orphans,
+            'bill_count': summary['bill_count'],
+            'sales_total': round(summary['sales_total'] or 0, 2),
+            'mismatched_bills': mismatched,
+            'ok': integrity == "ok" and orphans == 0
+        }
+    finally:
+        connection.close()
+
+
+def running_service_url(database: Optional[DatabaseConnection] = None) -> Optional[str]:
+    """URL of a billing service that is serving this database, if one answers"""
+    from ..service.client import ServiceClient
+
+    url = (database or db).get_setting('billing_service_url')
+    if not url:
+        return None
+    try:
+        ServiceClient(url, timeout=2).health()
+        return url
+    except Exception:
+        return None  # left behind by a service that did not shut down cleanly
+
+
+def reset_counters(connection: sqlite3.Connection):
+    """
+    Bring the counters kept outside the changesets in line with the restored rows:
+    invoice sequences continue after the highest restored or archived number,
+    leased invoice blocks are retired at that number, and stock counters
+    are matched to items.stock_quantity again
+    """
+    prefixes = {row[0] for row in connection.execute(
+        "SELECT prefix FROM invoice_sequences UNION SELECT prefix FROM invoice_blocks "
+        "UNION SELECT setting_value FROM settings WHERE setting_key = 'invoice_prefix'"
+    ) if row[0]}
+    for prefix in prefixes:
+        highest = connection.execute(
+            """
+            SELECT COALESCE(MAX(num), 0) FROM (
+                SELECT MAX(CAST(SUBSTR(invoice_number, LENGTH(?) + 1) AS INTEGER)) AS num
+                FROM bills WHERE invoice_number LIKE ?
+                UNION ALL
+                SELECT max_number FROM archived_invoice_sequences WHERE prefix = ?
+            )
+            """,
+            (prefix, f"{prefix}%", prefix)
+        ).fetchone()[0]
+        connection.execute(
+            "INSERT OR REPLACE INTO invoice_sequences (prefix, last_number) VALUES (?, ?)", (prefix, highest)
+        )
+        # Numbers above the restored ones will be issued again, so no block may still hold them
+        connection.execute(
+            """
+            UPDATE invoice_blocks SET released_at = COALESCE(released_at, CURRENT_TIMESTAMP),
+            end_number = MAX(start_number - 1, MIN(end_number, ?))
+            WHERE prefix = ? AND (released_at IS NULL OR end_number > ?)
+            """,
+            (highest, prefix, highest)
+        )
+
+    connection.execute("DELETE FROM stock_counters WHERE item_id NOT IN (SELECT item_id FROM items)")
+    connection.execute(f"""
+        INSERT INTO stock_counters (item_id, terminal_id, added, removed)
+        SELECT item_id, {LOCAL_TERMINAL_SQL}, MAX(delta, 0), MAX(-delta, 0) FROM (
+            SELECT i.item_id, COALESCE(i.stock_quantity, 0) - COALESCE(SUM(c.added - c.removed), 0) AS delta
+            FROM items i LEFT JOIN stock_counters c ON c.item_id = i.item_id
+            GROUP BY i.item_id
+        )
+        WHERE delta != 0
+        ON CONFLICT(item_id, terminal_id) DO UPDATE SET
+        added = added + excluded.added, removed = removed + excluded.removed
+    """)
+
+
+class RestoreEngine:
+    """Builds a restored database into a fresh file and swaps it in"""
+
+    def __init__(self, backup_dir: Optional[str] = None, database: Optional[DatabaseConnection] = None,
+                 progress_callback: Optional[Callable[[str], None]] = None):
+        self.database = database or db
+        self.backup_dir = backup_dir or os.path.join(
+            os.path.dirname(os.path.abspath(self.database.db_path)), "backups"
+        )
+        self.progress_callback = progress_callback
+        self.verified: Dict[str, Dict[str, Any]] = {}
+
+    def report(self, message: str):
+        if self.progress_callback:
+            self.progress_callback(message)
+
+    def restore_points(self) -> List[Dict[str, Any]]:
+        """Every snapshot time that can be restored to, oldest first"""
+        snapshots = scan_snapshots(self.backup_dir)
+        first_full = next((s['time'] for s in snapshots if s['type'] == 'FULL'), None)
+        if first_full is None:
+            return []
+        return [s for s in snapshots if s['time'] >= first_full]
+
+    def plan(self, target_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """Pick the latest full snapshot at or before target_time and the incrementals after it"""
+        snapshots = [s for s in scan_snapshots(self.backup_dir)
+                     if target_time is None or s['time'] <= target_time]
+        fulls = [s for s in snapshots if s['type'] == 'FULL']
+        if not fulls:
+            raise Exception("No full backup found before the chosen time")
+
+        full = fulls[-1]
+        incrementals = [s for s in snapshots if s['type'] == 'INCREMENTAL' and s['time'] > full['time']]
+        return {'full': full, 'incrementals': incrementals}
+
+    def build(self, target_time: Optional[datetime] = None,
+              output_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Restore into a fresh file (the live database is not touched)
+        Returns the plan, records applied and verification results; bills
+        with mismatched totals are reported there and must be accepted
+        when swapping in
+        """
+        started = time.perf_counter()
+        plan = self.plan(target_time)
+        output_path = output_path or self.database.db_path + ".restored"
+        temp_path = output_path + ".part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        self.report(f"Unpacking full backup {os.path.basename(plan['full']['file_path'])}")
+        with gzip.open(plan['full']['file_path'], 'rb') as source, open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+
+        connection = sqlite3.connect(temp_path)
+        records = 0
+        try:
+            # The sequence survives change_log pruning, unlike MAX(change_id)
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            base_seq = row[0] if row else 0
+            previous_to_seq = None
+
+            for index, snapshot in enumerate(plan['incrementals'], 1):
+                self.report(f"Applying changeset {index} of {len(plan['incrementals'])}")
+                header, changes = read_changeset(snapshot['file_path'])
+
+                # Changesets must follow on from each other without gaps
+                if previous_to_seq is None:
+                    if header['from_seq'] > base_seq:
+                        raise Exception(f"Changes missing before {os.path.basename(snapshot['file_path'])}")
+                elif header['from_seq'] != previous_to_seq:
+                    raise Exception(f"Changeset chain broken at {os.path.basename(snapshot['file_path'])}")
+                previous_to_seq = header['to_seq']
+
+                with connection:
+                    for change in changes:
+                        table = change['table']
+                        key = CHANGE_TRACKED_TABLES.get(table)
+                        if not key:
+                            continue
+                        if change['op'] == 'delete':
+                            connection.execute(f"DELETE FROM {table} WHERE {key} = ?", (change['id'],))
+                        else:
+                            row = change['row']
+                            columns = ", ".join(row)
+                            placeholders = ", ".join("?" for _ in row)
+                            connection.execute(
+                                f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})",
+                                tuple(row.values())
+                            )
+                        records += 1
+
+            # Replaying fires the change triggers; those entries are not real changes
+            with connection:
+                connection.execute("DELETE FROM change_log WHERE change_id > ?", (base_seq,))
+                reset_counters(connection)
+        finally:
+            connection.close()
+
+        self.report("Verifying restored database")
+        verification = verify_database(temp_path)
+        if not verification['ok']:
+            os.remove(temp_path)
+            raise Exception(
+                f"Restored database failed verification: integrity {verification['integrity']}, "
+                f"{verification['orphan_lines']} orphaned bill lines"
+            )
+
+        os.replace(temp_path, output_path)
+        self.verified[output_path] = verification
+        restored_to = plan['incrementals'][-1]['time'] if plan['incrementals'] else plan['full']['time']
+        return {
+            'output_path': output_path,
+            'restored_to': restored_to,
+            'full': plan['full'],
+            'incrementals': len(plan['incrementals']),
+            'records': records,
+            'verification': verification,
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        }
+
+    def swap_in(self, restored_path: str, accept_mismatches: bool = False) -> str:
+        """
+        Replace the live database with a restored file in one rename
+        The current file is kept beside it; returns its path.
+        A full snapshot is taken afterwards so later changesets build on the
+        restored data. Refused while the billing service has the database
+        open, and when bills have mismatched totals unless accept_mismatches.
+        Other terminals opening the file directly must be closed first.
+        """
+        service_url = running_service_url(self.database)
+        if service_url:
+            raise Exception(f"The billing service at {service_url} is using the database. "
+                            f"Stop it and close all other terminals before restoring")
+
+        verification = self.verified.get(restored_path) or verify_database(restored_path)
+        mismatched = verification['mismatched_bills']
+        if mismatched and not accept_mismatches:
+            raise Exception(f"{len(mismatched)} restored bills have mismatched totals "
+                            f"({', '.join(mismatched[:5])}); confirm to restore anyway")
+
+        live_path = self.database.db_path
+        previous_path = f"{live_path}.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        self.database.disconnect()
+        # The restored file may predate later migrations
+        self.database.migrations_checked = False
+        try:
+            if os.path.exists(live_path):
+                try:
+                    os.link(live_path, previous_path)
+                except OSError:
+                    shutil.copy2(live_path, previous_path)
+            os.replace(restored_path, live_path)
+        finally:
+            self.database.connect()
+
+        SnapshotManager(self.database, self.backup_dir).take_full()
+        return previous_path
@@ -0,0 +1,204 @@
+"""
+Head office sync
+Exports rows changed since a change_log cursor as small compressed
+changeset files, so nightly sync moves kilobytes instead of the database
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from .connection import db, DatabaseConnection, CHANGE_TRACKED_TABLES
+from .backup import file_checksum, SNAPSHOT_FETCH_SIZE
+
+
+# Tables sent to head office, parents before children
+SYNC_TABLES = ('customers', 'items', 'bills', 'bill_items', 'stock_movements')
+
+# Staff has no change log; names are sent in full with every changeset
+STAFF_COLUMNS = ('staff_id', 'staff_name')
+
+# Version of the changeset file format
+CHANGESET_FORMAT = 1
+
+
+def get_sync_cursor(database: Optional[DatabaseConnection] = None) -> Optional[int]:
+    """Last change_log entry head office has confirmed (None before the first sync)"""
+    database = database or db
+    value = database.get_setting('sync_cursor')
+    return int(value) if value is not None else None
+
+
+def earliest_available_seq(database: Optional[DatabaseConnection] = None) -> int:
+    """Oldest change_log entry still kept after rotation pruning"""
+    database = database or db
+    result = database.get_single_result("SELECT MIN(change_id) AS first FROM change_log")
+    if result and result['first'] is not None:
+        return result['first']
+    # Empty log: everything up to the sequence has been pruned
+    result = database.get_single_result("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    return (result['seq'] if result else 0) + 1
+
+
+def read_changeset(path: str) -> Tuple[Dict[str, Any], Iterator[Tuple[str, str, Any]]]:
+    """
+    Open a changeset file
+    Returns its header and an iterator of (table, 'upsert', row dict) and
+    (table, 'delete', row id) records
+    """
+    f = gzip.open(path, 'rt', encoding='utf-8')
+    header = json.loads(f.readline())
+    if header.get('format') != CHANGESET_FORMAT:
+        f.close()
+        raise Exception(f"Unsupported changeset format: {header.get('format')}")
+
+    def records():
+        with f:
+            table, columns = None, None
+            for line in f:
+                record = json.loads(line)
+                if 'table' in record:
+                    table, columns = record['table'], record['columns']
+                elif 'u' in record:
+                    yield table, 'upsert', dict(zip(columns, record['u']))
+                elif 'd' in record:
+                    yield table, 'delete', record['d']
+
+    return header, records()
+
+
+class ChangesetExporter:
+    """
+    Writes changesets of bills, bill lines, items, customers and stock movements
+
+    Each changeset holds the current state of every row changed after the
+    cursor, so applying the same file twice at head office is harmless.
+    Rows moved to a year archive are not sent as deletions.
+    """
+
+    def __init__(self, database: Optional[DatabaseConnection] = None,
+                 export_dir: Optional[str] = None, store_code: Optional[str] = None):
+        self.database = database or db
+        self.export_dir = export_dir or os.path.join(
+            os.path.dirname(os.path.abspath(self.database.db_path)), "sync"
+        )
+        # No default: head office keys every row by store, so two stores sharing a code overwrite each other
+        self.store_code = store_code or self.database.get_setting('store_code') or None
+
+    def changed_rows(self, from_seq: int, to_seq: int) -> Dict[str, Dict[int, str]]:
+        """Latest operation per changed row, by table"""
+        changed: Dict[str, Dict[int, str]] = {}
+        placeholders = ", ".join("?" for _ in SYNC_TABLES)
+        for row in self.database.execute_query(
+            f"""
+            SELECT table_name, row_id, operation FROM change_log
+            WHERE change_id IN (
+                SELECT MAX(change_id) FROM change_log
+                WHERE change_id > ? AND change_id <= ? AND table_name IN ({placeholders})
+                GROUP BY table_name, row_id
+            )
+            """,
+            (from_seq, to_seq, *SYNC_TABLES)
+        ):
+            changed.setdefault(row['table_name'], {})[row['row_id']] = row['operation']
+        return changed
+
+    def export_since(self, cursor: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Write a changeset of rows changed after cursor (default: the last
+        confirmed sync). Returns None when nothing changed
+        """
+        if not self.store_code:
+            raise Exception("No store code set; set this store's code before syncing with head office")
+
+        from_seq = cursor if cursor is not None else (get_sync_cursor(self.database) or 0)
+        if from_seq + 1 < earliest_available_seq(self.database):
+            raise Exception(
+                f"Changes after {from_seq} have been pruned from the change log; "
+                f"send a full backup to head office instead"
+            )
+
+        started = time.perf_counter()
+        result = self.database.get_single_result("SELECT COALESCE(MAX(change_id), 0) AS seq FROM change_log")
+        to_seq = result['seq']
+        if to_seq <= from_seq:
+            return None
+
+        changed = self.changed_rows(from_seq, to_seq)
+        os.makedirs(self.export_dir, exist_ok=True)
+        path = os.path.join(self.export_dir, f"changes_{self.store_code}_{from_seq}_{to_seq}.jsonl.gz")
+        temp_path = path + ".part"
+        records = 0
+
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=9) as f:
+            f.write(json.dumps({
+                'format': CHANGESET_FORMAT, 'store': self.store_code,
+                'from_seq': from_seq, 'to_seq': to_seq,
+                'created_at': datetime.now().isoformat(timespec='seconds')
+            }) + "\n")
+
+            for table in SYNC_TABLES:
+                operations = changed.get(table)
+                if not operations:
+                    continue
+                key = CHANGE_TRACKED_TABLES[table]
+                row_ids = [row_id for row_id, operation in operations.items() if operation != 'A']
+                if not row_ids:
+                    continue
+                columns = [row['name'] for row in self.database.execute_query(f"PRAGMA table_info({table})")]
+                f.write(json.dumps({'table': table, 'columns': columns}) + "\n")
+
+                for start in range(0, len(row_ids), SNAPSHOT_FETCH_SIZE):
+                    batch = row_ids[start:start + SNAPSHOT_FETCH_SIZE]
+                    placeholders = ", ".join("?" for _ in batch)
+                    found = set()
+                    for row in self.database.execute_query(
+                        f"SELECT {', '.join(columns)} FROM {table} WHERE {key} IN ({placeholders})", tuple(batch)
+                    ):
+                        found.add(row[key])
+                        f.write(json.dumps({'u': list(row)}, ensure_ascii=False, separators=(',', ':')) + "\n")
+                        records += 1
+                    # Rows that no longer exist were deleted
+                    for row_id in batch:
+                        if row_id not in found:
+                            f.write(json.dumps({'d': row_id}) + "\n")
+                            records += 1
+
+            if records:
+                f.write(json.dumps({'table': 'staff', 'columns': STAFF_COLUMNS}) + "\n")
+                for row in self.database.execute_query(f"SELECT {', '.join(STAFF_COLUMNS)} FROM staff"):
+                    f.write(json.dumps({'u': list(row)}, ensure_ascii=False, separators=(',', ':')) + "\n")
+        os.replace(temp_path, path)
+
+        result = {
+            'file_path': path,
+            'from_seq': from_seq,
+            'to_seq': to_seq,
+            'records': records,
+            'file_size': os.path.getsize(path),
+            'checksum': file_checksum(path),
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        }
+        result['export_id'] = self.database.execute_insert(
+            """
+            INSERT INTO sync_exports (file_path, from_seq, to_seq, records, file_size, checksum)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (path, from_seq, to_seq, records, result['file_size'], result['checksum'])
+        )
+        return result
+
+    def acknowledge(self, to_seq: int) -> bool:
+        """Head office has applied changes up to to_seq; older ones may now be pruned"""
+        current = get_sync_cursor(self.database)
+        if current is not None and to_seq < current:
+            return False
+        return self.database.update_setting('sync_cursor', str(to_seq))
+
+    def get_exports(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Recent exports, newest first"""
+        return [dict(row) for row in self.database.execute_query(
+            "SELECT * FROM sync_exports ORDER BY export_id DESC LIMIT ?", (limit,)
+        )]
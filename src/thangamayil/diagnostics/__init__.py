@@ -0,0 +1 @@
+"""Diagnostics package for Thangamayil Billing Software"""
@@ -0,0 +1,310 @@
+"""
+Benchmarks
+Times item lookup, billing, reports, the bill list, receipt rendering and
+backup against a large store database. Results are saved as JSON and
+compared with a baseline run to catch regressions.
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from ..database.connection import db
+from .metrics import LatencyHistogram
+
+
+RESULTS_FORMAT = 1
+
+# Where runs and generated datasets are kept
+BENCHMARK_DIR = "benchmarks"
+DATASET_DIR = os.path.join(BENCHMARK_DIR, "data")
+
+# Each case runs until it has used this many seconds or its call limit
+CASE_SECONDS = 3.0
+WARMUP_CALLS = 3
+
+# A case regresses when its median is this much slower than the baseline
+# (and slower by at least MIN_REGRESSION_MS, so sub-millisecond noise is ignored)
+DEFAULT_THRESHOLD = 0.20
+MIN_REGRESSION_MS = 0.05
+COMPARE_METRIC = 'p50_ms'
+
+SAMPLE_SIZE = 200
+LINES_PER_BENCHMARK_BILL = 5
+
+
+def _samples(rng: random.Random) -> Dict[str, Any]:
+    """Barcodes, search terms, bills and items picked from the database"""
+    item_range = db.get_single_result("SELECT MIN(item_id) AS low, MAX(item_id) AS high FROM items")
+    bill_range = db.get_single_result("SELECT MIN(bill_id) AS low, MAX(bill_id) AS high FROM bills")
+    if not item_range['high'] or not bill_range['high']:
+        raise Exception("Benchmark database has no items or bills")
+
+    item_ids = sorted({rng.randint(item_range['low'], item_range['high']) for _ in range(SAMPLE_SIZE)})
+    placeholders = ", ".join("?" for _ in item_ids)
+    items = [dict(row) for row in db.execute_query(
+        f"""
+        SELECT item_id, item_name, barcode, price, gst_percentage FROM items
+        WHERE item_id IN ({placeholders}) AND is_active = 1
+        """,
+        item_ids
+    )]
+    # Benchmark bills must not run the sampled items out of stock (this is the working copy)
+    db.execute_update(
+        f"UPDATE items SET stock_quantity = stock_quantity + 100000 WHERE item_id IN ({placeholders})", item_ids
+    )
+    words = sorted({word for item in items for word in item['item_name'].split() if len(word) > 3 and word.isalpha()})
+    latest = db.get_single_result("SELECT MAX(bill_date) AS latest FROM bills")['latest']
+
+    return {
+        # One lookup in ten misses, as when a sticker is misread
+        'barcodes': [item['barcode'] for item in items] + ["0000000000000"] * (len(items) // 10),
+        'search_terms': words + [item['barcode'][:8] for item in items[:20]],
+        'bill_ids': [rng.randint(bill_range['low'], bill_range['high']) for _ in range(SAMPLE_SIZE)],
+        'items': items,
+        'latest': datetime.strptime(latest[:10], '%Y-%m-%d'),
+        'staff_id': db.get_single_result("SELECT MIN(staff_id) AS staff_id FROM staff WHERE is_active = 1")['staff_id']
+    }
+
+
+def _cases(samples: Dict[str, Any], rng: random.Random, work_dir: str) -> List[Tuple[str, Callable, int]]:
+    """Benchmark cases as (name, function, call limit)"""
+    from ..models.items import ItemsManager
+    from ..models.billing import BillingManager
+    from ..printing.receipt import load_receipt_data, get_receipt_template, get_receipt_paper
+    from ..ui.bill_management import bills_query
+    from ..ui.reports import group_by_staff, group_by_payment_mode
+    from ..database.backup import BackupEngine
+
+    def pick(key):
+        return samples[key][rng.randrange(len(samples[key]))]
+
+    def create_finalize():
+        bill_id = BillingManager.create_bill(samples['staff_id'])
+        if not bill_id:
+            raise Exception("Bill not created")
+        for _ in range(LINES_PER_BENCHMARK_BILL):
+            item = pick('items')
+            BillingManager.add_item_to_bill(bill_id, {
+                'item_id': item['item_id'], 'item_name': item['item_name'], 'barcode': item['barcode'],
+                'quantity': 1, 'unit_price': item['price'], 'gst_percentage': item['gst_percentage']
+            })
+        if not BillingManager.finalize_bill(bill_id, 'CASH'):
+            raise Exception("Bill not finalized")
+
+    # Report ranges end on the last day with bills, as the window's date fields would
+    latest = samples['latest']
+    last_day = latest.strftime('%Y-%m-%d')
+    ranges = {
+        'day': (last_day, last_day),
+        'month': ((latest - timedelta(days=29)).strftime('%Y-%m-%d'), last_day),
+        'year': ((latest - timedelta(days=364)).strftime('%Y-%m-%d'), last_day)
+    }
+
+    def bills_report(span, summarise=None):
+        def run():
+            bills = BillingManager.get_bills_by_date(*ranges[span])
+            if summarise:
+                summarise(bills)
+        return run
+
+    def bill_list(date_filter, status_filter="All", search=False):
+        def run():
+            query, params = bills_query(date_filter, status_filter, pick('search_terms') if search else "")
+            db.execute_query(query, params)
+        return run
+
+    def report_totals(bills):
+        return sum(bill['subtotal'] + bill['cgst_amount'] + bill['sgst_amount'] + bill['igst_amount']
+                   for bill in bills)
+
+    template = get_receipt_template(get_receipt_paper())
+    backup_path = os.path.join(work_dir, "backup.db")
+
+    return [
+        ("items.get_item_by_barcode", lambda: ItemsManager.get_item_by_barcode(pick('barcodes')), 5000),
+        ("items.search_items", lambda: ItemsManager.search_items(pick('search_terms')), 500),
+        ("billing.create_finalize_bill", create_finalize, 500),
+        ("billing.calculate_bill_totals", lambda: BillingManager.calculate_bill_totals(pick('bill_ids')), 2000),
+        ("reports.daily_sales.day", bills_report('day'), 200),
+        ("reports.daily_sales.month", bills_report('month'), 50),
+        ("reports.daily_sales.year", bills_report('year'), 10),
+        ("reports.staff_performance.month", bills_report('month', group_by_staff), 50),
+        ("reports.payment_modes.month", bills_report('month', group_by_payment_mode), 50),
+        ("reports.bills_summary.month", bills_report('month', report_totals), 50),
+        ("reports.gst_summary.month", bills_report('month', report_totals), 50),
+        ("bill_list.today", bill_list("Today"), 200),
+        ("bill_list.this_week", bill_list("This Week"), 100),
+        ("bill_list.this_month", bill_list("This Month"), 50),
+        ("bill_list.cancelled", bill_list("All", "Cancelled"), 20),
+        ("bill_list.search", bill_list("All", "All", search=True), 10),
+        ("bill_list.all", bill_list("All"), 5),
+        ("receipt.load", lambda: load_receipt_data(pick('bill_ids')), 2000),
+        ("receipt.render", lambda: template.render(load_receipt_data(pick('bill_ids'))), 2000),
+        ("backup.copy", lambda: BackupEngine(db).copy(backup_path), 3),
+    ]
+
+
+def dataset_info(path: str) -> Dict[str, Any]:
+    """Size and row counts of a benchmark database"""
+    connection = sqlite3.connect(path)
+    try:
+        counts = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ('items', 'customers', 'bills', 'bill_items', 'stock_movements')}
+    finally:
+        connection.close()
+    return {'path': os.path.abspath(path), 'file_size': os.path.getsize(path), 'rows': counts}
+
+
+class BenchmarkSuite:
+    """Runs the benchmark cases on a copy of a database"""
+
+    def __init__(self, database_path: str, seconds: float = CASE_SECONDS, only: Optional[List[str]] = None,
+                 seed: int = 1, label: str = "", progress_callback: Optional[Callable[[str], None]] = None):
+        self.database_path = database_path
+        self.seconds = seconds
+        self.only = only or []
+        self.seed = seed
+        self.label = label
+        self.progress_callback = progress_callback
+
+    def _progress(self, message: str):
+        if self.progress_callback:
+            self.progress_callback(message)
+
+    def _time_case(self, function: Callable, limit: int) -> Dict[str, Any]:
+        for _ in range(min(WARMUP_CALLS, limit)):
+            function()
+
+        histogram = LatencyHistogram()
+        started = time.perf_counter()
+        deadline = started + self.seconds
+        while histogram.count < limit and (histogram.count == 0 or time.perf_counter() < deadline):
+            call_started = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                histogram.errors += 1
+                self._progress(f"    error: {e}")
+            histogram.record(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+        result = histogram.summary()
+        result['ops_per_sec'] = histogram.count / elapsed if elapsed else 0.0
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Run every case (or those matching only) and return the results"""
+        if not os.path.exists(self.database_path):
+            raise Exception(f"Database not found: {self.database_path}")
+
+        # Cases write bills, so they run on a copy and the dataset stays as generated
+        work_dir = tempfile.mkdtemp(prefix="thangamayil_bench_")
+        work_path = os.path.join(work_dir, "bench.db")
+        shutil.copyfile(self.database_path, work_path)
+
+        previous_path = db.db_path
+        db.disconnect()
+        db.db_path = work_path
+        try:
+            db.connect()
+            rng = random.Random(self.seed)
+            cases = _cases(_samples(rng), rng, work_dir)
+            results = {}
+            for name, function, limit in cases:
+                if self.only and not any(pattern in name for pattern in self.only):
+                    continue
+                self._progress(f"  {name}")
+                results[name] = self._time_case(function, limit)
+        finally:
+            db.disconnect()
+            db.db_path = previous_path
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return {
+            'format': RESULTS_FORMAT,
+            'label': self.label,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count()
+            },
+            'dataset': dataset_info(self.database_path),
+            'settings': {'seconds': self.seconds, 'seed': self.seed},
+            'results': results
+        }
+
+
+# Result files
+
+def save_results(results: Dict[str, Any], results_dir: str = BENCHMARK_DIR) -> str:
+    """Write a run to results_dir; returns the file path"""
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = results['created_at'].replace(':', '').replace('-', '')
+    name = f"{stamp}-{results['label']}.json" if results['label'] else f"{stamp}.json"
+    path = os.path.join(results_dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    if results.get('format') != RESULTS_FORMAT or 'results' not in results:
+        raise Exception(f"Not a benchmark results file: {path}")
+    return results
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD,
+                    metric: str = COMPARE_METRIC) -> List[Dict[str, Any]]:
+    """Per case change of metric against the baseline, status REGRESSION / IMPROVED / OK / NEW / MISSING"""
+    rows = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        before = baseline['results'].get(name)
+        after = current['results'].get(name)
+        row = {'name': name, 'baseline': before[metric] if before else None,
+               'current': after[metric] if after else None, 'change': None}
+        if before is None:
+            row['status'] = 'NEW'
+        elif after is None:
+            row['status'] = 'MISSING'
+        else:
+            delta = after[metric] - before[metric]
+            row['change'] = delta / before[metric] if before[metric] else 0.0
+            if row['change'] > threshold and delta >= MIN_REGRESSION_MS:
+                row['status'] = 'REGRESSION'
+            elif row['change'] < -threshold and -delta >= MIN_REGRESSION_MS:
+                row['status'] = 'IMPROVED'
+            else:
+                row['status'] = 'OK'
+        rows.append(row)
+    return rows
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [f"{'Case':<36} {'Calls':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>9}"]
+    for name, result in results['results'].items():
+        lines.append(f"{name:<36} {result['count']:>6} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} "
+                     f"{result['p99_ms']:>9.2f} {result['ops_per_sec']:>9.1f}")
+    return "\n".join(lines) + "\n"
+
+
+def format_comparison(rows: List[Dict[str, Any]], metric: str = COMPARE_METRIC) -> str:
+    lines = [f"{'Case':<36} {'Baseline':>10} {'Current':>10} {'Change':>8}  Status ({metric})"]
+    for row in rows:
+        baseline = f"{row['baseline']:.2f}" if row['baseline'] is not None else "-"
+        current = f"{row['current']:.2f}" if row['current'] is not None else "-"
+        change = f"{row['change'] * 100:+.0f}%" if row['change'] is not None else "-"
+        lines.append(f"{row['name']:<36} {baseline:>10} {current:>10} {change:>8}  {row['status']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,429 @@
+"""
+Synthetic store data
+Generates a store database of production size - years of bills with
+festival peaks, GST slabs, repeat customers and the stock movements of
+every sale - for benchmarks and testing against realistic volumes
+"""
+
+import bisect
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import bcrypt
+
+from ..database.connection import DatabaseConnection, DEFAULT_TERMINAL_ID
+
+
+# Preset sizes (items, bills, customers, years); lines per bill averages 5
+SCALES = {
+    'small': {'items': 2_000, 'bills': 20_000, 'customers': 2_000, 'years': 1},
+    'medium': {'items': 20_000, 'bills': 200_000, 'customers': 25_000, 'years': 2},
+    'large': {'items': 100_000, 'bills': 2_000_000, 'customers': 250_000, 'years': 3},
+}
+
+DEFAULT_LINES_PER_BILL = 5.0
+STAFF_COUNT = 8
+STAFF_PASSWORD = "staff123"
+
+# Rows written per executemany batch
+BATCH_ROWS = 50_000
+
+# name, HSN code, share of items, median price, price spread, GST % for low / high priced items
+# (garments and fabric: 5% up to Rs.1000, 12% above)
+CATEGORIES = [
+    ("Silk Sarees", "5007", 0.14, 6500, 0.7, (5, 12)),
+    ("Cotton Sarees", "5208", 0.16, 1100, 0.5, (5, 12)),
+    ("Fancy Sarees", "5407", 0.10, 1800, 0.6, (5, 12)),
+    ("Dhotis", "5208", 0.08, 450, 0.4, (5, 12)),
+    ("Men's Shirts", "6205", 0.12, 900, 0.4, (5, 12)),
+    ("Churidar Sets", "6204", 0.10, 1400, 0.5, (5, 12)),
+    ("Kids Wear", "6209", 0.10, 650, 0.5, (5, 12)),
+    ("Blouse Materials", "5208", 0.06, 300, 0.5, (5, 5)),
+    ("Towels", "6302", 0.05, 250, 0.4, (5, 12)),
+    ("Innerwear", "6108", 0.05, 200, 0.4, (5, 12)),
+    ("Handloom Khadi", "5208", 0.02, 800, 0.4, (0, 0)),
+    ("Accessories", "7117", 0.02, 350, 0.6, (18, 18)),
+]
+
+COLOURS = ["Red", "Maroon", "Green", "Mango Yellow", "Peacock Blue", "Navy", "Pink", "Purple", "Orange",
+           "Cream", "White", "Black", "Magenta", "Bottle Green", "Mustard", "Grey", "Copper", "Rani Pink"]
+STYLES = ["Kanchipuram", "Arani", "Chettinad", "Kovai", "Madurai", "Printed", "Zari Border", "Plain",
+          "Checked", "Embroidered", "Designer", "Traditional", "Party Wear", "Daily Wear", "Premium"]
+FIRST_NAMES = ["Murugan", "Lakshmi", "Karthik", "Priya", "Senthil", "Meena", "Arun", "Divya", "Saravanan",
+               "Kavitha", "Vignesh", "Anitha", "Ramesh", "Deepa", "Suresh", "Revathi", "Bala", "Geetha",
+               "Prakash", "Sangeetha", "Ganesh", "Malathi", "Rajesh", "Selvi", "Kumar", "Valli"]
+LAST_NAMES = ["Raman", "Subramanian", "Krishnan", "Natarajan", "Pandian", "Sundaram", "Velu", "Murthy",
+              "Shanmugam", "Rajendran", "Palanisamy", "Annamalai", "Chidambaram", "Periyasamy"]
+TOWNS = ["Madurai", "Tiruchirappalli", "Coimbatore", "Salem", "Erode", "Tirunelveli", "Thanjavur",
+         "Dindigul", "Karur", "Namakkal", "Sivakasi", "Virudhunagar", "Kumbakonam", "Pudukkottai"]
+
+# Deepavali moves with the lunar calendar; other years fall back to 1 November
+DEEPAVALI = {2020: (11, 14), 2021: (11, 4), 2022: (10, 24), 2023: (11, 12), 2024: (10, 31),
+             2025: (10, 20), 2026: (11, 8), 2027: (10, 29), 2028: (10, 17), 2029: (11, 5)}
+
+# month, day, days of build-up, days after, peak multiplier of daily bills
+FESTIVALS = [
+    (1, 14, 10, 2, 2.5),   # Pongal
+    (4, 14, 6, 1, 1.8),    # Tamil New Year
+    (7, 17, 0, 30, 1.6),   # Aadi sale (whole month)
+    (12, 25, 5, 7, 1.3),   # Christmas and New Year
+]
+DEEPAVALI_BUILD_UP, DEEPAVALI_PEAK = 21, 3.5
+
+# Wedding season months (Thai, Vaikasi, Avani) raise silk sales
+WEDDING_MONTHS = {1: 1.3, 2: 1.3, 5: 1.25, 6: 1.2, 8: 1.2, 9: 1.15}
+
+WEEKDAY_FACTOR = [0.85, 0.8, 0.85, 0.9, 1.0, 1.25, 1.45]  # Monday .. Sunday
+
+# Share of bills for a registered customer; the rest go to the Cash Customer
+REGISTERED_CUSTOMER_SHARE = 0.35
+INTERSTATE_SHARE = 0.02
+CANCELLED_SHARE = 0.004
+
+
+def _festival_factor(day: date) -> float:
+    """Daily bill multiplier for festival build-up and sale periods"""
+    factor = 1.0
+    month, dom = DEEPAVALI.get(day.year, (11, 1))
+    festivals = FESTIVALS + [(month, dom, DEEPAVALI_BUILD_UP, 1, DEEPAVALI_PEAK)]
+    for month, dom, before, after, peak in festivals:
+        festival = date(day.year, month, dom)
+        offset = (festival - day).days
+        if 0 <= offset <= before:
+            # Ramp up to the peak on the eve of the festival
+            factor = max(factor, 1 + (peak - 1) * (1 - offset / (before + 1)))
+        elif 0 < -offset <= after:
+            factor = max(factor, peak if before == 0 else 1 + (peak - 1) * 0.3)
+    return factor * WEDDING_MONTHS.get(day.month, 1.0)
+
+
+def _zipf_cumulative(count: int, exponent: float, rng: random.Random) -> List[float]:
+    """Cumulative weights giving a few popular entries and a long tail, in random order"""
+    weights = [1 / (rank ** exponent) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    cumulative, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class StoreDataGenerator:
+    """Writes a new store database filled with synthetic history"""
+
+    def __init__(self, db_path: str, items: int, bills: int, customers: int, years: float = 3,
+                 lines_per_bill: float = DEFAULT_LINES_PER_BILL, seed: int = 1,
+                 end_date: Optional[date] = None,
+                 progress_callback: Optional[Callable[[str], None]] = None):
+        self.db_path = db_path
+        self.items = items
+        self.bills = bills
+        self.customers = customers
+        self.years = years
+        self.lines_per_bill = max(1.0, lines_per_bill)
+        self.end_date = end_date or date.today()
+        self.rng = random.Random(seed)
+        self.progress_callback = progress_callback
+        self.connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_scale(cls, db_path: str, scale: str, **overrides) -> "StoreDataGenerator":
+        options = dict(SCALES[scale])
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(db_path, **options)
+
+    def _progress(self, message: str):
+        if self.progress_callback:
+            self.progress_callback(message)
+
+    def _insert(self, sql: str, rows: List[tuple]):
+        if rows:
+            self.connection.executemany(sql, rows)
+            rows.clear()
+
+    # Generation
+
+    def generate(self) -> Dict[str, Any]:
+        """Create the database; returns row counts and the time taken"""
+        if os.path.exists(self.db_path):
+            raise Exception(f"Database already exists: {self.db_path}")
+        started = time.time()
+
+        # Schema, migrations and default settings exactly as the application creates them
+        database = DatabaseConnection(self.db_path)
+        database.disconnect()
+
+        self.connection = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            self.connection.execute("PRAGMA journal_mode = OFF")
+            self.connection.execute("PRAGMA synchronous = OFF")
+            self.connection.execute("PRAGMA cache_size = -262144")
+            self.connection.execute("PRAGMA temp_store = MEMORY")
+
+            # Change log and stock counter triggers would fire per row; they are
+            # recreated afterwards and the counters written once from final stock
+            triggers = self.connection.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+            ).fetchall()
+            for name, _ in triggers:
+                self.connection.execute(f"DROP TRIGGER {name}")
+
+            self.connection.execute("BEGIN")
+            staff = self._generate_staff()
+            cash_customer = self._generate_customers()
+            catalogue = self._generate_items()
+            counts = self._generate_bills(catalogue, staff, cash_customer)
+            self._finish_stock(catalogue)
+            for _, sql in triggers:
+                self.connection.execute(sql)
+            self.connection.execute("COMMIT")
+
+            self._progress("Analysing...")
+            self.connection.execute("ANALYZE")
+            self.connection.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            self.connection.close()
+            self.connection = None
+
+        counts.update({
+            'items': self.items,
+            'customers': self.customers,
+            'staff': STAFF_COUNT,
+            'file_size': os.path.getsize(self.db_path),
+            'duration': time.time() - started
+        })
+        return counts
+
+    def _generate_staff(self) -> List[int]:
+        password_hash = bcrypt.hashpw(STAFF_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO staff (staff_name, password_hash) VALUES (?, ?)",
+            [(f"staff{number:02d}", password_hash) for number in range(1, STAFF_COUNT + 1)]
+        )
+        return [row[0] for row in self.connection.execute("SELECT staff_id FROM staff WHERE is_active = 1")]
+
+    def _generate_customers(self) -> int:
+        self._progress(f"Customers: {self.customers:,}")
+        rng = self.rng
+        rows = []
+        for number in range(self.customers):
+            # Unique mobile numbers: the multiplier is coprime to 10**9
+            phone = f"9{(number * 7919 + 104729) % 10 ** 9:09d}"
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            rows.append((name, phone, f"{rng.randint(1, 250)}, {rng.choice(TOWNS)}"))
+            if len(rows) >= BATCH_ROWS:
+                self._insert("INSERT INTO customers (customer_name, phone_number, address) VALUES (?, ?, ?)", rows)
+        self._insert("INSERT INTO customers (customer_name, phone_number, address) VALUES (?, ?, ?)", rows)
+        return self.connection.execute(
+            "SELECT customer_id FROM customers WHERE phone_number = '1234567899'"
+        ).fetchone()[0]
+
+    def _generate_items(self) -> List[Tuple]:
+        """Items as (item_id, name, barcode, price, gst, stock)"""
+        self._progress(f"Items: {self.items:,}")
+        rng = self.rng
+        category_ids = []
+        for name, *_ in CATEGORIES:
+            self.connection.execute("INSERT OR IGNORE INTO categories (category_name) VALUES (?)", (name,))
+            category_ids.append(self.connection.execute(
+                "SELECT category_id FROM categories WHERE category_name = ?", (name,)
+            ).fetchone()[0])
+        shares = [category[2] for category in CATEGORIES]
+
+        catalogue, rows = [], []
+        start = self.end_date - timedelta(days=int(self.years * 365))
+        created = f"{start.isoformat()} 09:00:00"
+        for number in range(1, self.items + 1):
+            index = rng.choices(range(len(CATEGORIES)), shares)[0]
+            name, hsn, _, median, spread, (low_gst, high_gst) = CATEGORIES[index]
+            # Prices end in 9 like shelf prices
+            price = max(49, round(median * math.exp(rng.gauss(0, spread)), -1) - 1)
+            gst = low_gst if price <= 1000 else high_gst
+            item_name = f"{rng.choice(STYLES)} {rng.choice(COLOURS)} {name.rstrip('s')} {number:06d}"
+            barcode = f"{8901000000000 + number}"
+            stock = rng.randint(5, 60)
+            is_active = 0 if rng.random() < 0.03 else 1
+            catalogue.append((number, item_name, barcode, float(price), float(gst), stock))
+            rows.append((number, barcode, item_name, hsn, category_ids[index], float(price), float(gst),
+                         stock, is_active, created, created))
+            if len(rows) >= BATCH_ROWS:
+                self._insert_items(rows)
+        self._insert_items(rows)
+        return catalogue
+
+    def _insert_items(self, rows: List[tuple]):
+        self._insert(
+            """
+            INSERT INTO items (item_id, barcode, item_name, hsn_code, category_id, price, gst_percentage,
+            stock_quantity, is_active, created_at, modified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+
+    def _daily_bills(self) -> List[Tuple[date, int]]:
+        """Bills per day: weekday pattern, festivals, weddings and steady growth"""
+        days = max(1, int(self.years * 365))
+        start = self.end_date - timedelta(days=days - 1)
+        weights = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            growth = 1 + 0.12 * offset / 365
+            weights.append(WEEKDAY_FACTOR[day.weekday()] * _festival_factor(day) * growth)
+
+        total = sum(weights)
+        exact = [self.bills * weight / total for weight in weights]
+        counts = [int(value) for value in exact]
+        # Largest remainders take the bills lost to rounding down
+        for index in sorted(range(days), key=lambda i: exact[i] - counts[i], reverse=True)[:self.bills - sum(counts)]:
+            counts[index] += 1
+        return [(start + timedelta(days=offset), counts[offset]) for offset in range(days)]
+
+    def _generate_bills(self, catalogue: List[Tuple], staff: List[int], cash_customer: int) -> Dict[str, int]:
+        rng = self.rng
+        random_value = rng.random
+        item_weights = _zipf_cumulative(len(catalogue), 1.07, rng)
+        item_total = item_weights[-1]
+        customer_ids = [row[0] for row in self.connection.execute(
+            "SELECT customer_id FROM customers WHERE customer_id != ? ORDER BY customer_id", (cash_customer,)
+        )]
+        customer_weights = _zipf_cumulative(len(customer_ids), 0.8, rng) if customer_ids else []
+        staff_weights = [rng.uniform(0.5, 1.5) for _ in staff]
+        prefix = self.connection.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = 'invoice_prefix'"
+        ).fetchone()[0]
+
+        stock = [0] + [entry[5] for entry in catalogue]
+        added = list(stock)
+        removed = [0] * len(stock)
+        start_date = self.end_date - timedelta(days=int(self.years * 365))
+        movements = [(item_id, 'IN', quantity, 'INITIAL', None, 'Opening stock', staff[0],
+                      f"{start_date.isoformat()} 09:00:00")
+                     for item_id, _, _, _, _, quantity in catalogue]
+        bill_rows, line_rows = [], []
+        bill_id = line_count = cancelled = 0
+        mean_extra_lines = self.lines_per_bill - 1
+
+        for day, count in self._daily_bills():
+            festive = _festival_factor(day) > 1.4
+            upi_share = min(0.55, 0.25 + 0.1 * (day.year - start_date.year))
+            for seconds in sorted(int(rng.triangular(10, 21.5, 18.5) * 3600) for _ in range(count)):
+                bill_id += 1
+                bill_date = f"{day.isoformat()} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+                staff_id = rng.choices(staff, staff_weights)[0]
+                is_interstate = random_value() < INTERSTATE_SHARE
+                is_cancelled = 1 if random_value() < CANCELLED_SHARE else 0
+                if customer_ids and random_value() < REGISTERED_CUSTOMER_SHARE:
+                    customer_id = customer_ids[bisect.bisect(customer_weights, random_value() * customer_weights[-1])]
+                else:
+                    customer_id = cash_customer
+
+                subtotal = total_gst = item_discount = 0.0
+                for _ in range(1 + _poisson(rng, mean_extra_lines)):
+                    index = bisect.bisect(item_weights, random_value() * item_total)
+                    item_id, item_name, barcode, price, gst_rate, _ = catalogue[index]
+                    quantity = 1 if random_value() < 0.85 else rng.randint(2, 4)
+                    discount = rng.choice((5.0, 10.0, 15.0)) if random_value() < (0.12 if festive else 0.03) else 0.0
+
+                    # Same arithmetic as GSTCalculator.calculate_line_total
+                    line_amount = quantity * price
+                    discount_amount = (line_amount * discount) / 100
+                    taxable = line_amount - discount_amount
+                    gst_amount = (taxable * gst_rate) / 100
+                    subtotal += taxable
+                    total_gst += gst_amount
+                    item_discount += discount_amount
+                    line_rows.append((bill_id, item_id, item_name, barcode, quantity, price, discount,
+                                      discount_amount, gst_rate, gst_amount, taxable + gst_amount, bill_date))
+
+                    if stock[item_id] < quantity:
+                        # Restocked before it ran out
+                        restock = rng.randint(10, 40) + quantity
+                        stock[item_id] += restock
+                        added[item_id] += restock
+                        movements.append((item_id, 'IN', restock, 'STOCK_ADJUSTMENT', None, 'Restock',
+                                          staff_id, bill_date))
+                    stock[item_id] -= quantity
+                    removed[item_id] += quantity
+                    movements.append((item_id, 'OUT', -quantity, 'BILL', bill_id, None, staff_id, bill_date))
+                    if is_cancelled:
+                        stock[item_id] += quantity
+                        added[item_id] += quantity
+                        movements.append((item_id, 'IN', quantity, 'BILL_CANCEL', bill_id,
+                                          'Stock restored from cancelled bill', staff_id, bill_date))
+                    line_count += 1
+
+                pre_round = subtotal + total_gst
+                grand_total = round(pre_round)
+                half = 0.0 if is_interstate else total_gst / 2
+                if random_value() < 0.55:
+                    payment = 'CASH'
+                else:
+                    payment = 'UPI' if random_value() < upi_share / 0.45 else 'CARD'
+                bill_rows.append((bill_id, f"{prefix}{bill_id:06d}", bill_date, customer_id, staff_id, subtotal,
+                                  half, half, total_gst if is_interstate else 0.0, grand_total - pre_round,
+                                  grand_total, payment, is_cancelled, bill_date))
+                cancelled += is_cancelled
+
+                if len(line_rows) >= BATCH_ROWS:
+                    self._flush_bills(bill_rows, line_rows, movements)
+                    self._progress(f"Bills: {bill_id:,} of {self.bills:,} ({day.isoformat()})")
+
+        self._flush_bills(bill_rows, line_rows, movements)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO invoice_sequences (prefix, last_number) VALUES (?, ?)", (prefix, bill_id)
+        )
+        self.final_stock, self.added, self.removed = stock, added, removed
+        return {'bills': bill_id, 'bill_items': line_count, 'cancelled': cancelled,
+                'stock_movements': self.connection.execute("SELECT COUNT(*) FROM stock_movements").fetchone()[0]}
+
+    def _flush_bills(self, bill_rows: List[tuple], line_rows: List[tuple], movements: List[tuple]):
+        self._insert(
+            """
+            INSERT INTO bills (bill_id, invoice_number, bill_date, customer_id, staff_id, subtotal,
+            cgst_amount, sgst_amount, igst_amount, round_off, grand_total, payment_mode, is_cancelled, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            bill_rows
+        )
+        self._insert(
+            """
+            INSERT INTO bill_items (bill_id, item_id, item_name, barcode, quantity, unit_price,
+            discount_percentage, discount_amount, gst_percentage, gst_amount, line_total, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            line_rows
+        )
+        self._insert(
+            """
+            INSERT INTO stock_movements (item_id, movement_type, quantity, reference_type, reference_id,
+            notes, staff_id, movement_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            movements
+        )
+
+    def _finish_stock(self, catalogue: List[Tuple]):
+        """Final stock on items and matching stock counters"""
+        self._progress("Stock counters...")
+        self.connection.executemany(
+            "UPDATE items SET stock_quantity = ? WHERE item_id = ?",
+            [(self.final_stock[item_id], item_id) for item_id, *_ in catalogue]
+        )
+        self.connection.execute("DELETE FROM stock_counters")
+        self.connection.executemany(
+            "INSERT INTO stock_counters (item_id, terminal_id, added, removed) VALUES (?, ?, ?, ?)",
+            [(item_id, DEFAULT_TERMINAL_ID, self.added[item_id], self.removed[item_id])
+             for item_id, *_ in catalogue]
+        )
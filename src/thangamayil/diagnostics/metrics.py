@@ -0,0 +1,295 @@
+"""
+Latency metrics
+Timers and HDR-style histograms for billing hot paths, written per till as
+Prometheus text so checkout latency can be tracked over time
+"""
+
+import atexit
+import functools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+
+# Names the till in metrics (and in invoice blocks); defaults to the computer name
+TERMINAL_ENV = "THANGAMAYIL_TERMINAL"
+
+METRIC_PREFIX = "thangamayil_operation"
+
+# Histogram resolution: values keep their top SUB_BUCKET_BITS bits, so a
+# recorded value is off by at most 1/32 (about 3%)
+SUB_BUCKET_BITS = 6
+
+# Values are recorded in microseconds
+UNITS_PER_SECOND = 1_000_000
+
+# Bucket bounds exported to Prometheus (seconds)
+EXPORT_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Seconds between metrics file writes
+FLUSH_INTERVAL = 60
+
+
+def terminal_name() -> str:
+    """Name of this till"""
+    return os.environ.get(TERMINAL_ENV) or socket.gethostname() or "TERMINAL"
+
+
+def _bucket_index(value: int) -> int:
+    magnitude = max(0, value.bit_length() - SUB_BUCKET_BITS)
+    return (magnitude << SUB_BUCKET_BITS) + (value >> magnitude)
+
+
+def _bucket_upper(index: int) -> int:
+    """Largest value stored in a bucket"""
+    magnitude = index >> SUB_BUCKET_BITS
+    sub_bucket = index - (magnitude << SUB_BUCKET_BITS)
+    return ((sub_bucket + 1) << magnitude) - 1
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations with bounded relative error
+    Buckets are kept sparse, so a histogram costs a few hundred bytes
+    however many values it holds.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+        self.errors = 0
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * UNITS_PER_SECOND))
+        index = _bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float:
+        """Duration in seconds below which percent of the values fall"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(self.count * percent / 100)))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max) / UNITS_PER_SECOND
+        return self.max / UNITS_PER_SECOND
+
+    def count_at_or_below(self, seconds: float) -> int:
+        limit = seconds * UNITS_PER_SECOND
+        return sum(count for index, count in self.buckets.items() if _bucket_upper(index) <= limit)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.errors += other.errors
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total / self.count / 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max / 1000
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'buckets': {str(index): count for index, count in self.buckets.items()},
+                'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.buckets = {int(index): count for index, count in data.get('buckets', {}).items()}
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total', 0)
+        histogram.min = data.get('min')
+        histogram.max = data.get('max', 0)
+        histogram.errors = data.get('errors', 0)
+        return histogram
+
+
+class MetricsRegistry:
+    """Named latency histograms for this till, saved to the metrics folder"""
+
+    def __init__(self, metrics_dir: Optional[str] = None):
+        self.metrics_dir = metrics_dir
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, name: str, seconds: float, failed: bool = False):
+        with self.lock:
+            histogram = self._histogram(name)
+            histogram.record(seconds)
+            if failed:
+                histogram.errors += 1
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time a block; exceptions leaving the block are counted as errors"""
+        started = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record(name, time.perf_counter() - started, failed)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator timing every call of a function"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Summary per operation"""
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    # Files
+
+    def _paths(self):
+        metrics_dir = self.metrics_dir or os.path.join(os.getcwd(), "metrics")
+        base = os.path.join(metrics_dir, terminal_name())
+        return metrics_dir, base + ".prom", base + ".json"
+
+    def load(self):
+        """Continue from the histograms saved by the previous run"""
+        _, _, state_path = self._paths()
+        self.loaded = True
+        if not os.path.exists(state_path):
+            return
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Metrics state not loaded: {e}")
+            return
+        with self.lock:
+            for name, data in saved.get('histograms', {}).items():
+                self._histogram(name).merge(LatencyHistogram.from_dict(data))
+
+    def render_prometheus(self) -> str:
+        """Histograms in the Prometheus text exposition format"""
+        till = terminal_name().replace('\\', '\\\\').replace('"', '\\"')
+        histogram_lines = [
+            f"# HELP {METRIC_PREFIX}_duration_seconds Duration of billing operations",
+            f"# TYPE {METRIC_PREFIX}_duration_seconds histogram"
+        ]
+        quantile_lines = [
+            f"# HELP {METRIC_PREFIX}_latency_seconds Latency quantiles of billing operations",
+            f"# TYPE {METRIC_PREFIX}_latency_seconds summary"
+        ]
+        error_lines = [
+            f"# HELP {METRIC_PREFIX}_errors_total Operations that raised an error",
+            f"# TYPE {METRIC_PREFIX}_errors_total counter"
+        ]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                labels = f'operation="{name}",till="{till}"'
+                total_seconds = histogram.total / UNITS_PER_SECOND
+                for bound in EXPORT_BOUNDS:
+                    histogram_lines.append(f'{METRIC_PREFIX}_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                                           f'{histogram.count_at_or_below(bound)}')
+                histogram_lines += [
+                    f'{METRIC_PREFIX}_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}',
+                    f'{METRIC_PREFIX}_duration_seconds_sum{{{labels}}} {total_seconds:.6f}',
+                    f'{METRIC_PREFIX}_duration_seconds_count{{{labels}}} {histogram.count}'
+                ]
+                for quantile in EXPORT_QUANTILES:
+                    quantile_lines.append(f'{METRIC_PREFIX}_latency_seconds{{{labels},quantile="{quantile}"}} '
+                                          f'{histogram.percentile(quantile * 100):.6f}')
+                quantile_lines += [
+                    f'{METRIC_PREFIX}_latency_seconds_sum{{{labels}}} {total_seconds:.6f}',
+                    f'{METRIC_PREFIX}_latency_seconds_count{{{labels}}} {histogram.count}'
+                ]
+                error_lines.append(f'{METRIC_PREFIX}_errors_total{{{labels}}} {histogram.errors}')
+        return "\n".join(histogram_lines + quantile_lines + error_lines) + "\n"
+
+    def flush(self) -> Optional[str]:
+        """Write the Prometheus file and the histogram state; returns the .prom path"""
+        if not self.loaded:
+            if not self.histograms:
+                return None
+            self.load()
+        metrics_dir, prom_path, state_path = self._paths()
+        os.makedirs(metrics_dir, exist_ok=True)
+
+        with self.lock:
+            state = {'till': terminal_name(), 'saved_at': time.time(),
+                     'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()}}
+        for path, content in ((prom_path, self.render_prometheus()), (state_path, json.dumps(state))):
+            with open(path + ".part", 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(path + ".part", path)
+        return prom_path
+
+    def start(self, interval: float = FLUSH_INTERVAL):
+        """Load saved histograms and write the metrics file periodically and at exit"""
+        if self._thread:
+            return
+        self.load()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="metrics-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Metrics not saved: {e}")
+
+    def _run(self, interval: float):
+        while not self._stop_event.wait(interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Metrics not saved: {e}")
+
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
+timed = metrics.timed
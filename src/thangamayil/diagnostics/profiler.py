@@ -0,0 +1,213 @@
+"""
+On-demand profiling
+Started and stopped from the running application (Ctrl+Shift+P, the
+Performance Metrics window, or console_app.py --profile) so a slow
+checkout can be profiled at the store without restarting or editing code.
+cProfile writes a .pstats file; the sampling profiler writes collapsed
+stacks (flamegraph.pl / speedscope) covering every thread. Both also
+write a readable .txt summary including the SQL run meanwhile.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, Sequence
+
+from .metrics import terminal_name
+
+
+MODES = ('sampling', 'cprofile')
+DEFAULT_MODE = 'sampling'
+
+PROFILE_DIR = "profiles"
+
+# Sampling profiler: seconds between stack samples of every thread
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+
+# Lines of the readable summary
+SUMMARY_FUNCTIONS = 40
+SUMMARY_STATEMENTS = 15
+
+
+def profile_mode_from_args(argv: Sequence[str]) -> Optional[str]:
+    """Profiling mode from --profile [sampling|cprofile] on the command line"""
+    argv = list(argv)
+    if '--profile' not in argv:
+        return None
+    index = argv.index('--profile')
+    if index + 1 < len(argv) and argv[index + 1] in MODES:
+        return argv[index + 1]
+    return DEFAULT_MODE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Periodic stack samples of all threads, counted as collapsed stacks"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(2)
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """One line per distinct stack: frames root first, separated by ;, then the sample count"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def top_functions(self, limit: int = SUMMARY_FUNCTIONS) -> str:
+        """Functions by samples seen on the stack (inclusive) and at the top (self)"""
+        inclusive: Counter = Counter()
+        exclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            for label in set(frames):
+                inclusive[label] += count
+            if frames:
+                exclusive[frames[-1]] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{'Total %':>8} {'Self %':>8}  Function"]
+        for label, count in inclusive.most_common(limit):
+            lines.append(f"{count * 100 / total:>7.1f}% {exclusive[label] * 100 / total:>7.1f}%  {label}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """Profiling session control for the running application"""
+
+    def __init__(self, profile_dir: Optional[str] = None):
+        self.profile_dir = profile_dir
+        self.mode: Optional[str] = None
+        self.started_at = 0.0
+        self.lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[SamplingProfiler] = None
+        self._traced_sql = False
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = DEFAULT_MODE) -> bool:
+        """Start profiling; False if a session is already running"""
+        if mode not in MODES:
+            raise Exception(f"Unknown profiling mode: {mode}")
+        with self.lock:
+            if self.running:
+                return False
+            from ..database.connection import db
+            # SQL run during the session is summarised next to the profile
+            self._traced_sql = not db.tracer and not db.remote
+            if self._traced_sql:
+                db.enable_tracing()
+
+            if mode == 'cprofile':
+                # cProfile follows the thread that starts it (the UI thread)
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                self._sampler = SamplingProfiler()
+                self._sampler.start()
+            self.mode = mode
+            self.started_at = time.time()
+            return True
+
+    def stop(self) -> Optional[Dict[str, Any]]:
+        """Stop profiling and write the files; returns their paths, or None if not running"""
+        with self.lock:
+            if not self.running:
+                return None
+            from ..database.connection import db
+            if self._profile:
+                self._profile.disable()
+            if self._sampler:
+                self._sampler.stop()
+            tracer = db.disable_tracing() if self._traced_sql else db.tracer
+
+            try:
+                return self._write(tracer)
+            finally:
+                self._profile = None
+                self._sampler = None
+                self.mode = None
+
+    def toggle(self, mode: str = DEFAULT_MODE) -> Optional[Dict[str, Any]]:
+        """Start a session, or stop the running one and return its files"""
+        if self.running:
+            return self.stop()
+        self.start(mode)
+        return None
+
+    def _write(self, tracer) -> Dict[str, Any]:
+        from ..database.connection import db
+        profile_dir = self.profile_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_path)), PROFILE_DIR)
+        os.makedirs(profile_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(profile_dir, f"{terminal_name()}-{stamp}-{self.mode}")
+        duration = time.time() - self.started_at
+        result = {'mode': self.mode, 'duration': duration, 'summary': base + ".txt"}
+
+        summary = io.StringIO()
+        summary.write(f"{self.mode} profile of {terminal_name()}, {stamp}, {duration:.1f} s\n\n")
+        if self._profile:
+            result['file'] = base + ".pstats"
+            self._profile.dump_stats(result['file'])
+            stats = pstats.Stats(self._profile, stream=summary)
+            stats.sort_stats('cumulative').print_stats(SUMMARY_FUNCTIONS)
+        else:
+            result['file'] = base + ".collapsed"
+            with open(result['file'], 'w', encoding='utf-8') as f:
+                f.write(self._sampler.collapsed())
+            summary.write(f"{self._sampler.samples} samples every {self._sampler.interval * 1000:.0f} ms\n")
+            summary.write(self._sampler.top_functions())
+
+        if tracer:
+            summary.write("\nSQL by total time\n")
+            for row in tracer.report(SUMMARY_STATEMENTS):
+                summary.write(f"{row['total_ms']:>9.1f} ms {row['calls']:>6} calls  {row['statement'][:120]}\n"
+                              f"{'':>27}{', '.join(row['sites'])}\n")
+
+        with open(result['summary'], 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        return result
+
+
+# Global profiler instance
+profiler = Profiler()
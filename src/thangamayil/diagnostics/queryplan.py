@@ -0,0 +1,329 @@
+"""
+Query plan audit
+Runs the application's read queries, passes each one through EXPLAIN QUERY
+PLAN and reports full scans, temporary B-trees and automatic indexes, with
+an index suggestion checked against the real schema. The text report has no
+timings or row counts, so reports from two releases can be diffed.
+"""
+
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from ..database.connection import db, DatabaseConnection
+from .sqltrace import fingerprint
+
+
+# Lookup tables small enough that a scan is expected
+SMALL_TABLES = {'settings', 'staff', 'categories', 'invoice_sequences', 'invoice_blocks',
+                'archived_invoice_sequences', 'archives', 'sync_exports', 'backup_log'}
+
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+(?:(\w+)\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE
+)
+_NOT_ALIAS = {'WHERE', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'JOIN', 'ON', 'GROUP', 'ORDER',
+              'LIMIT', 'UNION', 'USING', 'NATURAL', 'HAVING', 'WINDOW', 'AND', 'OR'}
+_PREDICATE = r"(?<![\w.]){alias}(\w+)\s*(=|<=|>=|<|>|!=|\bIN\b|\bBETWEEN\b|\bLIKE\b|\bIS\b)\s*('%|\?|'|[\w(.-])"
+_FUNCTION_ON_COLUMN = r"\b(\w+)\([^()]*?(?<![\w.]){alias}(\w+)[^)]*\)\s*(?:=|<|>|\bBETWEEN\b|\bIN\b)"
+_CLAUSE_END = r"(?=\b(?:LEFT|RIGHT|INNER|CROSS|JOIN|WHERE|GROUP|ORDER|LIMIT|HAVING|UNION)\b|$)"
+
+
+def _conditions(sql: str, table: str, alias: str) -> str:
+    """WHERE clause plus the table's own JOIN ... ON condition"""
+    text = " ".join(sql.split())
+    where = re.search(r"\bWHERE\b(.*?)" + _CLAUSE_END.replace("WHERE|", ""), text, re.IGNORECASE)
+    join = re.search(rf"\bJOIN\s+(?:\w+\.)?{re.escape(table)}(?:\s+(?:AS\s+)?{re.escape(alias)})?\s+ON\b(.*?)"
+                     + _CLAUSE_END, text, re.IGNORECASE)
+    return " ".join(match.group(1) for match in (join, where) if match)
+
+
+def _sample_values(database: DatabaseConnection) -> Dict[str, Any]:
+    """Real keys and dates from the database, so plans follow real data"""
+    def first(sql, default):
+        row = database.get_single_result(sql)
+        return row[0] if row and row[0] is not None else default
+
+    last_bill = first("SELECT MAX(bill_date) FROM bills", None)
+    date_to = datetime.strptime(last_bill[:10], '%Y-%m-%d') if last_bill else datetime.now()
+    item_name = first("SELECT item_name FROM items WHERE is_active = 1 LIMIT 1", "silk")
+    return {
+        'item_id': first("SELECT MIN(item_id) FROM items", 1),
+        'barcode': first("SELECT barcode FROM items WHERE barcode IS NOT NULL LIMIT 1", "0000"),
+        'search': item_name[:3],
+        'bill_id': first("SELECT MAX(bill_id) FROM bills", 1),
+        'date_from': (date_to - timedelta(days=30)).strftime('%Y-%m-%d'),
+        'date_to': date_to.strftime('%Y-%m-%d'),
+        'staff_id': first("SELECT MIN(staff_id) FROM staff", 1)
+    }
+
+
+def _audited_queries() -> List[Tuple[str, Callable[[Dict[str, Any]], Any]]]:
+    """Read paths whose SQL is audited (name, function taking sample values)"""
+    from ..models.items import ItemsManager
+    from ..models.billing import BillingManager
+    from ..models.auth import StaffManager
+    from ..printing.receipt import load_receipt_data
+    from ..ui.bill_management import bills_query
+
+    def bill_list(date_filter, status_filter="All", search=False):
+        def run(sample):
+            query, params = bills_query(date_filter, status_filter, sample['search'] if search else "")
+            return db.execute_query(query, tuple(params))
+        return run
+
+    return [
+        ("items.get_all_items", lambda s: ItemsManager.get_all_items()),
+        ("items.get_all_categories", lambda s: ItemsManager.get_all_categories()),
+        ("items.get_item_by_id", lambda s: ItemsManager.get_item_by_id(s['item_id'])),
+        ("items.get_item_by_barcode", lambda s: ItemsManager.get_item_by_barcode(s['barcode'])),
+        ("items.search_items", lambda s: ItemsManager.search_items(s['search'])),
+        ("items.barcode_exists", lambda s: ItemsManager.barcode_exists(s['barcode'], s['item_id'])),
+        ("items.get_low_stock_items", lambda s: ItemsManager.get_low_stock_items()),
+        ("items.get_stock_movements", lambda s: ItemsManager.get_stock_movements()),
+        ("items.get_stock_movements[item]", lambda s: ItemsManager.get_stock_movements(s['item_id'])),
+        ("billing.get_bill_details", lambda s: BillingManager.get_bill_details(s['bill_id'])),
+        ("billing.get_bills_by_date", lambda s: BillingManager.get_bills_by_date(s['date_from'], s['date_to'])),
+        ("billing.get_bills_by_date[staff]",
+         lambda s: BillingManager.get_bills_by_date(s['date_from'], s['date_to'], s['staff_id'])),
+        ("printing.load_receipt_data", lambda s: load_receipt_data(s['bill_id'])),
+        ("staff.get_active_staff", lambda s: StaffManager.get_active_staff()),
+        ("bill_management.load_bills[All]", bill_list("All")),
+        ("bill_management.load_bills[Today]", bill_list("Today")),
+        ("bill_management.load_bills[This Month,Active]", bill_list("This Month", "Active")),
+        ("bill_management.load_bills[search]", bill_list("All", search=True)),
+    ]
+
+
+@contextmanager
+def _capture(connection: sqlite3.Connection, statements: List[str]):
+    """Collect the SELECT statements SQLite runs (with values filled in)"""
+    def on_statement(sql):
+        head = sql.lstrip()[:6].upper()
+        if (head.startswith("SELECT") or head.startswith("WITH")) and (not statements or statements[-1] != sql):
+            statements.append(sql)
+
+    connection.set_trace_callback(on_statement)
+    try:
+        yield
+    finally:
+        connection.set_trace_callback(None)
+
+
+class QueryPlanAuditor:
+    """Audits the plans of the application's queries on one database"""
+
+    def __init__(self, database: Optional[DatabaseConnection] = None):
+        self.database = database or db
+        self._indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None
+
+    def explain(self, sql: str) -> List[str]:
+        """Query plan as indented lines"""
+        rows = self.database.connection.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+
+    def existing_indexes(self) -> Dict[str, List[Tuple[str, ...]]]:
+        """Column lists of the indexes on each table"""
+        if self._indexes is None:
+            self._indexes = {}
+            connection = self.database.connection
+            for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+                columns = []
+                for index in connection.execute(f"PRAGMA index_list({table})").fetchall():
+                    info = connection.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                    columns.append(tuple(row[2] for row in info))
+                self._indexes[table] = columns
+        return self._indexes
+
+    # Findings
+
+    def findings(self, sql: str, plan: List[str]) -> List[Dict[str, Any]]:
+        """Problems in one plan, each with an index suggestion where one applies"""
+        tables = {}
+        for schema, table, alias in _TABLE_REF.findall(sql):
+            if alias and alias.upper() not in _NOT_ALIAS:
+                tables[alias] = table
+            tables.setdefault(table, table)
+
+        results = []
+        for line in plan:
+            detail = line.strip()
+            if detail.startswith("SCAN ") and "CONSTANT ROW" not in detail and not detail[5:].startswith("("):
+                alias = detail.split()[1]
+                table = tables.get(alias, alias)
+                if table in SMALL_TABLES:
+                    continue
+                kind = "full index scan" if "USING" in detail else "full table scan"
+                finding = {'kind': 'SCAN', 'table': table, 'alias': alias,
+                           'message': f"{kind} of {table}" + (f" ({alias})" if alias != table else "")}
+                finding.update(self._advise(sql, table, alias))
+                results.append(finding)
+            elif "AUTOMATIC" in detail and "INDEX" in detail:
+                alias = detail.split()[1]
+                table = tables.get(alias, alias)
+                finding = {'kind': 'AUTOMATIC INDEX', 'table': table, 'alias': alias,
+                           'message': f"SQLite builds a temporary index on {table} for every run"}
+                finding.update(self._advise(sql, table, alias))
+                results.append(finding)
+            elif detail.startswith("USE TEMP B-TREE"):
+                results.append({'kind': 'TEMP B-TREE', 'message': detail.lower().replace("use ", "sorts with a ", 1)})
+        return results
+
+    def _advise(self, sql: str, table: str, alias: str) -> Dict[str, Any]:
+        """Notes on why a table cannot use an index, and an index that would help"""
+        notes = []
+        aliased = alias != table
+        prefix = rf"{re.escape(alias)}\." if aliased else rf"(?:{re.escape(table)}\.)?"
+        conditions = _conditions(sql, table, alias)
+        columns = self._table_columns(table)
+
+        for function, column in re.findall(_FUNCTION_ON_COLUMN.format(alias=prefix), conditions, re.IGNORECASE):
+            notes.append(f"{function.upper()}({alias}.{column}) cannot use an index on {column}; "
+                         f"compare {alias}.{column} with a range instead")
+
+        equal, ranged = [], []
+        for column, operator, value in re.findall(_PREDICATE.format(alias=prefix), conditions, re.IGNORECASE):
+            if column not in columns:
+                continue
+            operator = operator.upper()
+            if operator == 'LIKE':
+                if value.startswith("'%"):
+                    notes.append(f"LIKE '%...' on {alias}.{column} cannot use an index")
+            elif operator in ('=', 'IN', 'IS'):
+                equal.append(column)
+            elif operator != '!=':
+                ranged.append(column)
+        # Join conditions written the other way round (c.x = b.y, seen from b)
+        equal += [column for column in re.findall(rf"=\s*{prefix}(\w+)", conditions) if column in columns]
+
+        order = []
+        if not re.search(r"\bGROUP\s+BY\b", sql, re.IGNORECASE):
+            order_match = re.search(r"\bORDER\s+BY\s+(.+?)(?:\bLIMIT\b|$)", sql, re.IGNORECASE | re.DOTALL)
+            for term in order_match.group(1).split(",") if order_match else []:
+                match = re.match(rf"\s*{prefix}(\w+)", term, re.IGNORECASE)
+                if not match or match.group(1) not in columns:
+                    break
+                order.append(match.group(1))
+
+        key = list(dict.fromkeys(column for column in equal if column not in order))
+        key += [column for column in (ranged[:1] or order) if column not in key]
+        advice: Dict[str, Any] = {'notes': notes}
+        if not key:
+            return advice
+        if all(column.startswith('is_') for column in key):
+            notes.append(f"only yes/no flags filter {alias}; an index on them would not be selective")
+            return advice
+
+        # Cover the other columns the query reads from this table when it reads few
+        if aliased and not re.search(rf"(?<![\w.]){re.escape(alias)}\.\*", sql):
+            rowid = self._rowid_column(table)
+            extra = [column for column in dict.fromkeys(re.findall(rf"(?<![\w.]){re.escape(alias)}\.(\w+)", sql))
+                     if column in columns and column not in key and column != rowid]
+            if len(key) + len(extra) <= 5:
+                key += extra
+                advice['covering'] = True
+
+        if any(index[:len(key)] == tuple(key) for index in self.existing_indexes().get(table, [])):
+            return advice
+        name = f"idx_{table}_{'_'.join(key)}"
+        advice['suggestion'] = f"CREATE INDEX {name} ON {table}({', '.join(key)})"
+        advice['verified'] = self._verify(sql, advice['suggestion'], name)
+        return advice
+
+    def _table_columns(self, table: str) -> List[str]:
+        return [row[1] for row in self.database.connection.execute(f"PRAGMA table_info({table})").fetchall()]
+
+    def _rowid_column(self, table: str) -> Optional[str]:
+        for row in self.database.connection.execute(f"PRAGMA table_info({table})").fetchall():
+            if row[5] and row[2].upper() == 'INTEGER':
+                return row[1]
+        return None
+
+    def _verify(self, sql: str, statement: str, name: str) -> bool:
+        """Create the index inside a rolled-back transaction and check the planner picks it"""
+        connection = sqlite3.connect(self.database.db_path, isolation_level=None)
+        try:
+            connection.execute("BEGIN")
+            connection.execute(statement)
+            plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+            connection.execute("ROLLBACK")
+        except sqlite3.Error:
+            return False
+        finally:
+            connection.close()
+        return any(f" {name} " in f"{detail} " for detail in plan)
+
+    # Audit
+
+    def audit(self, queries: Optional[List[Tuple[str, Callable]]] = None) -> Dict[str, Any]:
+        """Run each audited read path and explain the statements it issues"""
+        if not self.database.connection:
+            self.database.connect()
+        sample = _sample_values(self.database)
+        results = []
+        for name, run in queries or _audited_queries():
+            statements: List[str] = []
+            error = None
+            with _capture(self.database.connection, statements):
+                try:
+                    run(sample)
+                except Exception as e:
+                    error = str(e)
+
+            seen = set()
+            for sql in statements:
+                key = fingerprint(sql)
+                if key in seen:
+                    continue
+                seen.add(key)
+                plan = self.explain(sql)
+                results.append({'name': name, 'statement': key, 'plan': plan,
+                                'findings': self.findings(sql, plan)})
+            if error or not statements:
+                results.append({'name': name, 'statement': None, 'plan': [],
+                                'findings': [{'kind': 'ERROR', 'message': error or "no query was run"}]})
+
+        suggestions = sorted({finding['suggestion'] for result in results for finding in result['findings']
+                              if finding.get('suggestion')})
+        return {
+            'sqlite_version': sqlite3.sqlite_version,
+            'queries': results,
+            'scans': sum(1 for result in results for finding in result['findings'] if finding['kind'] == 'SCAN'),
+            'temp_btrees': sum(1 for result in results for finding in result['findings']
+                               if finding['kind'] == 'TEMP B-TREE'),
+            'suggestions': suggestions
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Plain text report, stable between runs so releases can be diffed"""
+    lines = [
+        f"Query plan audit (SQLite {report['sqlite_version']})",
+        f"{len(report['queries'])} statements, {report['scans']} scans, {report['temp_btrees']} temp B-trees",
+        ""
+    ]
+    for result in report['queries']:
+        lines.append(f"== {result['name']}")
+        if result['statement']:
+            lines.append(f"   {result['statement']}")
+        for detail in result['plan']:
+            lines.append(f"   | {detail}")
+        for finding in result['findings']:
+            lines.append(f"   ! {finding['kind']}: {finding['message']}")
+            for note in finding.get('notes', []):
+                lines.append(f"     - {note}")
+            if finding.get('suggestion'):
+                checked = "used by the planner" if finding.get('verified') else "not used by the planner"
+                covering = ", covering" if finding.get('covering') else ""
+                lines.append(f"     + {finding['suggestion']}  ({checked}{covering})")
+        lines.append("")
+
+    lines.append("Suggested indexes:")
+    lines += [f"  {statement};" for statement in report['suggestions']] or ["  (none)"]
+    return "\n".join(lines) + "\n"
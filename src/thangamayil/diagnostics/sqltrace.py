@@ -0,0 +1,259 @@
+"""
+SQL tracing
+Opt-in timing of every statement run through DatabaseConnection, grouped by
+normalised fingerprint with the code that issued it. Slow statements go to a
+rotating log, and statements repeated many times inside one transaction or
+window (N+1 patterns) are reported.
+"""
+
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+
+DEFAULT_SLOW_QUERY_MS = 100
+
+# A statement run this many times in one window is reported as an N+1 pattern
+N_PLUS_ONE_REPEATS = 5
+
+# Slow query log rotation
+SLOW_LOG_NAME = "slow_queries.log"
+SLOW_LOG_MAX_BYTES = 1024 * 1024
+SLOW_LOG_BACKUPS = 3
+
+# Frames in these files are skipped when finding the caller of a statement
+_INTERNAL_FILES = ('connection.py', 'sqltrace.py', 'contextlib.py')
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_BLOB = re.compile(r"\b[xX]'[0-9a-fA-F]*'")
+_KEYWORD_LITERAL = re.compile(r"\b(?:NULL|TRUE|FALSE)\b", re.IGNORECASE)
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Statement with literals replaced by ?, so calls differing only in values group together"""
+    sql = _COMMENT.sub(" ", sql)
+    sql = _BLOB.sub("?", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _KEYWORD_LITERAL.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip()
+    return _VALUE_LIST.sub("(?+)", sql)
+
+
+def call_site(skip: int = 1) -> str:
+    """file:line function of the first caller outside the database layer"""
+    frame = sys._getframe(skip)
+    while frame and os.path.basename(frame.f_code.co_filename) in _INTERNAL_FILES:
+        frame = frame.f_back
+    if not frame:
+        return "?"
+    path = frame.f_code.co_filename.replace(os.sep, "/")
+    marker = path.rfind("/thangamayil/")
+    path = path[marker + len("/thangamayil/"):] if marker >= 0 else os.path.basename(path)
+    return f"{path}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+class QueryWindow:
+    """Statements SQLite ran during one unit of work"""
+
+    def __init__(self, name: str, implicit: bool = False):
+        self.name = name
+        self.implicit = implicit
+        self.statements: Counter = Counter()
+        self.trigger_statements = 0
+        self.started = time.perf_counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, threshold: int = N_PLUS_ONE_REPEATS) -> List[tuple]:
+        """Statements run at least threshold times, most repeated first"""
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+class SQLTracer:
+    """Statement statistics for one database connection"""
+
+    def __init__(self, log_dir: Optional[str] = None, slow_ms: float = DEFAULT_SLOW_QUERY_MS,
+                 repeats: int = N_PLUS_ONE_REPEATS):
+        self.log_dir = log_dir or os.path.join(os.getcwd(), "logs")
+        self.slow_ms = slow_ms
+        self.repeats = repeats
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.n_plus_one: Dict[str, Dict[str, Any]] = {}
+        self.slow_count = 0
+        self._local = threading.local()
+        self._log: Optional[logging.Logger] = None
+
+    # Hooks used by DatabaseConnection
+
+    def attach(self, connection):
+        connection.set_trace_callback(self._on_statement)
+
+    def detach(self, connection):
+        connection.set_trace_callback(None)
+
+    @contextmanager
+    def statement(self, sql: str):
+        """Time one statement issued through execute_query/execute_update/execute_insert"""
+        self._local.last = None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            key = fingerprint(sql)
+            site = call_site()
+            with self.lock:
+                entry = self._entry(key)
+                entry['calls'] += 1
+                entry['total_ms'] += elapsed_ms
+                entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+                entry['sites'][site] += 1
+                slow = elapsed_ms >= self.slow_ms
+                if slow:
+                    self.slow_count += 1
+            if slow:
+                self._write_log(f"SLOW {elapsed_ms:.1f} ms  {site}  {key}")
+
+    def _on_statement(self, sql: str):
+        """Trace callback: every statement SQLite runs, including trigger programs"""
+        try:
+            stack = self._windows()
+            command = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+            if command == "BEGIN":
+                stack.append(QueryWindow(call_site(), implicit=True))
+            elif command in ("COMMIT", "END") or (command == "ROLLBACK" and " TO " not in sql.upper()):
+                if stack and stack[-1].implicit:
+                    self._close(stack.pop())
+            elif command not in ("SAVEPOINT", "RELEASE", "ROLLBACK"):
+                # Each trigger program is reported again with the statement
+                # that fired it (or as "-- TRIGGER name")
+                if sql == getattr(self._local, 'last', None) or sql.startswith("-- TRIGGER"):
+                    for window in stack:
+                        window.trigger_statements += 1
+                    return
+                self._local.last = sql
+                for window in stack:
+                    window.statements[fingerprint(sql)] += 1
+            with self.lock:
+                self._entry(fingerprint(sql))['executed'] += 1
+        except Exception as e:
+            print(f"SQL trace error: {e}")
+
+    # Windows
+
+    def _windows(self) -> List[QueryWindow]:
+        stack = getattr(self._local, 'windows', None)
+        if stack is None:
+            stack = self._local.windows = []
+        return stack
+
+    @contextmanager
+    def window(self, name: Optional[str] = None):
+        """
+        Count the statements run inside a block (a screen refresh, a report).
+        Transactions get a window of their own automatically.
+        """
+        window = QueryWindow(name or call_site())
+        stack = self._windows()
+        stack.append(window)
+        try:
+            yield window
+        finally:
+            stack.remove(window)
+            self._close(window)
+
+    def _close(self, window: QueryWindow):
+        for statement, count in window.repeated(self.repeats):
+            with self.lock:
+                entry = self.n_plus_one.setdefault(statement, {'windows': 0, 'max_repeats': 0, 'sites': Counter()})
+                entry['windows'] += 1
+                entry['max_repeats'] = max(entry['max_repeats'], count)
+                entry['sites'][window.name] += 1
+            self._write_log(f"N+1 {count}x in one window  {window.name}  {statement}")
+
+    # Results
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = self.stats[key] = {'calls': 0, 'executed': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                       'sites': Counter()}
+        return entry
+
+    def report(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Statements by total time: calls timed here, statements SQLite ran, and top callers"""
+        with self.lock:
+            rows = [{
+                'statement': key,
+                'calls': entry['calls'],
+                'executed': entry['executed'],
+                'total_ms': entry['total_ms'],
+                'mean_ms': entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0,
+                'max_ms': entry['max_ms'],
+                'sites': [site for site, _ in entry['sites'].most_common(3)]
+            } for key, entry in self.stats.items()]
+        rows.sort(key=lambda row: (row['total_ms'], row['executed']), reverse=True)
+        return rows[:limit]
+
+    def n_plus_one_report(self) -> List[Dict[str, Any]]:
+        """Statements repeated inside one window, most repeated first"""
+        with self.lock:
+            rows = [{
+                'statement': key,
+                'windows': entry['windows'],
+                'max_repeats': entry['max_repeats'],
+                'sites': [site for site, _ in entry['sites'].most_common(3)]
+            } for key, entry in self.n_plus_one.items()]
+        rows.sort(key=lambda row: row['max_repeats'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.n_plus_one.clear()
+            self.slow_count = 0
+
+    # Slow query log
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.log_dir, SLOW_LOG_NAME)
+
+    def _write_log(self, message: str):
+        try:
+            if self._log is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+                self._log = logging.getLogger(f"thangamayil.sql.{id(self)}")
+                self._log.propagate = False
+                self._log.setLevel(logging.INFO)
+                self._log.addHandler(handler)
+            self._log.info(message)
+        except OSError as e:
+            print(f"Slow query log not written: {e}")
+
+    def close(self):
+        if self._log:
+            for handler in list(self._log.handlers):
+                handler.close()
+                self._log.removeHandler(handler)
+            self._log = None
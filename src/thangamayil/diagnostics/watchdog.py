@@ -0,0 +1,145 @@
+"""
+UI freeze watchdog
+A heartbeat scheduled with after() measures how late the Tk event loop
+runs. When it stops for longer than the threshold, a helper thread
+captures the main thread's stack, so the blocking call behind a frozen
+screen is logged along with the window that was in use.
+"""
+
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .metrics import metrics
+
+
+DEFAULT_FREEZE_MS = 500
+HEARTBEAT_MS = 100
+
+# Stacks captured per freeze (one at the threshold, then one per further threshold)
+MAX_SAMPLES_PER_FREEZE = 5
+
+# Innermost frames kept per captured stack
+STACK_DEPTH = 30
+
+LAG_METRIC = "ui_event_loop_lag"
+
+FREEZE_LOG_NAME = "ui_freezes.log"
+FREEZE_LOG_MAX_BYTES = 1024 * 1024
+FREEZE_LOG_BACKUPS = 3
+
+
+class UIWatchdog:
+    """Event loop lag monitor for a Tk root window"""
+
+    def __init__(self, root, log_dir: Optional[str] = None, freeze_ms: float = DEFAULT_FREEZE_MS,
+                 heartbeat_ms: int = HEARTBEAT_MS):
+        self.root = root
+        self.log_dir = log_dir or os.path.join(os.getcwd(), "logs")
+        self.freeze_ms = freeze_ms
+        self.heartbeat_ms = heartbeat_ms
+        self.active_window = ""
+        self.freezes = 0
+        self._main_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._samples = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._log: Optional[logging.Logger] = None
+        self._log_lock = threading.Lock()
+
+    def start(self):
+        """Start the heartbeat; call from the thread running the event loop"""
+        if self._thread:
+            return
+        self._main_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        try:
+            self.root.bind_all('<FocusIn>', self._on_focus, add='+')
+        except Exception as e:
+            print(f"UI watchdog could not follow window focus: {e}")
+        self.root.after(self.heartbeat_ms, self.heartbeat)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ui-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(2)
+            self._thread = None
+        if self._log:
+            for handler in list(self._log.handlers):
+                handler.close()
+                self._log.removeHandler(handler)
+            self._log = None
+
+    def _on_focus(self, event):
+        try:
+            self.active_window = event.widget.winfo_toplevel().title()
+        except Exception:
+            pass  # Focus events from widgets already being destroyed
+
+    def heartbeat(self):
+        """Runs on the event loop every heartbeat_ms"""
+        now = time.perf_counter()
+        elapsed = now - self._last_beat
+        self._last_beat = now
+        metrics.record(LAG_METRIC, max(0.0, elapsed - self.heartbeat_ms / 1000))
+
+        if self._samples:
+            self._write_log(f"FREEZE ended after {elapsed * 1000:.0f} ms  window: {self.active_window}")
+            self._samples = 0
+        if not self._stop_event.is_set():
+            self.root.after(self.heartbeat_ms, self.heartbeat)
+
+    def _run(self):
+        interval = min(self.heartbeat_ms, self.freeze_ms) / 2000
+        while not self._stop_event.wait(interval):
+            self.check()
+
+    def check(self):
+        """Capture the main thread's stack if the event loop has stopped too long"""
+        stalled_ms = (time.perf_counter() - self._last_beat) * 1000 - self.heartbeat_ms
+        if stalled_ms < self.freeze_ms * (self._samples + 1) or self._samples >= MAX_SAMPLES_PER_FREEZE:
+            return
+        if not self._samples:
+            self.freezes += 1
+        self._samples += 1
+
+        frame = sys._current_frames().get(self._main_thread_id)
+        stack = "".join(traceback.format_stack(frame, STACK_DEPTH)) if frame else "  (main thread not found)\n"
+        self._write_log(f"FREEZE {stalled_ms:.0f} ms  window: {self.active_window}  "
+                        f"sample {self._samples}\n{stack.rstrip()}")
+
+    # Freeze log
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.log_dir, FREEZE_LOG_NAME)
+
+    def _write_log(self, message: str):
+        with self._log_lock:
+            self._write_log_locked(message)
+
+    def _write_log_locked(self, message: str):
+        try:
+            if self._log is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=FREEZE_LOG_MAX_BYTES, backupCount=FREEZE_LOG_BACKUPS, encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+                self._log = logging.getLogger(f"thangamayil.ui.{id(self)}")
+                self._log.propagate = False
+                self._log.setLevel(logging.INFO)
+                self._log.addHandler(handler)
+            self._log.info(message)
+        except OSError as e:
+            print(f"UI freeze log not written: {e}")
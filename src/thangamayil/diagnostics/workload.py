@@ -0,0 +1,365 @@
+"""
+Workload recording and replay
+Records the billing and item calls a till makes during a real day (with
+timing, barcodes and quantities; customers are anonymised) and replays
+them against a copy of the database at real or accelerated speed, so
+capacity can be checked before festival rush.
+"""
+
+import atexit
+import functools
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+
+from ..database.connection import db, LOCK_WAIT_METRIC
+from .metrics import LatencyHistogram, metrics, terminal_name, TERMINAL_ENV
+
+
+# Set to record this till's workload (value: folder for the recordings, or 1)
+RECORD_ENV = "THANGAMAYIL_RECORD_WORKLOAD"
+WORKLOAD_DIR = "workloads"
+
+RECORDING_FORMAT = 1
+
+# Recorded lines are written out after this many calls (and on stop)
+FLUSH_EVERY = 50
+
+# Manager calls that change stock or bills; a False/None result is a refusal
+WRITE_CALLS = {'create_bill', 'add_item_to_bill', 'update_bill_item', 'remove_item_from_bill',
+               'finalize_bill', 'cancel_bill', 'add_item', 'update_item', 'deactivate_item',
+               'update_stock', 'reduce_stock_for_sale', 'add_category'}
+
+
+def _managers() -> Dict[str, type]:
+    from ..models.billing import BillingManager
+    from ..models.items import ItemsManager
+    return {'BillingManager': BillingManager, 'ItemsManager': ItemsManager}
+
+
+class WorkloadRecorder:
+    """Logs the public BillingManager and ItemsManager calls made in this process"""
+
+    def __init__(self, workload_dir: Optional[str] = None):
+        self.workload_dir = workload_dir or os.path.join(os.getcwd(), WORKLOAD_DIR)
+        self.path: Optional[str] = None
+        self.calls = 0
+        self.lock = threading.Lock()
+        self._file = None
+        self._started = 0.0
+        self._pending = 0
+        self._originals: List[tuple] = []
+        self._local = threading.local()
+        # Customers become hashes with a salt that is never saved, so repeat
+        # visits show in the recording but cannot be traced to a person
+        self._salt = os.urandom(16)
+
+    @property
+    def recording(self) -> bool:
+        return self._file is not None
+
+    def start(self) -> str:
+        """Start recording; returns the recording file path"""
+        if self.recording:
+            return self.path
+        os.makedirs(self.workload_dir, exist_ok=True)
+        till = terminal_name()
+        self.path = os.path.join(self.workload_dir, f"{till}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl")
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._started = time.perf_counter()
+        self.calls = 0
+        self._file.write(json.dumps({'format': RECORDING_FORMAT, 'till': till, 'started_at': time.time()}) + "\n")
+
+        for manager_name, manager in _managers().items():
+            for name, member in list(vars(manager).items()):
+                if isinstance(member, staticmethod) and not name.startswith('_'):
+                    self._originals.append((manager, name, member))
+                    setattr(manager, name, staticmethod(self._wrap(manager_name, name, member.__func__)))
+        atexit.register(self.stop)
+        return self.path
+
+    def stop(self):
+        for manager, name, member in self._originals:
+            setattr(manager, name, member)
+        self._originals = []
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _wrap(self, manager_name: str, name: str, function: Callable) -> Callable:
+        signature = inspect.signature(function)
+        recorder = self
+
+        @functools.wraps(function)
+        def recorded(*args, **kwargs):
+            # Calls made by other manager calls are replayed by their caller
+            if getattr(recorder._local, 'depth', 0):
+                return function(*args, **kwargs)
+            offset = time.perf_counter() - recorder._started
+            try:
+                arguments = recorder._anonymise(dict(signature.bind(*args, **kwargs).arguments))
+            except TypeError:
+                arguments = None
+            recorder._local.depth = 1
+            started = time.perf_counter()
+            result = None
+            try:
+                result = function(*args, **kwargs)
+                return result
+            finally:
+                recorder._local.depth = 0
+                if arguments is not None:
+                    entry = {'t': round(offset, 4), 'call': f"{manager_name}.{name}", 'args': arguments,
+                             'ms': round((time.perf_counter() - started) * 1000, 3)}
+                    if name == 'create_bill':
+                        entry['result'] = result
+                    elif name in WRITE_CALLS:
+                        entry['ok'] = bool(result)
+                    recorder._write(entry)
+
+        return recorded
+
+    def _anonymise(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        if arguments.get('customer_id') is not None:
+            digest = hashlib.sha256(self._salt + str(arguments['customer_id']).encode()).hexdigest()
+            arguments['customer_id'] = f"c-{digest[:12]}"
+        if 'bill_item_id' in arguments:
+            # Line ids differ in the replay; remember which bill and item the line was
+            line = db.get_single_result(
+                "SELECT bill_id, item_id FROM bill_items WHERE bill_item_id = ?", (arguments['bill_item_id'],)
+            )
+            arguments['line'] = dict(line) if line else None
+        return arguments
+
+    def _write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, default=str)
+        with self.lock:
+            if not self._file:
+                return
+            self._file.write(line + "\n")
+            self.calls += 1
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+
+
+def start_recording_from_env() -> Optional[WorkloadRecorder]:
+    """Start recording when RECORD_ENV is set; returns the recorder"""
+    value = os.environ.get(RECORD_ENV)
+    if not value or value == "0":
+        return None
+    recorder = WorkloadRecorder(None if value == "1" else value)
+    print(f"Recording workload to {recorder.start()}")
+    return recorder
+
+
+def load_recording(path: str) -> Dict[str, Any]:
+    """Header and calls of a recording file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != RECORDING_FORMAT:
+            raise Exception(f"Not a workload recording: {path}")
+        # A till that was switched off mid-write leaves a partial last line
+        calls = []
+        for line in f:
+            try:
+                calls.append(json.loads(line))
+            except ValueError:
+                break
+    return {'header': header, 'calls': calls, 'path': path}
+
+
+# Replay
+
+def _replay_till(database_path: str, recording_path: str, speed: float, start_at: float,
+                 offset: float) -> Dict[str, Any]:
+    """One till's recording against the database; runs in its own process"""
+    recording = load_recording(recording_path)
+    os.environ[TERMINAL_ENV] = f"{recording['header']['till']}-REPLAY"
+    db.disconnect()
+    db.db_path = database_path
+    db.connect()
+    metrics.reset()
+    managers = _managers()
+
+    customers = [row['customer_id'] for row in db.execute_query(
+        "SELECT customer_id FROM customers WHERE phone_number != '1234567899' ORDER BY customer_id"
+    )]
+    customer_map: Dict[str, Any] = {}
+    bill_map: Dict[int, int] = {}
+    histograms: Dict[str, LatencyHistogram] = {}
+    refused = skipped = 0
+    max_lag = 0.0
+
+    while time.time() < start_at:
+        time.sleep(min(0.05, start_at - time.time()))
+
+    for entry in recording['calls']:
+        if speed:
+            due = start_at + (offset + entry['t']) / speed
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+
+        manager_name, name = entry['call'].split('.', 1)
+        function = getattr(managers.get(manager_name), name, None)
+        if function is None:
+            skipped += 1
+            continue
+
+        arguments = dict(entry['args'])
+        if arguments.get('bill_id') in bill_map:
+            arguments['bill_id'] = bill_map[arguments['bill_id']]
+        if isinstance(arguments.get('customer_id'), str):
+            key = arguments['customer_id']
+            if key not in customer_map:
+                customer_map[key] = customers[len(customer_map) % len(customers)] if customers else None
+            arguments['customer_id'] = customer_map[key]
+        if 'line' in arguments:
+            line = arguments.pop('line')
+            found = line and db.get_single_result(
+                "SELECT bill_item_id FROM bill_items WHERE bill_id = ? AND item_id = ? ORDER BY bill_item_id LIMIT 1",
+                (bill_map.get(line['bill_id'], line['bill_id']), line['item_id'])
+            )
+            if not found:
+                skipped += 1
+                continue
+            arguments['bill_item_id'] = found['bill_item_id']
+
+        histogram = histograms.get(entry['call'])
+        if histogram is None:
+            histogram = histograms[entry['call']] = LatencyHistogram()
+        started = time.perf_counter()
+        try:
+            result = function(**arguments)
+        except Exception as e:
+            histogram.errors += 1
+            result = None
+            print(f"Replay error in {entry['call']}: {e}")
+        histogram.record(time.perf_counter() - started)
+
+        if name == 'create_bill' and result and entry.get('result'):
+            bill_map[entry['result']] = result
+        elif name in WRITE_CALLS and not result:
+            refused += 1
+
+    lock_waits = metrics.histograms.get(LOCK_WAIT_METRIC)
+    db.disconnect()
+    return {
+        'till': recording['header']['till'],
+        'histograms': {call: histogram.to_dict() for call, histogram in histograms.items()},
+        'lock_waits': lock_waits.to_dict() if lock_waits else None,
+        'refused': refused,
+        'skipped': skipped,
+        'max_lag': max_lag,
+        'finished_at': time.time()
+    }
+
+
+class WorkloadReplayer:
+    """Replays recordings (one process per till) against a copy of a database"""
+
+    def __init__(self, database_path: str, recording_paths: List[str], speed: float = 1.0,
+                 progress_callback: Optional[Callable[[str], None]] = None):
+        self.database_path = database_path
+        self.recording_paths = recording_paths
+        self.speed = speed
+        self.progress_callback = progress_callback
+
+    def _progress(self, message: str):
+        if self.progress_callback:
+            self.progress_callback(message)
+
+    def run(self) -> Dict[str, Any]:
+        """Replay every recording together; returns throughput, latency percentiles and lock waits"""
+        if not os.path.exists(self.database_path):
+            raise Exception(f"Database not found: {self.database_path}")
+        recordings = [load_recording(path) for path in self.recording_paths]
+        if not recordings:
+            raise Exception("No recordings to replay")
+
+        # Tills recorded at different times keep their offsets from the first one
+        first = min(recording['header']['started_at'] for recording in recordings)
+        recorded_seconds = max(
+            (recording['header']['started_at'] - first + (recording['calls'][-1]['t'] if recording['calls'] else 0))
+            for recording in recordings
+        )
+
+        work_dir = tempfile.mkdtemp(prefix="thangamayil_replay_")
+        work_path = os.path.join(work_dir, "replay.db")
+        shutil.copyfile(self.database_path, work_path)
+        self._progress(f"Replaying {sum(len(r['calls']) for r in recordings)} calls from {len(recordings)} tills "
+                       f"({recorded_seconds / 60:.1f} recorded minutes) at "
+                       f"{f'{self.speed:g}x' if self.speed else 'full'} speed")
+
+        # Tills are separate processes, as on separate counters
+        context = multiprocessing.get_context('spawn')
+        start_at = time.time() + 2
+        try:
+            with context.Pool(len(recordings)) as pool:
+                results = pool.starmap(_replay_till, [
+                    (work_path, recording['path'], self.speed, start_at, recording['header']['started_at'] - first)
+                    for recording in recordings
+                ])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        elapsed = max(result['finished_at'] for result in results) - start_at
+
+        calls: Dict[str, LatencyHistogram] = {}
+        overall = LatencyHistogram()
+        lock_waits = LatencyHistogram()
+        for result in results:
+            for call, data in result['histograms'].items():
+                histogram = LatencyHistogram.from_dict(data)
+                calls.setdefault(call, LatencyHistogram()).merge(histogram)
+                overall.merge(histogram)
+            if result['lock_waits']:
+                lock_waits.merge(LatencyHistogram.from_dict(result['lock_waits']))
+
+        bills = calls.get('BillingManager.finalize_bill')
+        return {
+            'tills': [result['till'] for result in results],
+            'speed': self.speed,
+            'recorded_seconds': recorded_seconds,
+            'elapsed': elapsed,
+            'calls': overall.count,
+            'calls_per_second': overall.count / elapsed if elapsed > 0 else 0.0,
+            'bills_per_second': (bills.count if bills else 0) / elapsed if elapsed > 0 else 0.0,
+            'errors': overall.errors,
+            'refused': sum(result['refused'] for result in results),
+            'skipped': sum(result['skipped'] for result in results),
+            'max_lag': max(result['max_lag'] for result in results),
+            'latency': {call: histogram.summary() for call, histogram in sorted(calls.items())},
+            'lock_waits': lock_waits.summary()
+        }
+
+
+def format_replay(summary: Dict[str, Any]) -> str:
+    speed = f"{summary['speed']:g}x" if summary['speed'] else "full speed"
+    lines = [
+        f"Tills: {', '.join(summary['tills'])} | Speed: {speed}",
+        f"Recorded {summary['recorded_seconds']:.0f} s, replayed in {summary['elapsed']:.1f} s "
+        f"(up to {summary['max_lag'] * 1000:.0f} ms behind schedule)",
+        f"Calls: {summary['calls']} ({summary['calls_per_second']:.1f}/s) | "
+        f"Bills: {summary['bills_per_second']:.2f}/s | Errors: {summary['errors']} | "
+        f"Refused: {summary['refused']} | Skipped: {summary['skipped']}",
+        "",
+        f"{'Call':<40} {'Count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    ]
+    rows = list(summary['latency'].items()) + [("write lock wait", summary['lock_waits'])]
+    for call, result in rows:
+        lines.append(f"{call:<40} {result['count']:>6} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} "
+                     f"{result['p99_ms']:>9.2f} {result['max_ms']:>9.2f}")
+    return "\n".join(lines) + "\n"
@@ -3,12 +3,29 @@ Billing and invoice management models
 Handles bill creation, GST calculations, and transaction operations
 """
 
+import threading
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from ..database.connection import db
+from ..diagnostics.metrics import timed, terminal_name, TERMINAL_ENV
+from ..database.archive import archive_sources, find_archived_bill
 from .items import ItemsManager
 
 
+# Invoice numbers leased to a terminal at a time (invoice_block_size setting);
+# 0 keeps the shared per-bill sequence, blocks are opt-in for multi-till shops
+DEFAULT_INVOICE_BLOCK_SIZE = 0
+
+# Size of a block leased explicitly while blocks are turned off
+INVOICE_LEASE_SIZE = 500
+
+# Lease the next block in the background once this share of a block is left
+INVOICE_BLOCK_REFILL_FRACTION = 0.2
+
+# Names the terminal leasing blocks; defaults to the computer name
+INVOICE_TERMINAL_ENV = TERMINAL_ENV
+
+
 class GSTCalculator:
     """Handles GST calculations"""
     
@@ -60,25 +77,117 @@ class GSTCalculator:
             'igst_amount': gst_calc['igst'],
             'line_total': taxable_amount + gst_calc['total_gst']
         }
+    
+    @staticmethod
+    def calculate_bill_summary(lines: List[Dict[str, Any]], bill_discount_percentage: float = 0,
+                               is_interstate: bool = False) -> Dict[str, Any]:
+        """
+        Calculate line and bill totals in a single pass over the lines
+        Shared by billing, POS display and every receipt so totals always agree
+        """
+        line_calcs = []
+        gross_amount = 0
+        item_discount = 0
+        subtotal = 0
+        total_cgst = 0
+        total_sgst = 0
+        total_igst = 0
+        
+        for line in lines:
+            calc = GSTCalculator.calculate_line_total(
+                quantity=line['quantity'] or 0,
+                unit_price=line['unit_price'] or 0,
+                discount_percentage=line.get('discount_percentage') or 0,
+                gst_rate=line.get('gst_percentage') or 0,
+                is_interstate=is_interstate
+            )
+            line_calcs.append(calc)
+            
+            gross_amount += calc['line_amount']
+            item_discount += calc['discount_amount']
+            subtotal += calc['taxable_amount']
+            total_cgst += calc['cgst_amount']
+            total_sgst += calc['sgst_amount']
+            total_igst += calc['igst_amount']
+        
+        # Apply bill-level discount
+        bill_discount_amount = (subtotal * bill_discount_percentage) / 100
+        discounted_subtotal = subtotal - bill_discount_amount
+        
+        # Recalculate GST on discounted amount
+        if bill_discount_percentage > 0:
+            gst_ratio = (total_cgst + total_sgst + total_igst) / subtotal if subtotal > 0 else 0
+            total_gst_after_discount = discounted_subtotal * gst_ratio
+            
+            if is_interstate:
+                total_cgst = 0
+                total_sgst = 0
+                total_igst = total_gst_after_discount
+            else:
+                total_cgst = total_gst_after_discount / 2
+                total_sgst = total_gst_after_discount / 2
+                total_igst = 0
+        
+        total_gst = total_cgst + total_sgst + total_igst
+        pre_round_total = discounted_subtotal + total_gst
+        
+        # Apply rounding
+        grand_total = round(pre_round_total)
+        round_off = grand_total - pre_round_total
+        
+        return {
+            'lines': line_calcs,
+            'gross_amount': gross_amount,
+            'item_discount': item_discount,
+            'subtotal': subtotal,
+            'discount_percentage': bill_discount_percentage,
+            'discount_amount': bill_discount_amount,
+            'cgst_amount': total_cgst,
+            'sgst_amount': total_sgst,
+            'igst_amount': total_igst,
+            'total_gst': total_gst,
+            'pre_round_total': pre_round_total,
+            'round_off': round_off,
+            'grand_total': grand_total
+        }
 
 
 class BillingManager:
     """Handles billing operations"""
     
+    @staticmethod
+    def _highest_invoice_number(prefix: str) -> int:
+        """Highest number used with a prefix, including archived years"""
+        result = db.get_single_result(
+            """
+            SELECT MAX(num) as max_num FROM (
+                SELECT MAX(CAST(SUBSTR(invoice_number, LENGTH(?) + 1) AS INTEGER)) as num
+                FROM bills WHERE invoice_number LIKE ?
+                UNION ALL
+                SELECT max_number FROM archived_invoice_sequences WHERE prefix = ?
+            )
+            """,
+            (prefix, f"{prefix}%", prefix)
+        )
+        return result['max_num'] if result and result['max_num'] else 0
+    
     @staticmethod
     def generate_invoice_number() -> str:
-        """Generate unique invoice number"""
+        """Preview the next invoice number (does not reserve it)"""
         try:
             prefix = db.get_setting('invoice_prefix') or 'TSK'
             
-            # Get next sequence number
-            result = db.get_single_result(
-                "SELECT MAX(CAST(SUBSTR(invoice_number, LENGTH(?) + 1) AS INTEGER)) as max_num FROM bills WHERE invoice_number LIKE ?",
-                (prefix, f"{prefix}%")
-            )
+            # Next number from this terminal's block, else from the sequence
+            if BillingManager._invoice_block_size() > 0:
+                blocks = BillingManager._open_blocks(prefix, BillingManager._invoice_terminal())
+                if blocks:
+                    return f"{prefix}{blocks[0]['next_number']:06d}"
             
-            next_num = 1 if not result or not result['max_num'] else result['max_num'] + 1
-            return f"{prefix}{next_num:06d}"
+            sequence = db.get_single_result(
+                "SELECT last_number FROM invoice_sequences WHERE prefix = ?", (prefix,)
+            )
+            last_number = sequence['last_number'] if sequence else BillingManager._highest_invoice_number(prefix)
+            return f"{prefix}{last_number + 1:06d}"
             
         except Exception:
             # Fallback to timestamp-based
@@ -86,19 +195,187 @@ class BillingManager:
             return f"TSK{timestamp}"
     
     @staticmethod
-    def create_bill(staff_id: int, customer_id: Optional[int] = None) -> Optional[int]:
-        """Create new bill and return bill_id"""
+    def allocate_invoice_number() -> str:
+        """
+        Reserve the next invoice number
+        Taken from this terminal's leased block when blocks are enabled,
+        otherwise from the shared sequence row. Runs inside a write
+        transaction, so two terminals never get the same number
+        """
+        prefix = db.get_setting('invoice_prefix') or 'TSK'
+        block_size = BillingManager._invoice_block_size()
+        if block_size > 0:
+            return f"{prefix}{BillingManager._take_from_block(prefix, block_size):06d}"
+        
+        with db.transaction():
+            next_number = BillingManager._advance_sequence(prefix, 1)
+        return f"{prefix}{next_number:06d}"
+    
+    @staticmethod
+    def _advance_sequence(prefix: str, count: int) -> int:
+        """Move the shared sequence on by count and return the first number taken"""
+        sequence = db.get_single_result(
+            "SELECT last_number FROM invoice_sequences WHERE prefix = ?", (prefix,)
+        )
+        if sequence:
+            first_number = sequence['last_number'] + 1
+            db.execute_update(
+                "UPDATE invoice_sequences SET last_number = ? WHERE prefix = ?", (first_number + count - 1, prefix)
+            )
+        else:
+            # First bill with this prefix: continue from existing bills
+            first_number = BillingManager._highest_invoice_number(prefix) + 1
+            db.execute_insert(
+                "INSERT INTO invoice_sequences (prefix, last_number) VALUES (?, ?)", (prefix, first_number + count - 1)
+            )
+        return first_number
+    
+    @staticmethod
+    def _invoice_block_size() -> int:
         try:
-            invoice_number = BillingManager.generate_invoice_number()
-            
-            bill_id = db.execute_insert(
+            return int(db.get_setting('invoice_block_size') or DEFAULT_INVOICE_BLOCK_SIZE)
+        except (TypeError, ValueError):
+            return DEFAULT_INVOICE_BLOCK_SIZE
+    
+    @staticmethod
+    def _invoice_terminal() -> str:
+        return terminal_name()
+    
+    @staticmethod
+    def _open_blocks(prefix: str, terminal: str) -> List[Dict[str, Any]]:
+        return [dict(row) for row in db.execute_query(
+            """
+            SELECT block_id, next_number, end_number FROM invoice_blocks
+            WHERE prefix = ? AND terminal = ? AND next_number <= end_number AND released_at IS NULL
+            ORDER BY block_id
+            """,
+            (prefix, terminal)
+        )]
+    
+    @staticmethod
+    def lease_invoice_block(prefix: Optional[str] = None, size: Optional[int] = None,
+                            terminal: Optional[str] = None) -> Dict[str, Any]:
+        """Lease the next range of invoice numbers to a terminal"""
+        prefix = prefix or db.get_setting('invoice_prefix') or 'TSK'
+        size = size or BillingManager._invoice_block_size() or INVOICE_LEASE_SIZE
+        terminal = terminal or BillingManager._invoice_terminal()
+        
+        with db.transaction():
+            start_number = BillingManager._advance_sequence(prefix, size)
+            block_id = db.execute_insert(
                 """
-                INSERT INTO bills 
-                (invoice_number, staff_id, customer_id, subtotal, grand_total)
-                VALUES (?, ?, ?, 0.00, 0.00)
+                INSERT INTO invoice_blocks (prefix, terminal, start_number, end_number, next_number)
+                VALUES (?, ?, ?, ?, ?)
                 """,
-                (invoice_number, staff_id, customer_id)
+                (prefix, terminal, start_number, start_number + size - 1, start_number)
+            )
+        return {'block_id': block_id, 'prefix': prefix, 'terminal': terminal,
+                'start_number': start_number, 'end_number': start_number + size - 1}
+    
+    _refill_lock = threading.Lock()
+    _refilling = False
+    
+    @staticmethod
+    def _refill_in_background(prefix: str, block_size: int, terminal: str):
+        """Lease the next block on a background thread, one at a time"""
+        with BillingManager._refill_lock:
+            if BillingManager._refilling:
+                return
+            BillingManager._refilling = True
+        
+        def refill():
+            try:
+                BillingManager.lease_invoice_block(prefix, block_size, terminal)
+            except Exception as e:
+                print(f"Invoice block refill error: {e}")
+            finally:
+                BillingManager._refilling = False
+        
+        threading.Thread(target=refill, name="invoice-block-refill", daemon=True).start()
+    
+    @staticmethod
+    def _take_from_block(prefix: str, block_size: int) -> int:
+        """Next number from this terminal's blocks, leasing one if none is open"""
+        terminal = BillingManager._invoice_terminal()
+        with db.transaction():
+            blocks = BillingManager._open_blocks(prefix, terminal)
+            if not blocks:
+                BillingManager.lease_invoice_block(prefix, block_size, terminal)
+                blocks = BillingManager._open_blocks(prefix, terminal)
+            
+            block = blocks[0]
+            db.execute_update(
+                "UPDATE invoice_blocks SET next_number = next_number + 1 WHERE block_id = ?",
+                (block['block_id'],)
             )
+            remaining = sum(open_block['end_number'] - open_block['next_number'] + 1 for open_block in blocks) - 1
+        
+        if remaining < block_size * INVOICE_BLOCK_REFILL_FRACTION:
+            BillingManager._refill_in_background(prefix, block_size, terminal)
+        return block['next_number']
+    
+    @staticmethod
+    def release_invoice_blocks(terminal: Optional[str] = None) -> int:
+        """
+        Give up a terminal's open blocks (e.g. when a till is retired)
+        Their unused numbers are never issued and show as unused in the audit
+        """
+        return db.execute_update(
+            "UPDATE invoice_blocks SET released_at = CURRENT_TIMESTAMP WHERE terminal = ? AND released_at IS NULL",
+            (terminal or BillingManager._invoice_terminal(),)
+        )
+    
+    @staticmethod
+    def audit_invoice_series(prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Check every leased number: issued numbers must have a bill (live or
+        archived); numbers a terminal never reached are reported as unused
+        """
+        prefix = prefix or db.get_setting('invoice_prefix') or 'TSK'
+        used = set()
+        for schema in archive_sources("1900-04-01", "9999-03-31"):
+            for row in db.execute_query(
+                f"SELECT invoice_number FROM {schema}.bills WHERE invoice_number LIKE ?", (f"{prefix}%",)
+            ):
+                suffix = row['invoice_number'][len(prefix):]
+                if suffix.isdigit():
+                    used.add(int(suffix))
+        
+        blocks = [dict(row) for row in db.execute_query(
+            "SELECT * FROM invoice_blocks WHERE prefix = ? ORDER BY start_number", (prefix,)
+        )]
+        missing, unused = [], 0
+        for block in blocks:
+            issued_end = min(block['next_number'] - 1, block['end_number'])
+            missing.extend(number for number in range(block['start_number'], issued_end + 1)
+                           if number not in used)
+            unused += block['end_number'] - issued_end
+        
+        return {
+            'prefix': prefix,
+            'blocks': len(blocks),
+            'issued': sum(min(block['next_number'] - 1, block['end_number']) - block['start_number'] + 1
+                          for block in blocks),
+            'missing': [f"{prefix}{number:06d}" for number in missing],
+            'unused': unused
+        }
+    
+    @staticmethod
+    @timed('create_bill')
+    def create_bill(staff_id: int, customer_id: Optional[int] = None) -> Optional[int]:
+        """Create new bill and return bill_id"""
+        try:
+            with db.transaction():
+                invoice_number = BillingManager.allocate_invoice_number()
+                
+                bill_id = db.execute_insert(
+                    """
+                    INSERT INTO bills 
+                    (invoice_number, staff_id, customer_id, subtotal, grand_total)
+                    VALUES (?, ?, ?, 0.00, 0.00)
+                    """,
+                    (invoice_number, staff_id, customer_id)
+                )
             
             return bill_id
             
@@ -208,6 +485,20 @@ class BillingManager:
             print(f"Remove item from bill error: {e}")
             return False
     
+    @staticmethod
+    def replace_bill_items(bill_id: int, items: List[Dict[str, Any]], is_interstate: bool = False) -> bool:
+        """Replace all lines of an edited bill in one transaction, so a failure cannot leave it empty"""
+        try:
+            with db.transaction():
+                db.execute_update("DELETE FROM bill_items WHERE bill_id = ?", (bill_id,))
+                for item in items:
+                    if not BillingManager.add_item_to_bill(bill_id, item, is_interstate):
+                        raise Exception(f"Could not add {item['item_name']}")
+            return True
+        except Exception as e:
+            print(f"Replace bill items error: {e}")
+            return False
+    
     @staticmethod
     def calculate_bill_totals(bill_id: int, bill_discount_percentage: float = 0, 
                              is_interstate: bool = False) -> Dict[str, float]:
@@ -222,50 +513,11 @@ class BillingManager:
             if not items:
                 return {'subtotal': 0, 'total_gst': 0, 'grand_total': 0}
             
-            subtotal = 0
-            total_cgst = 0
-            total_sgst = 0
-            total_igst = 0
-            
-            for item in items:
-                # Recalculate each item with current settings
-                calc = GSTCalculator.calculate_line_total(
-                    quantity=item['quantity'],
-                    unit_price=item['unit_price'],
-                    discount_percentage=item['discount_percentage'],
-                    gst_rate=item['gst_percentage'],
-                    is_interstate=is_interstate
-                )
-                
-                subtotal += calc['taxable_amount']
-                total_cgst += calc['cgst_amount']
-                total_sgst += calc['sgst_amount']
-                total_igst += calc['igst_amount']
-            
-            # Apply bill-level discount
-            bill_discount_amount = (subtotal * bill_discount_percentage) / 100
-            discounted_subtotal = subtotal - bill_discount_amount
-            
-            # Recalculate GST on discounted amount
-            if bill_discount_percentage > 0:
-                gst_ratio = (total_cgst + total_sgst + total_igst) / subtotal if subtotal > 0 else 0
-                total_gst_after_discount = discounted_subtotal * gst_ratio
-                
-                if is_interstate:
-                    total_cgst = 0
-                    total_sgst = 0
-                    total_igst = total_gst_after_discount
-                else:
-                    total_cgst = total_gst_after_discount / 2
-                    total_sgst = total_gst_after_discount / 2
-                    total_igst = 0
-            
-            total_gst = total_cgst + total_sgst + total_igst
-            pre_round_total = discounted_subtotal + total_gst
-            
-            # Apply rounding
-            grand_total = round(pre_round_total)
-            round_off = grand_total - pre_round_total
+            summary = GSTCalculator.calculate_bill_summary(
+                [dict(item) for item in items],
+                bill_discount_percentage,
+                is_interstate
+            )
             
             # Update bill
             db.execute_update(
@@ -277,27 +529,27 @@ class BillingManager:
                 WHERE bill_id = ?
                 """,
                 (
-                    subtotal,
-                    bill_discount_amount,
+                    summary['subtotal'],
+                    summary['discount_amount'],
                     bill_discount_percentage,
-                    total_cgst,
-                    total_sgst,
-                    total_igst,
-                    round_off,
-                    grand_total,
+                    summary['cgst_amount'],
+                    summary['sgst_amount'],
+                    summary['igst_amount'],
+                    summary['round_off'],
+                    summary['grand_total'],
                     bill_id
                 )
             )
             
             return {
-                'subtotal': subtotal,
-                'discount_amount': bill_discount_amount,
-                'cgst_amount': total_cgst,
-                'sgst_amount': total_sgst,
-                'igst_amount': total_igst,
-                'total_gst': total_gst,
-                'round_off': round_off,
-                'grand_total': grand_total
+                'subtotal': summary['subtotal'],
+                'discount_amount': summary['discount_amount'],
+                'cgst_amount': summary['cgst_amount'],
+                'sgst_amount': summary['sgst_amount'],
+                'igst_amount': summary['igst_amount'],
+                'total_gst': summary['total_gst'],
+                'round_off': summary['round_off'],
+                'grand_total': summary['grand_total']
             }
             
         except Exception as e:
@@ -305,32 +557,35 @@ class BillingManager:
             return {'subtotal': 0, 'total_gst': 0, 'grand_total': 0}
     
     @staticmethod
+    @timed('finalize_bill')
     def finalize_bill(bill_id: int, payment_mode: str = 'CASH') -> bool:
         """Finalize bill and update stock"""
         try:
-            # Get bill details
-            bill = db.get_single_result("SELECT * FROM bills WHERE bill_id = ?", (bill_id,))
-            if not bill:
-                return False
-            
-            # Get all bill items
-            items = db.execute_query("SELECT * FROM bill_items WHERE bill_id = ?", (bill_id,))
-            
-            # Update stock for each item
-            for item in items:
-                ItemsManager.reduce_stock_for_sale(
-                    item_id=item['item_id'],
-                    quantity=item['quantity'],
-                    bill_id=bill_id,
-                    staff_id=bill['staff_id']
+            # Stock and payment are written together under one write lock
+            with db.transaction():
+                # Get bill details
+                bill = db.get_single_result("SELECT * FROM bills WHERE bill_id = ?", (bill_id,))
+                if not bill:
+                    return False
+                
+                # Get all bill items
+                items = db.execute_query("SELECT * FROM bill_items WHERE bill_id = ?", (bill_id,))
+                
+                # Update stock for each item
+                for item in items:
+                    ItemsManager.reduce_stock_for_sale(
+                        item_id=item['item_id'],
+                        quantity=item['quantity'],
+                        bill_id=bill_id,
+                        staff_id=bill['staff_id']
+                    )
+                
+                # Update payment mode
+                db.execute_update(
+                    "UPDATE bills SET payment_mode = ? WHERE bill_id = ?",
+                    (payment_mode, bill_id)
                 )
             
-            # Update payment mode
-            db.execute_update(
-                "UPDATE bills SET payment_mode = ? WHERE bill_id = ?",
-                (payment_mode, bill_id)
-            )
-            
             return True
             
         except Exception as e:
@@ -341,29 +596,35 @@ class BillingManager:
     def get_bill_details(bill_id: int) -> Optional[Dict[str, Any]]:
         """Get complete bill details"""
         try:
-            # Get bill header
-            bill = db.get_single_result(
-                """
+            header_query = """
                 SELECT b.*, s.staff_name, c.customer_name, c.phone_number
-                FROM bills b
+                FROM {schema}.bills b
                 LEFT JOIN staff s ON b.staff_id = s.staff_id
                 LEFT JOIN customers c ON b.customer_id = c.customer_id
                 WHERE b.bill_id = ?
-                """,
-                (bill_id,)
-            )
+            """
             
+            # Get bill header, falling back to the archive of a closed year
+            schema = 'main'
+            bill = db.get_single_result(header_query.format(schema=schema), (bill_id,))
             if not bill:
-                return None
+                schema = find_archived_bill(bill_id)
+                if not schema:
+                    return None
+                bill = db.get_single_result(header_query.format(schema=schema), (bill_id,))
+                if not bill:
+                    return None
             
             # Get bill items
             items = db.execute_query(
-                "SELECT * FROM bill_items WHERE bill_id = ? ORDER BY bill_item_id",
+                f"SELECT * FROM {schema}.bill_items WHERE bill_id = ? ORDER BY bill_item_id",
                 (bill_id,)
             )
             
+            bill = dict(bill)
+            bill['is_archived'] = schema != 'main'
             return {
-                'bill': dict(bill),
+                'bill': bill,
                 'items': [dict(item) for item in items]
             }
             
@@ -373,14 +634,14 @@ class BillingManager:
     
     @staticmethod
     def get_bills_by_date(date_from: str, date_to: str, staff_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get bills within date range"""
+        """Get bills within date range, including archived financial years"""
         query = """
             SELECT b.*, s.staff_name, c.customer_name,
             COUNT(bi.bill_item_id) as item_count
-            FROM bills b
+            FROM {schema}.bills b
             LEFT JOIN staff s ON b.staff_id = s.staff_id
             LEFT JOIN customers c ON b.customer_id = c.customer_id
-            LEFT JOIN bill_items bi ON b.bill_id = bi.bill_id
+            LEFT JOIN {schema}.bill_items bi ON b.bill_id = bi.bill_id
             WHERE DATE(b.bill_date) BETWEEN ? AND ?
             AND b.is_cancelled = 0
         """
@@ -393,40 +654,45 @@ class BillingManager:
         
         query += " GROUP BY b.bill_id ORDER BY b.bill_date DESC"
         
-        return [dict(row) for row in db.execute_query(query, params)]
+        bills = []
+        for schema in archive_sources(date_from, date_to):
+            bills.extend(dict(row) for row in db.execute_query(query.format(schema=schema), params))
+        
+        if len(bills) > 1:
+            bills.sort(key=lambda bill: bill['bill_date'], reverse=True)
+        return bills
     
     @staticmethod
     def cancel_bill(bill_id: int, staff_id: int) -> bool:
         """Cancel a bill and restore stock"""
         try:
-            # Get bill items to restore stock
-            items = db.execute_query("SELECT * FROM bill_items WHERE bill_id = ?", (bill_id,))
-            
-            for item in items:
-                # Restore stock
-                current_item = ItemsManager.get_item_by_id(item['item_id'])
-                if current_item:
-                    new_stock = current_item['stock_quantity'] + item['quantity']
-                    db.execute_update(
-                        "UPDATE items SET stock_quantity = ? WHERE item_id = ?",
-                        (new_stock, item['item_id'])
+            with db.transaction():
+                # Get bill items to restore stock
+                items = db.execute_query("SELECT * FROM bill_items WHERE bill_id = ?", (bill_id,))
+                
+                for item in items:
+                    # Restore stock relative to the current value
+                    restored = db.execute_update(
+                        "UPDATE items SET stock_quantity = stock_quantity + ? WHERE item_id = ?",
+                        (item['quantity'], item['item_id'])
                     )
                     
-                    # Log stock movement
-                    db.execute_insert(
-                        """
-                        INSERT INTO stock_movements 
-                        (item_id, movement_type, quantity, reference_type, reference_id, staff_id, notes)
-                        VALUES (?, 'IN', ?, 'BILL_CANCEL', ?, ?, 'Stock restored from cancelled bill')
-                        """,
-                        (item['item_id'], item['quantity'], bill_id, staff_id)
-                    )
-            
-            # Mark bill as cancelled
-            db.execute_update(
-                "UPDATE bills SET is_cancelled = 1 WHERE bill_id = ?",
-                (bill_id,)
-            )
+                    if restored:
+                        # Log stock movement
+                        db.execute_insert(
+                            """
+                            INSERT INTO stock_movements 
+                            (item_id, movement_type, quantity, reference_type, reference_id, staff_id, notes)
+                            VALUES (?, 'IN', ?, 'BILL_CANCEL', ?, ?, 'Stock restored from cancelled bill')
+                            """,
+                            (item['item_id'], item['quantity'], bill_id, staff_id)
+                        )
+                
+                # Mark bill as cancelled
+                db.execute_update(
+                    "UPDATE bills SET is_cancelled = 1 WHERE bill_id = ?",
+                    (bill_id,)
+                )
             
             return True
             
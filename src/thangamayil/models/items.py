@@ -5,6 +5,7 @@ Handles inventory operations, categories, and stock management
 
 from typing import List, Optional, Dict, Any
 from ..database.connection import db
+from ..diagnostics.metrics import timed
 
 
 class ItemsManager:
@@ -61,6 +62,7 @@ class ItemsManager:
         return dict(result) if result else None
     
     @staticmethod
+    @timed('get_item_by_barcode')
     def get_item_by_barcode(barcode: str) -> Optional[Dict[str, Any]]:
         """Get item by barcode"""
         result = db.get_single_result(
@@ -75,6 +77,7 @@ class ItemsManager:
         return dict(result) if result else None
     
     @staticmethod
+    @timed('search_items')
     def search_items(search_term: str) -> List[Dict[str, Any]]:
         """Search items by name or barcode"""
         search_pattern = f"%{search_term}%"
@@ -162,30 +165,32 @@ class ItemsManager:
                     staff_id: Optional[int] = None, notes: str = "") -> bool:
         """Update item stock and log movement"""
         try:
-            # Get current stock
-            current_item = ItemsManager.get_item_by_id(item_id)
-            if not current_item:
-                return False
-            
-            current_stock = current_item['stock_quantity']
-            change = new_quantity - current_stock
-            
-            # Update item stock
-            db.execute_update(
-                "UPDATE items SET stock_quantity = ?, modified_at = CURRENT_TIMESTAMP WHERE item_id = ?",
-                (new_quantity, item_id)
-            )
-            
-            # Log stock movement if there's a change
-            if change != 0:
-                db.execute_insert(
-                    """
-                    INSERT INTO stock_movements 
-                    (item_id, movement_type, quantity, reference_type, staff_id, notes)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (item_id, movement_type, change, "STOCK_ADJUSTMENT", staff_id, notes)
+            # Read and write under one write lock so sales on other terminals
+            # are not lost between the read and the update
+            with db.transaction():
+                current_item = ItemsManager.get_item_by_id(item_id)
+                if not current_item:
+                    return False
+                
+                current_stock = current_item['stock_quantity']
+                change = new_quantity - current_stock
+                
+                # Update item stock
+                db.execute_update(
+                    "UPDATE items SET stock_quantity = ?, modified_at = CURRENT_TIMESTAMP WHERE item_id = ?",
+                    (new_quantity, item_id)
                 )
+                
+                # Log stock movement if there's a change
+                if change != 0:
+                    db.execute_insert(
+                        """
+                        INSERT INTO stock_movements 
+                        (item_id, movement_type, quantity, reference_type, staff_id, notes)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        (item_id, movement_type, change, "STOCK_ADJUSTMENT", staff_id, notes)
+                    )
             
             return True
         except Exception as e:
@@ -196,32 +201,29 @@ class ItemsManager:
     def reduce_stock_for_sale(item_id: int, quantity: int, bill_id: int, staff_id: int) -> bool:
         """Reduce stock for sale and log movement"""
         try:
-            # Get current stock
-            current_item = ItemsManager.get_item_by_id(item_id)
-            if not current_item:
-                return False
-            
-            if current_item['stock_quantity'] < quantity:
-                print(f"Insufficient stock for item {item_id}")
-                return False
-            
-            new_stock = current_item['stock_quantity'] - quantity
-            
-            # Update stock
-            db.execute_update(
-                "UPDATE items SET stock_quantity = ?, modified_at = CURRENT_TIMESTAMP WHERE item_id = ?",
-                (new_stock, item_id)
-            )
-            
-            # Log movement
-            db.execute_insert(
-                """
-                INSERT INTO stock_movements 
-                (item_id, movement_type, quantity, reference_type, reference_id, staff_id)
-                VALUES (?, 'OUT', ?, 'BILL', ?, ?)
-                """,
-                (item_id, -quantity, bill_id, staff_id)
-            )
+            with db.transaction():
+                # Conditional update: never sells stock another terminal already sold
+                updated = db.execute_update(
+                    """
+                    UPDATE items SET stock_quantity = stock_quantity - ?, modified_at = CURRENT_TIMESTAMP
+                    WHERE item_id = ? AND stock_quantity >= ?
+                    """,
+                    (quantity, item_id, quantity)
+                )
+                if not updated:
+                    if ItemsManager.get_item_by_id(item_id):
+                        print(f"Insufficient stock for item {item_id}")
+                    return False
+                
+                # Log movement
+                db.execute_insert(
+                    """
+                    INSERT INTO stock_movements 
+                    (item_id, movement_type, quantity, reference_type, reference_id, staff_id)
+                    VALUES (?, 'OUT', ?, 'BILL', ?, ?)
+                    """,
+                    (item_id, -quantity, bill_id, staff_id)
+                )
             
             return True
         except Exception as e:
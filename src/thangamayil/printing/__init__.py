@@ -0,0 +1 @@
+"""Printing package for Thangamayil Billing Software"""
\ No newline at end of file
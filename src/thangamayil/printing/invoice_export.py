@@ -0,0 +1,461 @@
+"""
+Batch invoice PDF export
+Streams bills for a date range and renders A4 or thermal PDFs across a process pool
+"""
+
+import io
+import os
+import re
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+from ..database.connection import db
+from .receipt import (
+    PAPER_WIDTHS, get_receipt_template, get_receipt_paper, get_shop_settings,
+    build_receipt_data, format_bill_date
+)
+
+
+EXPORT_LAYOUTS = ('a4', 'thermal')
+
+# Bills fetched per query while streaming a date range
+FETCH_BATCH_SIZE = 500
+
+
+def invoice_filename(invoice_number: str) -> str:
+    """Safe PDF file name for an invoice"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(invoice_number)) + ".pdf"
+
+
+def _date_range_filter(date_from: str, date_to: str, include_cancelled: bool) -> Tuple[str, List[Any]]:
+    """WHERE clause for bills in a date range (index friendly on bill_date)"""
+    clause = "b.bill_date >= ? AND b.bill_date < DATE(?, '+1 day')"
+    params: List[Any] = [date_from, date_to]
+    if not include_cancelled:
+        clause += " AND b.is_cancelled = 0"
+    return clause, params
+
+
+def count_bills(date_from: str, date_to: str, include_cancelled: bool = False) -> int:
+    """Count printable (non-empty) bills in a date range"""
+    clause, params = _date_range_filter(date_from, date_to, include_cancelled)
+    result = db.get_single_result(
+        f"""
+        SELECT COUNT(*) AS bill_count FROM bills b
+        WHERE {clause}
+        AND EXISTS (SELECT 1 FROM bill_items bi WHERE bi.bill_id = b.bill_id)
+        """,
+        tuple(params)
+    )
+    return result['bill_count'] if result else 0
+
+
+def iter_bill_receipts(date_from: str, date_to: str, include_cancelled: bool = False,
+                       batch_size: int = FETCH_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Stream receipt data for every bill in a date range
+    Bills are paged by bill_id and their items fetched with one query per page
+    """
+    clause, params = _date_range_filter(date_from, date_to, include_cancelled)
+    shop = get_shop_settings()
+    last_bill_id = 0
+
+    while True:
+        bills = [dict(row) for row in db.execute_query(
+            f"""
+            SELECT b.*, c.customer_name, c.phone_number AS customer_phone
+            FROM bills b
+            LEFT JOIN customers c ON b.customer_id = c.customer_id
+            WHERE {clause} AND b.bill_id > ?
+            ORDER BY b.bill_id
+            LIMIT ?
+            """,
+            tuple(params + [last_bill_id, batch_size])
+        )]
+        if not bills:
+            break
+
+        last_bill_id = bills[-1]['bill_id']
+
+        # Fetch all lines for this page at once
+        lines_by_bill: Dict[int, List[Dict[str, Any]]] = {bill['bill_id']: [] for bill in bills}
+        placeholders = ", ".join("?" for _ in bills)
+        for row in db.execute_query(
+            f"""
+            SELECT bi.*, i.hsn_code
+            FROM bill_items bi
+            LEFT JOIN items i ON bi.item_id = i.item_id
+            WHERE bi.bill_id IN ({placeholders})
+            ORDER BY bi.bill_id, bi.bill_item_id
+            """,
+            tuple(bill['bill_id'] for bill in bills)
+        ):
+            lines_by_bill[row['bill_id']].append(dict(row))
+
+        for bill in bills:
+            lines = lines_by_bill[bill['bill_id']]
+            if not lines:
+                continue  # Empty bills cannot be printed
+            bill['is_interstate'] = (bill.get('igst_amount') or 0) > 0
+            yield build_receipt_data(bill, lines, shop)
+
+
+def render_thermal_pdf(receipt_data: Dict[str, Any], paper: str) -> bytes:
+    """Render a receipt as a narrow PDF page matching the thermal layout"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import mm
+
+    template = get_receipt_template(paper)
+    text_lines = template.render(receipt_data).split("\n")
+
+    page_width = (58 if template.line_width <= 32 else 80) * mm
+    margin = 3 * mm
+    # Courier glyphs are 0.6 em wide
+    font_size = (page_width - 2 * margin) / (0.6 * template.line_width)
+    leading = font_size * 1.25
+    page_height = len(text_lines) * leading + 2 * margin
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(page_width, page_height))
+    text = pdf.beginText(margin, page_height - margin - font_size)
+    text.setFont("Courier", font_size, leading)
+    for line in text_lines:
+        text.textLine(line)
+    pdf.drawText(text)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_a4_pdf(receipt_data: Dict[str, Any]) -> bytes:
+    """Render a receipt as an A4 tax invoice"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+
+    shop = receipt_data['shop']
+    bill = receipt_data['bill']
+    totals = receipt_data['totals']
+    page_width, page_height = A4
+    left = 15 * mm
+    right = page_width - 15 * mm
+
+    # Column x positions: (label, x, right aligned)
+    columns = [
+        ("#", left, False),
+        ("Item", left + 10 * mm, False),
+        ("HSN", left + 85 * mm, False),
+        ("Qty", left + 112 * mm, True),
+        ("Rate", left + 132 * mm, True),
+        ("Disc%", left + 148 * mm, True),
+        ("GST%", left + 163 * mm, True),
+        ("Amount", right, True)
+    ]
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle(f"Invoice {bill['invoice_number']}")
+
+    def draw_row(values, y, font="Helvetica", size=9):
+        pdf.setFont(font, size)
+        for (label, x, right_aligned), value in zip(columns, values):
+            if right_aligned:
+                pdf.drawRightString(x, y, value)
+            else:
+                pdf.drawString(x, y, value)
+
+    def draw_page_header():
+        y = page_height - 20 * mm
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawCentredString(page_width / 2, y, shop['shop_name'])
+        pdf.setFont("Helvetica", 9)
+        pdf.drawCentredString(page_width / 2, y - 5 * mm, shop['shop_address'])
+        pdf.drawCentredString(page_width / 2, y - 9 * mm, f"Ph: {shop['shop_phone']}  |  GSTIN: {shop['gstin']}")
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.drawCentredString(page_width / 2, y - 17 * mm, "TAX INVOICE")
+
+        y -= 26 * mm
+        pdf.setFont("Helvetica", 9)
+        pdf.drawString(left, y, f"Invoice: {bill['invoice_number']}")
+        pdf.drawRightString(right, y, f"Date: {format_bill_date(bill.get('bill_date'))}")
+        customer_name = bill.get('customer_name')
+        if customer_name:
+            y -= 5 * mm
+            customer = customer_name
+            if bill.get('customer_phone'):
+                customer += f" ({bill['customer_phone']})"
+            pdf.drawString(left, y, f"Customer: {customer}")
+        if bill.get('is_cancelled'):
+            pdf.setFont("Helvetica-Bold", 9)
+            pdf.drawRightString(right, y - 5 * mm, "CANCELLED")
+
+        y -= 10 * mm
+        draw_row([label for label, _, _ in columns], y, "Helvetica-Bold")
+        pdf.line(left, y - 2 * mm, right, y - 2 * mm)
+        return y - 7 * mm
+
+    y = draw_page_header()
+    for index, (line, calc) in enumerate(zip(receipt_data['lines'], totals['lines']), 1):
+        if y < 40 * mm:
+            pdf.showPage()
+            y = draw_page_header()
+        draw_row([
+            str(index),
+            str(line.get('item_name') or '')[:45],
+            str(line.get('hsn_code') or ''),
+            str(line['quantity']),
+            f"{float(line['unit_price'] or 0):.2f}",
+            f"{float(line.get('discount_percentage') or 0):.1f}",
+            f"{float(line.get('gst_percentage') or 0):.1f}",
+            f"{calc['line_total']:.2f}"
+        ], y)
+        y -= 5 * mm
+
+    # Totals block
+    pdf.line(left, y + 2 * mm, right, y + 2 * mm)
+    summary_rows = [
+        ("Subtotal", totals['gross_amount']),
+        ("Item Discount", -totals['item_discount']),
+        ("Bill Discount", -totals['discount_amount']),
+        ("CGST", totals['cgst_amount']),
+        ("SGST", totals['sgst_amount']),
+        ("IGST", totals['igst_amount']),
+        ("Round Off", totals['round_off'])
+    ]
+    pdf.setFont("Helvetica", 9)
+    for label, amount in summary_rows:
+        if abs(amount) < 0.005 and label != "Subtotal":
+            continue
+        y -= 5 * mm
+        pdf.drawString(right - 60 * mm, y, label)
+        pdf.drawRightString(right, y, f"{amount:.2f}")
+
+    y -= 7 * mm
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawString(right - 60 * mm, y, "Grand Total")
+    pdf.drawRightString(right, y, f"{totals['grand_total']:.2f}")
+    pdf.setFont("Helvetica", 9)
+    pdf.drawString(left, y, f"Payment: {bill.get('payment_mode') or 'CASH'}")
+
+    pdf.setFont("Helvetica-Oblique", 8)
+    pdf.drawCentredString(page_width / 2, 15 * mm, "This is a Computer Generated Invoice")
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_invoice_batch(batch: List[Tuple[str, Dict[str, Any]]], layout: str,
+                         paper: str) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """Render a batch of invoices; runs inside pool worker processes"""
+    results = []
+    for filename, receipt_data in batch:
+        try:
+            if layout == 'thermal':
+                pdf_bytes = render_thermal_pdf(receipt_data, paper)
+            else:
+                pdf_bytes = render_a4_pdf(receipt_data)
+            results.append((filename, pdf_bytes, None))
+        except Exception as e:
+            results.append((filename, None, str(e)))
+    return results
+
+
+class DirectoryOutput:
+    """Writes exported PDFs into a directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def exists(self, filename: str) -> bool:
+        """Check if an invoice was already exported"""
+        return os.path.exists(os.path.join(self.path, filename))
+
+    def write(self, filename: str, data: bytes):
+        """Write one PDF"""
+        # Write to a temp file first so an interrupted export never leaves a torn PDF
+        target = os.path.join(self.path, filename)
+        temp_path = target + ".part"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, target)
+
+    def close(self):
+        """Nothing to flush for directory output"""
+        pass
+
+
+# Zip local file header: signature, version, flags, method, time, date, crc, sizes, name and extra lengths
+ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+
+def read_zip_entries(path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Entries of a zip that was never closed (no central directory), read from
+    the local headers in order, stopping at the first incomplete entry
+    """
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(ZIP_LOCAL_HEADER.size)
+            if len(header) < ZIP_LOCAL_HEADER.size:
+                return
+            (signature, _, flags, method, _, _, crc, compressed_size, _,
+             name_length, extra_length) = ZIP_LOCAL_HEADER.unpack(header)
+            # Entries sized after their data, or whose header was never completed, cannot be read back
+            if (signature != b'PK\x03\x04' or flags & 0x08 or not compressed_size
+                    or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)):
+                return
+            name = f.read(name_length).decode('utf-8', 'replace')
+            f.read(extra_length)
+            data = f.read(compressed_size)
+            if len(data) < compressed_size:
+                return
+            try:
+                if method == zipfile.ZIP_DEFLATED:
+                    data = zlib.decompressobj(-15).decompress(data)
+            except zlib.error:
+                return
+            if zlib.crc32(data) != crc:
+                return
+            yield name, data
+
+
+class ZipOutput:
+    """
+    Writes exported PDFs into a zip archive
+    The archive is built as <name>.zip.part and renamed when closed; resuming
+    after a crash keeps every complete entry of the unfinished file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.temp_path = path + ".part"
+        if os.path.exists(self.temp_path):
+            if not zipfile.is_zipfile(self.temp_path):
+                self._recover()
+        elif os.path.exists(path):
+            os.replace(path, self.temp_path)  # appending to a finished export
+        try:
+            self.archive = zipfile.ZipFile(self.temp_path, 'a', compression=zipfile.ZIP_DEFLATED)
+        except zipfile.BadZipFile:
+            raise Exception(f"Cannot resume export: {path} is not a valid zip file")
+        self.names = set(self.archive.namelist())
+
+    def _recover(self):
+        """Rebuild an interrupted archive from its readable entries"""
+        broken_path = self.temp_path + ".broken"
+        os.replace(self.temp_path, broken_path)
+        with zipfile.ZipFile(self.temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, data in read_zip_entries(broken_path):
+                archive.writestr(name, data)
+        os.remove(broken_path)
+
+    def exists(self, filename: str) -> bool:
+        """Check if an invoice is already in the archive"""
+        return filename in self.names
+
+    def write(self, filename: str, data: bytes):
+        """Add one PDF to the archive"""
+        self.archive.writestr(filename, data)
+        self.names.add(filename)
+
+    def close(self):
+        """Write the zip central directory and put the archive in place"""
+        self.archive.close()
+        os.replace(self.temp_path, self.path)
+
+
+class InvoiceExporter:
+    """Exports every invoice in a date range as PDF files into a directory or zip"""
+
+    def __init__(self, output_path: str, layout: str = 'a4', paper: Optional[str] = None,
+                 workers: Optional[int] = None, chunk_size: int = 25,
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        if layout not in EXPORT_LAYOUTS:
+            raise ValueError(f"Unknown invoice layout: {layout}")
+        self.output_path = output_path
+        self.layout = layout
+        self.paper = paper if paper in PAPER_WIDTHS else get_receipt_paper()
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the export after the batches already in flight"""
+        self.cancelled = True
+
+    def open_output(self):
+        """Open the zip or directory output"""
+        if self.output_path.lower().endswith('.zip'):
+            return ZipOutput(self.output_path)
+        return DirectoryOutput(self.output_path)
+
+    def export(self, date_from: str, date_to: str, include_cancelled: bool = False) -> Dict[str, Any]:
+        """
+        Export invoices and return counts
+        Invoices already present in the output are skipped, so a rerun resumes
+        """
+        stats = {'total': count_bills(date_from, date_to, include_cancelled),
+                 'exported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        output = self.open_output()
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        pending = set()
+
+        def report_progress():
+            if self.progress_callback:
+                self.progress_callback(stats['exported'] + stats['skipped'] + stats['failed'], stats['total'])
+
+        def collect(results):
+            for filename, pdf_bytes, error in results:
+                if error:
+                    stats['failed'] += 1
+                    stats['errors'].append(f"{filename}: {error}")
+                else:
+                    output.write(filename, pdf_bytes)
+                    stats['exported'] += 1
+            report_progress()
+
+        def submit(batch):
+            if executor is None:
+                collect(render_invoice_batch(batch, self.layout, self.paper))
+                return
+            # Keep a bounded number of batches in flight so memory stays flat
+            while len(pending) >= self.workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    collect(future.result())
+            pending.add(executor.submit(render_invoice_batch, batch, self.layout, self.paper))
+
+        try:
+            batch = []
+            for receipt_data in iter_bill_receipts(date_from, date_to, include_cancelled):
+                if self.cancelled:
+                    break
+
+                filename = invoice_filename(receipt_data['bill']['invoice_number'])
+                if output.exists(filename):
+                    stats['skipped'] += 1
+                    continue
+
+                batch.append((filename, receipt_data))
+                if len(batch) >= self.chunk_size:
+                    submit(batch)
+                    batch = []
+
+            if batch and not self.cancelled:
+                submit(batch)
+
+            for future in pending:
+                collect(future.result())
+            report_progress()
+
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            output.close()
+
+        return stats
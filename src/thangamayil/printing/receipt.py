@@ -0,0 +1,300 @@
+"""
+Receipt template engine
+Renders thermal receipts from one bill data structure for preview, print and reprint
+"""
+
+import textwrap
+from functools import lru_cache
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from ..database.connection import db
+from ..diagnostics.metrics import timed
+from ..models.billing import GSTCalculator
+
+
+# Characters per line for supported thermal paper widths
+PAPER_WIDTHS = {
+    '58mm': 32,
+    '80mm': 48,
+    '4in': 64
+}
+
+DEFAULT_PAPER = '4in'
+
+# Shop settings printed in the receipt header, with their fallback values
+SHOP_SETTINGS = {
+    'shop_name': 'தங்கமயில் சில்க்ஸ்',
+    'shop_address': 'No.1 Main Road, Tamil Nadu, IN',
+    'shop_phone': '+91-9876543210',
+    'gstin': '33AAACT9454F1ZB'
+}
+
+
+class ReceiptTemplate:
+    """Receipt layout compiled once per paper width"""
+
+    def __init__(self, line_width: int):
+        self.line_width = line_width
+        self.double_rule = "=" * line_width
+        self.single_rule = "-" * line_width
+
+        # Wide paper keeps HSN and GST% in the item row, narrow paper moves them below
+        self.inline_tax = line_width >= 48
+        if self.inline_tax:
+            # Item(24) + HSN(8) + GST%(6) + Qty(5) + Rate(7) + Total(8) on 4 inch paper
+            self.name_width = min(24, line_width - 34)
+            self.item_format = (
+                "{name:<%d}{hsn:<8}{gst:>6}{qty:>5}{rate:>7}{total:>8}" % self.name_width
+            )
+        else:
+            # Item + Qty(4) + Rate(7) + Total(9) on 58mm paper
+            self.name_width = line_width - 20
+            self.item_format = "{name:<%d}{qty:>4}{rate:>7}{total:>9}" % self.name_width
+
+        self.item_header = self.item_format.format(
+            name='Item', hsn='HSN', gst='GST%', qty='Qty', rate='Rate', total='Total'
+        )
+
+        # Static blocks are built once and reused for every receipt
+        self.title_block = [
+            self.double_rule,
+            *self.centered("*** TAX INVOICE ***"),
+            *self.centered("(GST Compliant Bill)"),
+            self.double_rule
+        ]
+        self.preview_title_block = [
+            self.double_rule,
+            *self.centered("*** TAX INVOICE (PREVIEW) ***"),
+            *self.centered("(GST Compliant Bill)"),
+            self.double_rule
+        ]
+        self.items_header_block = [self.single_rule, self.item_header, self.single_rule]
+        self.summary_header_block = [
+            self.double_rule,
+            *self.centered("BILL SUMMARY"),
+            self.double_rule
+        ]
+        self.gst_header_block = [
+            self.single_rule,
+            *self.centered("GST BREAKDOWN"),
+            self.single_rule
+        ]
+        self.footer_block = [
+            "",
+            "",
+            *self.centered("*** TERMS & CONDITIONS ***"),
+            *self.centered("This is a Computer Generated Invoice"),
+            *self.centered("Subject to Local Jurisdiction"),
+            *self.centered("No Exchange | No Refund"),
+            "",
+            *self.centered("Thank you for shopping with us!"),
+            self.single_rule,
+            "",
+            ""  # Extra lines for paper cutting
+        ]
+        self.preview_footer_block = [
+            "",
+            *self.centered("***** PREVIEW MODE *****"),
+            *self.centered("This is a preview only"),
+            *self.centered("Thank you for shopping with us!"),
+            "",
+            self.single_rule
+        ]
+
+    def centered(self, text: str) -> List[str]:
+        """Center text on the paper, wrapping lines that are too wide"""
+        return [line.center(self.line_width) for line in textwrap.wrap(text, self.line_width)] or [""]
+
+    def amount_row(self, label: str, value: str) -> str:
+        """Format a label with a right-aligned amount"""
+        return f"{label}{value.rjust(self.line_width - len(label))}"
+
+    @timed('render_receipt')
+    def render(self, data: Dict[str, Any], preview: bool = False) -> str:
+        """Render receipt text from bill data in a single pass over the lines"""
+        shop = data['shop']
+        bill = data['bill']
+        totals = data['totals']
+
+        # Header
+        bill_lines = [self.double_rule]
+        bill_lines.extend(self.centered(shop['shop_name']))
+        bill_lines.extend(self.centered(shop['shop_address']))
+        bill_lines.extend(self.centered(f"Ph: {shop['shop_phone']}"))
+        bill_lines.extend(self.centered(f"GSTIN: {shop['gstin']}"))
+        bill_lines.extend(self.preview_title_block if preview else self.title_block)
+
+        # Bill details
+        bill_lines.append(f"Invoice: {bill['invoice_number']}")
+        bill_lines.append(f"Date: {format_bill_date(bill.get('bill_date'))}")
+
+        customer_name = bill.get('customer_name')
+        if customer_name and customer_name != "Walk-in Customer":
+            bill_lines.append(f"Customer: {customer_name}")
+            if bill.get('customer_phone'):
+                bill_lines.append(f"Phone: {bill['customer_phone']}")
+
+        bill_lines.extend(self.items_header_block)
+
+        # Items
+        name_width = self.name_width
+        for line, calc in zip(data['lines'], totals['lines']):
+            item_name = str(line.get('item_name') or 'Unknown Item')
+            if len(item_name) > name_width:
+                item_name = item_name[:name_width - 3] + "..."
+
+            hsn_code = str(line.get('hsn_code') or '')
+            gst_percentage = float(line.get('gst_percentage') or 0)
+
+            bill_lines.append(self.item_format.format(
+                name=item_name,
+                hsn=hsn_code[:8],
+                gst=f"{gst_percentage:.1f}%",
+                qty=str(line['quantity']),
+                rate=f"{float(line['unit_price'] or 0):.0f}",
+                total=f"{calc['line_total']:.0f}"
+            ))
+
+            if not self.inline_tax and (hsn_code or gst_percentage > 0):
+                bill_lines.append(f"  HSN: {hsn_code or '-'}  GST: {gst_percentage:.1f}%")
+
+            # Add discount info if applicable (on separate line)
+            discount_percentage = float(line.get('discount_percentage') or 0)
+            if discount_percentage > 0:
+                bill_lines.append(f"  Disc: {discount_percentage:.1f}% = -{calc['discount_amount']:.0f}")
+
+        bill_lines.extend(self.summary_header_block)
+
+        # Subtotal and discounts section
+        bill_lines.append(self.amount_row("Subtotal:", str(int(totals['gross_amount']))))
+
+        if totals['item_discount'] > 0:
+            bill_lines.append(self.amount_row("Item Disc:", '-' + str(int(totals['item_discount']))))
+
+        if totals['discount_amount'] > 0:
+            bill_lines.append(self.amount_row("Bill Disc:", '-' + str(int(totals['discount_amount']))))
+
+        # GST breakdown
+        cgst_amount = totals['cgst_amount']
+        sgst_amount = totals['sgst_amount']
+        igst_amount = totals['igst_amount']
+        taxable_amount = totals['subtotal'] - totals['discount_amount']
+
+        if cgst_amount > 0 or igst_amount > 0:
+            bill_lines.extend(self.gst_header_block)
+
+        if cgst_amount > 0:
+            # Average rate for display (CGST = SGST)
+            cgst_rate = (cgst_amount / (taxable_amount / 100)) if taxable_amount > 0 else 0
+            bill_lines.append(self.amount_row(f"CGST@{cgst_rate:.1f}%:", str(int(cgst_amount))))
+            bill_lines.append(self.amount_row(f"SGST@{cgst_rate:.1f}%:", str(int(sgst_amount))))
+
+        if igst_amount > 0:
+            igst_rate = (igst_amount / (taxable_amount / 100)) if taxable_amount > 0 else 0
+            bill_lines.append(self.amount_row(f"IGST@{igst_rate:.1f}%:", str(int(igst_amount))))
+
+        # Round off section
+        round_off = totals['round_off']
+        if abs(round_off) >= 0.005:
+            bill_lines.append(self.single_rule)
+            sign = "+" if round_off > 0 else ""
+            bill_lines.append(self.amount_row("Round Off:", f"{sign}{round_off:.2f}"))
+
+        # Final total section
+        bill_lines.append(self.double_rule)
+        bill_lines.append(self.amount_row("TOTAL:", str(int(totals['grand_total']))))
+        bill_lines.append(self.double_rule)
+
+        # Payment info
+        bill_lines.append(f"Payment: {bill.get('payment_mode') or 'CASH'}")
+        bill_lines.extend(self.preview_footer_block if preview else self.footer_block)
+
+        return "\n".join(bill_lines)
+
+
+@lru_cache(maxsize=None)
+def get_receipt_template(paper: str = DEFAULT_PAPER) -> ReceiptTemplate:
+    """Get the compiled receipt template for a paper width (cached)"""
+    return ReceiptTemplate(PAPER_WIDTHS.get(paper, PAPER_WIDTHS[DEFAULT_PAPER]))
+
+
+def get_receipt_paper() -> str:
+    """Get the configured receipt paper width"""
+    try:
+        paper = db.get_setting('receipt_paper_width')
+    except Exception:
+        paper = None
+    return paper if paper in PAPER_WIDTHS else DEFAULT_PAPER
+
+
+def format_bill_date(bill_date: Optional[str]) -> str:
+    """Format a stored bill timestamp for the receipt"""
+    if not bill_date:
+        return datetime.now().strftime('%d-%m-%Y %H:%M')
+    try:
+        return datetime.strptime(str(bill_date)[:19], '%Y-%m-%d %H:%M:%S').strftime('%d-%m-%Y %H:%M')
+    except ValueError:
+        return str(bill_date)
+
+
+def get_shop_settings() -> Dict[str, str]:
+    """Get receipt header settings in one query"""
+    shop = dict(SHOP_SETTINGS)
+    placeholders = ", ".join("?" for _ in SHOP_SETTINGS)
+    for row in db.execute_query(
+        f"SELECT setting_key, setting_value FROM settings WHERE setting_key IN ({placeholders})",
+        tuple(SHOP_SETTINGS)
+    ):
+        if row['setting_value']:
+            shop[row['setting_key']] = row['setting_value']
+    return shop
+
+
+def build_receipt_data(bill: Dict[str, Any], lines: List[Dict[str, Any]],
+                       shop: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Build the receipt data structure from a bill header and its lines
+    Totals come from GSTCalculator so preview, print and reprint agree
+    """
+    totals = GSTCalculator.calculate_bill_summary(
+        lines,
+        float(bill.get('discount_percentage') or 0),
+        bool(bill.get('is_interstate'))
+    )
+    return {
+        'shop': shop if shop is not None else get_shop_settings(),
+        'bill': bill,
+        'lines': lines,
+        'totals': totals
+    }
+
+
+def load_receipt_data(bill_id: int) -> Optional[Dict[str, Any]]:
+    """Load a saved bill from the database as receipt data"""
+    header = db.get_single_result(
+        """
+        SELECT b.*, c.customer_name, c.phone_number AS customer_phone
+        FROM bills b
+        LEFT JOIN customers c ON b.customer_id = c.customer_id
+        WHERE b.bill_id = ?
+        """,
+        (bill_id,)
+    )
+    if not header:
+        return None
+
+    bill = dict(header)
+    bill['is_interstate'] = (bill.get('igst_amount') or 0) > 0
+
+    lines = [dict(row) for row in db.execute_query(
+        """
+        SELECT bi.*, i.hsn_code
+        FROM bill_items bi
+        LEFT JOIN items i ON bi.item_id = i.item_id
+        WHERE bi.bill_id = ?
+        ORDER BY bi.bill_item_id
+        """,
+        (bill_id,)
+    )]
+
+    return build_receipt_data(bill, lines)
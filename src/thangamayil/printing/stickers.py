@@ -0,0 +1,324 @@
+"""
+Barcode sticker sheets
+Renders real barcode images onto N-up label sheets as multi-page PDFs
+"""
+
+import io
+import os
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Sequence
+from ..database.connection import db
+
+
+MM = 72 / 25.4  # PDF points per millimetre
+
+# Largest sticker job accepted from the UI
+MAX_STICKERS = 2000
+
+
+class StickerSheet:
+    """Page and label geometry for an N-up sticker sheet (millimetres)"""
+
+    def __init__(self, name: str, page_width: float, page_height: float,
+                 columns: int, rows: int, label_width: float, label_height: float,
+                 gap_x: float = 2, gap_y: float = 0):
+        self.name = name
+        self.page_width = page_width
+        self.page_height = page_height
+        self.columns = columns
+        self.rows = rows
+        self.label_width = label_width
+        self.label_height = label_height
+        self.gap_x = gap_x
+        self.gap_y = gap_y
+
+        # Labels are centred on the page
+        used_width = columns * label_width + (columns - 1) * gap_x
+        used_height = rows * label_height + (rows - 1) * gap_y
+        self.margin_left = (page_width - used_width) / 2
+        self.margin_top = (page_height - used_height) / 2
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    def label_origin(self, slot: int):
+        """Bottom-left corner of a label slot in points"""
+        row, column = divmod(slot, self.columns)
+        x = self.margin_left + column * (self.label_width + self.gap_x)
+        top = self.margin_top + row * (self.label_height + self.gap_y)
+        y = self.page_height - top - self.label_height
+        return x * MM, y * MM
+
+
+# Roll layouts print one row per page on the 4 inch thermal label printer,
+# A4 layouts match common pre-cut sticker sheets
+STICKER_SHEETS = {
+    'roll_3up': StickerSheet("4in Roll - 3 across (32 x 25 mm)", 101.6, 25, 3, 1, 32, 25),
+    'roll_2up': StickerSheet("4in Roll - 2 across (48 x 25 mm)", 101.6, 25, 2, 1, 48, 25),
+    'roll_1up': StickerSheet("4in Roll - 1 across (96 x 38 mm)", 101.6, 38, 1, 1, 96, 38),
+    'a4_65': StickerSheet("A4 Sheet - 65 labels (38.1 x 21.2 mm)", 210, 297, 5, 13, 38.1, 21.2, 2.5, 0),
+    'a4_40': StickerSheet("A4 Sheet - 40 labels (48.5 x 25.4 mm)", 210, 297, 4, 10, 48.5, 25.4, 2, 2),
+    'a4_24': StickerSheet("A4 Sheet - 24 labels (70 x 37 mm)", 210, 297, 3, 8, 70, 37, 0, 0)
+}
+
+DEFAULT_SHEET = 'roll_2up'
+
+# Fonts with Tamil glyphs, used for the store name when available
+TAMIL_FONT_CANDIDATES = [
+    r"C:\Windows\Fonts\Nirmala.ttf",
+    r"C:\Windows\Fonts\latha.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansTamil-Regular.ttf",
+    "/usr/share/fonts/truetype/lohit-tamil/Lohit-Tamil.ttf"
+]
+
+
+def get_sticker_sheet(sheet: str) -> StickerSheet:
+    """Get a sticker sheet layout by key"""
+    return STICKER_SHEETS.get(sheet, STICKER_SHEETS[DEFAULT_SHEET])
+
+
+def is_valid_ean13(code: str) -> bool:
+    """Check an EAN-13 code including its check digit"""
+    if len(code) != 13 or not code.isdigit():
+        return False
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(code[:12]))
+    return (10 - total % 10) % 10 == int(code[12])
+
+
+def barcode_symbology(code: str) -> str:
+    """EAN-13 for valid retail codes, CODE128 for everything else"""
+    return 'ean13' if is_valid_ean13(code) else 'code128'
+
+
+@lru_cache(maxsize=512)
+def barcode_png(code: str) -> bytes:
+    """
+    Render a barcode as PNG bytes (cached per barcode)
+    The human readable text is drawn on the sticker, not in the image
+    """
+    from barcode import get as get_barcode
+    from barcode.writer import ImageWriter
+
+    image = get_barcode(barcode_symbology(code), code, writer=ImageWriter()).render({
+        'write_text': False,
+        'module_width': 0.2,
+        'module_height': 10,
+        'quiet_zone': 1,
+        'dpi': 300
+    })
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_label_font() -> str:
+    """Register a Tamil capable font once, falling back to Helvetica"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    for path in TAMIL_FONT_CANDIDATES:
+        if os.path.exists(path):
+            try:
+                pdfmetrics.registerFont(TTFont('StickerTamil', path))
+                return 'StickerTamil'
+            except Exception:
+                continue
+    return 'Helvetica'
+
+
+def expand_labels(labels: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield one label per sticker, repeating each label by its quantity"""
+    for label in labels:
+        for _ in range(int(label.get('quantity') or 1)):
+            yield label
+
+
+def get_store_name() -> str:
+    """Store name printed on stickers"""
+    return db.get_setting('shop_name') or 'தங்கமயில் சில்க்ஸ்'
+
+
+def _item_labels(query: str, params: tuple, store_name: Optional[str]) -> List[Dict[str, Any]]:
+    """Run one label query and attach the store name"""
+    store_name = store_name or get_store_name()
+    return [
+        {'item_id': row['item_id'], 'store_name': store_name, 'item_name': row['item_name'],
+         'barcode': row['barcode'], 'mrp': row['price'], 'quantity': row['quantity']}
+        for row in db.execute_query(query, params)
+        if row['quantity'] > 0
+    ]
+
+
+def labels_for_category(category_id: int, quantity: int = 1,
+                        store_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Label job for every active item with a barcode in a category"""
+    return _item_labels(
+        """
+        SELECT item_id, item_name, barcode, price, ? AS quantity
+        FROM items
+        WHERE category_id = ? AND is_active = 1 AND barcode IS NOT NULL AND barcode != ''
+        ORDER BY item_name
+        """,
+        (quantity, category_id),
+        store_name
+    )
+
+
+def labels_for_items(item_ids: Sequence[int], quantity: int = 1,
+                     store_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Label job for a list of items, in the order given"""
+    if not item_ids:
+        return []
+    placeholders = ", ".join("?" for _ in item_ids)
+    labels = _item_labels(
+        f"""
+        SELECT item_id, item_name, barcode, price, ? AS quantity
+        FROM items
+        WHERE item_id IN ({placeholders}) AND barcode IS NOT NULL AND barcode != ''
+        """,
+        (quantity, *item_ids),
+        store_name
+    )
+    position = {item_id: index for index, item_id in enumerate(item_ids)}
+    labels.sort(key=lambda label: position[label['item_id']])
+    return labels
+
+
+def labels_for_goods_receipt(date_from: str, date_to: str, notes: Optional[str] = None,
+                             store_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Label job for stock received in a date range
+    One sticker per unit received: positive stock movements, excluding stock
+    restored from cancelled bills, summed per item. notes narrows the receipt
+    to movements whose notes contain the text (e.g. a consignment number).
+    """
+    query = """
+        SELECT i.item_id, i.item_name, i.barcode, i.price, SUM(sm.quantity) AS quantity
+        FROM stock_movements sm
+        JOIN items i ON sm.item_id = i.item_id
+        WHERE sm.quantity > 0
+        AND COALESCE(sm.reference_type, '') != 'BILL_CANCEL'
+        AND sm.movement_date >= ? AND sm.movement_date < DATE(?, '+1 day')
+        AND i.barcode IS NOT NULL AND i.barcode != ''
+    """
+    params: List[Any] = [date_from, date_to]
+    if notes:
+        query += " AND sm.notes LIKE ?"
+        params.append(f"%{notes}%")
+    query += " GROUP BY i.item_id ORDER BY i.item_name"
+    return _item_labels(query, tuple(params), store_name)
+
+
+def _fit_text(pdf, text: str, font: str, size: float, width: float) -> str:
+    """Truncate text to fit a width"""
+    if pdf.stringWidth(text, font, size) <= width:
+        return text
+    while text and pdf.stringWidth(text + "...", font, size) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def _draw_label(pdf, sheet: StickerSheet, label: Dict[str, Any]):
+    """Draw one label at the origin of the current form"""
+    from reportlab.lib.utils import ImageReader
+
+    width = sheet.label_width * MM
+    height = sheet.label_height * MM
+    padding = 1.5 * MM
+    inner_width = width - 2 * padding
+
+    # Font sizes scale with label height (25 mm is the reference sticker)
+    scale = min(sheet.label_height / 25, 1.4)
+    small = 5.5 * scale
+    large = 7.5 * scale
+
+    store_font = get_label_font()
+    y = height - padding - small
+    store_name = _fit_text(pdf, str(label.get('store_name') or ''), store_font, small, inner_width)
+    pdf.setFont(store_font, small)
+    pdf.drawCentredString(width / 2, y, store_name)
+
+    y -= small + 0.5 * MM
+    item_font = store_font if store_font != 'Helvetica' else 'Helvetica-Bold'
+    item_name = _fit_text(pdf, str(label.get('item_name') or ''), item_font, small, inner_width)
+    pdf.setFont(item_font, small)
+    pdf.drawCentredString(width / 2, y, item_name)
+
+    # Barcode fills the space between the names and the MRP line
+    code = str(label['barcode'])
+    bottom = padding + large + small + 1 * MM
+    bar_top = y - 1 * MM
+    bar_height = max(bar_top - bottom, 4 * MM)
+    pdf.drawImage(ImageReader(io.BytesIO(barcode_png(code))), padding, bottom,
+                  width=inner_width, height=bar_height, preserveAspectRatio=True)
+
+    pdf.setFont('Helvetica', small)
+    pdf.drawCentredString(width / 2, bottom - small, code)
+
+    mrp = label.get('mrp')
+    if mrp not in (None, ''):
+        pdf.setFont('Helvetica-Bold', large)
+        pdf.drawCentredString(width / 2, padding, f"MRP: Rs. {float(mrp):.2f}")
+
+
+def render_sticker_pdf(labels: Iterable[Dict[str, Any]], output, sheet: str = DEFAULT_SHEET,
+                       total: Optional[int] = None,
+                       progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                       cancel_check: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Render stickers onto sheet pages and write a single PDF
+
+    labels: dicts with store_name, item_name, barcode, mrp and quantity,
+    consumed lazily so large jobs never hold the expanded sticker list.
+    Each distinct label is drawn once as a PDF form and placed by reference,
+    so pages only carry positions and the barcode image is embedded once.
+    output: file path or binary file object
+    Returns the number of stickers written
+    """
+    from reportlab.pdfgen import canvas
+
+    layout = get_sticker_sheet(sheet)
+    pdf = canvas.Canvas(output, pagesize=(layout.page_width * MM, layout.page_height * MM))
+    pdf.setTitle("Barcode Stickers")
+
+    forms = {}
+    slot = 0
+    written = 0
+
+    for label in expand_labels(labels):
+        if cancel_check and cancel_check():
+            break
+
+        key = (label.get('store_name'), label.get('item_name'), str(label['barcode']), label.get('mrp'))
+        form_name = forms.get(key)
+        if form_name is None:
+            form_name = f"label{len(forms)}"
+            pdf.beginForm(form_name, 0, 0, layout.label_width * MM, layout.label_height * MM)
+            _draw_label(pdf, layout, label)
+            pdf.endForm()
+            forms[key] = form_name
+
+        if slot == layout.per_page:
+            pdf.showPage()
+            slot = 0
+            if progress_callback:
+                progress_callback(written, total)
+
+        x, y = layout.label_origin(slot)
+        pdf.saveState()
+        pdf.translate(x, y)
+        pdf.doForm(form_name)
+        pdf.restoreState()
+
+        slot += 1
+        written += 1
+
+    if written:
+        pdf.showPage()
+    pdf.save()
+
+    if progress_callback:
+        progress_callback(written, total)
+    return written
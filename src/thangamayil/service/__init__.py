@@ -0,0 +1 @@
+"""Billing service package for Thangamayil Billing Software"""
\ No newline at end of file
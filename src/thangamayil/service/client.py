@@ -0,0 +1,181 @@
+"""
+Billing service client
+Points a terminal (GUI or console) at a billing service instead of opening
+the database file directly
+"""
+
+import functools
+import http.client
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Sequence
+from urllib.parse import urlsplit
+from ..database.connection import db
+from ..models.auth import auth, StaffManager
+from ..models.billing import BillingManager
+from ..models.items import ItemsManager
+
+
+SERVICE_URL_ENV = "THANGAMAYIL_SERVICE_URL"
+SERVICE_TOKEN_ENV = "THANGAMAYIL_SERVICE_TOKEN"
+
+# Managers whose calls are sent to the service as a whole operation
+ROUTED_MANAGERS = {
+    'BillingManager': BillingManager,
+    'ItemsManager': ItemsManager,
+    'StaffManager': StaffManager
+}
+
+
+def service_url_from_args(argv: Sequence[str]) -> Optional[str]:
+    """Service URL from --service URL on the command line or the environment"""
+    argv = list(argv)
+    if '--service' in argv:
+        index = argv.index('--service')
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return os.environ.get(SERVICE_URL_ENV) or None
+
+
+class RemoteRow:
+    """Row returned by the service, readable by column name or index like sqlite3.Row"""
+
+    __slots__ = ('_data', '_values')
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        self._values = list(data.values())
+
+    def keys(self) -> List[str]:
+        return list(self._data.keys())
+
+    def __getitem__(self, key):
+        return self._values[key] if isinstance(key, int) else self._data[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class ServiceClient:
+    """HTTP/JSON client for the billing service (one kept-alive connection per thread)"""
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 30):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None) -> Dict[str, Any]:
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-Service-Token'] = self.token
+
+        # A kept-alive connection may have been closed by the service; retry once
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self._local.connection = connection
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                payload = json.loads(response.read() or b'{}')
+                break
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise Exception(f"Billing service unavailable at {self.url}: {e}")
+
+        if response.status != 200 or 'error' in payload:
+            raise Exception(payload.get('error') or f"Billing service error (HTTP {response.status})")
+        return payload
+
+    def call(self, target: str, method: str, *args, **kwargs) -> Any:
+        """Run one operation on the service and return its result"""
+        body = json.dumps({'target': target, 'method': method, 'args': args, 'kwargs': kwargs},
+                          default=str).encode('utf-8')
+        return self._request('POST', '/call', body)['result']
+
+    def health(self) -> Dict[str, Any]:
+        """Service status and group commit counters"""
+        return self._request('GET', '/health')
+
+    # DatabaseConnection delegates here while db.remote is set
+
+    def execute_query(self, query: str, params: Sequence[Any] = ()) -> List[RemoteRow]:
+        return [RemoteRow(row) for row in self.call('Database', 'execute_query', query, list(params))]
+
+    def execute_update(self, query: str, params: Sequence[Any] = ()) -> int:
+        if getattr(self._local, 'in_transaction', False):
+            raise Exception("Writes cannot run inside a remote transaction; use a manager operation")
+        return self.call('Database', 'execute_update', query, list(params))
+
+    def execute_insert(self, query: str, params: Sequence[Any] = ()) -> int:
+        if getattr(self._local, 'in_transaction', False):
+            raise Exception("Writes cannot run inside a remote transaction; use a manager operation")
+        return self.call('Database', 'execute_insert', query, list(params))
+
+    @contextmanager
+    def transaction(self):
+        """
+        Each call runs in its own transaction on the service, so writes that
+        must commit together belong in one manager operation instead
+        """
+        if getattr(self._local, 'in_transaction', False):
+            yield
+            return
+
+        self._local.in_transaction = True
+        try:
+            yield
+        finally:
+            self._local.in_transaction = False
+
+
+def _routed(client: ServiceClient, target: str, name: str, function):
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        return client.call(target, name, *args, **kwargs)
+    return call
+
+
+def connect_to_service(url: str, token: Optional[str] = None) -> ServiceClient:
+    """
+    Send this process's database work to a billing service
+
+    Manager operations run on the service as single calls; other queries
+    made through db are forwarded statement by statement. Backups,
+    archiving and maintenance stay with the service machine.
+    """
+    client = ServiceClient(url, token or os.environ.get(SERVICE_TOKEN_ENV))
+    client.health()
+
+    db.disconnect()
+    db.remote = client
+
+    for target, manager in ROUTED_MANAGERS.items():
+        for name, member in list(vars(manager).items()):
+            if isinstance(member, staticmethod) and not name.startswith('_'):
+                setattr(manager, name, staticmethod(_routed(client, target, name, member.__func__)))
+
+    def login(staff_name: str, password: str) -> bool:
+        """Check credentials on the service; the session stays on this terminal"""
+        try:
+            staff = client.call('AuthManager', 'login', staff_name, password)
+        except Exception as e:
+            print(f"Login error: {e}")
+            return False
+        auth.current_staff = staff
+        return staff is not None
+
+    auth.login = login
+    return client
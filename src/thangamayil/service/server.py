@@ -0,0 +1,315 @@
+"""
+Local billing service
+Owns the database and runs BillingManager, ItemsManager, StaffManager and
+AuthManager operations for every terminal over HTTP/JSON, committing writes in groups
+"""
+
+import hmac
+import ipaddress
+import json
+import queue
+import sqlite3
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, List, Tuple
+from ..database.connection import db, DatabaseConnection
+from ..models.auth import AuthManager, StaffManager
+from ..models.billing import BillingManager
+from ..models.items import ItemsManager
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# After the first queued call, wait this long for more to share its commit
+GROUP_COMMIT_WINDOW = 0.002
+MAX_GROUP_SIZE = 64
+
+# Managers whose public static methods terminals may call
+SERVICE_MANAGERS = {
+    'BillingManager': BillingManager,
+    'ItemsManager': ItemsManager,
+    'StaffManager': StaffManager
+}
+
+DATABASE_METHODS = ('execute_query', 'execute_update', 'execute_insert')
+
+# SQL sent by terminals may read any table (staff password hashes read as
+# NULL) and write only the tables the billing screens edit directly;
+# everything else goes through the managers
+REMOTE_WRITABLE_TABLES = ('bills', 'bill_items', 'customers')
+REMOTE_HIDDEN_COLUMNS = (('staff', 'password_hash'),)
+
+# Calls that never write; a group made only of these skips the write lock
+READ_ONLY_PREFIXES = ('get_', 'search_', 'barcode_exists', 'generate_invoice_number', 'execute_query')
+
+
+def is_loopback(host: str) -> bool:
+    """True when an address only accepts connections from this computer"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def remote_sql_authorizer(thread_id: int, writable: bool):
+    """SQLite authorizer limiting SQL sent by terminals, for statements prepared on thread_id"""
+
+    def authorize(action, arg1, arg2, schema, trigger):
+        # Other threads and trigger bodies (change_log, stock counters) are not terminal SQL
+        if threading.get_ident() != thread_id or trigger is not None:
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_READ:
+            return sqlite3.SQLITE_IGNORE if (arg1, arg2) in REMOTE_HIDDEN_COLUMNS else sqlite3.SQLITE_OK
+        if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+            return sqlite3.SQLITE_OK
+        if (writable and action in (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE)
+                and arg1 in REMOTE_WRITABLE_TABLES):
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    return authorize
+
+
+def to_json_value(value):
+    """Convert rows (and rows nested in results) to plain JSON types"""
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    return value
+
+
+class ServiceCall:
+    """One queued request waiting for the writer thread"""
+
+    def __init__(self, target: str, method: str, args: List[Any], kwargs: Dict[str, Any]):
+        self.target = target
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    @property
+    def read_only(self) -> bool:
+        return self.method.startswith(READ_ONLY_PREFIXES)
+
+
+class BillingService:
+    """
+    Billing service owning one database connection
+
+    HTTP handler threads only queue calls; a single writer thread runs them.
+    Calls arriving together are run in one transaction and committed once
+    (group commit), each inside its own savepoint so one failing call does
+    not undo the others.
+    """
+
+    def __init__(self, database: Optional[DatabaseConnection] = None,
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, token: Optional[str] = None,
+                 group_window: float = GROUP_COMMIT_WINDOW, max_group_size: int = MAX_GROUP_SIZE):
+        self.database = database or db
+        self.host = host
+        self.port = port
+        self.token = token
+        self.group_window = group_window
+        self.max_group_size = max_group_size
+        self.stats = {'calls': 0, 'groups': 0, 'commits': 0, 'largest_group': 0}
+        self.last_request = time.monotonic()
+        self._calls: "queue.Queue[Optional[ServiceCall]]" = queue.Queue()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last request, for idle-time maintenance"""
+        return time.monotonic() - self.last_request
+
+    def start(self) -> str:
+        """Start the writer and HTTP threads; returns the service URL"""
+        if not self.token and not is_loopback(self.host):
+            raise Exception(f"A service token is required to listen on {self.host}")
+        if not self.database.connection:
+            self.database.connect()
+
+        self._server = ThreadingHTTPServer((self.host, self.port), make_handler(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # port 0 picks a free port
+
+        # Lets a restore on this computer see that the database is in use
+        local_host = "127.0.0.1" if self.host in ('', '0.0.0.0') else self.host
+        self.database.update_setting('billing_service_url', f"http://{local_host}:{self.port}")
+
+        self._threads = [
+            threading.Thread(target=self._writer, name="service-writer", daemon=True),
+            threading.Thread(target=self._server.serve_forever, name="service-http", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self.url
+
+    def stop(self, timeout: float = 5):
+        """Stop accepting requests and finish queued calls"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._calls.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.database.connection:
+            self.database.update_setting('billing_service_url', '')
+
+    def submit(self, target: str, method: str, args: List[Any] = None,
+               kwargs: Dict[str, Any] = None) -> Any:
+        """Queue a call for the writer thread and wait for its result"""
+        call = ServiceCall(target, method, list(args or []), dict(kwargs or {}))
+        self.last_request = time.monotonic()
+        self._calls.put(call)
+        call.done.wait()
+        if call.error is not None:
+            raise Exception(call.error)
+        return call.result
+
+    def dispatch(self, call: ServiceCall) -> Any:
+        """Run one call against the database"""
+        if call.target == 'Database':
+            if call.method not in DATABASE_METHODS:
+                raise Exception(f"Unknown database method: {call.method}")
+            query, params = call.args
+            # Setting the authorizer expires prepared statements, so cached ones are checked again
+            self.database.connection.set_authorizer(
+                remote_sql_authorizer(threading.get_ident(), call.method != 'execute_query'))
+            try:
+                return getattr(self.database, call.method)(query, tuple(params))
+            finally:
+                self.database.connection.set_authorizer(None)
+
+        if call.target == 'AuthManager':
+            if call.method != 'login':
+                raise Exception(f"Unknown auth method: {call.method}")
+            # Sessions live on the terminals; the service only checks credentials
+            manager = AuthManager()
+            return manager.current_staff if manager.login(*call.args, **call.kwargs) else None
+
+        if call.target == 'Service' and call.method == 'stats':
+            return dict(self.stats)
+
+        manager = SERVICE_MANAGERS.get(call.target)
+        function = getattr(manager, call.method, None) if manager else None
+        if function is None or call.method.startswith('_') or not callable(function):
+            raise Exception(f"Unknown service call: {call.target}.{call.method}")
+        return function(*call.args, **call.kwargs)
+
+    def _next_group(self) -> Tuple[List[ServiceCall], bool]:
+        """Wait for a call, then collect others arriving within the group window"""
+        first = self._calls.get()
+        if first is None:
+            return [], True
+
+        group = [first]
+        deadline = time.monotonic() + self.group_window
+        while len(group) < self.max_group_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                call = self._calls.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if call is None:
+                return group, True
+            group.append(call)
+        return group, False
+
+    def _run_call(self, call: ServiceCall, isolated: bool):
+        try:
+            if isolated:
+                with self.database.transaction():  # savepoint inside the group
+                    call.result = to_json_value(self.dispatch(call))
+            else:
+                call.result = to_json_value(self.dispatch(call))
+        except Exception as e:
+            call.error = str(e)
+
+    def _run_group(self, group: List[ServiceCall]):
+        self.stats['calls'] += len(group)
+        self.stats['groups'] += 1
+        self.stats['largest_group'] = max(self.stats['largest_group'], len(group))
+        try:
+            if all(call.read_only for call in group):
+                for call in group:
+                    self._run_call(call, False)
+            else:
+                with self.database.transaction():
+                    for call in group:
+                        self._run_call(call, True)
+                self.stats['commits'] += 1
+        except Exception as e:
+            for call in group:
+                call.result = None
+                call.error = call.error or f"Commit failed: {e}"
+        finally:
+            for call in group:
+                call.done.set()
+
+    def _writer(self):
+        stopping = False
+        while not stopping:
+            group, stopping = self._next_group()
+            if group:
+                self._run_group(group)
+
+
+def make_handler(service: BillingService):
+    """HTTP request handler bound to a service"""
+
+    class ServiceRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep connections open between calls
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def log_message(self, format, *args):
+            pass  # one line per call would flood the console
+
+        def do_GET(self):
+            if self.path != '/health':
+                self.reply(404, {'error': "Not found"})
+                return
+            self.reply(200, {'status': 'ok', **service.stats})
+
+        def do_POST(self):
+            if self.path != '/call':
+                self.reply(404, {'error': "Not found"})
+                return
+            if service.token and not hmac.compare_digest(self.headers.get('X-Service-Token', ''), service.token):
+                self.reply(403, {'error': "Invalid service token"})
+                return
+
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                result = service.submit(request['target'], request['method'],
+                                        request.get('args'), request.get('kwargs'))
+                self.reply(200, {'result': result})
+            except Exception as e:
+                self.reply(200, {'error': str(e)})
+
+        def reply(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ServiceRequestHandler
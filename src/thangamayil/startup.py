@@ -0,0 +1,162 @@
+"""
+Application startup
+The login screen is shown first; the database is opened (created or
+migrated if needed) and the caches the first bill needs are warmed on a
+helper thread while the cashier types, and each phase is timed so slow
+starts on a till can be traced to their cause.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .database.connection import db
+from .diagnostics.metrics import metrics
+
+
+# Startup phases are recorded as latency metrics startup_<phase>
+METRIC_PREFIX = "startup_"
+
+STARTUP_LOG_NAME = "startup.log"
+
+
+class StartupTimer:
+    """Durations of the startup phases, measured from process start"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of startup work"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.phases[name] = seconds
+        metrics.record(METRIC_PREFIX + name, seconds)
+
+    def mark(self, name: str):
+        """Note a point reached, as time since process start"""
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            self.marks[name] = elapsed
+        metrics.record(METRIC_PREFIX + name, elapsed)
+
+    def summary(self) -> str:
+        with self.lock:
+            parts = [f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items()]
+            parts += [f"{name} at {seconds * 1000:.0f} ms" for name, seconds in self.marks.items()]
+        return "Startup: " + ", ".join(parts)
+
+    def save(self, log_dir: str):
+        """Append the summary to logs/startup.log"""
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, STARTUP_LOG_NAME), 'a', encoding='utf-8') as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {self.summary()}\n")
+        except OSError as e:
+            print(f"Startup log not written: {e}")
+
+
+class StartupTasks:
+    """Startup work run in order on a helper thread while the login screen is shown"""
+
+    def __init__(self, timer: StartupTimer):
+        self.timer = timer
+        self.tasks: List[Tuple[str, Callable]] = []
+        self.done: Dict[str, threading.Event] = {}
+        self.errors: Dict[str, Exception] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, name: str, function: Callable):
+        self.tasks.append((name, function))
+        self.done[name] = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="startup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        failed = None
+        for name, function in self.tasks:
+            # Later tasks build on earlier ones, so a failure skips the rest
+            if failed:
+                self.errors[name] = Exception(f"Skipped after {failed} failed")
+            else:
+                try:
+                    with self.timer.phase(name):
+                        function()
+                except Exception as e:
+                    self.errors[name] = e
+                    failed = name
+            self.done[name].set()
+
+    def is_done(self, name: str) -> bool:
+        return self.done[name].is_set()
+
+    def error(self, name: str) -> Optional[Exception]:
+        """The exception a finished task raised, if any"""
+        return self.errors.get(name) if self.is_done(name) else None
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Wait for a task; raises its exception if it failed, False on timeout"""
+        if not self.done[name].wait(timeout):
+            return False
+        if name in self.errors:
+            raise self.errors[name]
+        return True
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Do the first-use work of billing before it is needed: import the POS
+    modules, read the item catalog and its indexes into the page cache,
+    run the lookups a bill makes once (so their statements are prepared on
+    the shared connection) and compile the receipt template
+    """
+    from .models.items import ItemsManager
+    from .models.auth import StaffManager
+    from .printing.receipt import get_receipt_template, get_receipt_paper, get_shop_settings
+    from .ui import pos_billing, thermal_printer  # noqa: F401 (imported for the first F1)
+
+    counts: Dict[str, Any] = {}
+    if not db.remote:
+        # Item catalog: every index of the items table, then the rows themselves
+        indexes = db.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'items'"
+        )
+        for index in indexes:
+            db.execute_query(f'SELECT COUNT(*) FROM items INDEXED BY "{index["name"]}"')
+        counts['items'] = db.get_single_result(
+            "SELECT COUNT(*) AS items, MAX(LENGTH(item_name)) AS longest FROM items NOT INDEXED"
+        )['items']
+        counts['item_indexes'] = len(indexes)
+
+        # The scan and search lookups, untimed so the metrics show only real scans
+        sample = db.get_single_result("SELECT barcode FROM items WHERE is_active = 1 AND barcode IS NOT NULL LIMIT 1")
+        if sample:
+            ItemsManager.get_item_by_barcode.__wrapped__(sample['barcode'])
+            ItemsManager.search_items.__wrapped__(sample['barcode'])
+
+        # Settings, category map and staff list
+        counts['settings'] = len(db.execute_query("SELECT setting_key, setting_value FROM settings"))
+        counts['categories'] = len(ItemsManager.get_all_categories())
+        counts['staff'] = len(StaffManager.get_active_staff())
+        get_shop_settings()
+
+    get_receipt_template(get_receipt_paper())
+    return counts
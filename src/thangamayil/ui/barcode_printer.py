@@ -11,6 +11,32 @@ import platform
 from datetime import datetime
 from ..models.items import ItemsManager
 from ..database.connection import db
+from ..printing.stickers import (
+    STICKER_SHEETS, MAX_STICKERS, render_sticker_pdf,
+    labels_for_category, labels_for_items, labels_for_goods_receipt
+)
+
+
+def send_pdf_to_printer(pdf_path):
+    """Send a sticker PDF to the default printer, False if the platform is unsupported"""
+    system = platform.system()
+    
+    if system == "Windows":
+        # The PDF handler prints asynchronously, so the file is left in the temp folder
+        os.startfile(pdf_path, "print")
+        return True
+    
+    if system in ("Linux", "Darwin"):
+        try:
+            os.system(f'lp "{pdf_path}"')
+        finally:
+            try:
+                os.unlink(pdf_path)
+            except:
+                pass
+        return True
+    
+    return False
 
 
 class BarcodePrinterWindow:
@@ -192,7 +218,7 @@ class BarcodePrinterWindow:
         # Number of stickers
         ttk.Label(right_panel, text="No. of Stickers:").grid(row=row, column=0, sticky=tk.W, pady=5)
         self.quantity_var = tk.StringVar(value="1")
-        quantity_spinbox = ttk.Spinbox(right_panel, from_=1, to=100, textvariable=self.quantity_var, 
+        quantity_spinbox = ttk.Spinbox(right_panel, from_=1, to=MAX_STICKERS, textvariable=self.quantity_var, 
                                       width=28)
         quantity_spinbox.grid(row=row, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
         row += 1
@@ -236,6 +262,15 @@ class BarcodePrinterWindow:
         spacing_spinbox.grid(row=row, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
         row += 1
         
+        # Label sheet used for PDF output and printing
+        ttk.Label(right_panel, text="Label Sheet:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        self.sheet_names = {sheet.name: key for key, sheet in STICKER_SHEETS.items()}
+        self.sheet_var = tk.StringVar(value=STICKER_SHEETS['roll_2up'].name)
+        self.sheet_combo = ttk.Combobox(right_panel, textvariable=self.sheet_var, width=27,
+                                        values=list(self.sheet_names), state="readonly")
+        self.sheet_combo.grid(row=row, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        row += 1
+        
         # Separator
         ttk.Separator(right_panel, orient='horizontal').grid(row=row, column=0, columnspan=2, 
                                                            sticky=(tk.W, tk.E), pady=20)
@@ -251,6 +286,9 @@ class BarcodePrinterWindow:
                   command=self.print_stickers).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="💾 Save as PDF", 
                   command=self.save_as_pdf).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(right_panel, text="📦 Batch Labels (Category / Selected / Received Stock)", 
+                  command=self.show_batch_labels).grid(row=row + 1, column=0, columnspan=2, pady=(0, 10))
     
     def create_preview_panel(self, parent):
         """Create preview panel"""
@@ -297,7 +335,7 @@ class BarcodePrinterWindow:
                     f"{item['price']:.2f}",
                     item['stock_quantity']
                 )
-                self.items_tree.insert('', 'end', values=values)
+                self.items_tree.insert('', 'end', iid=str(item['item_id']), values=values)
     
     def on_search(self, event):
         """Handle search input"""
@@ -372,6 +410,10 @@ class BarcodePrinterWindow:
         self.width_var.set(str(width))
         self.per_row_var.set(str(per_row))
         
+        # Keep the roll label sheet in step with stickers per row
+        if hasattr(self, 'sheet_var') and self.sheet_names.get(self.sheet_var.get(), '').startswith('roll'):
+            self.sheet_var.set(STICKER_SHEETS[f"roll_{per_row}up"].name)
+        
         # Update preview if window exists
         if hasattr(self, 'preview_text'):
             self.update_preview()
@@ -533,85 +575,71 @@ class BarcodePrinterWindow:
         self.update_preview()
         messagebox.showinfo("Preview", "Sticker preview updated below!")
     
+    def show_batch_labels(self):
+        """Open the batch label job dialog"""
+        selected_ids = [int(iid) for iid in self.items_tree.selection()]
+        BatchLabelDialog(self.window, selected_ids, self.get_selected_sheet())
+    
+    def get_sticker_labels(self):
+        """Build the sticker job from the form fields"""
+        return [{
+            'store_name': self.store_name_var.get().strip(),
+            'item_name': self.item_name_var.get().strip(),
+            'barcode': self.barcode_var.get().strip(),
+            'mrp': float(self.mrp_var.get()),
+            'quantity': int(self.quantity_var.get())
+        }]
+    
+    def get_selected_sheet(self):
+        """Get the selected label sheet key"""
+        return self.sheet_names.get(self.sheet_var.get(), 'roll_2up')
+    
     def print_stickers(self):
         """Print the barcode stickers"""
         if not self.validate_inputs():
             return
         
         try:
-            store_name = self.store_name_var.get().strip()
-            item_name = self.item_name_var.get().strip()
-            barcode = self.barcode_var.get().strip()
-            mrp = self.mrp_var.get().strip()
             quantity = int(self.quantity_var.get())
-            size = self.size_var.get()
-            
-            # Generate sticker content
-            content = self.generate_sticker_content(store_name, item_name, barcode, mrp, quantity, size)
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
-                temp_file.write(content)
+            # Render the sticker sheet to a temporary PDF for the print spooler
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
                 temp_file_path = temp_file.name
+            render_sticker_pdf(self.get_sticker_labels(), temp_file_path, self.get_selected_sheet())
             
-            try:
-                # Try to print to default printer
-                system = platform.system()
-                
-                if system == "Windows":
-                    os.system(f'type "{temp_file_path}" > PRN')
-                elif system == "Linux":
-                    os.system(f'lp "{temp_file_path}"')
-                elif system == "Darwin":  # macOS
-                    os.system(f'lp "{temp_file_path}"')
-                else:
-                    # Fallback: Show preview
-                    self.show_print_preview(content)
-                    return
-                
-                messagebox.showinfo("Print Success", 
-                                  f"Successfully sent {quantity} barcode sticker(s) to printer!")
-                
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+            if not send_pdf_to_printer(temp_file_path):
+                # Fallback: Show preview
+                self.show_print_preview(self.generate_sticker_content(
+                    self.store_name_var.get().strip(), self.item_name_var.get().strip(),
+                    self.barcode_var.get().strip(), self.mrp_var.get().strip(),
+                    quantity, self.size_var.get()))
+                return
+            
+            messagebox.showinfo("Print Success", 
+                              f"Successfully sent {quantity} barcode sticker(s) to printer!")
                     
         except Exception as e:
             messagebox.showerror("Print Error", f"Failed to print stickers: {e}")
-            # Show preview as fallback
-            self.show_print_preview(content if 'content' in locals() else "Print failed")
     
     def save_as_pdf(self):
-        """Save stickers as PDF (placeholder for now)"""
+        """Save stickers as a PDF label sheet"""
         if not self.validate_inputs():
             return
         
         try:
-            # Generate content
-            store_name = self.store_name_var.get().strip()
-            item_name = self.item_name_var.get().strip()
             barcode = self.barcode_var.get().strip()
-            mrp = self.mrp_var.get().strip()
-            quantity = int(self.quantity_var.get())
-            size = self.size_var.get()
-            
-            content = self.generate_sticker_content(store_name, item_name, barcode, mrp, quantity, size)
             
             # Ask user for save location
             file_path = filedialog.asksaveasfilename(
                 title="Save Barcode Stickers",
-                defaultextension=".txt",
-                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
-                initialvalue=f"barcode_stickers_{barcode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+                defaultextension=".pdf",
+                filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")],
+                initialfile=f"barcode_stickers_{barcode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
             )
             
             if file_path:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                messagebox.showinfo("Save Success", f"Barcode stickers saved to:\n{file_path}")
+                count = render_sticker_pdf(self.get_sticker_labels(), file_path, self.get_selected_sheet())
+                messagebox.showinfo("Save Success", f"{count} barcode sticker(s) saved to:\n{file_path}")
             
         except Exception as e:
             messagebox.showerror("Save Error", f"Failed to save stickers: {e}")
@@ -706,10 +734,10 @@ class BarcodePrinterWindow:
         
         try:
             quantity = int(self.quantity_var.get())
-            if quantity < 1 or quantity > 100:
-                raise ValueError("Quantity must be between 1 and 100")
+            if quantity < 1 or quantity > MAX_STICKERS:
+                raise ValueError(f"Quantity must be between 1 and {MAX_STICKERS}")
         except ValueError:
-            messagebox.showwarning("Invalid Quantity", "Please enter a valid quantity (1-100)")
+            messagebox.showwarning("Invalid Quantity", f"Please enter a valid quantity (1-{MAX_STICKERS})")
             return False
         
         try:
@@ -731,6 +759,234 @@ class BarcodePrinterWindow:
         return True
 
 
+class BatchLabelDialog:
+    """Dialog for printing stickers for many items as one job"""
+    
+    SOURCES = ("Selected items", "Category", "Goods received")
+    
+    def __init__(self, parent, selected_item_ids, sheet):
+        self.selected_item_ids = selected_item_ids
+        self.categories = {c['category_name']: c['category_id'] for c in ItemsManager.get_all_categories()}
+        self.cancelled = False
+        self.running = False
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Batch Barcode Labels")
+        self.dialog.geometry("460x420")
+        try:
+            self.dialog.transient(parent)
+            self.dialog.grab_set()
+        except tk.TclError:
+            pass
+        
+        self.create_widgets(sheet)
+        self.on_source_change()
+    
+    def create_widgets(self, sheet):
+        """Create dialog widgets"""
+        main_frame = ttk.Frame(self.dialog, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(main_frame, text="📦 Batch Labels", font=("Arial", 14, "bold")).grid(
+            row=0, column=0, columnspan=2, pady=(0, 10))
+        
+        # Label source
+        ttk.Label(main_frame, text="Print labels for:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.source_var = tk.StringVar(value=self.SOURCES[0] if self.selected_item_ids else self.SOURCES[1])
+        source_combo = ttk.Combobox(main_frame, textvariable=self.source_var, values=self.SOURCES,
+                                    state="readonly", width=28)
+        source_combo.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        source_combo.bind('<<ComboboxSelected>>', self.on_source_change)
+        
+        ttk.Label(main_frame, text="Category:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.category_var = tk.StringVar()
+        self.category_combo = ttk.Combobox(main_frame, textvariable=self.category_var,
+                                           values=list(self.categories), state="readonly", width=28)
+        self.category_combo.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        
+        ttk.Label(main_frame, text="Stickers per Item:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.per_item_var = tk.StringVar(value="1")
+        self.per_item_spinbox = ttk.Spinbox(main_frame, from_=1, to=100, textvariable=self.per_item_var,
+                                            width=28)
+        self.per_item_spinbox.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        
+        # Goods receipt filters; quantity comes from the stock received
+        today = datetime.now().strftime('%Y-%m-%d')
+        ttk.Label(main_frame, text="Received From:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.received_from_var = tk.StringVar(value=today)
+        self.received_from_entry = ttk.Entry(main_frame, textvariable=self.received_from_var, width=30)
+        self.received_from_entry.grid(row=4, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        
+        ttk.Label(main_frame, text="Received To:").grid(row=5, column=0, sticky=tk.W, pady=5)
+        self.received_to_var = tk.StringVar(value=today)
+        self.received_to_entry = ttk.Entry(main_frame, textvariable=self.received_to_var, width=30)
+        self.received_to_entry.grid(row=5, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        
+        ttk.Label(main_frame, text="Notes Contain:").grid(row=6, column=0, sticky=tk.W, pady=5)
+        self.notes_var = tk.StringVar()
+        self.notes_entry = ttk.Entry(main_frame, textvariable=self.notes_var, width=30)
+        self.notes_entry.grid(row=6, column=1, sticky=(tk.W, tk.E), pady=5, padx=(10, 0))
+        
+        ttk.Label(main_frame, text="Label Sheet:").grid(row=7, column=0, sticky=tk.W, pady=5)
+        self.sheet_names = {s.name: key for key, s in STICKER_SHEETS.items()}
+        self.sheet_var = tk.StringVar(value=STICKER_SHEETS[sheet].name)
+        ttk.Combobox(main_frame, textvariable=self.sheet_var, values=list(self.sheet_names),
+                     state="readonly", width=28).grid(row=7, column=1, sticky=(tk.W, tk.E),
+                                                      pady=5, padx=(10, 0))
+        
+        # Progress
+        self.status_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=self.status_var, foreground="blue").grid(
+            row=8, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+        self.progress_bar = ttk.Progressbar(main_frame, mode='determinate')
+        self.progress_bar.grid(row=9, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        
+        # Buttons
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.grid(row=10, column=0, columnspan=2, pady=(15, 0))
+        ttk.Button(buttons_frame, text="💾 Save as PDF",
+                   command=lambda: self.start_job(print_job=False)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="🖨️ Print",
+                   command=lambda: self.start_job(print_job=True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="❌ Close", command=self.close).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.protocol("WM_DELETE_WINDOW", self.close)
+    
+    def on_source_change(self, event=None):
+        """Enable the fields used by the selected label source"""
+        source = self.source_var.get()
+        received = source == "Goods received"
+        
+        self.category_combo.config(state="readonly" if source == "Category" else "disabled")
+        self.per_item_spinbox.config(state="disabled" if received else "normal")
+        for entry in (self.received_from_entry, self.received_to_entry, self.notes_entry):
+            entry.config(state="normal" if received else "disabled")
+        
+        if source == "Selected items":
+            self.status_var.set(f"{len(self.selected_item_ids)} item(s) selected in the item list")
+        else:
+            self.status_var.set("")
+    
+    def build_labels(self):
+        """Fetch the label job for the selected source"""
+        source = self.source_var.get()
+        
+        if source == "Goods received":
+            for value in (self.received_from_var.get(), self.received_to_var.get()):
+                datetime.strptime(value, '%Y-%m-%d')
+            return labels_for_goods_receipt(self.received_from_var.get(), self.received_to_var.get(),
+                                            self.notes_var.get().strip() or None)
+        
+        per_item = int(self.per_item_var.get())
+        if per_item < 1:
+            raise ValueError("Stickers per item must be at least 1")
+        
+        if source == "Category":
+            if self.category_var.get() not in self.categories:
+                raise ValueError("Please select a category")
+            return labels_for_category(self.categories[self.category_var.get()], per_item)
+        
+        return labels_for_items(self.selected_item_ids, per_item)
+    
+    def start_job(self, print_job):
+        """Render the label job in the background"""
+        if self.running:
+            return
+        
+        try:
+            labels = self.build_labels()
+        except ValueError as e:
+            messagebox.showwarning("Batch Labels", f"Invalid input: {e}", parent=self.dialog)
+            return
+        except Exception as e:
+            messagebox.showerror("Batch Labels", f"Failed to load items: {e}", parent=self.dialog)
+            return
+        
+        if not labels:
+            messagebox.showinfo("Batch Labels", "No items with barcodes found for this selection",
+                                parent=self.dialog)
+            return
+        
+        total = sum(label['quantity'] for label in labels)
+        
+        if print_job:
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+                file_path = temp_file.name
+        else:
+            file_path = filedialog.asksaveasfilename(
+                parent=self.dialog,
+                title="Save Batch Labels",
+                defaultextension=".pdf",
+                filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")],
+                initialfile=f"batch_labels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            )
+            if not file_path:
+                return
+        
+        import threading
+        
+        sheet = self.sheet_names.get(self.sheet_var.get(), 'roll_2up')
+        state = {'done': 0, 'written': None, 'error': None}
+        
+        def on_progress(done, _total):
+            # Called from the worker thread; the dialog polls this value
+            state['done'] = done
+        
+        def worker():
+            try:
+                state['written'] = render_sticker_pdf(labels, file_path, sheet, total,
+                                                      on_progress, lambda: self.cancelled)
+            except Exception as e:
+                state['error'] = e
+        
+        self.running = True
+        self.cancelled = False
+        self.progress_bar['maximum'] = total
+        self.status_var.set(f"Rendering {total} stickers for {len(labels)} item(s)...")
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            if not self.dialog.winfo_exists():
+                return
+            self.progress_bar['value'] = state['done']
+            if thread.is_alive():
+                self.dialog.after(200, poll)
+                return
+            
+            self.running = False
+            if state['error']:
+                self.status_var.set("")
+                messagebox.showerror("Batch Labels", f"Failed to render labels: {state['error']}",
+                                     parent=self.dialog)
+                return
+            if self.cancelled:
+                self.status_var.set("Cancelled")
+                return
+            
+            self.status_var.set(f"{state['written']} stickers for {len(labels)} item(s) done")
+            try:
+                if not print_job:
+                    messagebox.showinfo("Batch Labels", f"{state['written']} sticker(s) saved to:\n{file_path}",
+                                        parent=self.dialog)
+                elif send_pdf_to_printer(file_path):
+                    messagebox.showinfo("Batch Labels", f"Sent {state['written']} sticker(s) to printer!",
+                                        parent=self.dialog)
+                else:
+                    messagebox.showinfo("Batch Labels", f"Printing is not supported here. Labels saved to:\n{file_path}",
+                                        parent=self.dialog)
+            except Exception as e:
+                messagebox.showerror("Batch Labels", f"Failed to print labels: {e}", parent=self.dialog)
+        
+        poll()
+    
+    def close(self):
+        """Cancel any running job and close"""
+        self.cancelled = True
+        self.dialog.destroy()
+
+
 # Standalone function to launch barcode printer
 def show_barcode_printer(parent=None):
     """Show barcode printer window"""
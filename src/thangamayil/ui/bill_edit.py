@@ -335,7 +335,7 @@ class EditBillDialog:
         """Save changes to the bill"""
         try:
             from ..database.connection import db
-            from ..models.billing import BillingManager, GSTCalculator
+            from ..models.billing import BillingManager
             
             if not self.bill_items:
                 messagebox.showerror("Error", "Cannot save bill without items")
@@ -359,39 +359,10 @@ class EditBillDialog:
                 db.execute_update("UPDATE bills SET customer_id = NULL WHERE bill_id = ?",
                                 (self.bill_data['bill_id'],))
             
-            # Delete existing bill items
-            db.execute_update("DELETE FROM bill_items WHERE bill_id = ?", (self.bill_data['bill_id'],))
-            
-            # Insert updated items
-            for item in self.bill_items:
-                # Recalculate line total
-                calc = GSTCalculator.calculate_line_total(
-                    quantity=item['quantity'],
-                    unit_price=item['unit_price'],
-                    discount_percentage=item['discount_percentage'],
-                    gst_rate=item['gst_percentage']
-                )
-                
-                query = '''
-                INSERT INTO bill_items (
-                    bill_id, item_id, item_name, barcode, quantity, unit_price, 
-                    discount_percentage, discount_amount, gst_percentage, gst_amount, line_total
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                '''
-                
-                db.execute_update(query, (
-                    self.bill_data['bill_id'],
-                    item.get('item_id'),
-                    item['item_name'],
-                    item.get('barcode', ''),
-                    item['quantity'],
-                    item['unit_price'],
-                    item['discount_percentage'],
-                    calc['discount_amount'],
-                    item['gst_percentage'],
-                    calc['gst_amount'],
-                    calc['line_total']
-                ))
+            # Replace the lines in one transaction so a failure cannot leave the bill empty
+            if not BillingManager.replace_bill_items(self.bill_data['bill_id'], self.bill_items):
+                messagebox.showerror("Error", "Failed to save bill items")
+                return
             
             # Recalculate bill totals
             try:
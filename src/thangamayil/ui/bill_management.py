@@ -8,6 +8,48 @@ from tkinter import ttk, messagebox
 from datetime import datetime
 
 
+def bills_query(date_filter: str = "All", status_filter: str = "All", search_term: str = ""):
+    """Bill list query for the window's filters (also run by the query plan audit)"""
+    query = '''
+    SELECT 
+        b.bill_id, b.invoice_number, b.bill_date, b.grand_total, 
+        b.payment_mode, b.is_cancelled, b.customer_id,
+        b.subtotal, b.discount_amount, b.cgst_amount, b.sgst_amount, 
+        b.igst_amount, b.round_off,
+        c.customer_name,
+        COUNT(bi.bill_item_id) as item_count
+    FROM bills b
+    LEFT JOIN customers c ON b.customer_id = c.customer_id
+    LEFT JOIN bill_items bi ON b.bill_id = bi.bill_id
+    WHERE 1=1
+    '''
+    params = []
+
+    # Date filter
+    if date_filter == "Today":
+        query += " AND DATE(b.bill_date) = DATE('now')"
+    elif date_filter == "Yesterday":
+        query += " AND DATE(b.bill_date) = DATE('now', '-1 day')"
+    elif date_filter == "This Week":
+        query += " AND DATE(b.bill_date) >= DATE('now', 'weekday 0', '-7 days')"
+    elif date_filter == "This Month":
+        query += " AND strftime('%Y-%m', b.bill_date) = strftime('%Y-%m', 'now')"
+
+    # Status filter
+    if status_filter == "Active":
+        query += " AND b.is_cancelled = 0"
+    elif status_filter == "Cancelled":
+        query += " AND b.is_cancelled = 1"
+
+    # Search filter
+    if search_term:
+        query += " AND (b.invoice_number LIKE ? OR c.customer_name LIKE ?)"
+        params.extend([f'%{search_term}%', f'%{search_term}%'])
+
+    query += " GROUP BY b.bill_id ORDER BY b.bill_date DESC"
+    return query, params
+
+
 class BillManagementWindow:
     """Window for managing existing bills - view, edit, delete, print"""
     
@@ -161,6 +203,8 @@ class BillManagementWindow:
                   width=18).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(buttons_frame, text="📊 Export CSV", command=self.export_to_csv, 
                   width=12).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons_frame, text="📄 Export PDFs", command=self.export_invoices_pdf, 
+                  width=14).pack(side=tk.LEFT, padx=(0, 5))
         
         ttk.Button(buttons_frame, text="❌ Close", command=self.window.destroy, 
                   width=12).pack(side=tk.RIGHT)
@@ -170,47 +214,9 @@ class BillManagementWindow:
         try:
             from ..database.connection import db
             
-            # Build query based on filters
-            query = '''
-            SELECT 
-                b.bill_id, b.invoice_number, b.bill_date, b.grand_total, 
-                b.payment_mode, b.is_cancelled, b.customer_id,
-                b.subtotal, b.discount_amount, b.cgst_amount, b.sgst_amount, 
-                b.igst_amount, b.round_off,
-                c.customer_name,
-                COUNT(bi.bill_item_id) as item_count
-            FROM bills b
-            LEFT JOIN customers c ON b.customer_id = c.customer_id
-            LEFT JOIN bill_items bi ON b.bill_id = bi.bill_id
-            WHERE 1=1
-            '''
-            params = []
-            
-            # Date filter
-            date_filter = self.date_filter.get()
-            if date_filter == "Today":
-                query += " AND DATE(b.bill_date) = DATE('now')"
-            elif date_filter == "Yesterday":
-                query += " AND DATE(b.bill_date) = DATE('now', '-1 day')"
-            elif date_filter == "This Week":
-                query += " AND DATE(b.bill_date) >= DATE('now', 'weekday 0', '-7 days')"
-            elif date_filter == "This Month":
-                query += " AND strftime('%Y-%m', b.bill_date) = strftime('%Y-%m', 'now')"
-            
-            # Status filter
-            status_filter = self.status_filter.get()
-            if status_filter == "Active":
-                query += " AND b.is_cancelled = 0"
-            elif status_filter == "Cancelled":
-                query += " AND b.is_cancelled = 1"
-            
-            # Search filter
-            search_term = self.search_var.get().strip()
-            if search_term:
-                query += " AND (b.invoice_number LIKE ? OR c.customer_name LIKE ?)"
-                params.extend([f'%{search_term}%', f'%{search_term}%'])
-            
-            query += " GROUP BY b.bill_id ORDER BY b.bill_date DESC"
+            query, params = bills_query(
+                self.date_filter.get(), self.status_filter.get(), self.search_var.get().strip()
+            )
             
             results = db.execute_query(query, tuple(params))
             
@@ -327,6 +333,103 @@ class BillManagementWindow:
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export CSV: {e}")
     
+    def export_invoices_pdf(self):
+        """Export all invoices in a date range as PDFs (zip archive)"""
+        try:
+            from tkinter import filedialog, simpledialog
+            from ..printing.invoice_export import InvoiceExporter
+            
+            today = datetime.now()
+            date_from = simpledialog.askstring("Export Invoices", "From date (YYYY-MM-DD):",
+                                               initialvalue=today.strftime('%Y-%m-01'), parent=self.window)
+            if not date_from:
+                return
+            date_to = simpledialog.askstring("Export Invoices", "To date (YYYY-MM-DD):",
+                                             initialvalue=today.strftime('%Y-%m-%d'), parent=self.window)
+            if not date_to:
+                return
+            
+            for value in (date_from, date_to):
+                datetime.strptime(value, '%Y-%m-%d')
+            
+            use_a4 = messagebox.askyesno("Invoice Format", "Export as A4 invoices?\n\n"
+                                         "Click 'No' for thermal receipt format.", parent=self.window)
+            
+            filename = filedialog.asksaveasfilename(
+                title="Save Invoices Archive",
+                defaultextension=".zip",
+                filetypes=[("Zip archives", "*.zip"), ("All files", "*.*")],
+                initialfile=f"invoices_{date_from}_to_{date_to}.zip"
+            )
+            if not filename:
+                return
+            
+            exporter = InvoiceExporter(filename, layout='a4' if use_a4 else 'thermal')
+            self.run_invoice_export(exporter, date_from, date_to)
+            
+        except ValueError:
+            messagebox.showerror("Invalid Date", "Please enter dates as YYYY-MM-DD")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to export invoices: {e}")
+    
+    def run_invoice_export(self, exporter, date_from, date_to):
+        """Run an invoice export in the background with a progress dialog"""
+        import threading
+        
+        progress_window = tk.Toplevel(self.window)
+        progress_window.title("Exporting Invoices")
+        progress_window.geometry("400x130")
+        progress_window.transient(self.window)
+        
+        status_var = tk.StringVar(value="Preparing export...")
+        ttk.Label(progress_window, textvariable=status_var).pack(pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, length=350, mode='determinate')
+        progress_bar.pack(pady=5)
+        ttk.Button(progress_window, text="Cancel", command=exporter.cancel).pack(pady=5)
+        
+        state = {'done': 0, 'total': 0, 'result': None, 'error': None}
+        
+        def on_progress(done, total):
+            # Called from the worker thread; the UI polls these values
+            state['done'] = done
+            state['total'] = total
+        
+        def worker():
+            try:
+                state['result'] = exporter.export(date_from, date_to)
+            except Exception as e:
+                state['error'] = e
+        
+        exporter.progress_callback = on_progress
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            if state['total']:
+                progress_bar['maximum'] = state['total']
+                progress_bar['value'] = state['done']
+                status_var.set(f"Exported {state['done']} of {state['total']} invoices")
+            
+            if thread.is_alive():
+                progress_window.after(200, poll)
+                return
+            
+            progress_window.destroy()
+            if state['error']:
+                messagebox.showerror("Export Error", f"Failed to export invoices: {state['error']}")
+                return
+            
+            result = state['result']
+            message = (f"Invoices saved to:\n{exporter.output_path}\n\n"
+                       f"Exported: {result['exported']}\n"
+                       f"Already present (skipped): {result['skipped']}\n"
+                       f"Failed: {result['failed']}")
+            if result['failed']:
+                message += "\n\n" + "\n".join(result['errors'][:5])
+            messagebox.showinfo("Export Complete", message)
+        
+        poll()
+    
     def get_selected_bill(self):
         """Get the currently selected bill data"""
         selection = self.bills_tree.selection()
@@ -387,7 +490,7 @@ class BillManagementWindow:
             if response is True:  # Yes - delete the bill
                 try:
                     from ..database.connection import db
-                    db.execute_query("DELETE FROM bills WHERE bill_id = ?", (bill['bill_id'],))
+                    db.execute_update("DELETE FROM bills WHERE bill_id = ?", (bill['bill_id'],))
                     messagebox.showinfo("Bill Deleted", f"Empty bill {bill['invoice_number']} has been deleted.")
                     self.load_bills()  # Refresh the list
                 except Exception as e:
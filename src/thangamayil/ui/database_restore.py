@@ -0,0 +1,202 @@
+"""
+Database Restore Window
+Point-in-time restore from scheduled backups with verification
+"""
+
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox
+import threading
+from ..database.restore import RestoreEngine
+
+
+class DatabaseRestoreWindow:
+    """Restore interface"""
+
+    def __init__(self):
+        self.window = None
+        self.engine = RestoreEngine()
+        self.restore_points = []
+        self.result = None
+        self.running = False
+
+    def show(self, parent=None):
+        """Display the restore window"""
+        self.window = tk.Toplevel(parent)
+        self.window.title("Restore Database - தங்கமயில் சில்க்ஸ்")
+        self.window.geometry("620x520")
+
+        # Set up proper window cleanup
+        self.window.protocol("WM_DELETE_WINDOW", self.close_window)
+
+        try:
+            if parent:
+                self.window.transient(parent)
+            self.window.grab_set()
+        except tk.TclError:
+            pass  # Skip if parent window is not available
+
+        self.create_widgets()
+        self.load_restore_points()
+
+    def close_window(self):
+        """Properly close the restore window"""
+        if self.running:
+            messagebox.showwarning("Restore", "Please wait for the restore to finish", parent=self.window)
+            return
+        if self.window:
+            try:
+                self.window.grab_release()
+            except tk.TclError:
+                pass
+            self.window.destroy()
+            self.window = None
+
+    def create_widgets(self):
+        """Create the UI widgets"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(main_frame, text="♻️ Restore Database", font=("Arial", 16, "bold")).pack(pady=(0, 5))
+        ttk.Label(main_frame, text=f"Backup folder: {self.engine.backup_dir}", foreground="gray").pack(anchor=tk.W)
+        ttk.Label(main_frame, text="Select the point in time to restore to:").pack(anchor=tk.W, pady=(10, 5))
+
+        # Restore points, newest first
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ('Time', 'Type', 'File')
+        self.points_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10,
+                                        selectmode='browse')
+        self.points_tree.heading('Time', text='Backup Time')
+        self.points_tree.heading('Type', text='Type')
+        self.points_tree.heading('File', text='File')
+        self.points_tree.column('Time', width=150)
+        self.points_tree.column('Type', width=100)
+        self.points_tree.column('File', width=320)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.points_tree.yview)
+        self.points_tree.configure(yscrollcommand=scrollbar.set)
+        self.points_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Status and verification report
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.status_var, foreground="blue").pack(anchor=tk.W, pady=(10, 0))
+        self.report_text = tk.Text(main_frame, height=7, font=("Courier New", 9), state=tk.DISABLED)
+        self.report_text.pack(fill=tk.X, pady=5)
+
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.pack(fill=tk.X)
+        ttk.Button(buttons_frame, text="🔍 Build and Verify", command=self.build_restore).pack(side=tk.LEFT, padx=5)
+        self.swap_button = ttk.Button(buttons_frame, text="♻️ Replace Live Database",
+                                      command=self.swap_in, state=tk.DISABLED)
+        self.swap_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="❌ Close", command=self.close_window).pack(side=tk.RIGHT, padx=5)
+
+    def load_restore_points(self):
+        """Load restore points from the backup folder"""
+        self.restore_points = list(reversed(self.engine.restore_points()))
+        for index, point in enumerate(self.restore_points):
+            self.points_tree.insert('', 'end', iid=str(index), values=(
+                point['time'].strftime('%d-%m-%Y %H:%M:%S'),
+                'Full' if point['type'] == 'FULL' else 'Incremental',
+                os.path.basename(point['file_path'])
+            ))
+        if self.restore_points:
+            self.points_tree.selection_set('0')
+        else:
+            self.status_var.set("No scheduled backups found")
+
+    def set_report(self, text):
+        """Show the verification report"""
+        self.report_text.config(state=tk.NORMAL)
+        self.report_text.delete(1.0, tk.END)
+        self.report_text.insert(tk.END, text)
+        self.report_text.config(state=tk.DISABLED)
+
+    def build_restore(self):
+        """Build the restored database in the background"""
+        selection = self.points_tree.selection()
+        if not selection or self.running:
+            return
+
+        target_time = self.restore_points[int(selection[0])]['time']
+        state = {'message': "Starting restore...", 'result': None, 'error': None}
+
+        def on_progress(message):
+            # Called from the worker thread; the UI polls this value
+            state['message'] = message
+
+        def worker():
+            try:
+                state['result'] = self.engine.build(target_time)
+            except Exception as e:
+                state['error'] = e
+
+        self.engine.progress_callback = on_progress
+        self.result = None
+        self.running = True
+        self.swap_button.config(state=tk.DISABLED)
+        self.set_report("")
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+
+        def poll():
+            self.status_var.set(state['message'])
+            if thread.is_alive():
+                self.window.after(200, poll)
+                return
+
+            self.running = False
+            if state['error']:
+                self.status_var.set("Restore failed")
+                messagebox.showerror("Restore Error", f"Restore failed: {state['error']}", parent=self.window)
+                return
+
+            self.result = state['result']
+            verification = self.result['verification']
+            lines = [
+                f"Restored to      : {self.result['restored_to'].strftime('%d-%m-%Y %H:%M:%S')}",
+                f"Changesets       : {self.result['incrementals']} ({self.result['records']} rows)",
+                f"Integrity check  : {verification['integrity']}",
+                f"Active bills     : {verification['bill_count']} (₹{verification['sales_total']:,.2f})",
+                f"Time taken       : {self.result['duration_ms'] / 1000:.1f} s"
+            ]
+            mismatched = verification['mismatched_bills']
+            if mismatched:
+                lines.append(f"Mismatched totals: {len(mismatched)} bills ({', '.join(mismatched[:5])}"
+                             f"{' ...' if len(mismatched) > 5 else ''})")
+            self.set_report("\n".join(lines))
+            self.status_var.set("Restored copy verified. Review the report, then replace the live database.")
+            self.swap_button.config(state=tk.NORMAL)
+
+        poll()
+
+    def swap_in(self):
+        """Replace the live database with the verified copy"""
+        if not self.result:
+            return
+
+        mismatched = self.result['verification']['mismatched_bills']
+        if mismatched and not messagebox.askyesno(
+                "Mismatched Totals",
+                f"{len(mismatched)} restored bills have totals that differ from their lines.\n\n"
+                "Restore with these bills as they are?", icon='warning', parent=self.window):
+            return
+
+        if not messagebox.askyesno("Replace Live Database",
+                                   "Replace the live database with the restored copy?\n\n"
+                                   "Close billing windows on all terminals first. "
+                                   "The current database is kept beside it.", parent=self.window):
+            return
+
+        try:
+            previous_path = self.engine.swap_in(self.result['output_path'], accept_mismatches=True)
+            self.result = None
+            self.swap_button.config(state=tk.DISABLED)
+            messagebox.showinfo("Restore Complete",
+                                f"Database restored successfully.\n\nPrevious database saved as:\n{previous_path}",
+                                parent=self.window)
+        except Exception as e:
+            messagebox.showerror("Restore Error", f"Failed to replace database: {e}", parent=self.window)
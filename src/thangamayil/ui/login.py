@@ -4,14 +4,16 @@ Handles user login and session initialization
 """
 
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox
 from ..models.auth import auth
 
 
 class LoginWindow:
     """Login window for staff authentication"""
     
-    def __init__(self):
+    def __init__(self, startup=None):
+        # Startup tasks (see thangamayil.startup) still opening the database
+        self.startup = startup
         self.root = tk.Tk()
         self.root.title("தங்கமயில் சில்க்ஸ் - Staff Login")
         self.root.geometry("700x700")
@@ -42,6 +44,10 @@ class LoginWindow:
         
         # Store login result
         self.login_successful = False
+        
+        # Report a database that could not be opened without waiting for a login attempt
+        if self.startup:
+            self.root.after(100, self.check_startup)
     
     def center_window(self):
         """Center the window on screen"""
@@ -179,8 +185,14 @@ class LoginWindow:
             self.show_error("Please enter both username and password")
             return
         
+        # Wait (without blocking the window) until the database is open
+        if self.startup and not self.startup.is_done('database'):
+            self.status_label.config(text="Opening database...", fg="#718096")
+            self.root.after(50, self.login)
+            return
+        
         # Clear previous error
-        self.status_label.config(text="")
+        self.status_label.config(text="", fg="#E53E3E")
         
         # Disable login button during authentication
         try:
@@ -208,9 +220,22 @@ class LoginWindow:
             # Widget destroyed, ignore
             pass
     
+    def check_startup(self):
+        """Close the login with an error if the database failed to open"""
+        error = self.startup.error('database')
+        if error:
+            messagebox.showerror(
+                "Database Error",
+                f"Failed to initialize database:\n{str(error)}\n\nPlease check database configuration.",
+                parent=self.root
+            )
+            self.on_window_close()
+        elif not self.startup.is_done('database'):
+            self.root.after(100, self.check_startup)
+    
     def show_error(self, message):
         """Display error message"""
-        self.status_label.config(text=message)
+        self.status_label.config(text=message, fg="#E53E3E")
         # Clear password field on error
         self.password_entry.delete(0, tk.END)
         self.password_entry.focus()
@@ -235,7 +260,7 @@ class LoginWindow:
             return False
 
 
-def show_login():
+def show_login(startup=None):
     """Show login window and return success status"""
-    login_window = LoginWindow()
+    login_window = LoginWindow(startup)
     return login_window.run()
\ No newline at end of file
@@ -3,6 +3,8 @@ Main application window
 Central hub for all billing operations and management
 """
 
+import os
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from ..models.auth import auth
@@ -42,6 +44,11 @@ class MainWindow:
         
         # Bind keyboard shortcuts
         self.setup_shortcuts()
+        
+        # Track user activity so maintenance only runs while idle
+        self.last_activity = time.monotonic()
+        for sequence in ('<Any-KeyPress>', '<Any-ButtonPress>'):
+            self.root.bind_all(sequence, self.mark_activity, add='+')
     
     def setup_styles(self):
         """Configure UI styles"""
@@ -209,14 +216,54 @@ class MainWindow:
         )
         settings_btn.pack(fill=tk.X, pady=15)
         
-        # Backup button
-        backup_btn = ttk.Button(
+        # Backup, restore, archive and maintenance work on the database file,
+        # so a terminal using the billing service leaves them to the service computer
+        from ..database.connection import db
+        if not db.remote:
+            # Backup button
+            backup_btn = ttk.Button(
+                right_panel,
+                text="💾 Database Backup (Ctrl+Shift+B)",
+                style="MainMenu.TButton",
+                command=self.create_backup
+            )
+            backup_btn.pack(fill=tk.X, pady=15)
+            
+            # Restore button
+            restore_btn = ttk.Button(
+                right_panel,
+                text="♻️ Restore Database",
+                style="MainMenu.TButton",
+                command=self.open_database_restore
+            )
+            restore_btn.pack(fill=tk.X, pady=15)
+            
+            # Archive button
+            archive_btn = ttk.Button(
+                right_panel,
+                text="🗄️ Archive Old Years",
+                style="MainMenu.TButton",
+                command=self.archive_old_years
+            )
+            archive_btn.pack(fill=tk.X, pady=15)
+            
+            # Maintenance button
+            maintenance_btn = ttk.Button(
+                right_panel,
+                text="🧹 Database Maintenance",
+                style="MainMenu.TButton",
+                command=self.run_maintenance
+            )
+            maintenance_btn.pack(fill=tk.X, pady=15)
+        
+        # Metrics button
+        metrics_btn = ttk.Button(
             right_panel,
-            text="💾 Database Backup (Ctrl+Shift+B)",
+            text="📈 Performance Metrics",
             style="MainMenu.TButton",
-            command=self.create_backup
+            command=self.open_metrics
         )
-        backup_btn.pack(fill=tk.X, pady=15)
+        metrics_btn.pack(fill=tk.X, pady=15)
         
         # Modern status bar
         status_frame = tk.Frame(self.root, bg='white', height=30)
@@ -232,6 +279,8 @@ class MainWindow:
     
     def setup_shortcuts(self):
         """Setup keyboard shortcuts for primary operations"""
+        from ..database.connection import db
+        
         # Primary operations shortcuts
         self.root.bind('<Control-n>', lambda e: self.open_pos_billing())  # Ctrl+N for New Bill
         self.root.bind('<Control-i>', lambda e: self.open_items_management())  # Ctrl+I for Items
@@ -240,7 +289,10 @@ class MainWindow:
         self.root.bind('<Control-u>', lambda e: self.open_staff_management())  # Ctrl+U for Users/Staff
         self.root.bind('<Control-s>', lambda e: self.open_settings())  # Ctrl+S for Settings
         self.root.bind('<Control-b>', lambda e: self.open_barcode_printer())  # Ctrl+B for Barcode Printer
-        self.root.bind('<Control-Shift-b>', lambda e: self.create_backup())  # Ctrl+Shift+B for Backup
+        if not db.remote:
+            self.root.bind('<Control-Shift-b>', lambda e: self.create_backup())  # Ctrl+Shift+B for Backup
+        # Ctrl+Shift+P toggles profiling from any window, including an open POS screen
+        self.root.bind_all('<Control-Shift-P>', lambda e: self.toggle_profiling())
         
         # Function keys
         self.root.bind('<F1>', lambda e: self.open_pos_billing())  # F1 for POS
@@ -255,9 +307,13 @@ class MainWindow:
     
     def update_status(self):
         """Update status bar with current user info"""
+        from ..diagnostics.profiler import profiler
+        state = f"🔴 Profiling ({profiler.mode}) - Ctrl+Shift+P to stop" if profiler.running else "🟢 Ready"
         if auth.is_logged_in():
             staff_name = auth.get_current_staff_name()
-            self.status_label.config(text=f"👤 {staff_name} | 🟢 Ready")
+            self.status_label.config(text=f"👤 {staff_name} | {state}")
+        else:
+            self.status_label.config(text=state)
     
     def open_pos_billing(self):
         """Open POS billing window"""
@@ -313,13 +369,43 @@ class MainWindow:
         except Exception as e:
             messagebox.showerror("Error", f"Could not open reports: {str(e)}")
     
+    def open_metrics(self):
+        """Open performance metrics window"""
+        try:
+            from .metrics_window import MetricsWindow
+            metrics_window = MetricsWindow(on_profiling_change=self.update_status)
+            metrics_window.show(parent=self.root)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open performance metrics: {str(e)}")
+    
+    def toggle_profiling(self):
+        """Start the sampling profiler, or stop it and say where the profile was saved"""
+        from ..diagnostics.profiler import profiler
+        try:
+            result = profiler.toggle()
+        except Exception as e:
+            messagebox.showerror("Profiling", f"Could not profile: {str(e)}")
+            return
+        self.update_status()
+        if result:
+            messagebox.showinfo("Profiling", f"Profile of {result['duration']:.0f} s saved to:\n{result['file']}\n\n"
+                                             f"Summary: {result['summary']}")
+    
+    def open_database_restore(self):
+        """Open database restore window"""
+        try:
+            from .database_restore import DatabaseRestoreWindow
+            restore_window = DatabaseRestoreWindow()
+            restore_window.show(parent=self.root)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open database restore: {str(e)}")
+    
     def open_settings(self):
         """Open settings window"""
         messagebox.showinfo("Settings", "Settings window - Coming soon!")
     
     def create_backup(self):
         """Create database backup"""
-        from ..database.connection import db
         from tkinter import filedialog
         import datetime
         
@@ -333,18 +419,191 @@ class MainWindow:
                 title="Save Database Backup",
                 defaultextension=".db",
                 filetypes=[("Database files", "*.db"), ("All files", "*.*")],
-                initialvalue=default_filename
+                initialfile=default_filename
             )
             
             if backup_path:
-                if db.backup_database(backup_path):
-                    messagebox.showinfo("Success", f"Database backup created successfully at:\n{backup_path}")
-                else:
-                    messagebox.showerror("Error", "Failed to create database backup")
+                self.run_backup(backup_path)
         
         except Exception as e:
             messagebox.showerror("Error", f"Backup failed: {str(e)}")
     
+    def run_backup(self, backup_path):
+        """Run an online backup in the background with a progress dialog"""
+        import threading
+        from ..database.backup import BackupEngine
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Database Backup")
+        progress_window.geometry("400x110")
+        progress_window.transient(self.root)
+        
+        status_var = tk.StringVar(value="Starting backup...")
+        ttk.Label(progress_window, textvariable=status_var).pack(pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, length=350, mode='determinate')
+        progress_bar.pack(pady=5)
+        
+        state = {'done': 0, 'total': 0, 'result': None, 'error': None}
+        
+        def on_progress(done, total):
+            # Called from the worker thread; the UI polls these values
+            state['done'] = done
+            state['total'] = total
+        
+        def worker():
+            try:
+                state['result'] = BackupEngine(progress_callback=on_progress).backup(backup_path)
+            except Exception as e:
+                state['error'] = e
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            if state['total']:
+                progress_bar['maximum'] = state['total']
+                progress_bar['value'] = state['done']
+                status_var.set(f"Copied {state['done']} of {state['total']} pages")
+            
+            if thread.is_alive():
+                progress_window.after(100, poll)
+                return
+            
+            progress_window.destroy()
+            if state['error']:
+                messagebox.showerror("Error", f"Backup failed: {state['error']}")
+                return
+            
+            result = state['result']
+            messagebox.showinfo("Success",
+                f"Database backup created successfully at:\n{backup_path}\n\n"
+                f"Size: {result['file_size'] / 1024:.0f} KB\n"
+                f"Time: {result['duration_ms'] / 1000:.1f} s\n"
+                f"Integrity check: {result['integrity']}")
+        
+        poll()
+    
+    def archive_old_years(self):
+        """Move closed financial years to archive files in the background"""
+        import threading
+        from ..database.archive import ArchiveManager, financial_year_label
+        
+        manager = ArchiveManager()
+        try:
+            years = manager.archivable_years()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not check for old years: {str(e)}")
+            return
+        
+        if not years:
+            messagebox.showinfo("Archive Old Years", "No closed financial years left to archive.")
+            return
+        
+        labels = ", ".join(financial_year_label(fy) for fy in years)
+        if not messagebox.askyesno("Archive Old Years",
+                                   f"Move {labels} to archive files?\n\n"
+                                   f"Archived bills stay available in reports and bill lookups.\n"
+                                   f"Archive folder: {manager.archive_dir}"):
+            return
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Archive Old Years")
+        progress_window.geometry("400x110")
+        progress_window.transient(self.root)
+        
+        status_var = tk.StringVar(value="Starting archive...")
+        ttk.Label(progress_window, textvariable=status_var).pack(pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, length=350, mode='determinate', maximum=len(years))
+        progress_bar.pack(pady=5)
+        
+        state = {'done': 0, 'current': None, 'results': [], 'error': None}
+        
+        def worker():
+            try:
+                for fy_start in years:
+                    state['current'] = financial_year_label(fy_start)
+                    state['results'].append(manager.archive_year(fy_start))
+                    state['done'] += 1
+            except Exception as e:
+                state['error'] = e
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            progress_bar['value'] = state['done']
+            if state['current']:
+                status_var.set(f"Archiving {state['current']}...")
+            
+            if thread.is_alive():
+                progress_window.after(100, poll)
+                return
+            
+            progress_window.destroy()
+            summary = "\n".join(
+                f"{result['label']}: {result['bills']} bills, {result['stock_movements']} stock movements"
+                for result in state['results']
+            )
+            if state['error']:
+                messagebox.showerror("Error", f"Archive of {state['current']} failed: {state['error']}"
+                                     + (f"\n\nCompleted:\n{summary}" if summary else ""))
+                return
+            messagebox.showinfo("Success", f"Archive complete.\n\n{summary}")
+        
+        poll()
+    
+    def mark_activity(self, event=None):
+        """Record user activity (keyboard or mouse)"""
+        self.last_activity = time.monotonic()
+    
+    def idle_seconds(self) -> float:
+        """Seconds since the last user activity"""
+        return time.monotonic() - self.last_activity
+    
+    def run_maintenance(self):
+        """Run full database maintenance in the background"""
+        import threading
+        from ..database.maintenance import MaintenanceEngine, format_run
+        
+        if not messagebox.askyesno("Database Maintenance",
+                                   "Run ANALYZE, optimize, checkpoint and VACUUM (when needed) now?\n\n"
+                                   "Billing may pause briefly while this runs."):
+            return
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Database Maintenance")
+        progress_window.geometry("400x110")
+        progress_window.transient(self.root)
+        
+        ttk.Label(progress_window, text="Running database maintenance...").pack(pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, length=350, mode='indeterminate')
+        progress_bar.pack(pady=5)
+        progress_bar.start(10)
+        
+        state = {'result': None, 'error': None}
+        
+        def worker():
+            try:
+                state['result'] = MaintenanceEngine().run('MANUAL')
+            except Exception as e:
+                state['error'] = e
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            if thread.is_alive():
+                progress_window.after(100, poll)
+                return
+            
+            progress_window.destroy()
+            if state['error']:
+                messagebox.showerror("Error", f"Maintenance failed: {state['error']}")
+                return
+            messagebox.showinfo("Database Maintenance", format_run(state['result']))
+        
+        poll()
+    
     def logout(self):
         """Logout current user"""
         try:
@@ -370,4 +629,47 @@ class MainWindow:
     
     def run(self):
         """Run the main window"""
-        self.root.mainloop()
\ No newline at end of file
+        from ..database.connection import db
+        from ..database.backup import BackupScheduler
+        from ..database.maintenance import MaintenanceScheduler
+        from ..diagnostics.metrics import metrics
+        from ..diagnostics.workload import start_recording_from_env
+        from ..diagnostics.watchdog import UIWatchdog, DEFAULT_FREEZE_MS
+        
+        # Scheduled incremental backups while the application is open, taken
+        # by one terminal at a time (a billing service runs its own next to the database)
+        self.backup_scheduler = BackupScheduler()
+        
+        # Statistics refresh and space reclaim while nobody is billing
+        self.maintenance_scheduler = MaintenanceScheduler(self.idle_seconds)
+        
+        if not db.remote:
+            self.backup_scheduler.start()
+            self.maintenance_scheduler.start()
+        
+        # Latency histograms written to metrics/<till>.prom for monitoring
+        metrics.start()
+        # Day's billing calls for replay (THANGAMAYIL_RECORD_WORKLOAD)
+        recorder = start_recording_from_env()
+        
+        # Stalls of the screen are logged to logs/ui_freezes.log with the blocking code
+        try:
+            freeze_ms = float(db.get_setting('ui_freeze_ms') or DEFAULT_FREEZE_MS)
+        except (TypeError, ValueError):
+            freeze_ms = DEFAULT_FREEZE_MS
+        self.watchdog = UIWatchdog(
+            self.root, log_dir=os.path.join(os.path.dirname(os.path.abspath(db.db_path)), "logs"), freeze_ms=freeze_ms
+        )
+        self.watchdog.start()
+        try:
+            self.root.mainloop()
+        finally:
+            from ..diagnostics.profiler import profiler
+            if profiler.running:
+                profiler.stop()
+            self.watchdog.stop()
+            if recorder:
+                recorder.stop()
+            metrics.stop()
+            self.maintenance_scheduler.stop()
+            self.backup_scheduler.stop()
\ No newline at end of file
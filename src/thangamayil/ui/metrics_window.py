@@ -0,0 +1,134 @@
+"""
+Performance Metrics Window
+Latency percentiles of the billing hot paths on this till
+"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+from ..diagnostics.metrics import metrics, terminal_name
+from ..diagnostics.profiler import profiler, MODES, DEFAULT_MODE
+
+
+class MetricsWindow:
+    """Latency metrics interface"""
+
+    def __init__(self, on_profiling_change=None):
+        self.window = None
+        self.on_profiling_change = on_profiling_change
+
+    def show(self, parent=None):
+        """Display the metrics window"""
+        self.window = tk.Toplevel(parent)
+        self.window.title("Performance Metrics - தங்கமயில் சில்க்ஸ்")
+        self.window.geometry("720x480")
+
+        # Set up proper window cleanup
+        self.window.protocol("WM_DELETE_WINDOW", self.close_window)
+
+        try:
+            if parent:
+                self.window.transient(parent)
+        except tk.TclError:
+            pass  # Skip if parent window is not available
+
+        self.create_widgets()
+        self.refresh()
+
+    def close_window(self):
+        """Properly close the metrics window"""
+        if self.window:
+            self.window.destroy()
+            self.window = None
+
+    def create_widgets(self):
+        """Create the UI widgets"""
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(main_frame, text="📈 Performance Metrics", font=("Arial", 16, "bold")).pack(pady=(0, 5))
+        ttk.Label(main_frame, text=f"Till: {terminal_name()}", foreground="gray").pack(anchor=tk.W)
+
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+
+        columns = ('Operation', 'Count', 'p50', 'p90', 'p99', 'Max', 'Errors')
+        self.metrics_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10)
+        for column in columns:
+            heading = column if column in ('Operation', 'Count', 'Errors') else f"{column} (ms)"
+            self.metrics_tree.heading(column, text=heading)
+            self.metrics_tree.column(column, width=180 if column == 'Operation' else 80,
+                                     anchor=tk.W if column == 'Operation' else tk.E)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.metrics_tree.yview)
+        self.metrics_tree.configure(yscrollcommand=scrollbar.set)
+        self.metrics_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.status_var, foreground="blue").pack(anchor=tk.W)
+
+        profile_frame = ttk.LabelFrame(main_frame, text="Profiler (Ctrl+Shift+P)", padding="5")
+        profile_frame.pack(fill=tk.X, pady=(10, 0))
+        self.profile_mode_var = tk.StringVar(value=profiler.mode or DEFAULT_MODE)
+        for mode in MODES:
+            ttk.Radiobutton(profile_frame, text=mode, value=mode,
+                            variable=self.profile_mode_var).pack(side=tk.LEFT, padx=5)
+        self.profile_button = ttk.Button(profile_frame, command=self.toggle_profiling)
+        self.profile_button.pack(side=tk.RIGHT, padx=5)
+        self.update_profile_button()
+
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(buttons_frame, text="🔄 Refresh", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="💾 Save Metrics File", command=self.save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="🗑️ Reset", command=self.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="❌ Close", command=self.close_window).pack(side=tk.RIGHT, padx=5)
+
+    def refresh(self):
+        """Reload the percentiles"""
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        snapshot = metrics.snapshot()
+        for name, summary in snapshot.items():
+            self.metrics_tree.insert('', 'end', values=(
+                name, summary['count'],
+                f"{summary['p50_ms']:.1f}", f"{summary['p90_ms']:.1f}",
+                f"{summary['p99_ms']:.1f}", f"{summary['max_ms']:.1f}",
+                summary['errors']
+            ))
+        if not snapshot:
+            self.status_var.set("No operations timed yet")
+        else:
+            self.status_var.set(f"{len(snapshot)} operations")
+
+    def save(self):
+        """Write the Prometheus metrics file now"""
+        try:
+            path = metrics.flush()
+            self.status_var.set(f"Saved to {path}" if path else "Nothing to save yet")
+        except OSError as e:
+            messagebox.showerror("Metrics", f"Could not save metrics: {e}", parent=self.window)
+
+    def reset(self):
+        """Start the histograms again"""
+        if messagebox.askyesno("Metrics", "Clear all latency measurements on this till?", parent=self.window):
+            metrics.reset()
+            self.refresh()
+            self.save()
+
+    def update_profile_button(self):
+        self.profile_button.config(text="⏹ Stop Profiling" if profiler.running else "⏺ Start Profiling")
+
+    def toggle_profiling(self):
+        """Start a profiling session, or stop it and show where it was saved"""
+        try:
+            if profiler.running:
+                result = profiler.stop()
+                self.status_var.set(f"Profile saved to {result['file']}")
+            else:
+                profiler.start(self.profile_mode_var.get())
+                self.status_var.set(f"Profiling ({profiler.mode}) - reproduce the slow operation, then stop")
+        except Exception as e:
+            messagebox.showerror("Profiling", f"Could not profile: {e}", parent=self.window)
+        self.update_profile_button()
+        if self.on_profiling_change:
+            self.on_profiling_change()
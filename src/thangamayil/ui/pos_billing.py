@@ -3,12 +3,14 @@ POS Billing Window
 Point of Sale interface for creating bills and processing transactions
 """
 
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 from ..models.items import ItemsManager
-from ..models.billing import BillingManager
+from ..models.billing import BillingManager, GSTCalculator
 from ..models.auth import auth
+from ..diagnostics.metrics import metrics
 
 
 class POSBillingWindow:
@@ -358,10 +360,14 @@ class POSBillingWindow:
             return
         
         try:
+            scanned = time.perf_counter()
             item = ItemsManager.get_item_by_barcode(barcode)
             if item:
                 self.add_item_to_bill(item)
                 self.barcode_var.set("")  # Clear barcode entry
+                # Scan-to-display: until the new line is drawn on screen
+                self.window.update_idletasks()
+                metrics.record('scan_to_display', time.perf_counter() - scanned)
             else:
                 messagebox.showwarning("Item Not Found", f"No item found with barcode: {barcode}")
                 self.barcode_entry.focus()
@@ -503,8 +509,6 @@ class POSBillingWindow:
     
     def calculate_line_total(self, bill_item):
         """Calculate line total for a bill item"""
-        from ..models.billing import GSTCalculator
-        
         calc = GSTCalculator.calculate_line_total(
             quantity=bill_item['quantity'],
             unit_price=bill_item['unit_price'],
@@ -522,44 +526,21 @@ class POSBillingWindow:
             self.total_var.set("₹0.00")
             return
         
-        # Calculate totals
-        subtotal = 0
-        total_gst = 0
-        
-        for bill_item in self.bill_items:
-            from ..models.billing import GSTCalculator
-            
-            calc = GSTCalculator.calculate_line_total(
-                quantity=bill_item['quantity'],
-                unit_price=bill_item['unit_price'],
-                discount_percentage=bill_item['discount_percentage'],
-                gst_rate=bill_item['gst_percentage']
-            )
-            
-            subtotal += calc['taxable_amount']
-            total_gst += calc['gst_amount']
+        # Calculate totals with the same arithmetic used for saving and printing
+        summary = GSTCalculator.calculate_bill_summary(self.bill_items, self.get_bill_discount_percent())
         
-        # Apply bill discount
+        # Update display
+        self.subtotal_var.set(f"₹{summary['subtotal']:.2f}")
+        self.discount_amount_var.set(f"₹{summary['discount_amount']:.2f}")
+        self.gst_var.set(f"₹{summary['total_gst']:.2f}")
+        self.total_var.set(f"₹{summary['grand_total']:.2f}")
+    
+    def get_bill_discount_percent(self):
+        """Get bill-level discount percentage from the entry"""
         try:
-            bill_discount_percent = float(self.discount_var.get() or 0)
+            return float(self.discount_var.get() or 0)
         except ValueError:
-            bill_discount_percent = 0
-        
-        bill_discount_amount = (subtotal * bill_discount_percent) / 100
-        discounted_subtotal = subtotal - bill_discount_amount
-        
-        # Recalculate GST on discounted amount
-        if bill_discount_percent > 0:
-            gst_ratio = total_gst / subtotal if subtotal > 0 else 0
-            total_gst = discounted_subtotal * gst_ratio
-        
-        grand_total = discounted_subtotal + total_gst
-        
-        # Update display
-        self.subtotal_var.set(f"₹{subtotal:.2f}")
-        self.discount_amount_var.set(f"₹{bill_discount_amount:.2f}")
-        self.gst_var.set(f"₹{total_gst:.2f}")
-        self.total_var.set(f"₹{grand_total:.2f}")
+            return 0
     
     def create_customer_section(self, parent):
         """Create customer section"""
@@ -863,56 +844,16 @@ class POSBillingWindow:
         
         try:
             from .thermal_printer import ThermalPrinter
-            from ..database.connection import db
-            
-            # Calculate GST amounts for preview
-            total_cgst = 0
-            total_sgst = 0
-            subtotal = 0
-            
-            try:
-                if not self.bill_items:
-                    print("No bill items for preview")
-                else:
-                    for item in self.bill_items:
-                        try:
-                            # Safe access to item properties with defaults (handle both 'price' and 'unit_price')
-                            quantity = float(item.get('quantity', 0))
-                            price = float(item.get('unit_price', item.get('price', 0)))
-                            discount_percentage = float(item.get('discount_percentage', 0))
-                            gst_percentage = float(item.get('gst_percentage', 0))
-                            
-                            item_subtotal = quantity * price
-                            item_discount = (item_subtotal * discount_percentage) / 100
-                            taxable_amount = item_subtotal - item_discount
-                            item_gst_amount = (taxable_amount * gst_percentage) / 100
-                            
-                            subtotal += taxable_amount
-                            total_cgst += item_gst_amount / 2  # CGST is half of total GST
-                            total_sgst += item_gst_amount / 2  # SGST is half of total GST
-                        except (TypeError, ValueError, KeyError) as item_error:
-                            print(f"Error processing item {item}: {item_error}")
-                            continue
-            except Exception as e:
-                print(f"Error calculating GST for preview: {e}")
-                # Fallback to zero values if calculation fails
-                total_cgst = 0
-                total_sgst = 0
             
-            # Create a temporary bill data structure for preview
+            # Unsaved bill header; totals are calculated by the receipt engine
             temp_bill_data = {
                 'bill_id': 'PREVIEW',
                 'invoice_number': f'PREVIEW-{self.current_bill_id}',
                 'bill_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'customer_id': getattr(self, 'customer_id', 1),
-                'discount_amount': 0,
-                'cgst_amount': total_cgst,
-                'sgst_amount': total_sgst,
-                'igst_amount': 0,
-                'round_off': 0,
-                'grand_total': self.calculate_preview_total(),
+                'customer_name': 'Preview Mode',
+                'discount_percentage': self.get_bill_discount_percent(),
                 'payment_mode': self.payment_mode_var.get() or 'CASH',
-                'is_cancelled': 0
+                'is_interstate': False
             }
             
             # Generate preview content
@@ -930,27 +871,6 @@ class POSBillingWindow:
             print(f"Bill items: {self.bill_items}")
             messagebox.showerror("Error", f"Failed to preview bill: {e}")
     
-    def calculate_preview_total(self):
-        """Calculate total for preview without saving to database"""
-        total = 0
-        try:
-            bill_discount_percent = float(self.discount_var.get() or 0)
-        except ValueError:
-            bill_discount_percent = 0
-            
-        for item in self.bill_items:
-            line_total = item['unit_price'] * item['quantity']
-            discount = (line_total * item['discount_percentage']) / 100
-            after_discount = line_total - discount
-            gst_amount = (after_discount * item['gst_percentage']) / 100
-            total += after_discount + gst_amount
-        
-        # Apply bill discount
-        if bill_discount_percent > 0:
-            total = total - (total * bill_discount_percent / 100)
-            
-        return total
-    
     def hold_bill(self):
         """Hold current bill"""
         if not self.bill_items:
@@ -1455,306 +1375,12 @@ class BillDetailsWindow:
     def print_bill(self):
         """Print the bill to thermal printer"""
         try:
-            # Generate thermal printer content
-            bill_content = self.generate_thermal_bill()
-            if bill_content:
-                # Send to thermal printer
-                self.send_to_thermal_printer(bill_content)
-                messagebox.showinfo("Print", f"Bill {self.bill_data['invoice_number']} sent to thermal printer successfully!")
-            else:
-                messagebox.showerror("Error", "Failed to generate bill content")
-                
+            from .thermal_printer import ThermalPrinter
+            printer = ThermalPrinter()
+            printer.print_bill(self.bill_data, self.window)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to print bill: {e}")
     
-    def generate_thermal_bill(self):
-        """Generate thermal printer bill format (4 inch width)"""
-        try:
-            from ..database.connection import db
-            from datetime import datetime
-            
-            # Get bill items from database
-            items_query = '''
-            SELECT * FROM bill_items 
-            WHERE bill_id = ? 
-            ORDER BY bill_item_id
-            '''
-            bill_items = db.execute_query(items_query, (self.bill_data['bill_id'],))
-            
-            # Get customer info
-            customer_query = '''
-            SELECT c.customer_name, c.phone_number, c.address 
-            FROM customers c 
-            JOIN bills b ON c.customer_id = b.customer_id 
-            WHERE b.bill_id = ?
-            '''
-            customer_result = db.execute_query(customer_query, (self.bill_data['bill_id'],))
-            customer_name = customer_result[0]['customer_name'] if customer_result else "Walk-in Customer"
-            customer_phone = customer_result[0]['phone_number'] if customer_result else ""
-            
-            # Get shop settings
-            shop_name = db.get_setting('shop_name') or 'தங்கமயில் சில்க்ஸ்'
-            shop_address = db.get_setting('shop_address') or 'No.1 Main Road, Tamil Nadu, IN'
-            shop_phone = db.get_setting('shop_phone') or '+91-9876543210'
-            gstin = db.get_setting('gstin') or '33AAACT9454F1ZB'
-            
-            # Build thermal printer content (64 characters width for 4 inch)
-            bill_lines = []
-            line_width = 64
-            
-            # Header
-            bill_lines.append("=" * line_width)
-            bill_lines.append(shop_name.center(line_width))
-            bill_lines.append(shop_address.center(line_width))
-            bill_lines.append(f"Ph: {shop_phone}".center(line_width))
-            bill_lines.append(f"GSTIN: {gstin}".center(line_width))
-            bill_lines.append("=" * line_width)
-            bill_lines.append("*** TAX INVOICE ***".center(line_width))
-            bill_lines.append("(GST Compliant Bill)".center(line_width))
-            bill_lines.append("=" * line_width)
-            
-            # Bill details
-            bill_date = datetime.strptime(self.bill_data['bill_date'], '%Y-%m-%d %H:%M:%S')
-            bill_lines.append(f"Invoice: {self.bill_data['invoice_number']}")
-            bill_lines.append(f"Date: {bill_date.strftime('%d-%m-%Y %H:%M')}")
-            
-            if customer_name != "Walk-in Customer":
-                bill_lines.append(f"Customer: {customer_name}")
-                if customer_phone:
-                    bill_lines.append(f"Phone: {customer_phone}")
-            
-            bill_lines.append("-" * line_width)
-            
-            # Items header
-            bill_lines.append("Item                    Qty  Rate   Total")
-            bill_lines.append("-" * line_width)
-            
-            # Items
-            subtotal = 0
-            total_discount = 0
-            total_gst = 0
-            
-            for item in bill_items:
-                # Calculate amounts - handle Row objects safely
-                unit_price = float(item['unit_price'] if item['unit_price'] is not None else 0)
-                quantity = int(item['quantity'] if item['quantity'] is not None else 1)
-                discount_percentage = float(item['discount_percentage'] if item['discount_percentage'] is not None else 0)
-                gst_percentage = float(item['gst_percentage'] if item['gst_percentage'] is not None else 0)
-                
-                line_subtotal = unit_price * quantity
-                discount_amount = (line_subtotal * discount_percentage) / 100
-                taxable_amount = line_subtotal - discount_amount
-                gst_amount = (taxable_amount * gst_percentage) / 100
-                line_total = taxable_amount + gst_amount
-                
-                subtotal += line_subtotal
-                total_discount += discount_amount
-                total_gst += gst_amount
-                
-                # Format item name (truncate if too long)
-                item_name = str(item['item_name'] if item['item_name'] is not None else 'Unknown Item')
-                if len(item_name) > 20:
-                    item_name = item_name[:17] + "..."
-                
-                # Format line: "Item name           Qty  Rate   Total"
-                qty_str = str(quantity)
-                rate_str = f"{unit_price:.0f}"
-                total_str = f"{line_total:.0f}"
-                
-                # Build line with proper spacing
-                spaces_after_name = max(1, 20 - len(item_name))
-                spaces_after_qty = max(1, 4 - len(qty_str))
-                spaces_after_rate = max(1, 7 - len(rate_str))
-                
-                line = f"{item_name}{' ' * spaces_after_name}{qty_str}{' ' * spaces_after_qty}{rate_str}{' ' * spaces_after_rate}{total_str}"
-                bill_lines.append(line)
-                
-                # Add discount info if applicable
-                if discount_percentage > 0:
-                    bill_lines.append(f"  Disc: {discount_percentage:.1f}% = -{discount_amount:.0f}")
-                
-                # Add GST info
-                if gst_percentage > 0:
-                    bill_lines.append(f"  GST: {gst_percentage:.1f}% = +{gst_amount:.0f}")
-            
-            bill_lines.append("=" * line_width)
-            bill_lines.append("BILL SUMMARY".center(line_width))
-            bill_lines.append("=" * line_width)
-            
-            # Summary calculations
-            bill_discount_amount = self.bill_data.get('discount_amount', 0)
-            cgst_amount = self.bill_data.get('cgst_amount', 0)
-            sgst_amount = self.bill_data.get('sgst_amount', 0)
-            igst_amount = self.bill_data.get('igst_amount', 0)
-            round_off = self.bill_data.get('round_off', 0)
-            
-            # Subtotal and discounts section
-            bill_lines.append(f"Subtotal:{str(int(subtotal)).rjust(line_width - 9)}")
-            
-            if total_discount > 0:
-                bill_lines.append(f"Item Disc:{('-' + str(int(total_discount))).rjust(line_width - 10)}")
-            
-            if bill_discount_amount > 0:
-                bill_lines.append(f"Bill Disc:{('-' + str(int(bill_discount_amount))).rjust(line_width - 10)}")
-            
-            # GST section separator
-            if cgst_amount > 0 or igst_amount > 0:
-                bill_lines.append("-" * line_width)
-                bill_lines.append("GST BREAKDOWN".center(line_width))
-                bill_lines.append("-" * line_width)
-            
-            # GST calculations
-            if cgst_amount > 0:
-                # Calculate average GST rate for display (assuming CGST = SGST)
-                taxable_amount = subtotal - total_discount - bill_discount_amount
-                total_gst_rate = (cgst_amount + sgst_amount) / (taxable_amount / 100) if taxable_amount > 0 else 0
-                cgst_rate = total_gst_rate / 2
-                bill_lines.append(f"CGST@{cgst_rate:.1f}%:{str(int(cgst_amount)).rjust(line_width - 12)}")
-                bill_lines.append(f"SGST@{cgst_rate:.1f}%:{str(int(sgst_amount)).rjust(line_width - 12)}")
-            
-            if igst_amount > 0:
-                # Calculate IGST rate for display
-                taxable_amount = subtotal - total_discount - bill_discount_amount
-                igst_rate = (igst_amount / (taxable_amount / 100)) if taxable_amount > 0 else 0
-                bill_lines.append(f"IGST@{igst_rate:.1f}%:{str(int(igst_amount)).rjust(line_width - 12)}")
-            
-            # Round off section
-            if round_off != 0:
-                bill_lines.append("-" * line_width)
-                sign = "+" if round_off > 0 else ""
-                bill_lines.append(f"Round Off:{(sign + str(round_off)).rjust(line_width - 10)}")
-            
-            # Final total section
-            bill_lines.append("=" * line_width)
-            bill_lines.append(f"TOTAL:{str(int(self.bill_data['grand_total'])).rjust(line_width - 6)}")
-            bill_lines.append("=" * line_width)
-            
-            # Payment info
-            bill_lines.append(f"Payment: {self.bill_data['payment_mode']}")
-            bill_lines.append("")
-            
-            # Footer - GST Compliance
-            bill_lines.append("")
-            bill_lines.append("*** TERMS & CONDITIONS ***".center(line_width))
-            bill_lines.append("This is a Computer Generated Invoice".center(line_width))
-            bill_lines.append("Subject to Local Jurisdiction".center(line_width))
-            bill_lines.append("No Exchange | No Refund".center(line_width))
-            bill_lines.append("")
-            bill_lines.append("Thank you for shopping with us!".center(line_width))
-            bill_lines.append("-" * line_width)
-            bill_lines.append("")
-            bill_lines.append("")  # Extra lines for paper cutting
-            
-            return "\n".join(bill_lines)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate bill: {str(e)}")
-            return None
-    
-    def send_to_thermal_printer(self, content):
-        """Send content to thermal printer"""
-        try:
-            import tempfile
-            import os
-            import platform
-            
-            # Create temporary file with bill content
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
-                temp_file.write(content)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Try to print to default printer
-                system = platform.system()
-                
-                if system == "Windows":
-                    # Windows: Print to default printer
-                    os.system(f'type "{temp_file_path}" > PRN')
-                    # Alternative: Use notepad /p for formatted printing
-                    # os.system(f'notepad /p "{temp_file_path}"')
-                    
-                elif system == "Linux":
-                    # Linux: Use lp command
-                    os.system(f'lp "{temp_file_path}"')
-                    
-                elif system == "Darwin":  # macOS
-                    # macOS: Use lp command
-                    os.system(f'lp "{temp_file_path}"')
-                
-                else:
-                    # Fallback: Show content in a dialog for manual printing
-                    self.show_print_preview(content)
-                    
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-                    
-        except Exception as e:
-            # Fallback: Show print preview
-            self.show_print_preview(content)
-            messagebox.showinfo("Print Method", 
-                "Automatic printing failed. Please copy the text from the preview window and print manually.")
-    
-    def show_print_preview(self, content):
-        """Show print preview window"""
-        preview_window = tk.Toplevel()
-        preview_window.title(f"Print Preview - {self.bill_data['invoice_number']}")
-        preview_window.geometry("600x800")
-        
-        if self.window:
-            try:
-                preview_window.transient(self.window)
-                preview_window.grab_set()
-            except tk.TclError:
-                pass
-        
-        # Create text widget with monospace font
-        text_frame = ttk.Frame(preview_window)
-        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        text_widget = tk.Text(text_frame, font=("Courier New", 10), wrap=tk.NONE)
-        scrollbar_v = ttk.Scrollbar(text_frame, orient="vertical", command=text_widget.yview)
-        scrollbar_h = ttk.Scrollbar(text_frame, orient="horizontal", command=text_widget.xview)
-        
-        text_widget.configure(yscrollcommand=scrollbar_v.set, xscrollcommand=scrollbar_h.set)
-        
-        text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar_v.pack(side=tk.RIGHT, fill=tk.Y)
-        scrollbar_h.pack(side=tk.BOTTOM, fill=tk.X)
-        
-        # Insert content
-        text_widget.insert(tk.END, content)
-        text_widget.config(state=tk.DISABLED)
-        
-        # Buttons
-        button_frame = ttk.Frame(preview_window)
-        button_frame.pack(fill=tk.X, padx=10, pady=5)
-        
-        ttk.Button(button_frame, text="📄 Copy to Clipboard", 
-                  command=lambda: self.copy_to_clipboard(content)).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="🖨️ Try Print Again", 
-                  command=lambda: self.send_to_thermal_printer(content)).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="❌ Close", 
-                  command=preview_window.destroy).pack(side=tk.RIGHT, padx=5)
-    
-    def copy_to_clipboard(self, content):
-        """Copy content to clipboard"""
-        try:
-            import tkinter as tk
-            # Create a temporary root if needed
-            temp_root = tk.Tk()
-            temp_root.withdraw()
-            temp_root.clipboard_clear()
-            temp_root.clipboard_append(content)
-            temp_root.update()
-            temp_root.destroy()
-            messagebox.showinfo("Copied", "Bill content copied to clipboard!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to copy to clipboard: {e}")
-    
     def cancel_bill(self):
         """Cancel the bill"""
         if messagebox.askyesno("Cancel Bill", 
@@ -2096,7 +1722,7 @@ class EditBillDialog:
         """Save changes to the bill"""
         try:
             from ..database.connection import db
-            from ..models.billing import BillingManager, GSTCalculator
+            from ..models.billing import BillingManager
             
             if not self.bill_items:
                 messagebox.showerror("Error", "Cannot save bill without items")
@@ -2120,39 +1746,10 @@ class EditBillDialog:
                 db.execute_update("UPDATE bills SET customer_id = NULL WHERE bill_id = ?",
                                 (self.bill_data['bill_id'],))
             
-            # Delete existing bill items
-            db.execute_update("DELETE FROM bill_items WHERE bill_id = ?", (self.bill_data['bill_id'],))
-            
-            # Insert updated items
-            for item in self.bill_items:
-                # Recalculate line total
-                calc = GSTCalculator.calculate_line_total(
-                    quantity=item['quantity'],
-                    unit_price=item['unit_price'],
-                    discount_percentage=item['discount_percentage'],
-                    gst_rate=item['gst_percentage']
-                )
-                
-                query = '''
-                INSERT INTO bill_items (
-                    bill_id, item_id, item_name, barcode, quantity, unit_price, 
-                    discount_percentage, discount_amount, gst_percentage, gst_amount, line_total
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                '''
-                
-                db.execute_update(query, (
-                    self.bill_data['bill_id'],
-                    item.get('item_id'),
-                    item['item_name'],
-                    item.get('barcode', ''),
-                    item['quantity'],
-                    item['unit_price'],
-                    item['discount_percentage'],
-                    calc['discount_amount'],
-                    item['gst_percentage'],
-                    calc['gst_amount'],
-                    calc['line_total']
-                ))
+            # Replace the lines in one transaction so a failure cannot leave the bill empty
+            if not BillingManager.replace_bill_items(self.bill_data['bill_id'], self.bill_items):
+                messagebox.showerror("Error", "Failed to save bill items")
+                return
             
             # Recalculate bill totals
             try:
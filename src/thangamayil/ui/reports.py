@@ -10,17 +10,54 @@ from datetime import datetime, timedelta
 from ..models.billing import BillingManager
 
 
+def group_by_staff(bills):
+    """Bills, items and sales per staff member (staff performance report)"""
+    staff_performance = {}
+    for bill in bills:
+        staff_name = bill['staff_name']
+        if staff_name not in staff_performance:
+            staff_performance[staff_name] = {
+                'bills': 0,
+                'total_amount': 0,
+                'total_items': 0
+            }
+        
+        staff_performance[staff_name]['bills'] += 1
+        staff_performance[staff_name]['total_amount'] += bill['grand_total']
+        staff_performance[staff_name]['total_items'] += bill['item_count']
+    return staff_performance
+
+
+def group_by_payment_mode(bills):
+    """Bill count and amount per payment mode (payment mode report)"""
+    payment_summary = {}
+    for bill in bills:
+        mode = bill['payment_mode']
+        if mode not in payment_summary:
+            payment_summary[mode] = {
+                'count': 0,
+                'amount': 0
+            }
+        
+        payment_summary[mode]['count'] += 1
+        payment_summary[mode]['amount'] += bill['grand_total']
+    return payment_summary
+
+
 class ReportsWindow:
     """Reports interface"""
     
-    def __init__(self):
+    def __init__(self, get_bills=None, title: str = "Reports - தங்கமயில் சில்க்ஸ்"):
+        # Head office passes the consolidated database's get_bills_by_date
+        self.get_bills = get_bills or BillingManager.get_bills_by_date
+        self.title = title
         self.window = None
         self.reports_data = []
     
     def show(self, parent=None):
         """Display the reports window"""
         self.window = tk.Toplevel(parent)
-        self.window.title("Reports - தங்கமயில் சில்க்ஸ்")
+        self.window.title(self.title)
         self.window.geometry("1000x700")
         
         # Set up proper window cleanup
@@ -193,7 +230,7 @@ class ReportsWindow:
             from_date = self.from_date.get()
             to_date = self.to_date.get()
             
-            bills = BillingManager.get_bills_by_date(from_date, to_date)
+            bills = self.get_bills(from_date, to_date)
             
             # Configure treeview columns
             columns = ('Date', 'Invoice', 'Staff', 'Items', 'Amount', 'Payment')
@@ -245,22 +282,8 @@ class ReportsWindow:
             from_date = self.from_date.get()
             to_date = self.to_date.get()
             
-            bills = BillingManager.get_bills_by_date(from_date, to_date)
-            
-            # Group by staff
-            staff_performance = {}
-            for bill in bills:
-                staff_name = bill['staff_name']
-                if staff_name not in staff_performance:
-                    staff_performance[staff_name] = {
-                        'bills': 0,
-                        'total_amount': 0,
-                        'total_items': 0
-                    }
-                
-                staff_performance[staff_name]['bills'] += 1
-                staff_performance[staff_name]['total_amount'] += bill['grand_total']
-                staff_performance[staff_name]['total_items'] += bill['item_count']
+            bills = self.get_bills(from_date, to_date)
+            staff_performance = group_by_staff(bills)
             
             # Configure treeview columns
             columns = ('Staff', 'Bills', 'Items', 'Total Sales', 'Avg Bill')
@@ -310,7 +333,7 @@ class ReportsWindow:
             from_date = self.from_date.get()
             to_date = self.to_date.get()
             
-            bills = BillingManager.get_bills_by_date(from_date, to_date)
+            bills = self.get_bills(from_date, to_date)
             
             # Configure treeview columns
             columns = ('Invoice', 'Date', 'Time', 'Staff', 'Subtotal', 'GST', 'Total')
@@ -372,20 +395,8 @@ class ReportsWindow:
             from_date = self.from_date.get()
             to_date = self.to_date.get()
             
-            bills = BillingManager.get_bills_by_date(from_date, to_date)
-            
-            # Group by payment mode
-            payment_summary = {}
-            for bill in bills:
-                mode = bill['payment_mode']
-                if mode not in payment_summary:
-                    payment_summary[mode] = {
-                        'count': 0,
-                        'amount': 0
-                    }
-                
-                payment_summary[mode]['count'] += 1
-                payment_summary[mode]['amount'] += bill['grand_total']
+            bills = self.get_bills(from_date, to_date)
+            payment_summary = group_by_payment_mode(bills)
             
             # Configure treeview columns
             columns = ('Payment Mode', 'Count', 'Amount', 'Percentage')
@@ -435,7 +446,7 @@ class ReportsWindow:
             from_date = self.from_date.get()
             to_date = self.to_date.get()
             
-            bills = BillingManager.get_bills_by_date(from_date, to_date)
+            bills = self.get_bills(from_date, to_date)
             
             # Configure treeview columns
             columns = ('Invoice', 'Date', 'Subtotal', 'CGST', 'SGST', 'IGST', 'Total GST')
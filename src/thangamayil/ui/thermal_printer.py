@@ -5,17 +5,22 @@ Handles thermal printer bill generation and printing based on billprint.md forma
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-from datetime import datetime
 import tempfile
 import os
 import platform
+from ..printing.receipt import (
+    get_receipt_template, get_receipt_paper, build_receipt_data, load_receipt_data
+)
+from ..diagnostics.metrics import timed
 
 
 class ThermalPrinter:
     """Handles thermal printer operations"""
     
-    def __init__(self):
-        self.line_width = 64  # 4 inch (101.6mm) thermal paper width in characters
+    def __init__(self, paper_width=None):
+        # Compiled layout is shared by every printer using the same paper width
+        self.template = get_receipt_template(paper_width or get_receipt_paper())
+        self.line_width = self.template.line_width
     
     def print_bill(self, bill_data, parent_window=None):
         """Print bill to thermal printer"""
@@ -33,208 +38,21 @@ class ThermalPrinter:
             messagebox.showerror("Error", f"Failed to print bill: {e}")
     
     def generate_thermal_bill(self, bill_data):
-        """Generate thermal printer bill format (4 inch width)"""
+        """Generate thermal printer bill format from the saved bill"""
         try:
-            from ..database.connection import db
-            
-            # Get bill items from database with HSN Code
-            items_query = '''
-            SELECT bi.*, i.hsn_code 
-            FROM bill_items bi
-            LEFT JOIN items i ON bi.item_name = i.item_name
-            WHERE bi.bill_id = ? 
-            ORDER BY bi.bill_item_id
-            '''
-            bill_items = db.execute_query(items_query, (bill_data['bill_id'],))
+            receipt_data = load_receipt_data(bill_data['bill_id'])
             
             # Check if bill items exist
-            if not bill_items:
-                raise Exception(f"Cannot print bill {bill_data.get('invoice_number', bill_data['bill_id'])}: No items found. This bill appears to be empty.")
-            
-            # Get customer info
-            customer_query = '''
-            SELECT c.customer_name, c.phone_number, c.address 
-            FROM customers c 
-            JOIN bills b ON c.customer_id = b.customer_id 
-            WHERE b.bill_id = ?
-            '''
-            customer_result = db.execute_query(customer_query, (bill_data['bill_id'],))
-            customer_name = customer_result[0]['customer_name'] if customer_result else "Walk-in Customer"
-            customer_phone = customer_result[0]['phone_number'] if customer_result else ""
-            
-            # Get shop settings
-            shop_name = db.get_setting('shop_name') or 'தங்கமயில் சில்க்ஸ்'
-            shop_address = db.get_setting('shop_address') or 'No.1 Main Road, Tamil Nadu, IN'
-            shop_phone = db.get_setting('shop_phone') or '+91-9876543210'
-            gstin = db.get_setting('gstin') or '33AAACT9454F1ZB'
-            
-            # Build thermal printer content
-            bill_lines = []
-            
-            # Header
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append(shop_name.center(self.line_width))
-            bill_lines.append(shop_address.center(self.line_width))
-            bill_lines.append(f"Ph: {shop_phone}".center(self.line_width))
-            bill_lines.append(f"GSTIN: {gstin}".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append("*** TAX INVOICE ***".center(self.line_width))
-            bill_lines.append("(GST Compliant Bill)".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            
-            # Bill details
-            bill_date = datetime.strptime(bill_data['bill_date'], '%Y-%m-%d %H:%M:%S')
-            bill_lines.append(f"Invoice: {bill_data['invoice_number']}")
-            bill_lines.append(f"Date: {bill_date.strftime('%d-%m-%Y %H:%M')}")
-            
-            if customer_name != "Walk-in Customer":
-                bill_lines.append(f"Customer: {customer_name}")
-                if customer_phone:
-                    bill_lines.append(f"Phone: {customer_phone}")
-            
-            bill_lines.append("-" * self.line_width)
-            
-            # Items header - HSN and GST% in same row  
-            # Format: Item(24) + HSN(8) + GST%(6) + Qty(5) + Rate(7) + Total(8) = 58 chars
-            header_line = f"{'Item':<24}{'HSN':<8}{'GST%':>6}{'Qty':>5}{'Rate':>7}{'Total':>8}"
-            bill_lines.append(header_line)
-            bill_lines.append("-" * self.line_width)
-            
-            # Items
-            subtotal = 0
-            total_discount = 0
-            total_gst = 0
-            
-            for item in bill_items:
-                try:
-                    # Calculate amounts - handle Row objects safely
-                    unit_price = float(item['unit_price'] if item['unit_price'] is not None else 0)
-                    quantity = int(item['quantity'] if item['quantity'] is not None else 1)
-                    discount_percentage = float(item['discount_percentage'] if item['discount_percentage'] is not None else 0)
-                    gst_percentage = float(item['gst_percentage'] if item['gst_percentage'] is not None else 0)
-                except KeyError as e:
-                    raise Exception(f"Missing column in bill_items: {e}. Available columns: {list(item.keys()) if hasattr(item, 'keys') else 'Unknown'}")
-                
-                line_subtotal = unit_price * quantity
-                discount_amount = (line_subtotal * discount_percentage) / 100
-                taxable_amount = line_subtotal - discount_amount
-                gst_amount = (taxable_amount * gst_percentage) / 100
-                line_total = taxable_amount + gst_amount
-                
-                subtotal += line_subtotal
-                total_discount += discount_amount
-                total_gst += gst_amount
-                
-                # Format item name and get HSN code
-                try:
-                    item_name = str(item['item_name'] if item['item_name'] is not None else 'Unknown Item')
-                    hsn_code = str(item['hsn_code'] if item.get('hsn_code') else '')
-                except KeyError:
-                    raise Exception(f"Missing 'item_name' column in bill_items. Available columns: {list(item.keys()) if hasattr(item, 'keys') else 'Unknown'}")
-                
-                # Format line with HSN and GST% in same row
-                qty_str = str(quantity)
-                rate_str = f"{unit_price:.0f}"
-                total_str = f"{line_total:.0f}"
-                hsn_str = hsn_code[:8] if hsn_code else ''
-                gst_str = f"{gst_percentage:.1f}%"
-                
-                # Column widths: Item(24) + HSN(8) + GST%(6) + Qty(5) + Rate(7) + Total(8)
-                name_width = 24
-                hsn_width = 8
-                gst_width = 6
-                qty_width = 5
-                rate_width = 7
-                total_width = 8
-                
-                # Truncate item name if needed
-                if len(item_name) > name_width:
-                    display_name = item_name[:name_width-3] + "..."
-                else:
-                    display_name = item_name
-                
-                # Build line with HSN, GST%, Qty, Rate, Total in same row
-                line = f"{display_name:<{name_width}}{hsn_str:<{hsn_width}}{gst_str:>{gst_width}}{qty_str:>{qty_width}}{rate_str:>{rate_width}}{total_str:>{total_width}}"
-                bill_lines.append(line)
-                
-                # Add discount info if applicable (on separate line)
-                if discount_percentage > 0:
-                    bill_lines.append(f"  Disc: {discount_percentage:.1f}% = -{discount_amount:.0f}")
-            
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append("BILL SUMMARY".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            
-            # Summary calculations
-            bill_discount_amount = bill_data['discount_amount'] if bill_data['discount_amount'] is not None else 0
-            cgst_amount = bill_data['cgst_amount'] if bill_data['cgst_amount'] is not None else 0
-            sgst_amount = bill_data['sgst_amount'] if bill_data['sgst_amount'] is not None else 0
-            igst_amount = bill_data['igst_amount'] if bill_data['igst_amount'] is not None else 0
-            round_off = bill_data['round_off'] if bill_data['round_off'] is not None else 0
-            
-            # Subtotal and discounts section
-            bill_lines.append(f"Subtotal:{str(int(subtotal)).rjust(self.line_width - 9)}")
-            
-            if total_discount > 0:
-                bill_lines.append(f"Item Disc:{('-' + str(int(total_discount))).rjust(self.line_width - 10)}")
-            
-            if bill_discount_amount > 0:
-                bill_lines.append(f"Bill Disc:{('-' + str(int(bill_discount_amount))).rjust(self.line_width - 10)}")
-            
-            # GST section separator
-            if cgst_amount > 0 or igst_amount > 0:
-                bill_lines.append("-" * self.line_width)
-                bill_lines.append("GST BREAKDOWN".center(self.line_width))
-                bill_lines.append("-" * self.line_width)
-            
-            # GST calculations
-            if cgst_amount > 0:
-                # Calculate average GST rate for display (assuming CGST = SGST)
-                taxable_amount = subtotal - total_discount - bill_discount_amount
-                total_gst_rate = (cgst_amount + sgst_amount) / (taxable_amount / 100) if taxable_amount > 0 else 0
-                cgst_rate = total_gst_rate / 2
-                bill_lines.append(f"CGST@{cgst_rate:.1f}%:{str(int(cgst_amount)).rjust(self.line_width - 12)}")
-                bill_lines.append(f"SGST@{cgst_rate:.1f}%:{str(int(sgst_amount)).rjust(self.line_width - 12)}")
-            
-            if igst_amount > 0:
-                # Calculate IGST rate for display
-                taxable_amount = subtotal - total_discount - bill_discount_amount
-                igst_rate = (igst_amount / (taxable_amount / 100)) if taxable_amount > 0 else 0
-                bill_lines.append(f"IGST@{igst_rate:.1f}%:{str(int(igst_amount)).rjust(self.line_width - 12)}")
-            
-            # Round off section
-            if round_off != 0:
-                bill_lines.append("-" * self.line_width)
-                sign = "+" if round_off > 0 else ""
-                bill_lines.append(f"Round Off:{(sign + str(round_off)).rjust(self.line_width - 10)}")
-            
-            # Final total section
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append(f"TOTAL:{str(int(bill_data['grand_total'])).rjust(self.line_width - 6)}")
-            bill_lines.append("=" * self.line_width)
+            if not receipt_data or not receipt_data['lines']:
+                raise Exception(f"Cannot print bill {bill_data['invoice_number'] or bill_data['bill_id']}: No items found. This bill appears to be empty.")
             
-            # Payment info
-            bill_lines.append(f"Payment: {bill_data['payment_mode']}")
-            bill_lines.append("")
-            
-            # Footer - GST Compliance
-            bill_lines.append("")
-            bill_lines.append("*** TERMS & CONDITIONS ***".center(self.line_width))
-            bill_lines.append("This is a Computer Generated Invoice".center(self.line_width))
-            bill_lines.append("Subject to Local Jurisdiction".center(self.line_width))
-            bill_lines.append("No Exchange | No Refund".center(self.line_width))
-            bill_lines.append("")
-            bill_lines.append("Thank you for shopping with us!".center(self.line_width))
-            bill_lines.append("-" * self.line_width)
-            bill_lines.append("")
-            bill_lines.append("")  # Extra lines for paper cutting
-            
-            return "\n".join(bill_lines)
+            return self.template.render(receipt_data)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate bill: {str(e)}")
             return None
     
+    @timed('print_receipt')
     def send_to_thermal_printer(self, content, parent_window=None):
         """Send content to thermal printer"""
         try:
@@ -335,157 +153,10 @@ class ThermalPrinter:
             messagebox.showerror("Error", f"Failed to copy to clipboard: {e}")
     
     def generate_thermal_bill_preview(self, temp_bill_data, bill_items):
-        """Generate thermal bill preview from temporary data without database access"""
+        """Generate thermal bill preview from unsaved bill data"""
         try:
-            from ..database.connection import db
-            
-            # Get shop settings
-            shop_name = db.get_setting('shop_name') or 'தங்கமயில் சில்க்ஸ்'
-            shop_address = db.get_setting('shop_address') or 'No.1 Main Road, Tamil Nadu, IN'
-            shop_phone = db.get_setting('shop_phone') or '+91-9876543210'
-            gstin = db.get_setting('gstin') or '33AAACT9454F1ZB'
-            
-            # Build thermal printer content
-            bill_lines = []
-            
-            # Header
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append(shop_name.center(self.line_width))
-            bill_lines.append(shop_address.center(self.line_width))
-            bill_lines.append(f"Ph: {shop_phone}".center(self.line_width))
-            bill_lines.append(f"GSTIN: {gstin}".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append("*** TAX INVOICE (PREVIEW) ***".center(self.line_width))
-            bill_lines.append("(GST Compliant Bill)".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            
-            # Bill details
-            bill_date = datetime.strptime(temp_bill_data['bill_date'], '%Y-%m-%d %H:%M:%S')
-            bill_lines.append(f"Invoice: {temp_bill_data['invoice_number']}")
-            bill_lines.append(f"Date: {bill_date.strftime('%d-%m-%Y %H:%M')}")
-            bill_lines.append("Customer: Preview Mode")
-            bill_lines.append("-" * self.line_width)
-            
-            # Items header - HSN and GST% in same row  
-            # Format: Item(24) + HSN(8) + GST%(6) + Qty(5) + Rate(7) + Total(8) = 58 chars
-            header_line = f"{'Item':<24}{'HSN':<8}{'GST%':>6}{'Qty':>5}{'Rate':>7}{'Total':>8}"
-            bill_lines.append(header_line)
-            bill_lines.append("-" * self.line_width)
-            
-            # Items
-            subtotal = 0
-            total_discount = 0
-            total_gst = 0
-            
-            for item in bill_items:
-                # Calculate amounts
-                unit_price = float(item['unit_price'])
-                quantity = int(item['quantity'])
-                discount_percentage = float(item['discount_percentage'])
-                gst_percentage = float(item['gst_percentage'])
-                
-                line_subtotal = unit_price * quantity
-                discount_amount = (line_subtotal * discount_percentage) / 100
-                taxable_amount = line_subtotal - discount_amount
-                gst_amount = (taxable_amount * gst_percentage) / 100
-                line_total = taxable_amount + gst_amount
-                
-                subtotal += line_subtotal
-                total_discount += discount_amount
-                total_gst += gst_amount
-                
-                # Format item name and get HSN code
-                item_name = str(item['item_name'])
-                hsn_code = str(item.get('hsn_code', '')) if item.get('hsn_code') else ''
-                
-                # Format line with right-aligned numeric columns
-                qty_str = str(quantity)
-                rate_str = f"{unit_price:.0f}"
-                total_str = f"{line_total:.0f}"
-                
-                # Column widths for 64-character thermal printer - increased item width
-                name_width = 32  # Item name (increased from 25)
-                qty_width = 5    # Quantity  
-                rate_width = 7   # Rate
-                total_width = 8  # Total
-                
-                # Truncate item name if needed
-                if len(item_name) > name_width:
-                    display_name = item_name[:name_width-3] + "..."
-                else:
-                    display_name = item_name
-                
-                # Build line with properly right-aligned numeric columns
-                line = f"{display_name:<{name_width}}{qty_str:>{qty_width}}{rate_str:>{rate_width}}{total_str:>{total_width}}"
-                bill_lines.append(line)
-                
-                # Add HSN Code if available
-                if hsn_code:
-                    bill_lines.append(f"  HSN: {hsn_code}")
-                
-                # Add discount info if applicable
-                if discount_percentage > 0:
-                    bill_lines.append(f"  Disc: {discount_percentage:.1f}% = -{discount_amount:.0f}")
-                
-                # Add GST info
-                if gst_percentage > 0:
-                    bill_lines.append(f"  GST: {gst_percentage:.1f}% = +{gst_amount:.0f}")
-            
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append("BILL SUMMARY".center(self.line_width))
-            bill_lines.append("=" * self.line_width)
-            
-            # Summary section
-            bill_lines.append(f"Subtotal:{str(int(subtotal)).rjust(self.line_width - 9)}")
-            
-            if total_discount > 0:
-                bill_lines.append(f"Item Disc:{('-' + str(int(total_discount))).rjust(self.line_width - 10)}")
-            
-            # Get GST amounts from preview data
-            bill_discount_amount = temp_bill_data.get('discount_amount', 0)
-            cgst_amount = temp_bill_data.get('cgst_amount', 0) 
-            sgst_amount = temp_bill_data.get('sgst_amount', 0)
-            round_off = temp_bill_data.get('round_off', 0)
-            
-            if bill_discount_amount > 0:
-                bill_lines.append(f"Bill Disc:{('-' + str(int(bill_discount_amount))).rjust(self.line_width - 10)}")
-            
-            # GST section separator
-            if cgst_amount > 0:
-                bill_lines.append("-" * self.line_width)
-                bill_lines.append("GST BREAKDOWN".center(self.line_width))
-                bill_lines.append("-" * self.line_width)
-                
-                # Calculate average GST rate for display (assuming CGST = SGST)
-                taxable_amount = subtotal - total_discount - bill_discount_amount
-                total_gst_rate = (cgst_amount + sgst_amount) / (taxable_amount / 100) if taxable_amount > 0 else 0
-                cgst_rate = total_gst_rate / 2
-                bill_lines.append(f"CGST@{cgst_rate:.1f}%:{str(int(cgst_amount)).rjust(self.line_width - 12)}")
-                bill_lines.append(f"SGST@{cgst_rate:.1f}%:{str(int(sgst_amount)).rjust(self.line_width - 12)}")
-            
-            # Round off section
-            if round_off != 0:
-                bill_lines.append("-" * self.line_width)
-                sign = "+" if round_off > 0 else ""
-                bill_lines.append(f"Round Off:{(sign + str(round_off)).rjust(self.line_width - 10)}")
-            
-            # Final total section
-            bill_lines.append("=" * self.line_width)
-            bill_lines.append(f"TOTAL:{str(int(temp_bill_data['grand_total'])).rjust(self.line_width - 6)}")
-            bill_lines.append("=" * self.line_width)
-            
-            # Payment info
-            bill_lines.append(f"Payment: {temp_bill_data['payment_mode']}")
-            bill_lines.append("")
-            
-            # Footer
-            bill_lines.append("***** PREVIEW MODE *****".center(self.line_width))
-            bill_lines.append("This is a preview only".center(self.line_width))
-            bill_lines.append("Thank you for shopping with us!".center(self.line_width))
-            bill_lines.append("")
-            bill_lines.append("-" * self.line_width)
-            
-            return "\n".join(bill_lines)
+            receipt_data = build_receipt_data(temp_bill_data, bill_items)
+            return self.template.render(receipt_data, preview=True)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate preview: {str(e)}")
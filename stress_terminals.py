@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Multi-terminal stress test
+Runs several simulated billing counters as separate processes against one
+database file and checks invoice numbers and stock afterwards
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+# Items sold by the simulated tills; the first one is kept scarce so tills
+# compete for its last units
+STRESS_ITEMS = 5
+LINES_PER_BILL = 2
+
+
+def setup_stress_items(stock: int, scarce_stock: int):
+    """Create or reset the stress items and return their ids"""
+    from thangamayil.database.connection import db
+    from thangamayil.models.items import ItemsManager
+
+    item_ids = []
+    for index in range(STRESS_ITEMS):
+        barcode = f"STRESS{index + 1:03d}"
+        quantity = scarce_stock if index == 0 else stock
+        item = ItemsManager.get_item_by_barcode(barcode)
+        if item:
+            db.execute_update("UPDATE items SET stock_quantity = ? WHERE item_id = ?", (quantity, item['item_id']))
+            item_ids.append(item['item_id'])
+        else:
+            item_ids.append(db.execute_insert(
+                """
+                INSERT INTO items (barcode, item_name, price, gst_percentage, stock_quantity)
+                VALUES (?, ?, ?, 5.0, ?)
+                """,
+                (barcode, f"Stress Test Saree {index + 1}", 500.0 + index * 100, quantity)
+            ))
+    return item_ids
+
+
+def invoice_position() -> dict:
+    """How far each invoice block and the sequence have got, so a run audits only its own numbers"""
+    from thangamayil.database.connection import db
+    from thangamayil.models.billing import BillingManager
+
+    prefix = db.get_setting('invoice_prefix') or 'TSK'
+    sequence = db.get_single_result("SELECT last_number FROM invoice_sequences WHERE prefix = ?", (prefix,))
+    return {
+        'prefix': prefix,
+        'last_number': sequence['last_number'] if sequence else BillingManager._highest_invoice_number(prefix),
+        'blocks': {row['block_id']: row['next_number'] for row in db.execute_query(
+            "SELECT block_id, next_number FROM invoice_blocks WHERE prefix = ?", (prefix,)
+        )}
+    }
+
+
+def missing_invoices_since(position: dict) -> list:
+    """Invoice numbers issued after position that have no bill"""
+    from thangamayil.database.connection import db
+    from thangamayil.models.billing import BillingManager
+
+    prefix = position['prefix']
+    issued = set()
+    if BillingManager._invoice_block_size() > 0:
+        for block in db.execute_query("SELECT * FROM invoice_blocks WHERE prefix = ?", (prefix,)):
+            first = position['blocks'].get(block['block_id'], block['start_number'])
+            issued.update(range(first, min(block['next_number'] - 1, block['end_number']) + 1))
+    else:
+        sequence = db.get_single_result("SELECT last_number FROM invoice_sequences WHERE prefix = ?", (prefix,))
+        issued.update(range(position['last_number'] + 1, (sequence['last_number'] if sequence else 0) + 1))
+
+    used = {int(row['invoice_number'][len(prefix):]) for row in db.execute_query(
+        "SELECT invoice_number FROM bills WHERE invoice_number LIKE ?", (f"{prefix}%",)
+    ) if row['invoice_number'][len(prefix):].isdigit()}
+    return [f"{prefix}{number:06d}" for number in sorted(issued - used)]
+
+
+def till_worker(till_number: int, bills: int, item_ids: list, staff_id: int,
+                service_url: str = None, db_path: str = None) -> dict:
+    """One billing counter: create, fill and finalize bills as fast as possible"""
+    from thangamayil.database.connection import db
+    from thangamayil.models.billing import BillingManager, INVOICE_TERMINAL_ENV
+    from thangamayil.models.items import ItemsManager
+
+    # Each till is its own terminal for invoice blocks, when the invoice_block_size setting turns them on
+    os.environ[INVOICE_TERMINAL_ENV] = f"TILL{till_number}"
+    if service_url:
+        from thangamayil.service.client import connect_to_service
+        connect_to_service(service_url)
+    else:
+        if db_path:
+            db.db_path = db_path
+        db.connect()
+    rng = random.Random(till_number)
+    items = {item_id: ItemsManager.get_item_by_id(item_id) for item_id in item_ids}
+    bill_ids, latencies, failures = [], [], 0
+
+    for _ in range(bills):
+        started = time.perf_counter()
+        bill_id = BillingManager.create_bill(staff_id)
+        if not bill_id:
+            failures += 1
+            continue
+
+        for item_id in rng.sample(item_ids, LINES_PER_BILL):
+            item = items[item_id]
+            if not BillingManager.add_item_to_bill(bill_id, {
+                'item_id': item_id,
+                'item_name': item['item_name'],
+                'barcode': item['barcode'],
+                'quantity': 1,
+                'unit_price': item['price'],
+                'gst_percentage': item['gst_percentage']
+            }):
+                failures += 1
+
+        BillingManager.calculate_bill_totals(bill_id)
+        if not BillingManager.finalize_bill(bill_id):
+            failures += 1
+        bill_ids.append(bill_id)
+        latencies.append(time.perf_counter() - started)
+
+    db.disconnect()
+    return {'till': till_number, 'bill_ids': bill_ids, 'latencies': latencies, 'failures': failures}
+
+
+def run_stress(tills: int = 3, bills_per_till: int = 20, verbose: bool = True,
+               use_service: bool = False) -> dict:
+    """
+    Run the tills in parallel processes against the database db points at
+    and check the results
+    use_service: tills talk to a billing service started in this process
+    instead of opening the file themselves
+    """
+    from thangamayil.database.connection import db
+
+    staff = db.get_single_result("SELECT staff_id FROM staff WHERE is_active = 1 ORDER BY staff_id")
+    demand = tills * bills_per_till * LINES_PER_BILL
+    item_ids = setup_stress_items(stock=demand, scarce_stock=max(1, bills_per_till // 2))
+    placeholders = ", ".join("?" for _ in item_ids)
+    stock_before = {row['item_id']: row['stock_quantity'] for row in db.execute_query(
+        f"SELECT item_id, stock_quantity FROM items WHERE item_id IN ({placeholders})", tuple(item_ids)
+    )}
+    last_movement = db.get_single_result("SELECT COALESCE(MAX(movement_id), 0) AS last FROM stock_movements")['last']
+    # Earlier runs and shop data are not audited, only the numbers this run issues
+    position = invoice_position()
+
+    service, service_url = None, None
+    if use_service:
+        from thangamayil.service.server import BillingService
+        service = BillingService(port=0)
+        service_url = service.start()
+
+    # Tills are separate processes, as on separate counters
+    context = multiprocessing.get_context('spawn')
+    started = time.perf_counter()
+    try:
+        with context.Pool(tills) as pool:
+            results = pool.starmap(
+                till_worker,
+                [(number, bills_per_till, item_ids, staff['staff_id'], service_url, os.path.abspath(db.db_path))
+                 for number in range(1, tills + 1)]
+            )
+    finally:
+        if service:
+            service.stop()
+    elapsed = time.perf_counter() - started
+
+    bill_ids = [bill_id for result in results for bill_id in result['bill_ids']]
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    failures = sum(result['failures'] for result in results)
+
+    duplicates = db.get_single_result(
+        """
+        SELECT COUNT(*) AS count FROM (
+            SELECT invoice_number FROM bills GROUP BY invoice_number HAVING COUNT(*) > 1
+        )
+        """
+    )['count']
+
+    # Every unit taken from stock must have a movement, and stock never goes negative
+    stock_after = {row['item_id']: row['stock_quantity'] for row in db.execute_query(
+        f"SELECT item_id, stock_quantity FROM items WHERE item_id IN ({placeholders})", tuple(item_ids)
+    )}
+    moved = {row['item_id']: -row['quantity'] for row in db.execute_query(
+        f"""
+        SELECT item_id, SUM(quantity) AS quantity FROM stock_movements
+        WHERE movement_id > ? AND reference_type = 'BILL' AND item_id IN ({placeholders})
+        GROUP BY item_id
+        """,
+        (last_movement, *item_ids)
+    )}
+    stock_ok = all(
+        stock_after[item_id] >= 0 and stock_before[item_id] - stock_after[item_id] == moved.get(item_id, 0)
+        for item_id in item_ids
+    )
+    refused = len(bill_ids) * LINES_PER_BILL - sum(moved.values())
+
+    missing_invoices = len(missing_invoices_since(position))
+
+    summary = {
+        'tills': tills,
+        'bills': len(bill_ids),
+        'failures': failures,
+        'duplicate_invoices': duplicates,
+        'missing_invoices': missing_invoices,
+        'stock_consistent': stock_ok,
+        'sales_refused_no_stock': refused,
+        'elapsed': elapsed,
+        'bills_per_second': len(bill_ids) / elapsed if elapsed else 0,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        'service_commits': service.stats['commits'] if service else None,
+        'ok': (failures == 0 and duplicates == 0 and missing_invoices == 0 and stock_ok
+               and len(bill_ids) == tills * bills_per_till)
+    }
+
+    if verbose:
+        print(f"Tills: {tills} | Bills: {summary['bills']} in {elapsed:.1f} s "
+              f"({summary['bills_per_second']:.1f} bills/s)")
+        print(f"Bill latency: p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms")
+        print(f"Failures: {failures} | Duplicate invoice numbers: {duplicates} | "
+              f"Missing invoice numbers: {missing_invoices}")
+        print(f"Stock consistent: {stock_ok} | Sales refused for lack of stock: {refused}")
+        if service:
+            print(f"Service: {service.stats['calls']} calls in {service.stats['commits']} commits "
+                  f"(largest group {service.stats['largest_group']})")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated billing counters against one database")
+    parser.add_argument('--tills', type=int, default=4, help="number of simulated counters")
+    parser.add_argument('--bills', type=int, default=50, help="bills per counter")
+    parser.add_argument('--service', action='store_true',
+                        help="tills use a local billing service instead of the file")
+    parser.add_argument('--workdir', help="folder holding thangamayil.db (default: a new temporary folder)")
+    args = parser.parse_args()
+
+    # The database is opened from the working directory, in this process and in each till
+    workdir = args.workdir or tempfile.mkdtemp(prefix="thangamayil_stress_")
+    os.chdir(workdir)
+    print(f"Database: {os.path.join(workdir, 'thangamayil.db')}")
+
+    summary = run_stress(args.tills, args.bills, use_service=args.service)
+    print("✓ Stress test passed" if summary['ok'] else "✗ Stress test failed")
+    return 0 if summary['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
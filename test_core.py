@@ -6,6 +6,9 @@ Tests database, authentication, and business logic
 
 import sys
 import os
+import tempfile
+import time
+from contextlib import contextmanager
 
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -16,6 +19,49 @@ from thangamayil.models.items import ItemsManager
 from thangamayil.models.billing import BillingManager, GSTCalculator
 
 
+@contextmanager
+def temporary_database():
+    """Point the global db at a new database in a temporary folder while a test runs"""
+    previous_path, previous_checked = db.db_path, db.migrations_checked
+    was_connected = db.connection is not None
+    db.disconnect()
+    db.db_path = os.path.join(tempfile.mkdtemp(prefix="thangamayil_test_"), "test.db")
+    db.migrations_checked = False
+    try:
+        db.connect()
+        yield db.db_path
+    finally:
+        db.disconnect()
+        db.db_path, db.migrations_checked = previous_path, previous_checked
+        if was_connected:
+            db.connect()
+
+
+def add_test_item(barcode, price=500.0, stock=100, category_id=None):
+    """Add an item to the current database and return it"""
+    ItemsManager.add_item({'barcode': barcode, 'item_name': f"Test Item {barcode}", 'hsn_code': '5007',
+                           'category_id': category_id, 'price': price, 'gst_percentage': 5.0,
+                           'stock_quantity': stock})
+    return ItemsManager.get_item_by_barcode(barcode)
+
+
+def create_test_bill(item, quantity=1, bill_date=None):
+    """Create and finalize a one-line bill, optionally back-dated; returns the bill_id"""
+    bill_id = BillingManager.create_bill(1)
+    BillingManager.add_item_to_bill(bill_id, {
+        'item_id': item['item_id'],
+        'item_name': item['item_name'],
+        'barcode': item['barcode'],
+        'quantity': quantity,
+        'unit_price': item['price'],
+        'gst_percentage': item['gst_percentage']
+    })
+    BillingManager.finalize_bill(bill_id)
+    if bill_date:
+        db.execute_update("UPDATE bills SET bill_date = ? WHERE bill_id = ?", (bill_date, bill_id))
+    return bill_id
+
+
 def test_database_connection():
     """Test database initialization and connection"""
     print("=== Testing Database Connection ===")
@@ -182,6 +228,1149 @@ def test_billing_operations():
         return False
 
 
+def test_receipt_rendering():
+    """Test receipt template rendering and shared totals"""
+    print("\n=== Testing Receipt Rendering ===")
+    try:
+        from thangamayil.printing.receipt import get_receipt_template, build_receipt_data
+        
+        bill = {
+            'invoice_number': 'TSK000001',
+            'bill_date': '2024-01-15 10:30:00',
+            'payment_mode': 'CASH',
+            'discount_percentage': 10
+        }
+        lines = [
+            {'item_name': 'Test Silk Saree', 'hsn_code': '5007', 'quantity': 2,
+             'unit_price': 1000.00, 'discount_percentage': 0, 'gst_percentage': 5.0},
+            {'item_name': 'Cotton Saree', 'hsn_code': '5208', 'quantity': 1,
+             'unit_price': 499.00, 'discount_percentage': 5, 'gst_percentage': 12.0}
+        ]
+        shop = {'shop_name': 'Test Shop', 'shop_address': 'Test Street',
+                'shop_phone': '0000', 'gstin': '33TEST'}
+        
+        receipt_data = build_receipt_data(bill, lines, shop)
+        totals = GSTCalculator.calculate_bill_summary(lines, 10)
+        same_totals = receipt_data['totals']['grand_total'] == totals['grand_total']
+        print(f"✓ Receipt totals match calculator: {same_totals}")
+        
+        # Compiled templates are cached per paper width
+        same_template = get_receipt_template('58mm') is get_receipt_template('58mm')
+        print(f"✓ Template cached per paper width: {same_template}")
+        
+        widths_ok = True
+        for paper in ('58mm', '80mm', '4in'):
+            template = get_receipt_template(paper)
+            content = template.render(receipt_data)
+            widest = max(len(line) for line in content.split("\n"))
+            widths_ok = widths_ok and widest <= template.line_width
+            print(f"✓ {paper} receipt: {len(content.splitlines())} lines, widest {widest}")
+        
+        return same_totals and same_template and widths_ok
+    except Exception as e:
+        print(f"✗ Receipt rendering error: {e}")
+        return False
+
+
+def test_invoice_export():
+    """Test exporting a date range of invoices to a zip and resuming it"""
+    print("\n=== Testing Invoice Export ===")
+    try:
+        import threading
+        import zipfile
+        from thangamayil.printing.invoice_export import InvoiceExporter, iter_bill_receipts, invoice_filename
+        
+        with temporary_database() as path:
+            item = add_test_item('EXPORT001')
+            in_range = [create_test_bill(item, bill_date=f'2024-03-0{day} 10:00:00') for day in (1, 2, 3)]
+            create_test_bill(item, bill_date='2024-04-01 10:00:00')
+            
+            receipts = list(iter_bill_receipts('2024-03-01', '2024-03-31', batch_size=2))
+            streamed = [receipt['bill']['bill_id'] for receipt in receipts] == in_range
+            print(f"✓ Streamed {len(receipts)} bills in pages of 2: {streamed}")
+            
+            # The Bill Management export runs on a worker thread sharing the connection
+            zip_path = os.path.join(os.path.dirname(path), "march.zip")
+            results = {}
+            worker = threading.Thread(target=lambda: results.update(
+                first=InvoiceExporter(zip_path, workers=1).export('2024-03-01', '2024-03-02')
+            ))
+            worker.start()
+            worker.join()
+            first = results.get('first', {})
+            print(f"✓ First export from a worker thread: {first.get('exported')} exported")
+            
+            # Leave the archive as a killed export would: no central directory and a torn last entry
+            with zipfile.ZipFile(zip_path) as archive:
+                entries_end = archive.start_dir
+            with open(zip_path, 'rb') as f:
+                unfinished = f.read(entries_end)
+            with open(zip_path + ".part", 'wb') as f:
+                f.write(unfinished + b'PK\x03\x04' + bytes(20))
+            os.remove(zip_path)
+            
+            second = InvoiceExporter(zip_path, workers=1).export('2024-03-01', '2024-03-31')
+            print(f"✓ Resumed after a crash: {second['exported']} exported, {second['skipped']} skipped")
+            
+            with zipfile.ZipFile(zip_path) as archive:
+                names = sorted(archive.namelist())
+                pdfs_ok = all(archive.read(name).startswith(b'%PDF') for name in names)
+            expected = sorted(invoice_filename(receipt['bill']['invoice_number']) for receipt in receipts)
+            print(f"✓ Zip holds {len(names)} PDFs: {names == expected and pdfs_ok}")
+        
+        return (streamed and first.get('exported') == 2 and second['exported'] == 1 and second['skipped'] == 2
+                and names == expected and pdfs_ok and not os.path.exists(zip_path + ".part"))
+    except Exception as e:
+        print(f"✗ Invoice export error: {e}")
+        return False
+
+
+def test_sticker_rendering():
+    """Test barcode sticker sheet rendering"""
+    print("\n=== Testing Sticker Rendering ===")
+    try:
+        import io
+        from thangamayil.printing.stickers import barcode_symbology, barcode_png, render_sticker_pdf
+        
+        symbologies_ok = (barcode_symbology('5901234123457') == 'ean13' and
+                          barcode_symbology('5901234123450') == 'code128' and
+                          barcode_symbology('TSK001') == 'code128')
+        print(f"✓ Barcode symbology selection: {symbologies_ok}")
+        
+        labels = [
+            {'store_name': 'Test Shop', 'item_name': 'Test Silk Saree',
+             'barcode': 'TSK001', 'mrp': 1500, 'quantity': 70},
+            {'store_name': 'Test Shop', 'item_name': 'Cotton Saree',
+             'barcode': '5901234123457', 'mrp': 499, 'quantity': 5}
+        ]
+        buffer = io.BytesIO()
+        count = render_sticker_pdf(labels, buffer, 'a4_65')
+        pdf_ok = count == 75 and buffer.getvalue().startswith(b'%PDF')
+        print(f"✓ Rendered {count} stickers on A4 sheets: {pdf_ok}")
+        
+        cached = barcode_png('TSK001') is barcode_png('TSK001')
+        print(f"✓ Barcode image cached: {cached}")
+        
+        return symbologies_ok and pdf_ok and cached
+    except Exception as e:
+        print(f"✗ Sticker rendering error: {e}")
+        return False
+
+
+def test_batch_labels():
+    """Test label jobs for a category, selected items and received stock"""
+    print("\n=== Testing Batch Labels ===")
+    try:
+        from datetime import date, timedelta
+        from types import SimpleNamespace
+        from thangamayil.printing.stickers import (labels_for_category, labels_for_items,
+                                                   labels_for_goods_receipt, expand_labels)
+        from thangamayil.ui.barcode_printer import BatchLabelDialog
+        
+        with temporary_database():
+            silk, cotton = [row['category_id'] for row in db.execute_query(
+                "SELECT category_id FROM categories WHERE category_name IN ('Silk Sarees', 'Cotton Sarees') "
+                "ORDER BY category_name DESC"
+            )]
+            first = add_test_item('LABEL001', stock=10, category_id=silk)
+            second = add_test_item('LABEL002', stock=10, category_id=silk)
+            other = add_test_item('LABEL003', stock=10, category_id=cotton)
+            ItemsManager.add_item({'barcode': None, 'item_name': 'No Barcode', 'category_id': silk,
+                                   'price': 100.0, 'stock_quantity': 10})
+            
+            category_ok = [label['barcode'] for label in labels_for_category(silk, 2)] == ['LABEL001', 'LABEL002']
+            print(f"✓ Category labels skip items without barcodes: {category_ok}")
+            
+            selected = labels_for_items([other['item_id'], first['item_id']], 3)
+            items_ok = ([label['barcode'] for label in selected] == ['LABEL003', 'LABEL001']
+                        and len(list(expand_labels(selected))) == 6)
+            print(f"✓ Selected item labels in the order given: {items_ok}")
+            
+            # Received stock, a sale, and stock restored by a cancelled bill
+            ItemsManager.update_stock(first['item_id'], 15, "IN", 1, "Consignment C-42")
+            ItemsManager.update_stock(second['item_id'], 13, "IN", 1, "Consignment C-43")
+            bill_id = create_test_bill(other, quantity=2)
+            BillingManager.cancel_bill(bill_id, 1)
+            
+            week = ((date.today() - timedelta(days=1)).isoformat(), (date.today() + timedelta(days=1)).isoformat())
+            received = {label['barcode']: label['quantity'] for label in labels_for_goods_receipt(*week)}
+            receipt_ok = received == {'LABEL001': 5, 'LABEL002': 3}
+            print(f"✓ Goods receipt labels (cancelled bill stock excluded): {received}")
+            
+            consignment = labels_for_goods_receipt(*week, notes="C-42")
+            notes_ok = [(label['barcode'], label['quantity']) for label in consignment] == [('LABEL001', 5)]
+            print(f"✓ Goods receipt narrowed by notes: {notes_ok}")
+            
+            # The dialog's selection, without a window
+            class StubVar:
+                def __init__(self, value):
+                    self.value = value
+                
+                def get(self):
+                    return self.value
+            
+            dialog = SimpleNamespace(
+                selected_item_ids=[second['item_id']], categories={'Silk Sarees': silk},
+                source_var=StubVar("Goods received"), received_from_var=StubVar(week[0]),
+                received_to_var=StubVar(week[1]), notes_var=StubVar(" "), per_item_var=StubVar("4"),
+                category_var=StubVar('Silk Sarees')
+            )
+            counts = {}
+            for source in BatchLabelDialog.SOURCES:
+                dialog.source_var = StubVar(source)
+                counts[source] = sum(label['quantity'] for label in BatchLabelDialog.build_labels(dialog))
+            dialog_ok = counts == {"Selected items": 4, "Category": 8, "Goods received": 8}
+            print(f"✓ Dialog sticker counts per source: {counts}")
+        
+        return category_ok and items_ok and receipt_ok and notes_ok and dialog_ok
+    except Exception as e:
+        print(f"✗ Batch labels error: {e}")
+        return False
+
+
+def test_online_backup():
+    """Test a verified online backup taken while bills are being written"""
+    print("\n=== Testing Online Backup ===")
+    try:
+        import sqlite3
+        import threading
+        from thangamayil.database.backup import BackupEngine, file_checksum, quick_check, get_backup_history
+        
+        with temporary_database() as path:
+            item = add_test_item('BACKUP001', stock=10000)
+            for _ in range(100):
+                create_test_bill(item)
+            bills_before = db.get_single_result("SELECT COUNT(*) AS n FROM bills")['n']
+            
+            # Keep billing on another thread (a busy till's pace) while the copy runs in small steps
+            stop = threading.Event()
+            
+            def keep_billing():
+                while not stop.wait(0.005):
+                    create_test_bill(item)
+            
+            writer = threading.Thread(target=keep_billing)
+            writer.start()
+            try:
+                backup_path = os.path.join(os.path.dirname(path), "backup.db")
+                result = BackupEngine(pages_per_step=2, step_pause=0.002).backup(backup_path)
+            finally:
+                stop.set()
+                writer.join()
+            bills_after = db.get_single_result("SELECT COUNT(*) AS n FROM bills")['n']
+            print(f"✓ Backed up in {result['duration_ms']} ms while {bills_after - bills_before} bills were saved")
+            
+            verified = quick_check(backup_path) == "ok" and file_checksum(backup_path) == result['checksum']
+            print(f"✓ Copy passes quick_check and matches its checksum: {verified}")
+            
+            copy = sqlite3.connect(backup_path)
+            copied_bills = copy.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+            copy.close()
+            copied = bills_before <= copied_bills <= bills_after
+            print(f"✓ Copy holds {copied_bills} bills: {copied}")
+            
+            logged = get_backup_history(1)[0]
+            logged_ok = (logged['backup_id'] == result['backup_id'] and logged['checksum'] == result['checksum']
+                         and logged['file_size'] == os.path.getsize(backup_path)
+                         and logged['backup_type'] == 'MANUAL')
+            print(f"✓ Recorded in backup_log: {logged_ok}")
+            leftover = not os.path.exists(backup_path + ".part")
+        
+        return verified and copied and logged_ok and leftover
+    except Exception as e:
+        print(f"✗ Online backup error: {e}")
+        return False
+
+
+def test_snapshots():
+    """Test scheduled full and incremental snapshots and their rotation"""
+    print("\n=== Testing Snapshots ===")
+    try:
+        import gzip
+        import json
+        from thangamayil.database.backup import SnapshotManager, current_change_seq
+        
+        def header(snapshot):
+            with gzip.open(snapshot['file_path'], 'rt', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        
+        with temporary_database() as path:
+            item = add_test_item('SNAP001')
+            create_test_bill(item)
+            manager = SnapshotManager(backup_dir=os.path.join(os.path.dirname(path), "backups"),
+                                      full_interval_hours=24, retention_count=1)
+            
+            first_full = manager.take_full()
+            unchanged = manager.take_incremental() is None
+            print(f"✓ No incremental without changes: {unchanged}")
+            
+            full_seq = manager.get_snapshots('FULL')[0]['change_seq']
+            create_test_bill(item)
+            incremental = manager.take_incremental()
+            chained = (header(incremental)['from_seq'] == full_seq
+                       and header(incremental)['to_seq'] == current_change_seq(db)
+                       and incremental['records'] > 0)
+            print(f"✓ Incremental follows the full snapshot with {incremental['records']} rows: {chained}")
+            
+            second_full = manager.take_full()
+            removed = manager.rotate()
+            remaining = [row['backup_id'] for row in manager.get_snapshots()]
+            pruned = db.get_single_result("SELECT COUNT(*) AS n FROM change_log")['n'] == 0
+            rotated = (removed == 2 and remaining == [second_full['backup_id']] and pruned
+                       and not os.path.exists(first_full['file_path'])
+                       and not os.path.exists(incremental['file_path']))
+            print(f"✓ Rotation kept one full snapshot and pruned change_log: {rotated}")
+            
+            # With change_log pruned empty the sequence must not go backwards
+            seq_kept = current_change_seq(db) == manager.get_snapshots('FULL')[0]['change_seq'] > 0
+            create_test_bill(item)
+            after_prune = manager.take_incremental()
+            forward = (after_prune is not None
+                       and header(after_prune)['from_seq'] == manager.get_snapshots('FULL')[0]['change_seq']
+                       and header(after_prune)['to_seq'] > header(after_prune)['from_seq'])
+            print(f"✓ Sequence continues after pruning: {seq_kept and forward}")
+        
+        return unchanged and chained and rotated and seq_kept and forward
+    except Exception as e:
+        print(f"✗ Snapshot error: {e}")
+        return False
+
+
+def test_scheduled_jobs():
+    """Test that one terminal at a time runs the scheduled backups and maintenance"""
+    print("\n=== Testing Scheduled Jobs ===")
+    try:
+        from thangamayil.database import backup
+        from thangamayil.diagnostics.metrics import TERMINAL_ENV
+        
+        previous_terminal = os.environ.get(TERMINAL_ENV)
+        
+        def claim_as(terminal):
+            os.environ[TERMINAL_ENV] = terminal
+            return backup.claim_scheduled_jobs()
+        
+        try:
+            with temporary_database():
+                first = claim_as("TILL1") and claim_as("TILL1") and not claim_as("TILL2")
+                print(f"✓ Lease held by the first terminal: {first}")
+                
+                # A terminal that stopped renewing is taken over
+                stale = time.time() - backup.SCHEDULED_JOBS_LEASE_MINUTES * 60 - 1
+                db.update_setting('scheduled_jobs_lease', f"TILL1|{stale:.0f}")
+                taken_over = claim_as("TILL2") and not claim_as("TILL1")
+                os.environ[TERMINAL_ENV] = "TILL2"
+                backup.release_scheduled_jobs()
+                released = claim_as("TILL1")
+                print(f"✓ Stale lease taken over, released lease reclaimed: {taken_over and released}")
+                
+                db.update_setting('scheduled_jobs_terminal', "TILL3")
+                designated = claim_as("TILL3") and not claim_as("TILL1")
+                print(f"✓ Designated terminal only: {designated}")
+                
+                # Maintenance waits while any terminal is still billing
+                from thangamayil.database.maintenance import MaintenanceEngine, MaintenanceScheduler, database_idle_seconds
+                create_test_bill(add_test_item('SCHEDULE001'))
+                scheduler = MaintenanceScheduler(lambda: float('inf'), engine=MaintenanceEngine(),
+                                                 idle_minutes=1, day_close_time="21:00")
+                shop_busy = database_idle_seconds() < 60 and scheduler.due() is None
+                print(f"✓ Maintenance waits for other terminals: {shop_busy}")
+        finally:
+            if previous_terminal is None:
+                os.environ.pop(TERMINAL_ENV, None)
+            else:
+                os.environ[TERMINAL_ENV] = previous_terminal
+        
+        return first and taken_over and released and designated and shop_busy
+    except Exception as e:
+        print(f"✗ Scheduled jobs error: {e}")
+        return False
+
+
+def test_point_in_time_restore():
+    """Test restoring a full snapshot plus changesets to an earlier time"""
+    print("\n=== Testing Point-in-Time Restore ===")
+    try:
+        from thangamayil.database.backup import SnapshotManager
+        from thangamayil.database.restore import RestoreEngine, scan_snapshots
+        from thangamayil.database.offline import stock_discrepancies
+        
+        with temporary_database() as path:
+            backup_dir = os.path.join(os.path.dirname(path), "backups")
+            manager = SnapshotManager(backup_dir=backup_dir, full_interval_hours=24, retention_count=3)
+            item = add_test_item('RESTORE001', stock=50)
+            create_test_bill(item)
+            manager.take_full()
+            create_test_bill(item, quantity=2)
+            BillingManager.cancel_bill(create_test_bill(item), 1)
+            manager.take_incremental()
+            
+            # State at the restore point
+            expected = [tuple(row) for row in db.execute_query(
+                "SELECT invoice_number, grand_total, is_cancelled FROM bills ORDER BY bill_id")]
+            expected_stock = ItemsManager.get_item_by_barcode('RESTORE001')['stock_quantity']
+            
+            # Later bills are lost by restoring to the first changeset
+            create_test_bill(item)
+            create_test_bill(item)
+            manager.take_incremental()
+            
+            engine = RestoreEngine(backup_dir)
+            target = [s for s in scan_snapshots(backup_dir) if s['type'] == 'INCREMENTAL'][0]['time']
+            result = engine.build(target)
+            built = result['incrementals'] == 1 and result['verification']['ok']
+            print(f"✓ Built from a full snapshot and {result['incrementals']} changeset: {built}")
+            
+            # Bills whose totals differ from their lines need an explicit confirm
+            import shutil
+            import sqlite3
+            tampered_path = result['output_path'] + ".tampered"
+            shutil.copy2(result['output_path'], tampered_path)
+            with sqlite3.connect(tampered_path) as connection:
+                connection.execute("UPDATE bills SET grand_total = grand_total + 5 WHERE bill_id = 1")
+            try:
+                engine.swap_in(tampered_path)
+                confirm_needed = False
+            except Exception as e:
+                confirm_needed = "mismatched" in str(e)
+            print(f"✓ Mismatched totals need confirming: {confirm_needed}")
+            
+            # Not while the billing service has the database open
+            from thangamayil.service.server import BillingService
+            service = BillingService(port=0)
+            service.start()
+            try:
+                engine.swap_in(result['output_path'])
+                service_refused = False
+            except Exception as e:
+                service_refused = "billing service" in str(e)
+            finally:
+                service.stop()
+            print(f"✓ Refused while the billing service runs: {service_refused}")
+            
+            engine.swap_in(result['output_path'])
+            restored = [tuple(row) for row in db.execute_query(
+                "SELECT invoice_number, grand_total, is_cancelled FROM bills ORDER BY bill_id")]
+            stock = ItemsManager.get_item_by_barcode('RESTORE001')['stock_quantity']
+            rows_ok = restored == expected and stock == expected_stock and not stock_discrepancies()
+            print(f"✓ Bills and stock match the restore point: {rows_ok}")
+            
+            # Numbering continues after the restored bills without reusing a number
+            prefix = db.get_setting('invoice_prefix') or 'TSK'
+            next_bill = create_test_bill(item)
+            invoice = BillingManager.get_bill_details(next_bill)['bill']['invoice_number']
+            numbered = invoice == f"{prefix}{len(expected) + 1:06d}"
+            print(f"✓ Next invoice after restore is {invoice}: {numbered}")
+        
+        return built and confirm_needed and service_refused and rows_ok and numbered
+    except Exception as e:
+        print(f"✗ Restore error: {e}")
+        return False
+
+
+def test_year_archival():
+    """Test moving a closed financial year to an archive file"""
+    print("\n=== Testing Year Archival ===")
+    try:
+        from thangamayil.database.archive import ArchiveManager, get_archives
+        
+        with temporary_database():
+            item = add_test_item('ARCHIVE001')
+            # Bill dated in a closed financial year
+            bill_id = create_test_bill(item, bill_date='2020-06-15 11:00:00')
+            invoice_number = BillingManager.get_bill_details(bill_id)['bill']['invoice_number']
+            
+            result = ArchiveManager(archive_dir=tempfile.mkdtemp()).archive_year(2020)
+            print(f"✓ Archived {result['label']}: {result['bills']} bills, {result['bill_items']} bill items")
+            
+            live = db.get_single_result("SELECT 1 FROM bills WHERE bill_id = ?", (bill_id,))
+            details = BillingManager.get_bill_details(bill_id)
+            lookup_ok = live is None and details is not None and details['bill']['is_archived'] and details['items']
+            print(f"✓ Archived bill readable through attach: {bool(lookup_ok)}")
+            
+            bills = BillingManager.get_bills_by_date('2020-06-01', '2020-06-30')
+            report_ok = any(bill['bill_id'] == bill_id for bill in bills)
+            print(f"✓ Archived bill included in reports: {report_ok}")
+            
+            # Invoice numbers keep counting past archived bills
+            numbering_ok = BillingManager.generate_invoice_number() > invoice_number
+            print(f"✓ Invoice numbers not reused: {numbering_ok}")
+            
+            # A later year and a back-dated bill give overlapping bill id ranges;
+            # archiving FY2020 again from elsewhere appends to its registered file
+            later_id = create_test_bill(item, bill_date='2021-06-15 11:00:00')
+            late_id = create_test_bill(item, bill_date='2020-09-15 11:00:00')
+            again = ArchiveManager(archive_dir=tempfile.mkdtemp()).archive_year(2020)
+            ArchiveManager(archive_dir=tempfile.mkdtemp()).archive_year(2021)
+            registry = {archive['fy_start']: archive for archive in get_archives()}
+            same_file = again['file_path'] == result['file_path'] == registry[2020]['file_path'] \
+                and registry[2020]['bill_count'] == 2
+            found = all(
+                (BillingManager.get_bill_details(found_id) or {}).get('bill', {}).get('bill_date', '')[:4] == year
+                for found_id, year in ((bill_id, '2020'), (late_id, '2020'), (later_id, '2021'))
+            )
+            audit_ok = not BillingManager.audit_invoice_series()['missing']
+            print(f"✓ Archiving again keeps one file per year and every bill reachable: "
+                  f"{same_file and found and audit_ok}")
+        
+        return bool(lookup_ok) and report_ok and numbering_ok and same_file and found and audit_ok
+    except Exception as e:
+        print(f"✗ Year archival error: {e}")
+        return False
+
+
+def test_database_maintenance():
+    """Test maintenance run with measurements and logging"""
+    print("\n=== Testing Database Maintenance ===")
+    try:
+        from thangamayil.database.maintenance import MaintenanceEngine
+        
+        with temporary_database():
+            item = add_test_item('MAINT001')
+            for _ in range(20):
+                create_test_bill(item)
+            
+            engine = MaintenanceEngine()
+            result = engine.run('MANUAL', force_vacuum=True)
+            ran = [task['task'] for task in result['tasks'] if not task['skipped']]
+            print(f"✓ Tasks run: {', '.join(ran)} in {result['duration_ms']} ms")
+            
+            after = result['after']
+            measured = after['page_count'] > 0 and after['freelist_count'] == 0
+            print(f"✓ Measured {after['page_count']} pages, {after['freelist_count']} free after VACUUM: {measured}")
+            
+            logged = engine.get_history(1)[0]['run_type'] == 'MANUAL'
+            print(f"✓ Run recorded in maintenance log: {logged}")
+        
+        return len(ran) == 4 and measured and logged
+    except Exception as e:
+        print(f"✗ Database maintenance error: {e}")
+        return False
+
+
+def test_maintenance_schedule():
+    """Test when the scheduler runs idle and day close maintenance"""
+    print("\n=== Testing Maintenance Schedule ===")
+    try:
+        from datetime import datetime, timedelta
+        from thangamayil.database.maintenance import MaintenanceEngine, MaintenanceScheduler
+        
+        with temporary_database():
+            engine = MaintenanceEngine()
+            scheduler = MaintenanceScheduler(lambda: float('inf'), engine=engine,
+                                             idle_minutes=1, day_close_time="9:00")
+            morning = datetime.now().replace(hour=8, minute=30)
+            evening = datetime.now().replace(hour=21, minute=30)
+            
+            idle_first = scheduler.due(morning) == 'IDLE'
+            idle_run = engine.run_idle()
+            unscanned = idle_run['before']['fragmentation_percent'] is None
+            print(f"✓ Idle run before day close, without a page scan: {idle_first and unscanned}")
+            
+            # '9:00' is read as a time, not compared as text against '21:30'
+            day_close = scheduler.due(evening) == 'DAY_CLOSE'
+            engine.run_day_close()
+            once_a_day = scheduler.due(evening) != 'DAY_CLOSE' and scheduler.due(evening + timedelta(days=1)) == 'DAY_CLOSE'
+            print(f"✓ Day close after 9:00, once per day: {day_close and once_a_day}")
+            
+            scheduler.idle_seconds = lambda: 0
+            busy = scheduler.due(evening + timedelta(days=1)) is None
+            print(f"✓ Nothing runs while in use: {busy}")
+        
+        return idle_first and unscanned and day_close and once_a_day and busy
+    except Exception as e:
+        print(f"✗ Maintenance schedule error: {e}")
+        return False
+
+
+def test_head_office_sync():
+    """Test exporting changes since a cursor as a changeset"""
+    print("\n=== Testing Head Office Sync ===")
+    try:
+        import tempfile
+        from thangamayil.database.sync import ChangesetExporter, read_changeset
+        
+        with temporary_database():
+            item = add_test_item('SYNC001')
+            export_dir = tempfile.mkdtemp(prefix="thangamayil_sync_")
+            cursor = db.get_single_result("SELECT COALESCE(MAX(change_id), 0) AS seq FROM change_log")['seq']
+            
+            # Without its own code a store's bills would land on another store's at head office
+            try:
+                ChangesetExporter(export_dir=export_dir).export_since(cursor)
+                needs_code = False
+            except Exception as e:
+                needs_code = "store code" in str(e)
+            print(f"✓ Export refused without a store code: {needs_code}")
+            db.update_setting('store_code', 'STORE1')
+            exporter = ChangesetExporter(export_dir=export_dir)
+            
+            ItemsManager.update_stock(item['item_id'], item['stock_quantity'] + 1)
+            result = exporter.export_since(cursor)
+            print(f"✓ Exported {result['records']} rows in {result['file_size']} bytes")
+            
+            header, records = read_changeset(result['file_path'])
+            tables = {table for table, op, row in records}
+            print(f"✓ Changeset tables: {', '.join(sorted(tables))}")
+            
+            nothing_new = exporter.export_since(result['to_seq']) is None
+            print(f"✓ Nothing to export after the cursor: {nothing_new}")
+        
+        return (needs_code and header['store'] == 'STORE1' and header['to_seq'] == result['to_seq']
+                and {'items', 'stock_movements'} <= tables and nothing_new)
+    except Exception as e:
+        print(f"✗ Head office sync error: {e}")
+        return False
+
+
+def test_head_office_consolidation():
+    """Test merging store changesets into the head office database"""
+    print("\n=== Testing Head Office Consolidation ===")
+    try:
+        from datetime import date
+        from thangamayil.database.sync import ChangesetExporter
+        from thangamayil.database.consolidation import ConsolidationEngine
+        
+        with temporary_database() as path:
+            item = add_test_item('CONSOL001')
+            create_test_bill(item)
+            create_test_bill(item, quantity=2)
+            
+            folder = os.path.dirname(path)
+            paths = [ChangesetExporter(export_dir=folder, store_code=store).export_since(0)['file_path']
+                     for store in ("STORE1", "STORE2")]
+            
+            engine = ConsolidationEngine(os.path.join(folder, "headoffice.db"), workers=2)
+            summary = engine.merge(paths)
+            print(f"✓ Merged {summary['merged']} changesets, {summary['rows']} rows")
+            
+            again = engine.merge(paths)
+            print(f"✓ Repeated changesets skipped: {again['merged'] == 0}")
+            
+            today = date.today().isoformat()
+            bills = engine.get_bills_by_date(today, today)
+            print(f"✓ Consolidated bills today: {len(bills)} (2 per store)")
+            
+            # A store file without its own store code is not merged
+            unnamed = engine.merge([path])['sources'][0]['status'].startswith("skipped")
+            print(f"✓ Store file without a store code skipped: {unnamed}")
+            
+            # The same invoices under new bill ids replace the old bills and their lines
+            import sqlite3
+            db.update_setting('store_code', 'STORE1')
+            copy_path = os.path.join(folder, "store1.db")
+            with sqlite3.connect(path) as source, sqlite3.connect(copy_path) as copy:
+                source.backup(copy)
+                copy.execute("UPDATE bill_items SET bill_id = bill_id + 100, bill_item_id = bill_item_id + 100")
+                copy.execute("UPDATE bills SET bill_id = bill_id + 100")
+            engine.merge([copy_path])
+            connection = engine.connect()
+            store_bills = connection.execute("SELECT COUNT(*) FROM bills WHERE store_code = 'STORE1'").fetchone()[0]
+            orphans = connection.execute(
+                """
+                SELECT COUNT(*) FROM bill_items bi LEFT JOIN bills b
+                ON b.store_code = bi.store_code AND b.bill_id = bi.bill_id WHERE b.bill_id IS NULL
+                """
+            ).fetchone()[0]
+            engine.disconnect()
+            replaced = store_bills == 2 and orphans == 0
+            print(f"✓ Renumbered bills replaced without orphaned lines: {replaced}")
+        
+        return summary['merged'] == 2 and again['merged'] == 0 and len(bills) == 4 and unnamed and replaced
+    except Exception as e:
+        print(f"✗ Head office consolidation error: {e}")
+        return False
+
+
+def test_offline_till_stock():
+    """Test stock counters merging after a till billed offline"""
+    print("\n=== Testing Offline Till Stock ===")
+    try:
+        from thangamayil.database.connection import DatabaseConnection
+        from thangamayil.database.offline import (prepare_offline_copy, merge_offline_copy,
+                                                  stock_discrepancies)
+        
+        with temporary_database() as path:
+            item = add_test_item('OFFLINE001', stock=10)
+            till_path = os.path.join(os.path.dirname(path), "till.db")
+            prepare_offline_copy(till_path, "TILL2")
+            
+            # Both sides sell while disconnected
+            ItemsManager.reduce_stock_for_sale(item['item_id'], 3, 0, 1)
+            till = DatabaseConnection(till_path)
+            till.execute_update("UPDATE items SET stock_quantity = stock_quantity - 4 WHERE item_id = ?",
+                                (item['item_id'],))
+            till.disconnect()
+            
+            result = merge_offline_copy(till_path)
+            merge_offline_copy(till_path)  # merging again changes nothing
+            main_stock = ItemsManager.get_item_by_id(item['item_id'])['stock_quantity']
+            till = DatabaseConnection(till_path)
+            till_stock = till.get_single_result("SELECT stock_quantity FROM items WHERE item_id = ?",
+                                                (item['item_id'],))['stock_quantity']
+            till.disconnect()
+            print(f"✓ Merged {result['terminal_id']}: main stock {main_stock}, till stock {till_stock}")
+            
+            consistent = not stock_discrepancies()
+            print(f"✓ Stock equals counter totals: {consistent}")
+        
+        return main_stock == 3 and till_stock == 3 and consistent
+    except Exception as e:
+        print(f"✗ Offline till stock error: {e}")
+        return False
+
+
+def test_invoice_blocks():
+    """Test invoice numbers issued from a terminal's leased block"""
+    print("\n=== Testing Invoice Blocks ===")
+    try:
+        with temporary_database():
+            # Off by default: bills take the next number of the shared sequence
+            BillingManager.create_bill(1)
+            sequence_only = not db.execute_query("SELECT 1 FROM invoice_blocks")
+            print(f"✓ Shared sequence used while blocks are off: {sequence_only}")
+            
+            db.update_setting('invoice_block_size', '500')
+            block = BillingManager.lease_invoice_block(terminal="TEST-TILL", size=5)
+            print(f"✓ Leased {block['start_number']}..{block['end_number']} to {block['terminal']}")
+            
+            terminal = BillingManager._invoice_terminal()
+            bill_id = BillingManager.create_bill(1)
+            number = int(BillingManager.get_bill_details(bill_id)['bill']['invoice_number'][len(block['prefix']):])
+            own_block = db.get_single_result(
+                "SELECT * FROM invoice_blocks WHERE terminal = ? AND ? BETWEEN start_number AND end_number",
+                (terminal, number)
+            )
+            print(f"✓ Bill number {number} from this terminal's block: {own_block is not None}")
+            
+            BillingManager.release_invoice_blocks("TEST-TILL")
+            audit = BillingManager.audit_invoice_series()
+            print(f"✓ Audit: {audit['issued']} issued, {audit['unused']} unused, {len(audit['missing'])} missing")
+        
+        return sequence_only and own_block is not None and audit['unused'] >= 5 and not audit['missing']
+    except Exception as e:
+        print(f"✗ Invoice blocks error: {e}")
+        return False
+
+
+def test_latency_metrics():
+    """Test latency histograms and the Prometheus metrics file"""
+    print("\n=== Testing Latency Metrics ===")
+    try:
+        import tempfile
+        from thangamayil.diagnostics.metrics import metrics, MetricsRegistry
+        from thangamayil.models.items import ItemsManager
+        
+        with temporary_database():
+            ItemsManager.get_item_by_barcode("NO-SUCH-BARCODE")
+        lookups = metrics.snapshot().get('get_item_by_barcode', {}).get('count', 0)
+        print(f"✓ Barcode lookups timed: {lookups}")
+        
+        registry = MetricsRegistry(tempfile.mkdtemp())
+        for ms in range(1, 101):
+            registry.record('scan_to_display', ms / 1000)
+        summary = registry.snapshot()['scan_to_display']
+        print(f"✓ p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+        
+        with open(registry.flush(), encoding='utf-8') as f:
+            text = f.read()
+        exported = 'thangamayil_operation_duration_seconds_count{operation="scan_to_display"' in text
+        print(f"✓ Prometheus file written: {exported}")
+        
+        return (lookups > 0 and exported and abs(summary['p50_ms'] - 50) <= 2
+                and abs(summary['p99_ms'] - 99) <= 4)
+    except Exception as e:
+        print(f"✗ Latency metrics error: {e}")
+        return False
+
+
+def test_sql_tracing():
+    """Test SQL tracing, statement fingerprints and N+1 detection"""
+    print("\n=== Testing SQL Tracing ===")
+    try:
+        from thangamayil.diagnostics.sqltrace import fingerprint
+        
+        same = fingerprint("SELECT * FROM items WHERE item_id = 7 AND barcode = 'X1'") == \
+            fingerprint("SELECT * FROM items  WHERE item_id = ? AND barcode = ?")
+        print(f"✓ Literals normalised in fingerprints: {same}")
+        
+        # Slow statements are logged beside the temporary database, not in ./logs
+        with temporary_database():
+            for index in range(5):
+                add_test_item(f"TRACE{index + 1:03d}")
+            tracer = db.enable_tracing(slow_ms=10000)
+            try:
+                with tracer.window("item lookups") as window:
+                    for item in ItemsManager.get_all_items()[:5]:
+                        ItemsManager.get_item_by_id(item['item_id'])
+            finally:
+                db.disable_tracing()
+        
+        lookups = [row for row in tracer.report(100) if row['statement'].endswith("WHERE i.item_id = ?")]
+        sites = lookups[0]['sites'] if lookups else []
+        print(f"✓ Statements in window: {window.total}, call site: {sites[:1]}")
+        
+        flagged = any(row['sites'] == ["item lookups"] for row in tracer.n_plus_one_report())
+        print(f"✓ Repeated lookups flagged as N+1: {flagged}")
+        
+        return same and bool(sites) and 'get_item_by_id' in sites[0] and (flagged or window.total < 5)
+    except Exception as e:
+        print(f"✗ SQL tracing error: {e}")
+        return False
+
+
+def test_query_plan_audit():
+    """Test the query plan audit of the application's queries"""
+    print("\n=== Testing Query Plan Audit ===")
+    try:
+        from thangamayil.diagnostics.queryplan import QueryPlanAuditor, format_report
+        
+        report = QueryPlanAuditor().audit()
+        names = {result['name'] for result in report['queries']}
+        errors = [finding['message'] for result in report['queries']
+                  for finding in result['findings'] if finding['kind'] == 'ERROR']
+        print(f"✓ {len(report['queries'])} statements explained, {report['scans']} scans")
+        print(f"✓ Suggested indexes: {len(report['suggestions'])}")
+        
+        stable = format_report(report) == format_report(QueryPlanAuditor().audit())
+        print(f"✓ Report identical between runs: {stable}")
+        if errors:
+            print(f"✗ Queries failed: {errors}")
+        
+        return not errors and stable and {'items.search_items', 'billing.get_bills_by_date'} <= names
+    except Exception as e:
+        print(f"✗ Query plan audit error: {e}")
+        return False
+
+
+def test_store_generator():
+    """Test the synthetic store database generator"""
+    print("\n=== Testing Store Generator ===")
+    try:
+        import tempfile
+        from thangamayil.database.connection import DatabaseConnection
+        from thangamayil.database.offline import stock_discrepancies
+        from thangamayil.diagnostics.datagen import StoreDataGenerator
+
+        path = os.path.join(tempfile.mkdtemp(prefix="thangamayil_store_"), "store.db")
+        result = StoreDataGenerator(path, items=200, bills=1500, customers=100, years=0.5).generate()
+        print(f"✓ Generated {result['bills']} bills with {result['bill_items']} lines")
+
+        store = DatabaseConnection(path)
+        counts_ok = (store.execute_query("SELECT COUNT(*) AS n FROM bills")[0]['n'] == 1500 and
+                     store.execute_query("SELECT COUNT(*) AS n FROM items")[0]['n'] == 200)
+
+        totals_ok = True
+        for bill in store.execute_query("SELECT * FROM bills ORDER BY bill_id LIMIT 50"):
+            lines = [dict(row) for row in store.execute_query(
+                "SELECT * FROM bill_items WHERE bill_id = ?", (bill['bill_id'],)
+            )]
+            summary = GSTCalculator.calculate_bill_summary(lines, 0, bill['igst_amount'] > 0)
+            if abs(summary['grand_total'] - bill['grand_total']) > 0.01 or \
+                    abs(summary['subtotal'] - bill['subtotal']) > 0.01:
+                totals_ok = False
+        print(f"✓ Bill totals match GST calculator: {totals_ok}")
+
+        stock_ok = not stock_discrepancies(store) and not store.execute_query(
+            """
+            SELECT item_id FROM items i WHERE stock_quantity !=
+            (SELECT SUM(quantity) FROM stock_movements m WHERE m.item_id = i.item_id)
+            """
+        )
+        print(f"✓ Stock matches movements and counters: {stock_ok}")
+        store.disconnect()
+
+        return counts_ok and totals_ok and stock_ok
+    except Exception as e:
+        print(f"✗ Store generator error: {e}")
+        return False
+
+
+def test_benchmarks():
+    """Test the benchmark suite and regression comparison"""
+    print("\n=== Testing Benchmarks ===")
+    try:
+        import copy
+        import tempfile
+        from thangamayil.diagnostics.datagen import StoreDataGenerator
+        from thangamayil.diagnostics.benchmark import BenchmarkSuite, compare_results
+
+        path = os.path.join(tempfile.mkdtemp(prefix="thangamayil_store_"), "store.db")
+        StoreDataGenerator(path, items=200, bills=1000, customers=50, years=0.25).generate()
+
+        previous_path = db.db_path
+        results = BenchmarkSuite(path, seconds=0.05, only=['items.', 'create_finalize', 'receipt.render']).run()
+        print(f"✓ Cases run: {len(results['results'])}")
+        restored = db.db_path == previous_path
+        print(f"✓ Application database restored: {restored}")
+
+        errors = sum(result['errors'] for result in results['results'].values())
+        if errors:
+            print(f"✗ Benchmark calls failed: {errors}")
+
+        slower = copy.deepcopy(results)
+        for result in slower['results'].values():
+            result['p50_ms'] = result['p50_ms'] * 2 + 1
+        statuses = {row['status'] for row in compare_results(results, slower)}
+        unchanged = {row['status'] for row in compare_results(results, results)}
+        print(f"✓ Regressions flagged: {statuses == {'REGRESSION'}}")
+
+        return (len(results['results']) == 4 and not errors and restored and
+                statuses == {'REGRESSION'} and unchanged == {'OK'})
+    except Exception as e:
+        print(f"✗ Benchmark error: {e}")
+        return False
+
+
+def test_workload_replay():
+    """Test recording model calls and replaying them against a copy"""
+    print("\n=== Testing Workload Replay ===")
+    try:
+        import tempfile
+        from thangamayil.diagnostics.workload import WorkloadRecorder, WorkloadReplayer, load_recording
+
+        with temporary_database():
+            staff_id = db.get_single_result("SELECT MIN(staff_id) AS staff_id FROM staff")['staff_id']
+            customer_id = db.get_single_result("SELECT MIN(customer_id) AS customer_id FROM customers")['customer_id']
+            add_test_item('REPLAY001')
+
+            recorder = WorkloadRecorder(tempfile.mkdtemp(prefix="thangamayil_workload_"))
+            path = recorder.start()
+            try:
+                scanned = ItemsManager.get_item_by_barcode('REPLAY001')
+                bill_id = BillingManager.create_bill(staff_id, customer_id)
+                BillingManager.add_item_to_bill(bill_id, {
+                    'item_id': scanned['item_id'], 'item_name': scanned['item_name'], 'barcode': scanned['barcode'],
+                    'quantity': 1, 'unit_price': scanned['price'], 'gst_percentage': scanned['gst_percentage']
+                })
+                BillingManager.calculate_bill_totals(bill_id)
+                BillingManager.finalize_bill(bill_id, 'UPI')
+            finally:
+                recorder.stop()
+
+            recording = load_recording(path)
+            calls = [entry['call'] for entry in recording['calls']]
+            print(f"✓ Recorded calls: {len(calls)}")
+            anonymised = recording['calls'][1]['args']['customer_id'] != customer_id
+            print(f"✓ Customer anonymised: {anonymised}")
+            # finalize_bill's own stock calls are not recorded separately
+            nested = 'ItemsManager.reduce_stock_for_sale' in calls
+
+            summary = WorkloadReplayer(db.db_path, [path], speed=0).run()
+            print(f"✓ Replayed calls: {summary['calls']} with {summary['errors']} errors")
+            print(f"✓ Write lock waits measured: {summary['lock_waits']['count']}")
+
+        return (len(calls) == 5 and anonymised and not nested and summary['calls'] == 5 and
+                summary['errors'] == 0 and summary['refused'] == 0 and summary['lock_waits']['count'] > 0)
+    except Exception as e:
+        print(f"✗ Workload replay error: {e}")
+        return False
+
+
+def test_ui_watchdog():
+    """Test the event loop freeze watchdog (with a stand-in for the Tk root)"""
+    print("\n=== Testing UI Watchdog ===")
+    try:
+        import tempfile
+        import time
+        from thangamayil.diagnostics.watchdog import UIWatchdog
+
+        class StubRoot:
+            def __init__(self):
+                self.scheduled = []
+
+            def after(self, ms, callback):
+                self.scheduled.append(callback)
+
+            def bind_all(self, sequence, callback, add=None):
+                pass
+
+        def blocking_print_call():
+            time.sleep(0.5)
+
+        root = StubRoot()
+        watchdog = UIWatchdog(root, log_dir=tempfile.mkdtemp(prefix="thangamayil_ui_"), freeze_ms=150, heartbeat_ms=20)
+        watchdog.active_window = "POS Billing"
+        watchdog.start()
+        try:
+            watchdog.heartbeat()
+            blocking_print_call()
+            watchdog.heartbeat()
+        finally:
+            watchdog.stop()
+
+        with open(watchdog.log_path, 'r', encoding='utf-8') as f:
+            log = f.read()
+        print(f"✓ Freezes detected: {watchdog.freezes}")
+        captured = 'blocking_print_call' in log and 'POS Billing' in log and 'FREEZE ended' in log
+        print(f"✓ Blocking call and window logged: {captured}")
+        return watchdog.freezes == 1 and captured and len(root.scheduled) == 3
+    except Exception as e:
+        print(f"✗ UI watchdog error: {e}")
+        return False
+
+
+def test_profiler():
+    """Test the on-demand cProfile and sampling profilers"""
+    print("\n=== Testing Profiler ===")
+    try:
+        import tempfile
+        import threading
+        import time
+        from thangamayil.diagnostics.profiler import Profiler, profile_mode_from_args
+        from thangamayil.models.items import ItemsManager
+
+        def slow_item_lookup():
+            end = time.perf_counter() + 0.3
+            while time.perf_counter() < end:
+                ItemsManager.get_all_items()
+
+        profiler = Profiler(profile_dir=tempfile.mkdtemp(prefix="thangamayil_profile_"))
+        results = {}
+        for mode in ('cprofile', 'sampling'):
+            profiler.start(mode)
+            if mode == 'sampling':
+                # The sampler covers every thread, not only the one that started it
+                worker = threading.Thread(target=slow_item_lookup)
+                worker.start()
+                worker.join()
+            else:
+                slow_item_lookup()
+            results[mode] = profiler.stop()
+
+        import pstats
+        stats = pstats.Stats(results['cprofile']['file'])
+        cprofiled = any(name == 'slow_item_lookup' for _, _, name in stats.stats)
+        print(f"✓ cProfile saved: {os.path.basename(results['cprofile']['file'])}")
+
+        with open(results['sampling']['file'], 'r', encoding='utf-8') as f:
+            collapsed = f.read()
+        sampled = 'slow_item_lookup' in collapsed and 'get_all_items' in collapsed
+        print(f"✓ Sampled stacks saved: {os.path.basename(results['sampling']['file'])}")
+
+        with open(results['sampling']['summary'], 'r', encoding='utf-8') as f:
+            summary = f.read()
+        sql_summarised = 'FROM items' in summary
+        print(f"✓ SQL included in summary: {sql_summarised}")
+
+        parsed = (profile_mode_from_args(['--profile']) == 'sampling'
+                  and profile_mode_from_args(['--profile', 'cprofile']) == 'cprofile'
+                  and profile_mode_from_args([]) is None)
+        return cprofiled and sampled and sql_summarised and parsed and not profiler.running
+    except Exception as e:
+        print(f"✗ Profiler error: {e}")
+        return False
+
+
+def test_startup():
+    """Test deferred database creation and the background startup tasks"""
+    print("\n=== Testing Startup ===")
+    try:
+        import tempfile
+        from thangamayil.database.connection import DatabaseConnection
+        from thangamayil.startup import StartupTimer, StartupTasks, warm_up
+        from thangamayil.diagnostics.metrics import metrics
+
+        path = os.path.join(tempfile.mkdtemp(prefix="thangamayil_startup_"), "store.db")
+        store = DatabaseConnection(path, create=False)
+        deferred = not os.path.exists(path)
+        print(f"✓ No file touched before first use: {deferred}")
+
+        timer = StartupTimer()
+        startup = StartupTasks(timer)
+        startup.add('database', store.connect)
+        startup.add('prefetch', lambda: store.execute_query("SELECT * FROM missing_table"))
+        startup.add('after_failure', lambda: None)
+        startup.start()
+        opened = startup.wait('database', timeout=30)
+        startup.join(30)
+        admin = store.get_single_result("SELECT password_hash FROM staff WHERE staff_name = 'admin'")
+        store.disconnect()
+        created = opened and admin is not None and admin['password_hash'] != 'admin123'
+        print(f"✓ Database created in the background: {created}")
+
+        try:
+            startup.wait('prefetch')
+            failure_raised = False
+        except Exception:
+            failure_raised = True
+        skipped = 'after_failure' in startup.errors
+        print(f"✓ Failures reported to waiters: {failure_raised and skipped}")
+        print(f"✓ {timer.summary()}")
+
+        # Warm-up reads catalog, settings and staff without adding to the scan metrics
+        scans = metrics.snapshot().get('get_item_by_barcode', {}).get('count', 0)
+        counts = warm_up()
+        warmed = counts['items'] > 0 and counts['settings'] > 0 and counts['staff'] > 0
+        untimed = metrics.snapshot().get('get_item_by_barcode', {}).get('count', 0) == scans
+        print(f"✓ Warm-up: {counts}")
+        return deferred and created and failure_raised and skipped and 'database' in timer.phases and warmed and untimed
+    except Exception as e:
+        print(f"✗ Startup error: {e}")
+        return False
+
+
+def test_multi_terminal_concurrency():
+    """Test several billing processes sharing one database file"""
+    print("\n=== Testing Multi-Terminal Concurrency ===")
+    try:
+        from stress_terminals import run_stress
+        
+        with temporary_database():
+            summary = run_stress(tills=3, bills_per_till=10)
+        print(f"✓ Concurrent tills consistent: {summary['ok']}")
+        return summary['ok']
+    except Exception as e:
+        print(f"✗ Multi-terminal concurrency error: {e}")
+        return False
+
+
+def test_billing_service():
+    """Test terminals billing through the local billing service"""
+    print("\n=== Testing Billing Service ===")
+    try:
+        from stress_terminals import run_stress
+        
+        from thangamayil.service.server import BillingService
+        from thangamayil.service.client import ServiceClient
+        
+        with temporary_database():
+            summary = run_stress(tills=2, bills_per_till=5, use_service=True)
+            print(f"✓ Service tills consistent: {summary['ok']}")
+            print(f"✓ Group commits: {summary['service_commits']}")
+            
+            def refused(function, *args):
+                try:
+                    function(*args)
+                except Exception:
+                    return True
+                return False
+            
+            # Listening beyond this computer needs a token
+            lan_refused = refused(BillingService(host="0.0.0.0", port=0).start)
+            print(f"✓ LAN service without a token refused: {lan_refused}")
+            
+            # SQL from terminals: no password hashes, no writes outside the billing tables
+            service = BillingService(port=0)
+            client = ServiceClient(service.start())
+            try:
+                hashes = [row['password_hash'] for row in client.execute_query("SELECT password_hash FROM staff")]
+                bill_update = client.execute_update("UPDATE bills SET payment_mode = payment_mode WHERE bill_id = -1")
+                with client.transaction():
+                    write_in_transaction = refused(client.execute_update, "UPDATE bills SET notes = notes", [])
+                sql_limited = (hashes and not any(hashes) and bill_update == 0 and write_in_transaction
+                               and refused(client.execute_update, "UPDATE staff SET password_hash = 'x'", [])
+                               and refused(client.execute_query, "DELETE FROM bills", [])
+                               and refused(client.execute_query, "PRAGMA table_info(staff)", []))
+            finally:
+                service.stop()
+        print(f"✓ Terminal SQL limited to reads and billing tables: {bool(sql_limited)}")
+        
+        return summary['ok'] and lan_refused and bool(sql_limited)
+    except Exception as e:
+        print(f"✗ Billing service error: {e}")
+        return False
+
+
 def main():
     """Run all tests"""
     print("தங்கமயில் சில்க்ஸ் - Core Functionality Test\n")
@@ -193,6 +1382,32 @@ def main():
         ("Items Management", test_items_management),
         ("GST Calculations", test_gst_calculations),
         ("Billing Operations", test_billing_operations),
+        ("Receipt Rendering", test_receipt_rendering),
+        ("Invoice Export", test_invoice_export),
+        ("Sticker Rendering", test_sticker_rendering),
+        ("Batch Labels", test_batch_labels),
+        ("Online Backup", test_online_backup),
+        ("Snapshots", test_snapshots),
+        ("Scheduled Jobs", test_scheduled_jobs),
+        ("Point-in-Time Restore", test_point_in_time_restore),
+        ("Year Archival", test_year_archival),
+        ("Database Maintenance", test_database_maintenance),
+        ("Maintenance Schedule", test_maintenance_schedule),
+        ("Head Office Sync", test_head_office_sync),
+        ("Head Office Consolidation", test_head_office_consolidation),
+        ("Offline Till Stock", test_offline_till_stock),
+        ("Invoice Blocks", test_invoice_blocks),
+        ("Latency Metrics", test_latency_metrics),
+        ("SQL Tracing", test_sql_tracing),
+        ("Query Plan Audit", test_query_plan_audit),
+        ("Store Generator", test_store_generator),
+        ("Benchmarks", test_benchmarks),
+        ("Workload Replay", test_workload_replay),
+        ("UI Watchdog", test_ui_watchdog),
+        ("Profiler", test_profiler),
+        ("Startup", test_startup),
+        ("Multi-Terminal Concurrency", test_multi_terminal_concurrency),
+        ("Billing Service", test_billing_service),
     ]
     
     passed = 0